@@ -0,0 +1,46 @@
+"""add dify file upload table
+
+Revision ID: add_dify_file_upload_001
+Revises: add_permission_scope_indexes_001
+Create Date: 2026-10-17 09:00:00.000000
+
+说明：
+- 新增 dify_file_upload 表，按（文件哈希, Dify 地址）缓存 /files/upload 返回的文件ID（见 app/services/dify_file_cache.py）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "add_dify_file_upload_001"
+down_revision = "add_permission_scope_indexes_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if "dify_file_upload" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "dify_file_upload",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("file_hash", sa.String(length=64), nullable=False),
+        sa.Column("endpoint", sa.String(length=500), nullable=False),
+        sa.Column("upload_file_id", sa.String(length=100), nullable=False),
+        sa.Column("file_name", sa.String(length=255), nullable=True),
+        sa.Column("upload_time", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("file_hash", "endpoint", name="uq_dify_file_upload_hash_endpoint"),
+    )
+    op.create_index("ix_dify_file_upload_expires_at", "dify_file_upload", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_dify_file_upload_expires_at", table_name="dify_file_upload")
+    op.drop_table("dify_file_upload")
@@ -0,0 +1,79 @@
+"""add invoice search indexes
+
+Revision ID: add_invoice_search_indexes_001
+Revises: add_list_query_indexes_001
+Create Date: 2026-10-16 21:00:00.000000
+
+说明：
+- 启用 pg_trgm 扩展，为 invoice.invoice_no / supplier_name / buyer_name、invoice_file.file_name
+  建立 GIN 三元组索引，支持 LIKE '%x%' 子串查询（查询条件见 app/services/invoice_search.py）
+- 为 供应商 + 采购方 名称建立 tsvector 表达式索引，支持关键词前缀搜索
+- 非 PostgreSQL 数据库跳过；数据库未提供 pg_trgm 扩展时只创建 tsvector 索引
+"""
+
+import logging
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_invoice_search_indexes_001"
+down_revision = "add_list_query_indexes_001"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# (索引名, 表名, 列)
+_TRGM_INDEXES = [
+    ("ix_invoice_invoice_no_trgm", "invoice", "invoice_no"),
+    ("ix_invoice_supplier_name_trgm", "invoice", "supplier_name"),
+    ("ix_invoice_buyer_name_trgm", "invoice", "buyer_name"),
+    ("ix_invoice_file_file_name_trgm", "invoice_file", "file_name"),
+]
+
+# 必须与 app/services/invoice_search.py 中的 PARTY_TSVECTOR_SQL 一致
+_PARTY_TSVECTOR = "to_tsvector('simple', coalesce(supplier_name, '') || ' ' || coalesce(buyer_name, ''))"
+
+
+def _enable_pg_trgm(connection) -> bool:
+    available = connection.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first()
+    if not available:
+        logger.warning("数据库未提供 pg_trgm 扩展，跳过三元组索引")
+        return False
+    try:
+        with connection.begin_nested():
+            connection.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except sa.exc.DBAPIError as e:
+        logger.warning(f"无法启用 pg_trgm 扩展，跳过三元组索引: {e}")
+        return False
+    return True
+
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+    tables = set(sa.inspect(connection).get_table_names())
+
+    if _enable_pg_trgm(connection):
+        for index_name, table_name, column in _TRGM_INDEXES:
+            if table_name in tables:
+                op.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} USING gin ({column} gin_trgm_ops)"
+                )
+
+    if "invoice" in tables:
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_invoice_party_tsv ON invoice USING gin ({_PARTY_TSVECTOR})")
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_invoice_party_tsv")
+    for index_name, _, _ in reversed(_TRGM_INDEXES):
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
@@ -0,0 +1,55 @@
+"""add list query indexes
+
+Revision ID: add_list_query_indexes_001
+Revises: add_statistics_rollup_001
+Create Date: 2026-10-16 20:00:00.000000
+
+说明：
+- /unified 列表查询改为先分页主表、再按主键 IN 查询明细，属性条件通过 EXISTS 过滤
+- 为明细表/属性表的外键列增加索引，避免按主键取明细和 EXISTS 过滤时全表扫描
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_list_query_indexes_001"
+down_revision = "add_statistics_rollup_001"
+branch_labels = None
+depends_on = None
+
+
+# (索引名, 表名, 列)
+_INDEXES = [
+    ("ix_material_lot_feature_material_lot_id", "material_lot_feature", ["material_lot_id"]),
+    ("ix_sales_order_doc_d_feature_sales_order_doc_d_id", "sales_order_doc_d_feature", ["sales_order_doc_d_id"]),
+    ("ix_nesting_layout_d_nesting_layout_id", "nesting_layout_d", ["nesting_layout_id"]),
+    ("ix_production_order_d_production_order_id", "production_order_d", ["production_order_id"]),
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    for index_name, table_name, columns in _INDEXES:
+        if table_name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        if index_name not in existing:
+            op.create_index(index_name, table_name, columns)
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    for index_name, table_name, _ in reversed(_INDEXES):
+        if table_name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        if index_name in existing:
+            op.drop_index(index_name, table_name=table_name)
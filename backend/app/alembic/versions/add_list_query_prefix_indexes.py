@@ -0,0 +1,53 @@
+"""add list query prefix indexes
+
+Revision ID: add_list_query_prefix_indexes_001
+Revises: add_nesting_coil_candidate_build_001
+Create Date: 2026-10-17 20:00:00.000000
+
+说明：
+- /unified 列表查询对 *_code / *_no 过滤字段按不区分大小写的前缀匹配
+  （LOWER(列) LIKE LOWER('x%')，见 app/api/list_query.py）
+- 普通 btree 索引不能用于该条件（表达式不同，且排序规则不是 C 时也不能用于 LIKE 前缀匹配），
+  为常用的编码/单号过滤列建立 lower(列) text_pattern_ops 表达式索引
+- 非 PostgreSQL 数据库跳过
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_list_query_prefix_indexes_001"
+down_revision = "add_nesting_coil_candidate_build_001"
+branch_labels = None
+depends_on = None
+
+
+# (索引名, 表名, 列)
+_PATTERN_INDEXES = [
+    ("ix_inventory_material_code_lower_pattern", "inventory", "material_code"),
+    ("ix_sales_order_doc_d_doc_no_lower_pattern", "sales_order_doc_d", "doc_no"),
+    ("ix_sales_order_doc_d_material_code_lower_pattern", "sales_order_doc_d", "material_code"),
+    ("ix_production_order_doc_no_lower_pattern", "production_order", "doc_no"),
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+    tables = set(sa.inspect(connection).get_table_names())
+
+    for index_name, table_name, column in _PATTERN_INDEXES:
+        if table_name in tables:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} (lower({column}) text_pattern_ops)"
+            )
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+    for index_name, _, _ in reversed(_PATTERN_INDEXES):
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
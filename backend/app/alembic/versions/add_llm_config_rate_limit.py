@@ -0,0 +1,40 @@
+"""add llm config rate limit
+
+Revision ID: add_llm_config_rate_limit_001
+Revises: add_template_preprocess_config_001
+Create Date: 2026-10-17 16:00:00.000000
+
+说明：
+- llm_config 表新增 rate_limit_per_minute、rate_limit_burst：按模型配置对 Dify 调用限速
+  （令牌桶，见 app/services/dify_traffic.py），为空时不限速
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_llm_config_rate_limit_001"
+down_revision = "add_template_preprocess_config_001"
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = ("rate_limit_per_minute", "rate_limit_burst")
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("llm_config")]
+    for name in NEW_COLUMNS:
+        if name not in columns:
+            op.add_column("llm_config", sa.Column(name, sa.Integer(), nullable=True))
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("llm_config")]
+    for name in NEW_COLUMNS:
+        if name in columns:
+            op.drop_column("llm_config", name)
@@ -0,0 +1,39 @@
+"""add nesting coil candidate build
+
+Revision ID: add_nesting_coil_candidate_build_001
+Revises: add_nesting_job_heartbeat_001
+Create Date: 2026-10-17 19:00:00.000000
+
+说明：
+- 新增 nesting_coil_candidate_build 表（钢卷候选索引全量构建记录）：存在记录即表示索引已构建，
+  仓库中没有符合条件的钢卷时不再在每次套料请求中重复全量构建
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_nesting_coil_candidate_build_001"
+down_revision = "add_nesting_job_heartbeat_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if "nesting_coil_candidate_build" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "nesting_coil_candidate_build",
+        sa.Column("index_name", sa.String(length=100), nullable=False),
+        sa.Column("build_date", sa.DateTime(), nullable=True),
+        sa.Column("candidate_count", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("index_name"),
+    )
+
+
+def downgrade():
+    op.drop_table("nesting_coil_candidate_build")
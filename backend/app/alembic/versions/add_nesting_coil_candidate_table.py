@@ -0,0 +1,57 @@
+"""add nesting coil candidate table
+
+Revision ID: add_nesting_coil_candidate_001
+Revises: add_nesting_job_001
+Create Date: 2026-10-16 16:00:00.000000
+
+说明：
+- 新增 nesting_coil_candidate 表（套料钢卷候选索引，按 材质 + 厚度分桶 查询）
+- 数据在首次套料时自动全量构建，也可执行 python -m app.services.coil_candidate_index 手动重建
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_nesting_coil_candidate_001"
+down_revision = "add_nesting_job_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if "nesting_coil_candidate" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "nesting_coil_candidate",
+        sa.Column("inventory_id", sa.String(length=200), nullable=False),
+        sa.Column("material_lot_id", sa.String(length=200), nullable=True),
+        sa.Column("material", sa.String(length=40), nullable=True),
+        sa.Column("thickness_bucket", sa.Integer(), nullable=True),
+        sa.Column("thickness", sa.Float(), nullable=True),
+        sa.Column("width", sa.Float(), nullable=True),
+        sa.Column("stock_qty", sa.Float(), nullable=True),
+        sa.Column("material_code", sa.String(length=40), nullable=True),
+        sa.Column("material_desc", sa.String(length=200), nullable=True),
+        sa.Column("lot_no", sa.String(length=20), nullable=True),
+        sa.Column("bin_name", sa.String(length=20), nullable=True),
+        sa.Column("warehouse_name", sa.String(length=20), nullable=True),
+        sa.Column("refresh_date", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("inventory_id"),
+    )
+    op.create_index(
+        "ix_nesting_coil_candidate_material_lot_id", "nesting_coil_candidate", ["material_lot_id"]
+    )
+    op.create_index(
+        "ix_nesting_coil_candidate_material_thickness", "nesting_coil_candidate", ["material", "thickness_bucket"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_nesting_coil_candidate_material_thickness", table_name="nesting_coil_candidate")
+    op.drop_index("ix_nesting_coil_candidate_material_lot_id", table_name="nesting_coil_candidate")
+    op.drop_table("nesting_coil_candidate")
@@ -0,0 +1,40 @@
+"""add nesting job heartbeat
+
+Revision ID: add_nesting_job_heartbeat_001
+Revises: add_recognition_task_heartbeat_001
+Create Date: 2026-10-17 18:30:00.000000
+
+说明：
+- nesting_job 新增 owner（提交任务的进程）、heartbeat_date（所属进程定期刷新的心跳时间）：
+  心跳超时的 pending/running 任务由存活进程标记为失败，避免进程退出后任务一直停留在 running
+  （见 app/services/nesting_job_runner.py）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_nesting_job_heartbeat_001"
+down_revision = "add_recognition_task_heartbeat_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("nesting_job")]
+    if "owner" not in columns:
+        op.add_column("nesting_job", sa.Column("owner", sa.String(length=100), nullable=True))
+    if "heartbeat_date" not in columns:
+        op.add_column("nesting_job", sa.Column("heartbeat_date", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("nesting_job")]
+    for name in ("heartbeat_date", "owner"):
+        if name in columns:
+            op.drop_column("nesting_job", name)
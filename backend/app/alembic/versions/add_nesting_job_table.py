@@ -0,0 +1,50 @@
+"""add nesting job table
+
+Revision ID: add_nesting_job_001
+Revises: add_recognition_progress_001
+Create Date: 2026-10-16 14:00:00.000000
+
+说明：
+- 新增 nesting_job 表（套料计算在后台进程池中执行，记录任务状态、进度与结果）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_nesting_job_001"
+down_revision = "add_recognition_progress_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if "nesting_job" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "nesting_job",
+        sa.Column("job_id", sa.String(length=200), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("progress", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("stage", sa.String(length=100), nullable=True),
+        sa.Column("request_data", sa.JSON(), nullable=True),
+        sa.Column("result_data", sa.JSON(), nullable=True),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("creator", sa.String(length=200), nullable=True),
+        sa.Column("create_date", sa.DateTime(), nullable=True),
+        sa.Column("start_date", sa.DateTime(), nullable=True),
+        sa.Column("finish_date", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("job_id"),
+    )
+    op.create_index("ix_nesting_job_status", "nesting_job", ["status"])
+    op.create_index("ix_nesting_job_creator", "nesting_job", ["creator"])
+
+
+def downgrade():
+    op.drop_index("ix_nesting_job_creator", table_name="nesting_job")
+    op.drop_index("ix_nesting_job_status", table_name="nesting_job")
+    op.drop_table("nesting_job")
@@ -0,0 +1,53 @@
+"""add permission scope indexes
+
+Revision ID: add_permission_scope_indexes_001
+Revises: add_invoice_search_indexes_001
+Create Date: 2026-10-16 22:00:00.000000
+
+说明：
+- 普通用户的列表查询改为 EXISTS 关联 user_company 过滤公司（见 app/services/permission_scope.py）
+- user_company 增加（user_id, company_id）联合索引，invoice.company_id 增加索引
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_permission_scope_indexes_001"
+down_revision = "add_invoice_search_indexes_001"
+branch_labels = None
+depends_on = None
+
+
+# (索引名, 表名, 列)
+_INDEXES = [
+    ("ix_user_company_user_id_company_id", "user_company", ["user_id", "company_id"]),
+    ("ix_invoice_company_id", "invoice", ["company_id"]),
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    for index_name, table_name, columns in _INDEXES:
+        if table_name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        if index_name not in existing:
+            op.create_index(index_name, table_name, columns)
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    for index_name, table_name, _ in reversed(_INDEXES):
+        if table_name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        if index_name in existing:
+            op.drop_index(index_name, table_name=table_name)
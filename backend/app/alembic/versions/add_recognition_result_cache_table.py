@@ -0,0 +1,58 @@
+"""add recognition result cache table
+
+Revision ID: add_recognition_result_cache_001
+Revises: add_dify_file_upload_001
+Create Date: 2026-10-17 11:00:00.000000
+
+说明：
+- 新增 recognition_result_cache 表：按（文件哈希, 模板版本, 输出Schema, 模型配置, 提示词哈希）指向已有识别结果，
+  重新识别时直接复用（见 app/services/recognition_memo.py）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "add_recognition_result_cache_001"
+down_revision = "add_dify_file_upload_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if "recognition_result_cache" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "recognition_result_cache",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("cache_key", sa.String(length=64), nullable=False),
+        sa.Column("result_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("file_hash", sa.String(length=64), nullable=False),
+        sa.Column("template_version_id", sa.String(length=100), nullable=True),
+        sa.Column("output_schema_id", sa.String(length=100), nullable=True),
+        sa.Column("model_config_id", sa.String(length=100), nullable=True),
+        sa.Column("prompt_hash", sa.String(length=64), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("create_time", sa.DateTime(), nullable=True),
+        sa.Column("last_hit_time", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["result_id"], ["recognition_result.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("cache_key"),
+    )
+    op.create_index("ix_recognition_result_cache_result_id", "recognition_result_cache", ["result_id"])
+    op.create_index("ix_recognition_result_cache_file_hash", "recognition_result_cache", ["file_hash"])
+    op.create_index("ix_recognition_result_cache_output_schema_id", "recognition_result_cache", ["output_schema_id"])
+    op.create_index("ix_recognition_result_cache_model_config_id", "recognition_result_cache", ["model_config_id"])
+
+
+def downgrade():
+    op.drop_index("ix_recognition_result_cache_model_config_id", table_name="recognition_result_cache")
+    op.drop_index("ix_recognition_result_cache_output_schema_id", table_name="recognition_result_cache")
+    op.drop_index("ix_recognition_result_cache_file_hash", table_name="recognition_result_cache")
+    op.drop_index("ix_recognition_result_cache_result_id", table_name="recognition_result_cache")
+    op.drop_table("recognition_result_cache")
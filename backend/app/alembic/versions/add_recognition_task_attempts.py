@@ -0,0 +1,40 @@
+"""add recognition task attempts
+
+Revision ID: add_recognition_task_attempts_001
+Revises: add_list_query_prefix_indexes_001
+Create Date: 2026-10-17 21:00:00.000000
+
+说明：
+- recognition_task 新增 attempts（被工作池领取执行的次数）：心跳超时的任务重新入队前检查领取次数，
+  达到 RECOGNITION_WORKER_MAX_ATTEMPTS 时标记为失败，不再无限重新入队
+  （见 app/services/recognition_worker.py）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_recognition_task_attempts_001"
+down_revision = "add_list_query_prefix_indexes_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("recognition_task")]
+    if "attempts" not in columns:
+        op.add_column(
+            "recognition_task",
+            sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("recognition_task")]
+    if "attempts" in columns:
+        op.drop_column("recognition_task", "attempts")
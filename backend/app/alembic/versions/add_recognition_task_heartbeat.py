@@ -0,0 +1,40 @@
+"""add recognition task heartbeat
+
+Revision ID: add_recognition_task_heartbeat_001
+Revises: add_llm_config_rate_limit_001
+Create Date: 2026-10-17 18:00:00.000000
+
+说明：
+- recognition_task 新增 worker_id（执行任务的工作池实例）、heartbeat_at（执行期间定期刷新的心跳时间）：
+  工作池定期将心跳超时的 processing 任务重新入队，存活实例正在执行的任务不受影响
+  （见 app/services/recognition_worker.py）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_recognition_task_heartbeat_001"
+down_revision = "add_llm_config_rate_limit_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("recognition_task")]
+    if "worker_id" not in columns:
+        op.add_column("recognition_task", sa.Column("worker_id", sa.String(length=100), nullable=True))
+    if "heartbeat_at" not in columns:
+        op.add_column("recognition_task", sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("recognition_task")]
+    for name in ("heartbeat_at", "worker_id"):
+        if name in columns:
+            op.drop_column("recognition_task", name)
@@ -0,0 +1,41 @@
+"""add recognition task progress
+
+Revision ID: add_recognition_progress_001
+Revises: add_recognition_worker_001
+Create Date: 2026-10-16 12:00:00.000000
+
+说明：
+- recognition_task 新增 progress、current_node、node_events 列（streaming 模式下记录工作流执行进度）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_recognition_progress_001"
+down_revision = "add_recognition_worker_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+
+    task_columns = [col["name"] for col in inspector.get_columns("recognition_task")]
+    if "progress" not in task_columns:
+        op.add_column(
+            "recognition_task",
+            sa.Column("progress", sa.Integer(), nullable=False, server_default="0"),
+        )
+    if "current_node" not in task_columns:
+        op.add_column("recognition_task", sa.Column("current_node", sa.String(length=200), nullable=True))
+    if "node_events" not in task_columns:
+        op.add_column("recognition_task", sa.Column("node_events", sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("recognition_task", "node_events")
+    op.drop_column("recognition_task", "current_node")
+    op.drop_column("recognition_task", "progress")
@@ -0,0 +1,42 @@
+"""add recognition worker fields
+
+Revision ID: add_recognition_worker_001
+Revises: fix_user_company_structure_001
+Create Date: 2026-10-16 09:00:00.000000
+
+说明：
+- llm_config 新增 max_concurrency 列（识别工作池中单配置并发上限）
+- recognition_task 新增 (status, priority, create_time) 组合索引，用于工作池出队
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_recognition_worker_001"
+down_revision = "fix_user_company_structure_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+
+    llm_columns = [col["name"] for col in inspector.get_columns("llm_config")]
+    if "max_concurrency" not in llm_columns:
+        op.add_column("llm_config", sa.Column("max_concurrency", sa.Integer(), nullable=True))
+
+    task_indexes = [idx["name"] for idx in inspector.get_indexes("recognition_task")]
+    if "ix_recognition_task_status_priority" not in task_indexes:
+        op.create_index(
+            "ix_recognition_task_status_priority",
+            "recognition_task",
+            ["status", sa.text("priority DESC"), "create_time"],
+        )
+
+
+def downgrade():
+    op.drop_index("ix_recognition_task_status_priority", table_name="recognition_task")
+    op.drop_column("llm_config", "max_concurrency")
@@ -0,0 +1,70 @@
+"""add statistics daily rollup table
+
+Revision ID: add_statistics_rollup_001
+Revises: add_nesting_coil_candidate_001
+Create Date: 2026-10-16 18:00:00.000000
+
+说明：
+- 新增 statistics_daily_rollup 表（按日期、公司汇总票据与识别任务，统计看板只读本表）
+- invoice.create_time、recognition_task.create_time 增加索引（按日期增量汇总）
+- 汇总数据在首次访问统计看板时自动全量构建，也可执行 python -m app.services.statistics_rollup 手动重建
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "add_statistics_rollup_001"
+down_revision = "add_nesting_coil_candidate_001"
+branch_labels = None
+depends_on = None
+
+
+def _index_names(inspector, table_name):
+    return {index["name"] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+
+    if "ix_invoice_create_time" not in _index_names(inspector, "invoice"):
+        op.create_index("ix_invoice_create_time", "invoice", ["create_time"])
+    if "ix_recognition_task_create_time" not in _index_names(inspector, "recognition_task"):
+        op.create_index("ix_recognition_task_create_time", "recognition_task", ["create_time"])
+
+    if "statistics_daily_rollup" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "statistics_daily_rollup",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("stat_date", sa.Date(), nullable=False),
+        sa.Column("company_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("invoice_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("invoice_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("review_pending", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("review_approved", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("review_rejected", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("task_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("task_pending", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("task_processing", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("task_completed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("task_failed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("refresh_time", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_statistics_daily_rollup_date_company", "statistics_daily_rollup", ["stat_date", "company_id"]
+    )
+    op.create_index("ix_statistics_daily_rollup_company_id", "statistics_daily_rollup", ["company_id"])
+
+
+def downgrade():
+    op.drop_index("ix_statistics_daily_rollup_company_id", table_name="statistics_daily_rollup")
+    op.drop_index("ix_statistics_daily_rollup_date_company", table_name="statistics_daily_rollup")
+    op.drop_table("statistics_daily_rollup")
+    op.drop_index("ix_recognition_task_create_time", table_name="recognition_task")
+    op.drop_index("ix_invoice_create_time", table_name="invoice")
@@ -0,0 +1,36 @@
+"""add template preprocess config
+
+Revision ID: add_template_preprocess_config_001
+Revises: add_recognition_result_cache_001
+Create Date: 2026-10-17 15:00:00.000000
+
+说明：
+- template 表新增 preprocess_config（JSON）：模板级识别前预处理配置，覆盖 PREPROCESS_* 全局默认值
+  （见 app/services/document_preprocess.py）
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "add_template_preprocess_config_001"
+down_revision = "add_recognition_result_cache_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("template")]
+    if "preprocess_config" not in columns:
+        op.add_column("template", sa.Column("preprocess_config", sa.JSON(), nullable=True))
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = [col["name"] for col in inspector.get_columns("template")]
+    if "preprocess_config" in columns:
+        op.drop_column("template", "preprocess_config")
@@ -0,0 +1,39 @@
+"""drop invoice party tsvector index
+
+Revision ID: drop_invoice_party_tsv_index_001
+Revises: add_recognition_task_attempts_001
+Create Date: 2026-10-17 22:00:00.000000
+
+说明：
+- 供应商/采购方关键词搜索改为子串匹配（使用 add_invoice_search_indexes 创建的三元组索引），
+  'simple' 分词下整个中文公司名只是一个词，tsvector 前缀匹配无法命中名称中间的关键词；
+  删除不再使用的表达式索引 ix_invoice_party_tsv
+- 非 PostgreSQL 数据库跳过
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "drop_invoice_party_tsv_index_001"
+down_revision = "add_recognition_task_attempts_001"
+branch_labels = None
+depends_on = None
+
+_PARTY_TSVECTOR = "to_tsvector('simple', coalesce(supplier_name, '') || ' ' || coalesce(buyer_name, ''))"
+
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_invoice_party_tsv")
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+    if "invoice" in sa.inspect(connection).get_table_names():
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_invoice_party_tsv ON invoice USING gin ({_PARTY_TSVECTOR})")
@@ -0,0 +1,393 @@
+"""
+/unified 列表查询构建
+各模块的 list 操作统一由 ListQuery 生成绑定参数的 SQL，替代字符串拼接的查询模板：
+
+- 过滤字段按列类型匹配：ID/状态精确匹配，编码/单号前缀匹配，描述类字段模糊匹配（后两者不区分大小写）；
+  前缀匹配（LOWER(列) LIKE LOWER(值%)）走 lower(列) text_pattern_ops 表达式索引
+  （见 add_list_query_prefix_indexes 迁移，新增前缀过滤的列需同样建索引），
+  传入值自带 % 时按原样作为 LIKE 模式，传入列表时按 IN 匹配
+- 子表字段（如批次属性）通过 EXISTS 过滤，分页与计数只作用于主表，明细按当前页主键再查询
+- 分页支持 page/limit（OFFSET）与游标（params.cursor，按 排序列 + 主键 的 keyset 条件，翻页耗时与页码无关）
+- 总数通过 params.countMode 指定：exact（默认）/estimate（按统计信息估算）/none（不计数）
+"""
+
+import base64
+import json
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, bindparam, inspect as sa_inspect, text
+from sqlmodel import Session
+
+from app.models import UnifiedRequest
+
+logger = logging.getLogger(__name__)
+
+MATCH_EXACT = "exact"
+MATCH_PREFIX = "prefix"
+MATCH_CONTAINS = "contains"
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATE = "estimate"
+COUNT_NONE = "none"
+
+_KEY_ALIAS = "_list_key"
+
+
+class ListQueryError(ValueError):
+    """列表查询参数错误（不支持的过滤/排序字段、无效游标等）"""
+
+
+@dataclass(frozen=True)
+class ListColumn:
+    """
+    可过滤/排序的字段
+
+    Attributes:
+        column: 带表名的列（如 inventory.material_code）
+        match: 匹配方式 exact/prefix/contains
+        exists: 子表字段的 EXISTS 子查询模板，{condition} 处替换为匹配条件；子表字段不能排序
+    """
+    column: str
+    match: str = MATCH_EXACT
+    exists: Optional[str] = None
+
+
+def _default_match(column_name: str, column_type: Any) -> str:
+    if not isinstance(column_type, String):
+        return MATCH_EXACT
+    if column_name.endswith(("_id", "_status")):
+        return MATCH_EXACT
+    if column_name.endswith(("_code", "_no")):
+        return MATCH_PREFIX
+    return MATCH_CONTAINS
+
+
+def model_columns(
+    model: Any,
+    table: Optional[str] = None,
+    overrides: Optional[Dict[str, str]] = None,
+    exists: Optional[str] = None,
+) -> Dict[str, ListColumn]:
+    """
+    由 SQLModel 表模型生成字段定义，驼峰属性名与下划线列名都可作为字段名
+
+    Args:
+        model: 表模型
+        table: SQL 中使用的表名/别名，默认为模型的表名
+        overrides: 指定字段的匹配方式 {字段名: match}
+        exists: 子表字段的 EXISTS 子查询模板
+    """
+    table = table or model.__tablename__
+    overrides = overrides or {}
+    columns: Dict[str, ListColumn] = {}
+    for attr in sa_inspect(model).column_attrs:
+        column = attr.columns[0]
+        match = overrides.get(attr.key) or overrides.get(column.name) or _default_match(column.name, column.type)
+        spec = ListColumn(f"{table}.{column.name}", match, exists)
+        columns[attr.key] = spec
+        columns[column.name] = spec
+    return columns
+
+
+def _escape_like(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "n" in value:
+            return Decimal(value["n"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ListQueryError("无效的分页游标")
+    if not isinstance(values, list):
+        raise ListQueryError("无效的分页游标")
+    return [_decode_value(v) for v in values]
+
+
+@dataclass
+class ListPage:
+    """一页查询结果"""
+    rows: List[Any]
+    keys: List[Any]
+    page: int
+    limit: int
+    total: Optional[int]
+    total_estimated: bool
+    has_next: bool
+    has_prev: bool
+    next_cursor: Optional[str]
+
+    @property
+    def total_pages(self) -> Optional[int]:
+        if self.total is None:
+            return None
+        return (self.total + self.limit - 1) // self.limit
+
+    def pagination(self) -> Dict[str, Any]:
+        return {
+            "page": self.page,
+            "limit": self.limit,
+            "total": self.total,
+            "total_pages": self.total_pages,
+            "has_next": self.has_next,
+            "has_prev": self.has_prev,
+            "next_cursor": self.next_cursor,
+            "total_estimated": self.total_estimated,
+        }
+
+    def sort_by_keys(self, items: List[Dict[str, Any]], key_field: str) -> List[Dict[str, Any]]:
+        """明细装配后按当前页主键顺序排列"""
+        order = {key: index for index, key in enumerate(self.keys)}
+        return sorted(items, key=lambda item: order.get(item.get(key_field), len(order)))
+
+
+class ListQuery:
+    """
+    单个主表的列表查询
+
+    Args:
+        table: 主表名
+        key: 主键列名（分页稳定排序与游标使用）
+        columns: 可过滤/排序字段 {字段名: ListColumn}
+        search: 关键词搜索的字段（任一匹配）
+        default_sort: 未指定排序时的排序 [(字段名, asc/desc)]
+        select: 页查询的 SELECT 列表，默认只查主键（明细由调用方按主键再查询）
+        from_clause: 页查询的 FROM 子句（可带只用于取值的 LEFT JOIN），默认为主表
+        with_clause: 页查询前置的 WITH 子句
+    """
+
+    def __init__(
+        self,
+        table: str,
+        key: str,
+        columns: Dict[str, ListColumn],
+        search: Sequence[ListColumn] = (),
+        default_sort: Sequence[Tuple[str, str]] = (),
+        select: Optional[str] = None,
+        from_clause: Optional[str] = None,
+        with_clause: str = "",
+    ):
+        self.table = table
+        self.key = key
+        self.key_column = f"{table}.{key}"
+        self.columns = columns
+        self.search = list(search)
+        self.default_sort = list(default_sort)
+        self.select = select
+        self.from_clause = from_clause or table
+        self.with_clause = with_clause
+
+    # ---------- 条件 ----------
+
+    def _match(self, spec: ListColumn, value: Any, params: Dict[str, Any], expanding: List[str]) -> str:
+        name = f"p{len(params)}"
+        if isinstance(value, (list, tuple, set)):
+            params[name] = list(value)
+            expanding.append(name)
+            return f"{spec.column} IN :{name}"
+        if isinstance(value, str) and "%" in value:
+            params[name] = value
+            return f"{spec.column} LIKE :{name}"
+        if spec.match == MATCH_PREFIX:
+            params[name] = f"{_escape_like(value)}%"
+            return f"LOWER({spec.column}) LIKE LOWER(:{name}) ESCAPE '\\'"
+        if spec.match == MATCH_CONTAINS:
+            params[name] = f"%{_escape_like(value)}%"
+            return f"{spec.column} ILIKE :{name} ESCAPE '\\'"
+        params[name] = value
+        return f"{spec.column} = :{name}"
+
+    def _conditions(self, request: UnifiedRequest, params: Dict[str, Any], expanding: List[str]) -> List[str]:
+        conditions = []
+        for field, value in (request.filters or {}).items():
+            if value is None or value == "" or value == []:
+                continue
+            spec = self.columns.get(field)
+            if spec is None:
+                raise ListQueryError(f"不支持的过滤字段: {field}")
+            condition = self._match(spec, value, params, expanding)
+            if spec.exists:
+                condition = f"EXISTS ({spec.exists.format(condition=condition)})"
+            conditions.append(condition)
+
+        if request.search and self.search:
+            parts: List[str] = []
+            grouped: Dict[str, List[str]] = {}
+            for spec in self.search:
+                condition = self._match(spec, request.search, params, expanding)
+                if spec.exists:
+                    grouped.setdefault(spec.exists, []).append(condition)
+                else:
+                    parts.append(condition)
+            for template, group in grouped.items():
+                parts.append(f"EXISTS ({template.format(condition='(' + ' OR '.join(group) + ')')})")
+            conditions.append("(" + " OR ".join(parts) + ")")
+        return conditions
+
+    def _sort(self, request: UnifiedRequest) -> List[Tuple[str, bool]]:
+        """[(列, 是否降序)]，末尾补主键保证顺序稳定"""
+        sort: List[Tuple[str, bool]] = []
+        for field, direction in (request.sort or dict(self.default_sort)).items():
+            spec = self.columns.get(field)
+            if spec is None or spec.exists:
+                raise ListQueryError(f"不支持的排序字段: {field}")
+            sort.append((spec.column, str(direction).lower() == "desc"))
+        if self.key_column not in [column for column, _ in sort]:
+            sort.append((self.key_column, False))
+        return sort
+
+    @staticmethod
+    def _keyset(sort: List[Tuple[str, bool]], values: List[Any], params: Dict[str, Any]) -> str:
+        """游标之后的行：(c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...（NULL 排在最后）"""
+        if len(values) != len(sort):
+            raise ListQueryError("无效的分页游标")
+        branches = []
+        for i, (column, desc) in enumerate(sort):
+            if values[i] is None:
+                continue
+            parts = []
+            for prev_column, value in zip([c for c, _ in sort[:i]], values[:i], strict=True):
+                if value is None:
+                    parts.append(f"{prev_column} IS NULL")
+                else:
+                    name = f"p{len(params)}"
+                    params[name] = value
+                    parts.append(f"{prev_column} = :{name}")
+            name = f"p{len(params)}"
+            params[name] = values[i]
+            parts.append(f"({column} {'<' if desc else '>'} :{name} OR {column} IS NULL)")
+            branches.append("(" + " AND ".join(parts) + ")")
+        return "(" + " OR ".join(branches) + ")" if branches else "1=0"
+
+    # ---------- 计数 ----------
+
+    def _count(self, session: Session, where: str, params: Dict[str, Any], expanding: List[str], mode: str):
+        """返回 (总数, 是否估算)"""
+        if mode == COUNT_NONE:
+            return None, False
+        if mode == COUNT_ESTIMATE and session.bind.dialect.name == "postgresql":
+            if where == "1=1":
+                estimate = session.execute(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+                    {"table": self.table},
+                ).scalar()
+            else:
+                plan = session.execute(
+                    self._text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {self.table} WHERE {where}", expanding), params
+                ).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                estimate = plan[0]["Plan"]["Plan Rows"]
+            # 从未 ANALYZE 的表 reltuples 为 -1，退回精确计数
+            if estimate is not None and estimate >= 0:
+                return int(estimate), True
+        total = session.execute(
+            self._text(f"SELECT COUNT(*) FROM {self.table} WHERE {where}", expanding), params
+        ).scalar()
+        return int(total or 0), False
+
+    @staticmethod
+    def _text(sql: str, expanding: Iterable[str]):
+        stmt = text(sql)
+        for name in expanding:
+            stmt = stmt.bindparams(bindparam(name, expanding=True))
+        return stmt
+
+    # ---------- 执行 ----------
+
+    def execute(self, session: Session, request: UnifiedRequest, default_limit: int = 20) -> ListPage:
+        extra = request.params or {}
+        page = max(1, int(request.page or 1))
+        limit = max(1, int(request.limit or default_limit))
+        cursor = extra.get("cursor")
+        count_mode = extra.get("countMode") or COUNT_EXACT
+
+        params: Dict[str, Any] = {}
+        expanding: List[str] = []
+        conditions = self._conditions(request, params, expanding)
+        where = " AND ".join(conditions) if conditions else "1=1"
+        sort = self._sort(request)
+
+        page_conditions = list(conditions)
+        page_params = dict(params)
+        if cursor:
+            page_conditions.append(self._keyset(sort, decode_cursor(cursor), page_params))
+        page_where = " AND ".join(page_conditions) if page_conditions else "1=1"
+
+        sort_columns = ", ".join(f"{column} AS _sort_{i}" for i, (column, _) in enumerate(sort))
+        order_by = ", ".join(f"{column} {'DESC' if desc else 'ASC'} NULLS LAST" for column, desc in sort)
+        select = self.select or self.key_column
+        page_params["_limit"] = limit + 1
+        sql = (
+            f"{self.with_clause}\n"
+            f"SELECT {select}, {self.key_column} AS {_KEY_ALIAS}, {sort_columns}\n"
+            f"FROM {self.from_clause}\n"
+            f"WHERE {page_where}\n"
+            f"ORDER BY {order_by}\n"
+            f"LIMIT :_limit"
+        )
+        if not cursor:
+            sql += " OFFSET :_offset"
+            page_params["_offset"] = (page - 1) * limit
+        rows = session.execute(self._text(sql, expanding), page_params).fetchall()
+
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_next and rows:
+            last = rows[-1]._mapping
+            next_cursor = encode_cursor([last[f"_sort_{i}"] for i in range(len(sort))])
+
+        if not cursor and not has_next and count_mode != COUNT_NONE:
+            # 最后一页可以直接得出总数
+            total, estimated = (page - 1) * limit + len(rows), False
+            if not rows and page > 1:
+                total, estimated = self._count(session, where, params, expanding, count_mode)
+        else:
+            total, estimated = self._count(session, where, params, expanding, count_mode)
+
+        return ListPage(
+            rows=rows,
+            keys=[row._mapping[_KEY_ALIAS] for row in rows],
+            page=page,
+            limit=limit,
+            total=total,
+            total_estimated=estimated,
+            has_next=has_next,
+            has_prev=bool(cursor) or page > 1,
+            next_cursor=next_cursor,
+        )
+
+
+def keys_param(sql: str, name: str = "keys"):
+    """明细查询：按当前页主键过滤（WHERE ... IN :keys）"""
+    return text(sql).bindparams(bindparam(name, expanding=True))
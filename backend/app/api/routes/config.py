@@ -14,6 +14,8 @@ from app.models.models_invoice import (
     Invoice, RecognitionTask, RecognitionResult, SchemaValidationRecord
 )
 from sqlalchemy import JSON
+from app.services import recognition_memo
+from app.services.schema_registry import schema_registry
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +50,9 @@ def get_llm_config(
                 "app_type": config.app_type,
                 "timeout": config.timeout,
                 "max_retries": config.max_retries,
+                "max_concurrency": config.max_concurrency,
+                "rate_limit_per_minute": config.rate_limit_per_minute,
+                "rate_limit_burst": config.rate_limit_burst,
                 "is_active": config.is_active,
                 "description": config.description
             }
@@ -140,6 +145,9 @@ def update_llm_config(
             existing_config.app_type = app_type
             existing_config.timeout = config.get("timeout", 300)
             existing_config.max_retries = config.get("max_retries", 3)
+            existing_config.max_concurrency = config.get("max_concurrency")
+            existing_config.rate_limit_per_minute = config.get("rate_limit_per_minute")
+            existing_config.rate_limit_burst = config.get("rate_limit_burst")
             existing_config.is_active = config.get("is_active", True)
             existing_config.is_default = config.get("is_default", False)
             existing_config.description = config.get("description")
@@ -161,6 +169,9 @@ def update_llm_config(
                 app_type=app_type,
                 timeout=config.get("timeout", 300),
                 max_retries=config.get("max_retries", 3),
+                max_concurrency=config.get("max_concurrency"),
+                rate_limit_per_minute=config.get("rate_limit_per_minute"),
+                rate_limit_burst=config.get("rate_limit_burst"),
                 is_active=config.get("is_active", True),
                 is_default=config.get("is_default", False),
                 description=config.get("description"),
@@ -170,8 +181,14 @@ def update_llm_config(
             session.flush()  # 获取新创建的ID
             llm_config_obj = new_config
         
+        # 配置变更后已缓存的识别结果不再复用
+        recognition_memo.invalidate(session, model_config_id=shared_id)
         session.commit()
         
+        # 清除识别工作池中该配置的并发上限缓存
+        from app.services.recognition_worker import recognition_worker_pool
+        recognition_worker_pool.invalidate_config_limit(shared_id)
+        
         return Message(message="大模型配置保存成功")
     except HTTPException:
         raise
@@ -265,9 +282,10 @@ def test_llm_connection(
     """
     测试SYNTAX API连接
     """
+    import httpx
+    from app.services.dify_client import dify_client
+
     try:
-        import httpx
-        
         endpoint = config.get("endpoint", "").strip()
         api_key = config.get("api_key", "")
         app_id = config.get("app_id")
@@ -306,25 +324,25 @@ def test_llm_connection(
             "Content-Type": "application/json"
         }
         
-        with httpx.Client(timeout=10.0) as client:
-            # 根据API类型选择HTTP方法
-            if test_data is not None:
-                # 有数据需要发送，使用POST请求
-                response = client.post(test_url, headers=headers, json=test_data)
-            else:
-                # 没有数据，使用GET请求
-                response = client.get(test_url, headers=headers)
+        # 使用与识别任务共享的连接池（同一 endpoint 复用连接）
+        test_path = test_url[len(endpoint.rstrip('/')):]
+        if test_data is not None:
+            # 有数据需要发送，使用POST请求
+            response = dify_client.request(endpoint, "POST", test_path, headers=headers, json=test_data, timeout=10.0)
+        else:
+            # 没有数据，使用GET请求
+            response = dify_client.request(endpoint, "GET", test_path, headers=headers, timeout=10.0)
 
-            if response.status_code in [200, 201, 202]:
-                return {
-                    "success": True,
-                    "message": "连接测试成功"
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"连接失败：HTTP {response.status_code} - {response.text[:200]}"
-                }
+        if response.status_code in [200, 201, 202]:
+            return {
+                "success": True,
+                "message": "连接测试成功"
+            }
+        else:
+            return {
+                "success": False,
+                "message": f"连接失败：HTTP {response.status_code} - {response.text[:200]}"
+            }
     except httpx.TimeoutException:
         return {
             "success": False,
@@ -817,6 +835,8 @@ def create_schema(
         session.add(schema)
         session.commit()
         session.refresh(schema)
+        # 默认Schema可能已变更
+        schema_registry.invalidate(schema.id)
 
         return Message(message="Schema创建成功")
     except HTTPException:
@@ -888,7 +908,9 @@ def update_schema(
 
         schema.update_time = datetime.now()
         session.add(schema)
+        recognition_memo.invalidate(session, output_schema_id=schema_id)
         session.commit()
+        schema_registry.invalidate(schema_id)
 
         return Message(message="Schema更新成功")
     except HTTPException:
@@ -949,7 +971,9 @@ def delete_schema(
         # 使用SQL直接删除Schema，避免SQLModel关系加载问题
         delete_schema_sql = text("DELETE FROM output_schema WHERE id = :schema_id")
         delete_result = session.execute(delete_schema_sql, {"schema_id": str(schema_id)})
+        recognition_memo.invalidate(session, output_schema_id=schema_id)
         session.commit()
+        schema_registry.invalidate(schema_id)
         
         if delete_result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Schema不存在")
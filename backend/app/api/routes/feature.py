@@ -11,6 +11,7 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select, or_, text
 
 from app.api.deps import CurrentUser, SessionDep
+from app.api.list_query import ListColumn, ListQuery, ListQueryError, keys_param, model_columns
 from app.models import (
     UnifiedRequest,
     UnifiedResponse
@@ -34,6 +35,18 @@ def _convert_to_snake_case(camel_str: str) -> str:
 
 router = APIRouter(prefix="/feature", tags=["feature"])
 
+FEATURE_LIST_QUERY = ListQuery(
+    table="feature",
+    key="feature_id",
+    columns=model_columns(Feature),
+    search=[
+        ListColumn("feature.feature_code", "contains"),
+        ListColumn("feature.feature_desc", "contains"),
+        ListColumn("feature.remark", "contains"),
+    ],
+    default_sort=[("createDate", "desc")],
+)
+
 
 @router.post("/unified", response_model=UnifiedResponse)
 def unified_feature_operations(
@@ -287,63 +300,14 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
         FROM feature
         left join data_type on feature.data_type = data_type.dict_value
         left join data_range on feature.data_ranger = data_range.dict_value
-        WHERE 1=1
+        WHERE feature.feature_id IN :keys
         """
-        count_sql = "SELECT COUNT(*) FROM feature WHERE 1=1"
-        
-        # 构建WHERE条件
-        where_conditions = []
-        params = {}
-        
-        # 应用过滤条件
-        if request.filters:
-            for field, value in request.filters.items():
-                # 转换字段名为snake_case
-                snake_field = _convert_to_snake_case(field)
-                where_conditions.append(f"{snake_field} ILIKE %({field})s")
-                params[field] = f"%{value}%"
-        
-        # 应用搜索条件
-        if request.search:
-            search_term = f"%{request.search}%"
-            where_conditions.append("(feature_code ILIKE %(search)s OR feature_desc ILIKE %(search)s OR remark ILIKE %(search)s)")
-            params["search"] = search_term
-        
-        # 添加WHERE条件到SQL
-        if where_conditions:
-            where_clause = " AND " + " AND ".join(where_conditions)
-            base_sql += where_clause
-            count_sql += where_clause
-        
-        # 获取总数
-        total_result = session.exec(text(count_sql), **params if params else {}).one()
-        total = total_result[0] if total_result else 0
-        
-        # 应用排序
-        if request.sort:
-            order_clauses = []
-            for field, direction in request.sort.items():
-                # 转换字段名为snake_case
-                snake_field = _convert_to_snake_case(field)
-                if direction.lower() == "desc":
-                    order_clauses.append(f"{snake_field} DESC")
-                else:
-                    order_clauses.append(f"{snake_field} ASC")
-            if order_clauses:
-                base_sql += " ORDER BY " + ", ".join(order_clauses)
-        else:
-            base_sql += " ORDER BY create_date DESC"
-        
-        # 应用分页
-        page = request.page or 1
-        limit = request.limit or 20
-        skip = (page - 1) * limit
-        
-        base_sql += f" LIMIT {limit} OFFSET {skip}"
         
-        # 执行查询
-        result = session.exec(text(base_sql), **params if params else {})
-        items = result.all()
+        # 分页与计数只查询 feature 表，当前页再关联数据字典
+        page = FEATURE_LIST_QUERY.execute(session, request)
+        items = []
+        if page.keys:
+            items = session.execute(keys_param(base_sql), {"keys": page.keys}).fetchall()
         
         # 转换为字典列表 - 将下划线命名转换为驼峰命名
         items_dict = []
@@ -355,16 +319,9 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
                 item_dict[camel_key] = value
             items_dict.append(item_dict)
         
-        # 构建分页信息
-        total_pages = (total + limit - 1) // limit
-        pagination = {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
+        items_dict = page.sort_by_keys(items_dict, "featureId")
+        pagination = page.pagination()
+        total = page.total
         
         return UnifiedResponse(
             success=True,
@@ -374,6 +331,13 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             message=f"查询成功，共{total}条记录"
         )
         
+    except ListQueryError as e:
+        return UnifiedResponse(
+            success=False,
+            code=400,
+            message=f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY"
+        )
     except Exception as e:
         return UnifiedResponse(
             success=False,
@@ -73,6 +73,60 @@ def health_check() -> Any:
     }
 
 
+@router.get("/recognition-worker")
+def recognition_worker_status() -> Any:
+    """
+    识别任务工作池状态（运行中任务数、各模型配置并发）
+    """
+    from app.services.recognition_worker import recognition_worker_pool
+    return recognition_worker_pool.stats()
+
+
+@router.get("/dify-client")
+def dify_client_status() -> Any:
+    """
+    Dify 客户端连接池状态（HTTP/2、已建立客户端的 endpoint）
+    """
+    from app.services.dify_client import dify_client
+    return dify_client.stats()
+
+
+@router.get("/nesting-jobs")
+def nesting_job_runner_status() -> Any:
+    """
+    套料任务进程池状态
+    """
+    from app.services.nesting_job_runner import nesting_job_runner
+    return nesting_job_runner.stats()
+
+
+@router.get("/preview-renderer")
+def preview_renderer_status() -> Any:
+    """
+    预览图进程池状态（缺少 Pillow/pypdfium2 时 unavailable 为原因）
+    """
+    from app.services.preview_renderer import preview_renderer
+    return preview_renderer.stats()
+
+
+@router.get("/schema-capabilities")
+def schema_capabilities_status() -> Any:
+    """
+    数据库结构能力（启动时读取的可选列）
+    """
+    from app.services.schema_capabilities import schema_capabilities
+    return schema_capabilities.get().to_dict()
+
+
+@router.post("/schema-capabilities/refresh")
+def refresh_schema_capabilities() -> Any:
+    """
+    重新读取数据库结构能力（执行数据库迁移后调用）
+    """
+    from app.services.schema_capabilities import schema_capabilities
+    return schema_capabilities.refresh().to_dict()
+
+
 @router.post("/db/reconnect")
 def reconnect_database_endpoint() -> Any:
     """
@@ -9,7 +9,6 @@ from datetime import datetime
 import logging
 
 from app.api.deps import SessionDep, CurrentUser
-from app.models import UserCompany
 from app.models import Message
 from app.models.models_invoice import (
     HolePositionRecord, HolePositionItem,
@@ -18,23 +17,13 @@ from app.models.models_invoice import (
     InvoiceFile
 )
 from sqlmodel import SQLModel, Field
+from app.services.permission_scope import can_access_company, company_scope_condition
 
 router = APIRouter(prefix="/hole-position", tags=["hole-position"])
 
 logger = logging.getLogger(__name__)
 
 
-def get_user_company_ids_hole_position(session: SessionDep, user_id: UUID) -> list[UUID]:
-    """
-    获取用户关联的所有公司ID列表
-    """
-    from app.models import UserCompany
-    user_companies = session.exec(
-        select(UserCompany).where(UserCompany.user_id == user_id)
-    ).all()
-    return [uc.company_id for uc in user_companies]
-
-
 def check_hole_position_permission(record: HolePositionRecord, current_user: CurrentUser, session: SessionDep) -> bool:
     """
     检查孔位类记录访问权限
@@ -42,23 +31,8 @@ def check_hole_position_permission(record: HolePositionRecord, current_user: Cur
     1. 超级用户可以访问所有记录
     2. 普通用户只能访问自己关联公司的记录
     """
-    # 超级用户可以访问所有记录
-    if current_user.is_superuser:
-        return True
-    
     # 如果记录没有公司ID，允许访问（向后兼容）
-    if not record.company_id:
-        return True
-    
-    # 获取用户关联的公司ID列表
-    user_company_ids = get_user_company_ids_hole_position(session, current_user.id)
-    
-    # 如果用户没有关联任何公司，则无权访问
-    if not user_company_ids:
-        return False
-    
-    # 检查记录的公司ID是否在用户的公司列表中
-    return record.company_id in user_company_ids
+    return can_access_company(session, current_user, record.company_id)
 
 
 def add_company_filter_hole_position(statement, current_user: CurrentUser, session: SessionDep, conditions=None):
@@ -66,21 +40,16 @@ def add_company_filter_hole_position(statement, current_user: CurrentUser, sessi
     根据用户的公司ID列表过滤孔位类记录查询
     规则：
     1. 超级用户可以查看所有记录
-    2. 普通用户只能查看自己关联公司的记录
+    2. 普通用户只能查看自己关联公司的记录（EXISTS 关联 user_company）
     3. 如果用户没有关联任何公司，则不展示任何记录
     """
     if conditions is None:
         conditions = []
     
     # 如果不是超级用户，添加公司过滤条件
-    if not current_user.is_superuser:
-        user_company_ids = get_user_company_ids_hole_position(session, current_user.id)
-        if user_company_ids:
-            # 用户有关联公司，只能查看这些公司的记录
-            conditions.append(HolePositionRecord.company_id.in_(user_company_ids))
-        else:
-            # 如果用户没有关联任何公司，返回空结果（使用一个永远为False的条件）
-            conditions.append(HolePositionRecord.id.is_(None))
+    scope_condition = company_scope_condition(HolePositionRecord.company_id, current_user)
+    if scope_condition is not None:
+        conditions.append(scope_condition)
     
     if conditions:
         statement = statement.where(and_(*conditions))
@@ -18,12 +18,42 @@ from app.models import (
 from app.models import (
     Inventory, MaterialLotFeature, MaterialLot
 )
+from app.api.list_query import ListColumn, ListQuery, ListQueryError, keys_param, model_columns
+from app.services.coil_candidate_index import refresh_coil_candidates
 from app.utils import get_server_datetime
 
 router = APIRouter(prefix="/inventory", tags=["inventory"])
 
+# 批次属性字段通过 EXISTS 过滤库存
+_MATERIAL_LOT_FEATURE_EXISTS = (
+    "SELECT 1 FROM material_lot_feature "
+    "WHERE material_lot_feature.material_lot_id = inventory.material_lot_id AND {condition}"
+)
+_FEATURE_COLUMNS = {
+    field: spec
+    for field, spec in model_columns(MaterialLotFeature, exists=_MATERIAL_LOT_FEATURE_EXISTS).items()
+    if spec.column.split(".")[1] in (
+        "material_lot_feature_id", "feature_id", "feature_code", "feature_desc", "feature_value"
+    )
+}
 
-
+INVENTORY_LIST_QUERY = ListQuery(
+    table="inventory",
+    key="inventory_id",
+    columns={**model_columns(Inventory), **_FEATURE_COLUMNS},
+    search=[
+        ListColumn("inventory.material_code", "contains"),
+        ListColumn("inventory.material_desc", "contains"),
+        ListColumn("inventory.plant_name", "contains"),
+        ListColumn("inventory.warehouse_name", "contains"),
+        ListColumn("inventory.bin_name", "contains"),
+        ListColumn("inventory.lot_no", "contains"),
+        ListColumn("material_lot_feature.feature_code", "contains", _MATERIAL_LOT_FEATURE_EXISTS),
+        ListColumn("material_lot_feature.feature_desc", "contains", _MATERIAL_LOT_FEATURE_EXISTS),
+        ListColumn("material_lot_feature.feature_value", "contains", _MATERIAL_LOT_FEATURE_EXISTS),
+    ],
+    default_sort=[("materialCode", "asc")],
+)
 
 
 @router.post("/unified", response_model=UnifiedResponse)
@@ -145,6 +175,9 @@ def _handle_unified_delete(request: UnifiedRequest, session: SessionDep, current
         delete_main_sql = "DELETE FROM inventory WHERE inventory_id = :inventory_id"
         session.execute(text(delete_main_sql), {"inventory_id": inventory_id})
         
+        # 同步移除套料钢卷候选索引
+        refresh_coil_candidates(session, inventory_ids=[inventory_id], commit=False)
+        
         session.commit()
         
         return UnifiedResponse(
@@ -167,102 +200,21 @@ def _handle_unified_delete(request: UnifiedRequest, session: SessionDep, current
 def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_user: CurrentUser) -> UnifiedResponse:
     """处理列表查询操作 - 使用 SQL 文本执行"""
     try:
-        # SQL 查询模板 - 包含子对象数据
-        sql_template = """
-        SELECT 
-            inventory.*,material_lot_feature.*,feature.feature_desc
-        FROM inventory 
-        LEFT JOIN material_lot_feature ON inventory.material_lot_id = material_lot_feature.material_lot_id
-        left join feature on feature.feature_id = material_lot_feature.feature_id
-        WHERE 1=1
-        -- {filter_conditions}
-        -- {search_conditions}
-        -- {order_conditions}
-        -- {pagination_conditions}
-        """
-        
-        # 构建过滤条件
-        filter_conditions = []
-        if request.filters:
-            for field, value in request.filters.items():
-                if value:
-                    # 将字段名转换为数据库字段名（驼峰转下划线）
-                    db_field = ''.join(['_' + c.lower() if c.isupper() else c for c in field]).lstrip('_')
-                    # 根据字段类型添加表别名
-                    if db_field in ['material_lot_feature_id', 'feature_id', 'feature_code', 'feature_desc', 'feature_value']:
-                        filter_conditions.append(f"AND material_lot_feature.{db_field} ILIKE '%{value}%'")
-                    else:
-                        filter_conditions.append(f"AND inventory.{db_field} ILIKE '%{value}%'")
-        
-        # 构建搜索条件
-        search_conditions = []
-        if request.search:
-            search_term = f"%{request.search}%"
-            search_conditions.append(f"""AND (
-                inventory.material_code ILIKE '{search_term}' OR 
-                inventory.material_desc ILIKE '{search_term}' OR 
-                inventory.plant_name ILIKE '{search_term}' OR 
-                inventory.warehouse_name ILIKE '{search_term}' OR 
-                inventory.bin_name ILIKE '{search_term}' OR 
-                inventory.material_lot_code ILIKE '{search_term}' OR
-                material_lot_feature.feature_code ILIKE '{search_term}' OR
-                material_lot_feature.feature_desc ILIKE '{search_term}' OR
-                material_lot_feature.feature_value ILIKE '{search_term}'
-            )""")
-        
-        # 构建排序条件
-        order_conditions = []
-        if request.sort:
-            for field, direction in request.sort.items():
-                # 将字段名转换为数据库字段名
-                db_field = ''.join(['_' + c.lower() if c.isupper() else c for c in field]).lstrip('_')
-                order_direction = "DESC" if direction.lower() == "desc" else "ASC"
-                # 根据字段类型添加表别名
-                if db_field in ['material_lot_feature_id', 'feature_id', 'feature_code', 'feature_desc', 'feature_value']:
-                    order_conditions.append(f"material_lot_feature.{db_field} {order_direction}")
-                else:
-                    order_conditions.append(f"inventory.{db_field} {order_direction}")
-        else:
-            order_conditions.append("inventory.material_code ASC")
-        
-        # 构建分页条件
-        page = request.page or 1
-        limit = request.limit or 20
-        offset = (page - 1) * limit
-        pagination_conditions = f"LIMIT {limit} OFFSET {offset}"
-        
-        # 替换 SQL 模板中的占位符
-        sql_query = sql_template.replace(
-            "-- {filter_conditions}", 
-            '\n'.join(filter_conditions)
-        ).replace(
-            "-- {search_conditions}", 
-            '\n'.join(search_conditions)
-        ).replace(
-            "-- {order_conditions}", 
-            f"ORDER BY {', '.join(order_conditions)}"
-        ).replace(
-            "-- {pagination_conditions}", 
-            pagination_conditions
-        )
-        
-        # 构建计数查询
-        count_sql = f"""
-        SELECT COUNT(DISTINCT inventory.inventory_id) as total
-        FROM inventory 
-        LEFT JOIN material_lot_feature ON inventory.material_lot_id = material_lot_feature.material_lot_id
-        WHERE 1=1
-        {' '.join(filter_conditions)}
-        {' '.join(search_conditions)}
-        """
-        
-        # 执行计数查询
-        count_result = session.exec(text(count_sql)).one()
-        total = count_result[0] if count_result else 0
-        
-        # 执行主查询
-        result = session.execute(text(sql_query))
-        rows = result.fetchall()
+        # 分页只作用于库存主表，批次属性条件通过 EXISTS 过滤
+        page = INVENTORY_LIST_QUERY.execute(session, request)
+        
+        # 查询当前页库存的批次属性明细
+        rows = []
+        if page.keys:
+            detail_sql = """
+            SELECT 
+                inventory.*,material_lot_feature.*,feature.feature_desc
+            FROM inventory 
+            LEFT JOIN material_lot_feature ON inventory.material_lot_id = material_lot_feature.material_lot_id
+            left join feature on feature.feature_id = material_lot_feature.feature_id
+            WHERE inventory.inventory_id IN :keys
+            """
+            rows = session.execute(keys_param(detail_sql), {"keys": page.keys}).fetchall()
         
         # 将查询结果组织成嵌套结构 - 直接使用字典，不创建 SQLModel 对象
         items_dict = {}  # 用于去重和分组
@@ -322,19 +274,10 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
                 }
                 items_dict[inventory_id]["materialLotFeatureList"].append(feature_dict)
         
-        # 将分组后的数据转换为列表
-        items = list(items_dict.values())
-        
-        # 构建分页信息
-        total_pages = (total + limit - 1) // limit
-        pagination = {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
+        # 将分组后的数据转换为列表（按当前页顺序）
+        items = page.sort_by_keys(list(items_dict.values()), "inventoryId")
+        pagination = page.pagination()
+        total = page.total
         
         return UnifiedResponse(
             success=True,
@@ -344,6 +287,13 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             message=f"查询成功，共{total}条记录"
         )
         
+    except ListQueryError as e:
+        return UnifiedResponse(
+            success=False,
+            code=400,
+            message=f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY"
+        )
     except Exception as e:
         return UnifiedResponse(
             success=False,
@@ -478,6 +428,9 @@ def _handle_unified_save(request: UnifiedRequest, session: SessionDep, current_u
         
         # 2. 处理明细数据 - 现在在materialLot对象内部处理，不在这里直接处理
         
+        # 同步刷新套料钢卷候选索引
+        refresh_coil_candidates(session, inventory_ids=[inventory_id], commit=False)
+        
         # 提交所有更改到数据库
         session.commit()
         
@@ -787,6 +740,10 @@ def _handle_unified_batch_save(request: UnifiedRequest, session: SessionDep, cur
                 stmt = insert(Inventory).values(**inventory_data_for_sql)
                 
                 session.add(inventory)
+                # 同步刷新套料钢卷候选索引（库存及其批次属性）
+                refresh_coil_candidates(
+                    session, inventory_ids=[inventory_id], material_lot_ids=[material_lot_id], commit=False
+                )
                 session.commit()
                 print(f"处理数据: {i+1}")
                 
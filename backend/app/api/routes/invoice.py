@@ -4,13 +4,13 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from sqlmodel import select, func, or_, and_
 from datetime import datetime
 import os
-import shutil
 import logging
+import zipfile
 import json
 from pathlib import Path
-from sqlalchemy import inspect, text
+from sqlalchemy import text
 
-from app.api.deps import SessionDep, CurrentUser
+from app.api.deps import SessionDep, CurrentUser, get_current_active_superuser
 from app.models import Message
 from app.models.models_invoice import (
     Invoice, InvoiceFile, InvoiceCreate, InvoiceUpdate, InvoiceResponse,
@@ -21,6 +21,10 @@ from app.models.models_invoice import (
     SchemaValidationRecord, Template
 )
 from sqlmodel import SQLModel, Field
+from app.services import file_ingest, file_serving, invoice_detail, invoice_search, recognition_memo, recognition_task_batch
+from app.services.preview_renderer import preview_dir, preview_renderer, read_manifest
+from app.services.schema_capabilities import schema_capabilities
+from app.services.permission_scope import can_access_company, company_scope_condition
 
 router = APIRouter(prefix="/invoices", tags=["invoices"])
 
@@ -32,12 +36,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# 文件上传目录配置
-# 使用绝对路径，基于后端运行目录
-import os
-BACKEND_DIR = Path(__file__).parent.parent.parent.parent  # 从 routes/invoice.py 到 backend 目录
-UPLOAD_DIR = BACKEND_DIR / "uploads" / "invoices"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# 文件上传存储见 app/services/file_ingest.py（uploads/ab/cd/<sha256> 内容寻址存储）
 
 
 # 辅助函数：安全地查询 RecognitionTask，避免查询不存在的 template_version_id 字段
@@ -47,32 +46,8 @@ def _safe_get_recognition_task(session: SessionDep, task_id: UUID):
     使用原始 SQL 查询，避免 SQLAlchemy 自动包含模型中的所有字段
     """
     try:
-        # 尝试获取表结构
-        try:
-            inspector = inspect(session.bind)
-            columns = [col['name'] for col in inspector.get_columns('recognition_task')]
-        except Exception as e:
-            logger.warning(f"无法获取表结构，使用默认字段列表: {e}")
-            columns = [
-                'id', 'task_no', 'invoice_id', 'template_id', 'params', 'status',
-                'priority', 'start_time', 'end_time', 'duration', 'error_message',
-                'error_code', 'provider', 'request_id', 'trace_id', 'operator_id', 'create_time'
-            ]
-        
-        # 构建基本字段列表
-        base_fields = [
-            'id', 'task_no', 'invoice_id', 'template_id', 'params', 'status',
-            'priority', 'start_time', 'end_time', 'duration', 'error_message',
-            'error_code', 'provider', 'request_id', 'trace_id', 'operator_id', 'create_time'
-        ]
-        
-        # 如果 template_version_id 字段存在，也包含它
-        if 'template_version_id' in columns:
-            base_fields.insert(4, 'template_version_id')
-        
-        existing_fields = [f for f in base_fields if f in columns]
-        if not existing_fields:
-            existing_fields = ['id', 'task_no', 'invoice_id', 'template_id', 'params', 'status']
+        # 使用启动时读取的表结构（template_version_id 存在时包含它）
+        existing_fields = schema_capabilities.get().recognition_task_fields
         
         fields_str = ', '.join(existing_fields)
         
@@ -112,32 +87,8 @@ def _safe_query_recognition_tasks(session: SessionDep, where_clause: str = "", p
     安全地查询 RecognitionTask 列表，排除可能不存在的 template_version_id 字段
     """
     try:
-        # 尝试获取表结构
-        try:
-            inspector = inspect(session.bind)
-            columns = [col['name'] for col in inspector.get_columns('recognition_task')]
-        except Exception as e:
-            logger.warning(f"无法获取表结构，使用默认字段列表: {e}")
-            columns = [
-                'id', 'task_no', 'invoice_id', 'template_id', 'params', 'status',
-                'priority', 'start_time', 'end_time', 'duration', 'error_message',
-                'error_code', 'provider', 'request_id', 'trace_id', 'operator_id', 'create_time'
-            ]
-        
-        # 构建基本字段列表
-        base_fields = [
-            'id', 'task_no', 'invoice_id', 'template_id', 'params', 'status',
-            'priority', 'start_time', 'end_time', 'duration', 'error_message',
-            'error_code', 'provider', 'request_id', 'trace_id', 'operator_id', 'create_time'
-        ]
-        
-        # 如果 template_version_id 字段存在，也包含它
-        if 'template_version_id' in columns:
-            base_fields.insert(4, 'template_version_id')
-        
-        existing_fields = [f for f in base_fields if f in columns]
-        if not existing_fields:
-            existing_fields = ['id', 'task_no', 'invoice_id', 'template_id', 'params', 'status']
+        # 使用启动时读取的表结构（template_version_id 存在时包含它）
+        existing_fields = schema_capabilities.get().recognition_task_fields
         
         fields_str = ', '.join(existing_fields)
         
@@ -165,18 +116,6 @@ def _safe_query_recognition_tasks(session: SessionDep, where_clause: str = "", p
         return []
 
 
-# 辅助函数：获取用户的公司ID列表
-def get_user_company_ids(session: SessionDep, user_id: UUID) -> list[UUID]:
-    """
-    获取用户关联的所有公司ID列表
-    """
-    from app.models import UserCompany
-    user_companies = session.exec(
-        select(UserCompany).where(UserCompany.user_id == user_id)
-    ).all()
-    return [uc.company_id for uc in user_companies]
-
-
 # 辅助函数：检查用户是否有权限访问发票
 def check_invoice_permission(invoice: Invoice, current_user: CurrentUser, session: SessionDep) -> bool:
     """
@@ -189,23 +128,8 @@ def check_invoice_permission(invoice: Invoice, current_user: CurrentUser, sessio
     Returns:
         bool: True表示有权限，False表示无权限
     """
-    # 超级用户可以访问所有发票
-    if current_user.is_superuser:
-        return True
-    
     # 如果发票没有公司ID，允许访问（向后兼容）
-    if not invoice.company_id:
-        return True
-    
-    # 获取用户关联的公司ID列表
-    user_company_ids = get_user_company_ids(session, current_user.id)
-    
-    # 如果用户没有关联任何公司，则无权访问
-    if not user_company_ids:
-        return False
-    
-    # 检查发票的公司ID是否在用户的公司列表中
-    return invoice.company_id in user_company_ids
+    return can_access_company(session, current_user, invoice.company_id)
 
 
 # 辅助函数：添加公司过滤条件
@@ -214,21 +138,16 @@ def add_company_filter(statement, current_user: CurrentUser, session: SessionDep
     根据用户的公司ID列表过滤发票查询
     规则：
     1. 超级用户可以查看所有发票
-    2. 普通用户只能查看自己关联公司的发票（invoice.company_id 在用户的公司列表中）
+    2. 普通用户只能查看自己关联公司的发票（EXISTS 关联 user_company，不展开公司ID列表）
     3. 如果用户没有关联任何公司，则不展示任何发票
     """
     if conditions is None:
         conditions = []
     
     # 如果不是超级用户，添加公司过滤条件
-    if not current_user.is_superuser:
-        user_company_ids = get_user_company_ids(session, current_user.id)
-        if user_company_ids:
-            # 用户有关联公司，只能查看这些公司的发票
-            conditions.append(Invoice.company_id.in_(user_company_ids))
-        else:
-            # 如果用户没有关联任何公司，返回空结果（使用一个永远为False的条件）
-            conditions.append(Invoice.id.is_(None))
+    scope_condition = company_scope_condition(Invoice.company_id, current_user)
+    if scope_condition is not None:
+        conditions.append(scope_condition)
     
     if conditions:
         statement = statement.where(and_(*conditions))
@@ -244,124 +163,16 @@ def upload_invoice(
     current_user: CurrentUser
 ) -> Any:
     """
-    上传票据文件
+    上传票据文件（流式计算哈希并写入内容寻址存储，文件与票据记录同一事务提交）
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
         logger.info(f"=== 票据上传开始 ===")
         logger.info(f"文件名: {file.filename}")
         logger.info(f"Content-Type: {file.content_type}")
         logger.info(f"上传用户ID: {current_user.id}")
         
-        # 1. 验证文件类型
-        allowed_types = ["application/pdf", "image/jpeg", "image/png", "image/jpg"]
-        logger.debug(f"检查文件类型: {file.content_type} in {allowed_types}")
-        if file.content_type not in allowed_types:
-            logger.warning(f"不支持的文件类型: {file.content_type}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支持的文件类型: {file.content_type}，仅支持 PDF、JPG、PNG"
-            )
-        logger.debug("文件类型验证通过")
-        
-        # 2. 验证文件大小（10MB）并读取文件内容
-        file_content = file.file.read()
-        file_size = len(file_content)
-        logger.debug(f"文件大小: {file_size} 字节")
-        if file_size > 10 * 1024 * 1024:
-            logger.warning(f"文件大小超过限制: {file_size} 字节")
-            raise HTTPException(status_code=400, detail="文件大小不能超过 10MB")
-        logger.debug("文件大小验证通过")
-        
-        # 3. 计算文件哈希值（用于唯一性校验）
-        import hashlib
-        file_hash = hashlib.sha256(file_content).hexdigest()
-        logger.info(f"文件哈希值: {file_hash}")
-        
-        # 4. 检查文件是否已存在（基于哈希值）
-        existing_file = session.exec(
-            select(InvoiceFile).where(InvoiceFile.file_hash == file_hash)
-        ).first()
-        
-        if existing_file:
-            logger.warning(f"文件已存在，哈希值: {file_hash}, 文件ID: {existing_file.id}")
-            # 检查是否属于当前用户
-            if existing_file.uploader_id == current_user.id:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"该文件已上传过，文件名: {existing_file.file_name}，上传时间: {existing_file.upload_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="该文件已被其他用户上传，不能重复上传"
-                )
-        logger.debug("文件唯一性校验通过")
-        
-        # 5. 生成唯一文件名
-        file_ext = Path(file.filename).suffix if file.filename else ".pdf"
-        unique_filename = f"{uuid4()}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-        logger.info(f"上传目录: {UPLOAD_DIR}")
-        logger.info(f"上传目录绝对路径: {UPLOAD_DIR.absolute()}")
-        logger.info(f"生成文件路径: {file_path}")
-        logger.info(f"文件路径绝对路径: {file_path.absolute()}")
-        
-        # 6. 保存文件
-        file.file.seek(0)  # 重置文件指针
-        logger.info("开始保存文件到磁盘")
-        try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            logger.info(f"文件已保存: {file_path.absolute()}")
-            
-            # 验证文件是否真的存在
-            if file_path.exists():
-                actual_size = file_path.stat().st_size
-                logger.info(f"文件保存成功，实际大小: {actual_size} 字节，期望大小: {file_size} 字节")
-                if actual_size != file_size:
-                    logger.warning(f"文件大小不匹配！实际: {actual_size}, 期望: {file_size}")
-            else:
-                logger.error(f"文件保存后不存在！路径: {file_path.absolute()}")
-                raise Exception(f"文件保存失败，文件不存在: {file_path.absolute()}")
-        except Exception as save_error:
-            logger.error(f"保存文件时出错: {str(save_error)}", exc_info=True)
-            raise
-        
-        # 7. 创建文件记录
-        logger.debug("创建文件记录")
-        invoice_file = InvoiceFile(
-            file_name=file.filename or "unknown",
-            file_path=str(file_path),
-            file_size=file_size,
-            file_type=file_ext[1:] if file_ext else "pdf",
-            mime_type=file.content_type or "application/pdf",
-            file_hash=file_hash,
-            uploader_id=current_user.id,
-            status="uploaded"
-        )
-        session.add(invoice_file)
-        session.commit()
-        session.refresh(invoice_file)
-        logger.info(f"文件记录已创建: {invoice_file.id}")
-        
-        # 8. 自动创建票据记录
-        logger.debug("创建票据记录")
-        invoice = Invoice(
-            invoice_no=f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}-{str(uuid4())[:8]}",
-            invoice_type="未知",
-            file_id=invoice_file.id,
-            creator_id=current_user.id,
-            company_id=current_user.company_id,  # 自动设置用户的公司ID
-            recognition_status="pending",
-            review_status="pending"
-        )
-        session.add(invoice)
-        session.commit()
-        session.refresh(invoice)
-        logger.info(f"票据记录已创建: {invoice.id}, 票据编号: {invoice.invoice_no}")
+        invoice_file, invoice = file_ingest.ingest_upload(session, file, current_user)
+        preview_renderer.submit(invoice_file.file_path, invoice_file.mime_type)
         
         # 构建返回消息
         message = f"文件上传成功，票据编号: {invoice.invoice_no}"
@@ -369,6 +180,9 @@ def upload_invoice(
         logger.info("=== 票据上传成功 ===")
         return Message(message=message)
     
+    except file_ingest.UploadRejected as e:
+        logger.warning(f"上传被拒绝: {file.filename if file else 'unknown'}, 原因: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except HTTPException:
         logger.error(f"HTTP异常: {file.filename if file else 'unknown'}")
         raise
@@ -389,9 +203,6 @@ def upload_invoice_external(
     上传票据文件（从外部API上传后保存到本地数据库）
     用于保存通过模型配置上传到外部API的文件信息
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
         logger.info(f"=== 外部API文件上传保存开始 ===")
         logger.info(f"文件名: {file.filename}")
@@ -401,92 +212,10 @@ def upload_invoice_external(
         if not external_file_id:
             raise HTTPException(status_code=400, detail="缺少外部文件ID")
         
-        # 1. 验证文件类型
-        allowed_types = ["application/pdf", "image/jpeg", "image/png", "image/jpg"]
-        if file.content_type not in allowed_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支持的文件类型: {file.content_type}，仅支持 PDF、JPG、PNG"
-            )
-        
-        # 2. 验证文件大小（10MB）并读取文件内容
-        file_content = file.file.read()
-        file_size = len(file_content)
-        if file_size > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="文件大小不能超过 10MB")
-        
-        # 3. 计算文件哈希值（用于唯一性校验）
-        import hashlib
-        file_hash = hashlib.sha256(file_content).hexdigest()
-        logger.info(f"文件哈希值: {file_hash}")
-        
-        # 4. 检查文件是否已存在（基于哈希值）
-        existing_file = session.exec(
-            select(InvoiceFile).where(InvoiceFile.file_hash == file_hash)
-        ).first()
-        
-        if existing_file:
-            logger.warning(f"文件已存在，哈希值: {file_hash}, 文件ID: {existing_file.id}")
-            if existing_file.uploader_id == current_user.id:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"该文件已上传过，文件名: {existing_file.file_name}，上传时间: {existing_file.upload_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="该文件已被其他用户上传，不能重复上传"
-                )
-        
-        # 5. 生成唯一文件名
-        file_ext = Path(file.filename).suffix if file.filename else ".pdf"
-        unique_filename = f"{uuid4()}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-        logger.info(f"生成文件路径: {file_path}")
-        
-        # 6. 保存文件
-        file.file.seek(0)  # 重置文件指针
-        try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            logger.info(f"文件已保存: {file_path.absolute()}")
-        except Exception as save_error:
-            logger.error(f"保存文件时出错: {str(save_error)}", exc_info=True)
-            raise
-        
-        # 7. 创建文件记录（包含外部文件ID）
-        logger.debug("创建文件记录")
-        invoice_file = InvoiceFile(
-            file_name=file.filename or "unknown",
-            file_path=str(file_path),
-            file_size=file_size,
-            file_type=file_ext[1:] if file_ext else "pdf",
-            mime_type=file.content_type or "application/pdf",
-            file_hash=file_hash,
-            uploader_id=current_user.id,
-            status="uploaded",
-            external_file_id=external_file_id  # 保存外部API返回的文件ID
+        invoice_file, invoice = file_ingest.ingest_upload(
+            session, file, current_user, external_file_id=external_file_id
         )
-        session.add(invoice_file)
-        session.commit()
-        session.refresh(invoice_file)
-        logger.info(f"文件记录已创建: {invoice_file.id}, 外部文件ID: {external_file_id}")
-        
-        # 8. 自动创建票据记录
-        logger.debug("创建票据记录")
-        invoice = Invoice(
-            invoice_no=f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}-{str(uuid4())[:8]}",
-            invoice_type="未知",
-            file_id=invoice_file.id,
-            creator_id=current_user.id,
-            company_id=current_user.company_id,  # 自动设置用户的公司ID
-            recognition_status="pending",
-            review_status="pending"
-        )
-        session.add(invoice)
-        session.commit()
-        session.refresh(invoice)
-        logger.info(f"票据记录已创建: {invoice.id}, 票据编号: {invoice.invoice_no}")
+        preview_renderer.submit(invoice_file.file_path, invoice_file.mime_type)
         
         # 构建返回消息
         message = f"文件上传成功，票据编号: {invoice.invoice_no}, 外部文件ID: {external_file_id}"
@@ -494,6 +223,9 @@ def upload_invoice_external(
         logger.info("=== 外部API文件上传保存成功 ===")
         return Message(message=message)
     
+    except file_ingest.UploadRejected as e:
+        logger.warning(f"上传被拒绝: {file.filename if file else 'unknown'}, 原因: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except HTTPException:
         logger.error(f"HTTP异常: {file.filename if file else 'unknown'}")
         raise
@@ -502,6 +234,56 @@ def upload_invoice_external(
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
 
+@router.post("/upload/batch")
+def upload_invoices_batch(
+    *,
+    session: SessionDep,
+    files: list[UploadFile] = File(...),
+    current_user: CurrentUser
+) -> Any:
+    """
+    批量上传票据文件（多个文件，或包含票据文件的 zip 压缩包）
+    并行暂存与计算哈希、一次去重查询、一次提交，返回逐个文件的结果；单个文件失败不影响其他文件
+    """
+    logger.info(f"=== 批量上传开始 === 文件数: {len(files)}, 上传用户ID: {current_user.id}")
+    archives: list = []
+    try:
+        try:
+            sources = list(file_ingest.expand_uploads(files, archives))
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"压缩包格式错误: {str(e)}")
+        if not sources:
+            raise HTTPException(status_code=400, detail="没有可上传的文件")
+        
+        results = file_ingest.ingest_batch(session, sources, current_user)
+        created = sum(1 for result in results if result.status == "created")
+        duplicates = sum(1 for result in results if result.status == "duplicate")
+        rejected = sum(1 for result in results if result.status == "rejected")
+        for result in results:
+            if result.status == "created":
+                preview_renderer.submit(str(file_ingest.content_path(result.file_hash)), result.content_type)
+        
+        logger.info("=== 批量上传完成 ===")
+        return {
+            "total": len(results),
+            "created": created,
+            "duplicates": duplicates,
+            "failed": rejected,
+            "results": [result.to_dict() for result in results],
+            "message": f"共 {len(results)} 个文件，成功 {created} 个，重复 {duplicates} 个，失败 {rejected} 个"
+        }
+    except file_ingest.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量上传失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"批量上传失败: {str(e)}")
+    finally:
+        for archive in archives:
+            archive.close()
+
+
 @router.get("/recognition-tasks")
 def get_recognition_tasks(
     *,
@@ -515,50 +297,15 @@ def get_recognition_tasks(
     获取识别任务列表
     """
     try:
-        # 如果不是超级用户，需要通过发票过滤识别任务
-        if not current_user.is_superuser:
-            if current_user.company_id:
-                # 用户有公司ID，只查询自己公司的发票的识别任务
-                # 先查询符合条件的发票ID列表
-                invoice_ids = session.exec(
-                    select(Invoice.id).where(Invoice.company_id == current_user.company_id)
-                ).all()
-                if invoice_ids:
-                    statement = select(RecognitionTask).where(RecognitionTask.invoice_id.in_(invoice_ids))
-                    if status:
-                        statement = statement.where(RecognitionTask.status == status)
-                else:
-                    # 用户没有可访问的发票，返回空结果
-                    statement = select(RecognitionTask).where(RecognitionTask.id.is_(None))
-                    if status:
-                        statement = statement.where(RecognitionTask.status == status)
-            else:
-                # 用户没有公司ID，返回空结果
-                statement = select(RecognitionTask).where(RecognitionTask.id.is_(None))
-                if status:
-                    statement = statement.where(RecognitionTask.status == status)
-        else:
-            # 超级用户可以查看所有识别任务
-            statement = select(RecognitionTask)
-            if status:
-                statement = statement.where(RecognitionTask.status == status)
-        
-        # 总数查询
+        # 如果不是超级用户，通过票据所属公司过滤识别任务（关联 invoice，EXISTS 关联 user_company）
+        statement = select(RecognitionTask)
         count_statement = select(func.count()).select_from(RecognitionTask)
-        if not current_user.is_superuser:
-            if current_user.company_id:
-                invoice_ids = session.exec(
-                    select(Invoice.id).where(Invoice.company_id == current_user.company_id)
-                ).all()
-                if invoice_ids:
-                    count_statement = count_statement.where(RecognitionTask.invoice_id.in_(invoice_ids))
-                    if status:
-                        count_statement = count_statement.where(RecognitionTask.status == status)
-                else:
-                    count_statement = count_statement.where(RecognitionTask.id.is_(None))
-            else:
-                count_statement = count_statement.where(RecognitionTask.id.is_(None))
-        elif status:
+        scope_condition = company_scope_condition(Invoice.company_id, current_user)
+        if scope_condition is not None:
+            statement = statement.join(Invoice, Invoice.id == RecognitionTask.invoice_id).where(scope_condition)
+            count_statement = count_statement.join(Invoice, Invoice.id == RecognitionTask.invoice_id).where(scope_condition)
+        if status:
+            statement = statement.where(RecognitionTask.status == status)
             count_statement = count_statement.where(RecognitionTask.status == status)
         
         total = session.exec(count_statement).one()
@@ -579,21 +326,11 @@ def get_recognition_tasks(
             params_dict = {}
             
             if not current_user.is_superuser:
-                if current_user.company_id:
-                    try:
-                        invoice_ids = session.exec(
-                            select(Invoice.id).where(Invoice.company_id == current_user.company_id)
-                        ).all()
-                        if invoice_ids:
-                            invoice_ids_str = [str(id) for id in invoice_ids]
-                            where_conditions.append("invoice_id = ANY(:invoice_ids)")
-                            params_dict["invoice_ids"] = invoice_ids_str
-                        else:
-                            where_conditions.append("1 = 0")
-                    except:
-                        where_conditions.append("1 = 0")
-                else:
-                    where_conditions.append("1 = 0")
+                where_conditions.append(
+                    "invoice_id IN (SELECT invoice.id FROM invoice JOIN user_company"
+                    " ON user_company.company_id = invoice.company_id WHERE user_company.user_id = :scope_user_id)"
+                )
+                params_dict["scope_user_id"] = str(current_user.id)
             
             if status:
                 where_conditions.append("status = :status")
@@ -646,6 +383,8 @@ def get_recognition_tasks(
                 start_time = task.start_time if hasattr(task, 'start_time') else None
                 end_time = task.end_time if hasattr(task, 'end_time') else None
                 create_time = task.create_time if hasattr(task, 'create_time') else None
+                progress = getattr(task, 'progress', None) or 0
+                current_node = getattr(task, 'current_node', None)
                 
                 model_name = None
                 if task_params and task_params.get("model_config_id"):
@@ -668,6 +407,8 @@ def get_recognition_tasks(
                     "provider": provider,
                     "recognition_mode": recognition_mode,
                     "model_name": model_name,
+                    "progress": progress,
+                    "current_node": current_node,
                     "start_time": start_time.isoformat() if start_time else None,
                     "end_time": end_time.isoformat() if end_time else None,
                     "create_time": create_time.isoformat() if create_time else None
@@ -907,7 +648,7 @@ def create_recognition_task(
         raise HTTPException(status_code=500, detail=f"创建任务失败: {str(e)}")
 
 
-@router.post("/recognition-tasks/{task_id}/start", response_model=Message)
+@router.post("/recognition-tasks/{task_id}/start", response_model=Message, status_code=202)
 def start_recognition(
     *,
     session: SessionDep,
@@ -915,7 +656,7 @@ def start_recognition(
     current_user: CurrentUser
 ) -> Any:
     """
-    启动识别任务（校验参数并调用Dify）
+    启动识别任务（校验参数后入队，立即返回 202，由后台识别工作池调用Dify）
     """
     try:
         # 使用安全查询方法，避免字段不存在的问题
@@ -963,75 +704,67 @@ def start_recognition(
         if not os.path.exists(file.file_path):
             raise HTTPException(status_code=404, detail="文件路径不存在")
         
-        # 更新任务状态 - 使用原始SQL避免字段不存在的问题
-        try:
-            # 尝试使用ORM更新
-            task.status = "processing"
-            task.start_time = datetime.now()
-            session.add(task)
-            session.commit()
-        except Exception as e:
-            # 如果ORM更新失败（可能是字段不存在），使用原始SQL
-            logger.warning(f"使用ORM更新任务状态失败，改用原始SQL: {e}")
-            try:
-                session.rollback()
-                # 检查表结构，确定哪些字段存在
-                inspector = inspect(session.bind)
-                columns = [col['name'] for col in inspector.get_columns('recognition_task')]
-                
-                # 构建UPDATE语句，只更新存在的字段
-                update_fields = []
-                update_params = {"task_id": str(task_id)}
-                
-                if 'status' in columns:
-                    update_fields.append("status = :status")
-                    update_params["status"] = "processing"
-                
-                if 'start_time' in columns:
-                    update_fields.append("start_time = :start_time")
-                    update_params["start_time"] = datetime.now()
-                
-                if update_fields:
-                    update_sql = f"""
-                        UPDATE recognition_task
-                        SET {', '.join(update_fields)}
-                        WHERE id = :task_id
-                    """
-                    session.execute(text(update_sql), update_params)
-                    session.commit()
-            except Exception as sql_error:
-                logger.error(f"使用原始SQL更新任务状态也失败: {sql_error}", exc_info=True)
-                session.rollback()
-                raise HTTPException(status_code=500, detail=f"更新任务状态失败: {str(sql_error)}")
+        # 入队，由后台识别工作池执行（不在请求内同步调用Dify）
+        from app.services.recognition_worker import enqueue_task
+        enqueue_task(session, task.id, invoice)
+        return Message(message="识别任务已提交，正在后台处理")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"启动任务失败: {str(e)}")
+
+
+@router.get("/recognition-tasks/{task_id}/progress")
+def get_recognition_task_progress(
+    *,
+    session: SessionDep,
+    task_id: UUID,
+    current_user: CurrentUser
+) -> Any:
+    """
+    获取识别任务执行进度（streaming 模式下随工作流节点更新，包含已识别的部分字段）
+    """
+    try:
+        task = session.get(RecognitionTask, task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="任务不存在")
         
-        # 更新票据状态
-        invoice.recognition_status = "processing"
-        session.add(invoice)
-        session.commit()
+        invoice = session.get(Invoice, task.invoice_id)
+        if not invoice:
+            raise HTTPException(status_code=404, detail="票据不存在")
         
-        # 调用SYNTAX服务（同步执行，实际生产环境应该使用异步队列）
-        try:
-            from app.services.dify_service import SyntaxService
-            syntax_service = SyntaxService(session)
-            # 注意：这里同步执行，实际应该使用异步任务队列（如Celery）
-            # 暂时同步执行以便测试，生产环境应该改为异步
-            success = syntax_service.process_task(task.id)
-            if success:
-                return Message(message="识别任务已完成")
-            else:
-                return Message(message="识别任务已启动，但执行失败，请查看任务详情")
-        except Exception as e:
-            logger.error(f"调用Dify服务失败: {str(e)}", exc_info=True)
-            # 即使Dify调用失败，任务状态已更新为processing，返回成功消息
-            return Message(message="识别任务已启动")
+        # 检查权限：使用统一的权限检查函数
+        if not check_invoice_permission(invoice, current_user, session):
+            raise HTTPException(status_code=403, detail="无权访问此票据")
+        
+        result = session.exec(
+            select(RecognitionResult).where(RecognitionResult.task_id == task.id)
+        ).first()
+        
+        return {
+            "task_id": str(task.id),
+            "status": task.status,
+            "progress": task.progress,
+            "current_node": task.current_node,
+            "node_events": task.node_events or [],
+            "error_code": task.error_code,
+            "error_message": task.error_message,
+            "result": {
+                "id": str(result.id),
+                "status": result.status,
+                "total_fields": result.total_fields,
+                "recognized_fields": result.recognized_fields,
+                "fields": result.normalized_fields or {},
+            } if result else None,
+        }
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"启动任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"查询任务进度失败: {str(e)}")
 
 
 @router.post("/recognition-tasks/batch", response_model=dict)
-async def batch_create_recognition_tasks(
+def batch_create_recognition_tasks(
     request: Request,
     session: SessionDep,
     batch_in: RecognitionTaskBatchCreate,
@@ -1039,6 +772,7 @@ async def batch_create_recognition_tasks(
 ) -> Any:
     """
     批量创建识别任务（同一批使用同一参数）
+    一次查询解析全部文件、一条多行 INSERT 写入全部任务；enqueue=true 时直接入队
     """
     # 详细日志记录
     logger.info("=" * 80)
@@ -1051,46 +785,11 @@ async def batch_create_recognition_tasks(
     logger.info(f"用户ID: {current_user.id}")
     logger.info(f"用户邮箱: {getattr(current_user, 'email', 'N/A')}")
     
-    # 记录请求头
-    logger.info("--- 请求头 ---")
-    for header_name, header_value in request.headers.items():
-        # 隐藏敏感信息
-        if header_name.lower() == 'authorization':
-            logger.info(f"{header_name}: Bearer ***")
-        else:
-            logger.info(f"{header_name}: {header_value}")
-    
-    # 记录原始请求体（用于调试）
-    try:
-        body = await request.body()
-        body_str = body.decode('utf-8')
-        logger.info("--- 原始请求体 ---")
-        logger.info(f"请求体长度: {len(body_str)} 字符")
-        logger.info(f"请求体内容: {body_str}")
-        
-        # 尝试解析JSON
-        try:
-            import json
-            body_json = json.loads(body_str)
-            logger.info("--- 解析后的JSON ---")
-            logger.info(f"uploaded_file_ids: {body_json.get('uploaded_file_ids', 'N/A')}")
-            logger.info(f"uploaded_file_ids 类型: {type(body_json.get('uploaded_file_ids', []))}")
-            logger.info(f"uploaded_file_ids 长度: {len(body_json.get('uploaded_file_ids', []))}")
-            if body_json.get('params'):
-                logger.info(f"params: {json.dumps(body_json.get('params'), ensure_ascii=False, indent=2)}")
-        except json.JSONDecodeError as e:
-            logger.warning(f"无法解析JSON: {str(e)}")
-    except Exception as e:
-        logger.warning(f"无法读取请求体: {str(e)}")
-    
     # 记录解析后的参数
     logger.info("--- 解析后的参数对象 ---")
     logger.info(f"batch_in 类型: {type(batch_in)}")
-    logger.info(f"uploaded_file_ids: {batch_in.uploaded_file_ids}")
-    logger.info(f"uploaded_file_ids 类型: {type(batch_in.uploaded_file_ids)}")
-    logger.info(f"uploaded_file_ids 长度: {len(batch_in.uploaded_file_ids)}")
-    for idx, file_id in enumerate(batch_in.uploaded_file_ids):
-        logger.info(f"  [{idx}] file_id: {file_id} (类型: {type(file_id)})")
+    logger.info(f"uploaded_file_ids 数量: {len(batch_in.uploaded_file_ids)}")
+    logger.info(f"enqueue: {batch_in.enqueue}")
     
     logger.info(f"params 对象: {batch_in.params}")
     logger.info(f"params.model_config_id: {batch_in.params.model_config_id}")
@@ -1118,53 +817,16 @@ async def batch_create_recognition_tasks(
         if batch_in.params.recognition_mode not in allowed_modes:
             raise HTTPException(status_code=400, detail=f"识别方式 {batch_in.params.recognition_mode} 不在允许列表中")
         
-        # 验证所有文件是否存在
-        logger.info("--- 验证文件 ---")
-        invoices = []
-        for idx, file_id in enumerate(batch_in.uploaded_file_ids):
-            logger.info(f"验证文件 [{idx}]: file_id={file_id} (类型: {type(file_id)})")
-            try:
-                # 如果file_id是字符串，尝试转换为UUID
-                from uuid import UUID
-                if isinstance(file_id, str):
-                    file_uuid = UUID(file_id)
-                else:
-                    file_uuid = file_id
-                
-                # 检查文件状态：只要文件状态不是成功状态（processed），都可以再次识别
-                from app.models.models_invoice import InvoiceFile
-                invoice_file = session.get(InvoiceFile, file_uuid)
-                if invoice_file:
-                    # 如果文件状态是 "processed"（成功状态），不允许再次识别
-                    if invoice_file.status == "processed":
-                        logger.warning(f"文件 [{idx}] 状态为成功（processed），跳过创建识别任务。文件: {invoice_file.file_name}")
-                        continue  # 跳过这个文件，继续处理下一个
-                    logger.info(f"文件 [{idx}] 状态检查通过：文件ID={invoice_file.id}, 状态={invoice_file.status}, 允许创建识别任务")
-                
-                logger.info(f"  转换后的UUID: {file_uuid}")
-                
-                # 通过file_id查找invoice
-                invoice = session.exec(
-                    select(Invoice).where(Invoice.file_id == file_uuid)
-                ).first()
-                
-                if not invoice:
-                    logger.error(f"  文件ID {file_id} 对应的票据不存在")
-                    raise HTTPException(status_code=404, detail=f"文件ID {file_id} 对应的票据不存在")
-                
-                # 检查权限：使用统一的权限检查函数
-                if not check_invoice_permission(invoice, current_user, session):
-                    logger.warning(f"  用户无权访问票据: invoice_id={invoice.id}, user.company_id={current_user.company_id}, invoice.company_id={invoice.company_id}")
-                    raise HTTPException(status_code=403, detail=f"无权访问文件ID {file_id} 对应的票据")
-                
-                logger.info(f"  找到票据: invoice_id={invoice.id}, invoice_no={invoice.invoice_no}")
-                invoices.append(invoice)
-            except ValueError as e:
-                logger.error(f"  文件ID格式错误: {file_id}, 错误: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"文件ID格式错误: {file_id}")
-            except Exception as e:
-                logger.error(f"  验证文件时出错: {str(e)}")
-                raise
+        # 一次查询解析全部文件对应的票据（已识别成功的文件跳过）
+        try:
+            resolved = recognition_task_batch.resolve_invoices(session, batch_in.uploaded_file_ids, current_user)
+        except recognition_task_batch.BatchTaskError as e:
+            logger.warning(f"批量任务 - 文件校验失败: {e.detail}")
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        invoices = resolved.invoices
+        if resolved.skipped_file_ids:
+            logger.warning(f"批量任务 - {len(resolved.skipped_file_ids)} 个文件状态为成功（processed），跳过创建识别任务")
+        logger.info(f"批量任务 - 需要创建任务的票据数: {len(invoices)}")
         
         # 构建参数快照（将UUID转换为字符串以便JSON序列化）
         params_dict = batch_in.params.model_dump()
@@ -1188,7 +850,6 @@ async def batch_create_recognition_tasks(
             # 用户指定模板，获取模板的 prompt
             if batch_in.params.template_id:
                 # 确保 template_id 是 UUID 类型
-                from uuid import UUID
                 if isinstance(batch_in.params.template_id, str):
                     template_id = UUID(batch_in.params.template_id)
                 else:
@@ -1340,142 +1001,61 @@ async def batch_create_recognition_tasks(
                             logger.error(f"批量任务 - 使用原始 SQL 查询模板版本也失败: {sql_error}")
                             # 如果都失败，template_version_str 保持为 None
         
-        # 批量创建任务
-        created_tasks = []
-        for invoice in invoices:
-            # 生成任务编号
-            task_no = f"TASK-{datetime.now().strftime('%Y%m%d%H%M%S')}-{str(uuid4())[:8]}"
-            
-            logger.info(f"批量任务 - 创建任务，template_id: {template_id} (类型: {type(template_id)})")
-            # 检查 recognition_task 表是否有 template_version_id 字段
-            try:
-                from sqlalchemy import inspect as sql_inspect
-                inspector = sql_inspect(session.bind)
-                task_columns = [col['name'] for col in inspector.get_columns('recognition_task')]
-                has_template_version_id = 'template_version_id' in task_columns
-                logger.info(f"批量任务 - recognition_task 表列: {task_columns}, 是否有 template_version_id: {has_template_version_id}")
-            except Exception as e:
-                logger.warning(f"批量任务 - 检查表结构失败: {e}，假设没有 template_version_id 字段")
-                has_template_version_id = False
-            
-            # 使用原始 SQL 插入，避免 SQLModel 尝试插入不存在的字段
-            try:
-                from sqlalchemy import text
-                task_id = uuid4()
-                
-                # 构建插入字段和值
-                insert_fields = ["id", "task_no", "invoice_id", "params", "status", "priority", "operator_id", "provider", "create_time"]
-                insert_values = {
-                    "id": str(task_id),
-                    "task_no": task_no,
-                    "invoice_id": str(invoice.id),
-                    "params": json.dumps(params_dict),
-                    "status": "pending",
-                    "priority": 0,
-                    "operator_id": str(current_user.id),
-                    "provider": "dify",
-                    "create_time": datetime.now()
-                }
-                
-                # 如果表中有 template_id 字段，添加它
-                if 'template_id' in task_columns:
-                    insert_fields.append("template_id")
-                    insert_values["template_id"] = str(template_id) if template_id else None
-                
-                # 如果表中有 template_version_id 字段，尝试获取并添加
-                if has_template_version_id and template_id:
-                    # 重用前面已经获取的 template_version_id_for_file
-                    template_version_id_to_use = template_version_id_for_file
-                    
-                    if template_version_id_to_use:
-                        insert_fields.append("template_version_id")
-                        insert_values["template_version_id"] = str(template_version_id_to_use)
-                        logger.info(f"批量任务 - 设置 template_version_id: {template_version_id_to_use}")
-                
-                # 使用原始 SQL 插入
-                fields_str = ', '.join(insert_fields)
-                values_str = ', '.join([f":{field}" for field in insert_fields])
-                insert_sql = f"""
-                    INSERT INTO recognition_task ({fields_str})
-                    VALUES ({values_str})
-                """
-                session.execute(text(insert_sql), insert_values)
-                
-                # 创建任务对象用于返回（不添加到session，因为已经用SQL插入了）
-                task = RecognitionTask(
-                    id=task_id,
-                    task_no=task_no,
-                    invoice_id=invoice.id,
-                    template_id=template_id,
-                    params=params_dict,
-                    priority=0,
-                    operator_id=current_user.id,
-                    status="pending",
-                    provider="dify"
-                )
-                created_tasks.append(task)
-                logger.info(f"批量任务 - 使用原始SQL成功创建任务: {task_id}")
-            except Exception as sql_error:
-                logger.error(f"批量任务 - 使用原始SQL创建任务失败: {sql_error}", exc_info=True)
-                raise HTTPException(status_code=500, detail=f"创建识别任务失败: {str(sql_error)}")
-        
-        # 更新 invoice_file 和 invoice 表中的模型和模板信息
+        # 批量创建任务（一条多行 INSERT；enqueue 时直接写入 queued 状态）
+        from app.services.recognition_worker import TASK_STATUS_QUEUED, recognition_worker_pool
+        task_status = TASK_STATUS_QUEUED if batch_in.enqueue else "pending"
         try:
-            from app.models.models_invoice import InvoiceFile
-            for invoice in invoices:
-                # 更新 invoice_file 表
-                invoice_file = session.get(InvoiceFile, invoice.file_id)
-                if invoice_file:
-                    # 更新模型名称、模板名称和模板版本
-                    if model_name:
-                        invoice_file.model_name = model_name
-                        logger.info(f"批量任务 - 更新文件 {invoice_file.file_name} 的模型名称: {model_name}")
-                    if template_name:
-                        invoice_file.template_name = template_name
-                        logger.info(f"批量任务 - 更新文件 {invoice_file.file_name} 的模板名称: {template_name}")
-                    if template_version_str:
-                        invoice_file.template_version = template_version_str
-                        logger.info(f"批量任务 - 更新文件 {invoice_file.file_name} 的模板版本: {template_version_str}")
-                    session.add(invoice_file)
-                
-                # 更新 invoice 表
-                if model_name:
-                    invoice.model_name = model_name
-                    logger.info(f"批量任务 - 更新票据 {invoice.invoice_no} 的模型名称: {model_name}")
-                if template_name:
-                    invoice.template_name = template_name
-                    logger.info(f"批量任务 - 更新票据 {invoice.invoice_no} 的模板名称: {template_name}")
-                if template_version_str:
-                    invoice.template_version = template_version_str
-                    logger.info(f"批量任务 - 更新票据 {invoice.invoice_no} 的模板版本: {template_version_str}")
-                session.add(invoice)
-        except Exception as e:
-            logger.warning(f"批量任务 - 更新 invoice_file 和 invoice 表失败: {e}，但不影响任务创建")
+            created_tasks = recognition_task_batch.insert_tasks(
+                session,
+                invoices,
+                params_dict,
+                current_user.id,
+                template_id=template_id,
+                template_version_id=template_version_id_for_file,
+                status=task_status,
+            )
+        except Exception as sql_error:
+            logger.error(f"批量任务 - 创建任务失败: {sql_error}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"创建识别任务失败: {str(sql_error)}")
+        
+        # 更新 invoice_file 和 invoice 表中的模型和模板信息（入队时票据识别状态置为 processing）
+        recognition_task_batch.apply_model_template_info(
+            session,
+            invoices,
+            model_name=model_name,
+            template_name=template_name,
+            template_version=template_version_str,
+            recognition_status="processing" if batch_in.enqueue and invoices else None,
+        )
         
         session.commit()
+        if batch_in.enqueue and created_tasks:
+            recognition_worker_pool.notify()
         
-        # 刷新所有任务（从数据库重新查询，因为是用原始SQL插入的）
-        for task in created_tasks:
-            try:
-                refreshed_task = session.get(RecognitionTask, task.id)
-                if refreshed_task:
-                    # 更新任务对象的属性
-                    for key, value in refreshed_task.__dict__.items():
-                        if not key.startswith('_'):
-                            setattr(task, key, value)
-            except Exception as e:
-                logger.warning(f"批量任务 - 刷新任务 {task.id} 失败: {e}，使用原始对象")
-        
+        # 直接使用写入的任务行构造响应，不再逐个回查
         result = {
             "batch_id": str(uuid4()),
             "count": len(created_tasks),
-            "task_ids": [str(task.id) for task in created_tasks],
-            "message": f"成功创建 {len(created_tasks)} 个识别任务"
+            "task_ids": [str(task["id"]) for task in created_tasks],
+            "tasks": [
+                {
+                    "id": str(task["id"]),
+                    "task_no": task["task_no"],
+                    "invoice_id": str(task["invoice_id"]),
+                    "status": task["status"],
+                }
+                for task in created_tasks
+            ],
+            "skipped_file_ids": [str(file_id) for file_id in resolved.skipped_file_ids],
+            "enqueued": batch_in.enqueue,
+            "message": (
+                f"成功创建 {len(created_tasks)} 个识别任务"
+                + ("，已提交后台处理" if batch_in.enqueue and created_tasks else "")
+            )
         }
         
         logger.info("--- 创建结果 ---")
         logger.info(f"成功创建任务数: {len(created_tasks)}")
-        logger.info(f"任务ID列表: {result['task_ids']}")
         logger.info("=" * 80)
         logger.info("=== 批量创建识别任务完成 ===")
         logger.info("=" * 80)
@@ -1500,6 +1080,7 @@ def query_invoices(
     invoice_no: str | None = None,
     supplier: str | None = None,
     buyer: str | None = None,
+    keyword: str | None = None,
     review_status: str | None = None,
     recognition_status: str | None = None,
     model_name: str | None = None,
@@ -1514,7 +1095,7 @@ def query_invoices(
     
     try:
         logger.info(f"=== 票据查询开始 ===")
-        logger.info(f"查询参数: skip={skip}, limit={limit}, invoice_no={invoice_no}, supplier={supplier}, buyer={buyer}, review_status={review_status}, recognition_status={recognition_status}, model_name={model_name}, template_name={template_name}")
+        logger.info(f"查询参数: skip={skip}, limit={limit}, invoice_no={invoice_no}, supplier={supplier}, buyer={buyer}, keyword={keyword}, review_status={review_status}, recognition_status={recognition_status}, model_name={model_name}, template_name={template_name}")
         
         statement = select(Invoice)
         
@@ -1522,13 +1103,19 @@ def query_invoices(
         conditions = []
         if invoice_no:
             logger.debug(f"添加查询条件: invoice_no contains '{invoice_no}'")
-            conditions.append(Invoice.invoice_no.contains(invoice_no))
+            conditions.append(invoice_search.contains(Invoice.invoice_no, invoice_no))
         if supplier:
             logger.debug(f"添加查询条件: supplier_name contains '{supplier}'")
-            conditions.append(Invoice.supplier_name.contains(supplier))
+            conditions.append(invoice_search.contains(Invoice.supplier_name, supplier))
         if buyer:
             logger.debug(f"添加查询条件: buyer_name contains '{buyer}'")
-            conditions.append(Invoice.buyer_name.contains(buyer))
+            conditions.append(invoice_search.contains(Invoice.buyer_name, buyer))
+        if keyword:
+            # 供应商/采购方关键词搜索
+            party_condition = invoice_search.party_condition(keyword)
+            if party_condition is not None:
+                logger.debug(f"添加查询条件: supplier/buyer keyword '{keyword}'")
+                conditions.append(party_condition)
         if review_status:
             logger.debug(f"添加查询条件: review_status = '{review_status}'")
             conditions.append(Invoice.review_status == review_status)
@@ -1736,9 +1323,9 @@ def get_invoice_files_list(
         # 构建查询条件
         conditions = []
         if file_name:
-            conditions.append(InvoiceFile.file_name.contains(file_name))
+            conditions.append(invoice_search.contains(InvoiceFile.file_name, file_name))
         if invoice_no:
-            conditions.append(Invoice.invoice_no.contains(invoice_no))
+            conditions.append(invoice_search.contains(Invoice.invoice_no, invoice_no))
         if file_status:
             conditions.append(InvoiceFile.status == file_status)
         if recognition_status:
@@ -1775,28 +1362,14 @@ def get_invoice_files_list(
                 except:
                     pass
                 # 重新查询，但这次使用原始 SQL 只选择存在的字段
-                from sqlalchemy import inspect, text
-                inspector = inspect(session.bind)
-                invoice_columns = [col['name'] for col in inspector.get_columns('invoice')]
-                
-                # 构建基本字段列表
-                base_invoice_fields = [
-                    'id', 'invoice_no', 'invoice_type', 'invoice_date', 'amount', 'tax_amount',
-                    'total_amount', 'currency', 'supplier_name', 'supplier_tax_no',
-                    'buyer_name', 'buyer_tax_no', 'file_id', 'recognition_accuracy',
-                    'recognition_status', 'review_status', 'reviewer_id', 'review_time',
-                    'review_comment', 'remark', 'creator_id', 'company_id', 'create_time', 'update_time'
-                ]
-                
-                # 只添加存在的可选字段
-                optional_fields = ['template_name', 'template_version', 'model_name']
-                for field in optional_fields:
-                    if field in invoice_columns:
-                        base_invoice_fields.append(field)
+                # 出现缺列错误说明缓存的表结构可能已过期，重新读取一次
+                capabilities = schema_capabilities.refresh()
+                base_invoice_fields = list(capabilities.invoice_fields)
+                file_cols = list(capabilities.table_columns('invoice_file'))
                 
                 # 使用原始 SQL 查询
                 invoice_fields_str = ', '.join([f'invoice.{f}' for f in base_invoice_fields])
-                invoice_file_fields_str = ', '.join([f'invoice_file.{col["name"]}' for col in inspector.get_columns('invoice_file')])
+                invoice_file_fields_str = ', '.join([f'invoice_file.{col}' for col in file_cols])
                 
                 # 构建 WHERE 条件
                 where_parts = []
@@ -1830,12 +1403,12 @@ def get_invoice_files_list(
                 
                 # 公司过滤
                 if not current_user.is_superuser:
-                    if current_user.company_id:
-                        where_parts.append(f"invoice.company_id = :p{param_idx}")
-                        sql_params[f"p{param_idx}"] = str(current_user.company_id)
-                        param_idx += 1
-                    else:
-                        where_parts.append("invoice.id IS NULL")
+                    where_parts.append(
+                        "EXISTS (SELECT 1 FROM user_company WHERE user_company.user_id = "
+                        f":p{param_idx} AND user_company.company_id = invoice.company_id)"
+                    )
+                    sql_params[f"p{param_idx}"] = str(current_user.id)
+                    param_idx += 1
                 
                 where_clause = " AND ".join(where_parts) if where_parts else "1=1"
                 
@@ -1854,8 +1427,6 @@ def get_invoice_files_list(
                 raw_results = session.execute(text(sql), sql_params).fetchall()
                 
                 # 转换为对象
-                file_cols = [col['name'] for col in inspector.get_columns('invoice_file')]
-                
                 class SimpleInvoiceFile:
                     def __init__(self, row, file_cols):
                         for i, col in enumerate(file_cols):
@@ -2012,6 +1583,7 @@ def get_invoice_files_list(
                 template_name=getattr(invoice, 'template_name', None),  # 从 invoice 表读取，字段不存在时返回 None
                 template_version=getattr(invoice, 'template_version', None),  # 从 invoice 表读取，字段不存在时返回 None
                 model_name=getattr(invoice, 'model_name', None),  # 从 invoice 表读取，字段不存在时返回 None
+                thumbnail_url=file_serving.thumbnail_url(invoice.id, invoice_file.file_hash),
                 
                 # 时间信息
                 create_time=invoice.create_time,
@@ -2045,708 +1617,17 @@ def get_invoice(
 ) -> Any:
     """
     获取票据详情
+    票据、公司、最新识别结果、模板版本及失败任务信息由一条关联查询读取（见 app/services/invoice_detail.py）
     """
-    logger.info(f"=== 开始获取发票详情 ===")
-    logger.info(f"invoice_id: {invoice_id}")
-    invoice = session.get(Invoice, invoice_id)
-    if not invoice:
+    detail = invoice_detail.load_invoice_detail(session, invoice_id)
+    if not detail:
         raise HTTPException(status_code=404, detail="票据不存在")
     
     # 检查权限：使用统一的权限检查函数
-    if not check_invoice_permission(invoice, current_user, session):
+    if not check_invoice_permission(detail.invoice, current_user, session):
         raise HTTPException(status_code=403, detail="无权访问此票据")
     
-    # 获取公司代码
-    company_code = None
-    if invoice.company_id:
-        from app.models.models_company import Company
-        company = session.get(Company, invoice.company_id)
-        if company:
-            company_code = company.code
-    
-    # 获取最新失败任务的错误信息
-    error_code = None
-    error_message = None
-    if invoice.recognition_status == "failed":
-        try:
-            failed_tasks = _safe_query_recognition_tasks(
-                session,
-                where_clause="WHERE invoice_id = :invoice_id AND status = :status ORDER BY create_time DESC LIMIT 1",
-                params={"invoice_id": str(invoice_id), "status": "failed"}
-            )
-            if failed_tasks:
-                failed_task = failed_tasks[0]
-                error_code = getattr(failed_task, 'error_code', None)
-                error_message = getattr(failed_task, 'error_message', None)
-        except Exception as e:
-            logger.warning(f"查询失败任务时出错: {e}")
-    
-    # 获取最新识别结果的模板版本快照信息和字段值
-    template_version_id = None
-    field_defs_snapshot = None
-    template_version = None
-    normalized_fields = None
-    template_name = None
-    
-    # 尝试查询识别结果，如果字段不存在则安全处理
-    try:
-        # #region agent log
-        logger.info(f"🔍 DEBUG: 开始查询 recognition_result，invoice_id={invoice_id}, invoice_id类型={type(invoice_id)}")
-        # #endregion
-
-        # 首先尝试字符串查询（因为数据库中可能存储为字符串）
-        latest_result_row = session.exec(
-            select(
-                RecognitionResult.id,
-                RecognitionResult.invoice_id,
-                RecognitionResult.recognition_time
-            )
-            .where(RecognitionResult.invoice_id == str(invoice_id))
-            .order_by(RecognitionResult.recognition_time.desc())
-            .limit(1)
-        ).first()
-
-        # #region agent log
-        logger.info(f"🔍 DEBUG: 字符串查询结果 latest_result_row={latest_result_row is not None}")
-        if latest_result_row:
-            logger.info(f"🔍 DEBUG: 字符串查询找到记录，result_id={latest_result_row[0]}, invoice_id={latest_result_row[1]}")
-        else:
-            logger.warning(f"🔍 DEBUG: 字符串查询未找到记录，尝试UUID查询，invoice_id={invoice_id}")
-        # #endregion
-
-        # 如果字符串查询没有找到，尝试 UUID 查询
-        if not latest_result_row:
-            latest_result_row = session.exec(
-                select(
-                    RecognitionResult.id,
-                    RecognitionResult.invoice_id,
-                    RecognitionResult.recognition_time
-                )
-                .where(RecognitionResult.invoice_id == invoice_id)
-                .order_by(RecognitionResult.recognition_time.desc())
-                .limit(1)
-            ).first()
-
-            # #region agent log
-            logger.info(f"🔍 DEBUG: UUID查询结果 latest_result_row={latest_result_row is not None}")
-            if latest_result_row:
-                logger.info(f"🔍 DEBUG: UUID查询找到记录，result_id={latest_result_row[0]}, invoice_id={latest_result_row[1]}")
-            else:
-                logger.warning(f"🔍 DEBUG: UUID查询也未找到记录，invoice_id={invoice_id}")
-            # #endregion
-        logger.info(f"查询识别结果: latest_result_row = {latest_result_row is not None}")
-        if latest_result_row:
-            logger.info(f"识别结果ID: {latest_result_row[0]}")
-        
-        # 如果查询成功，尝试获取完整对象以访问可能不存在的字段
-        if latest_result_row:
-            logger.info(f"✅ 找到识别结果记录，result_id: {latest_result_row[0]}")
-            try:
-                # 使用原始 SQL 查询以确保获取 raw_payload 和 raw_data
-                result_row = session.execute(
-                    text("""
-                        SELECT id, normalized_fields, raw_payload, raw_data, 
-                               template_version_id, field_defs_snapshot
-                        FROM recognition_result
-                        WHERE id = :result_id
-                    """),
-                    {"result_id": str(latest_result_row[0])}
-                ).fetchone()
-                
-                logger.info(f"SQL 查询结果: result_row = {result_row is not None}")
-                
-                if result_row:
-                    # 解析查询结果
-                    result_id, normalized_fields_db, raw_payload_db, raw_data_db, template_version_id_db, field_defs_snapshot_db = result_row
-                    
-                    # #region agent log
-                    logger.info(f"🔍 DEBUG: SQL查询返回结果，result_id={result_id}")
-                    logger.info(f"🔍 DEBUG: normalized_fields_db类型={type(normalized_fields_db)}, 值={str(normalized_fields_db)[:500] if normalized_fields_db else 'None'}")
-                    logger.info(f"🔍 DEBUG: normalized_fields_db是否为None={normalized_fields_db is None}")
-                    logger.info(f"🔍 DEBUG: normalized_fields_db是否为False={normalized_fields_db is False}")
-                    if normalized_fields_db:
-                        logger.info(f"🔍 DEBUG: normalized_fields_db长度={len(str(normalized_fields_db))}")
-                    # #endregion
-                    logger.info(f"从数据库查询到的数据:")
-                    logger.info(f"  normalized_fields_db 类型: {type(normalized_fields_db)}, 值: {str(normalized_fields_db)[:200] if normalized_fields_db else 'None'}")
-                    logger.info(f"  raw_payload_db 类型: {type(raw_payload_db)}, 值: {str(raw_payload_db)[:200] if raw_payload_db else 'None'}")
-                    logger.info(f"  raw_data_db 类型: {type(raw_data_db)}, 值: {str(raw_data_db)[:200] if raw_data_db else 'None'}")
-                    
-                    # 使用数据库中的值
-                    template_version_id = template_version_id_db
-                    field_defs_snapshot_raw = field_defs_snapshot_db
-                    
-                    # 处理 normalized_fields：PostgreSQL JSONB 可能返回字符串或字典
-                    logger.info(f"🔍 开始处理 normalized_fields_db")
-                    logger.info(f"  normalized_fields_db 值: {normalized_fields_db}")
-                    logger.info(f"  normalized_fields_db 类型: {type(normalized_fields_db)}")
-                    logger.info(f"  normalized_fields_db 是否为 None: {normalized_fields_db is None}")
-                    logger.info(f"  normalized_fields_db 是否为 False: {normalized_fields_db is False}")
-                    
-                    normalized_fields = None
-                    if normalized_fields_db:
-                        # #region agent log
-                        logger.info(f"🔍 DEBUG: normalized_fields_db不为空，开始处理")
-                        logger.info(f"🔍 DEBUG: normalized_fields_db完整内容={json.dumps(normalized_fields_db, ensure_ascii=False, default=str)[:1000]}")
-                        # #endregion
-                        logger.info(f"✅ normalized_fields_db 不为空，开始处理")
-                        if isinstance(normalized_fields_db, dict):
-                            normalized_fields = normalized_fields_db.copy()  # 使用 copy() 避免引用问题
-                            # #region agent log
-                            logger.info(f"🔍 DEBUG: normalized_fields是字典，字段数={len(normalized_fields)}, 键={list(normalized_fields.keys())}")
-                            # #endregion
-                            logger.info(f"✅ normalized_fields 是字典，字段数: {len(normalized_fields)}")
-                            logger.info(f"✅ normalized_fields 键: {list(normalized_fields.keys())}")
-                            # 验证数据完整性
-                            if len(normalized_fields) == 0:
-                                logger.error(f"❌ normalized_fields 字典为空！这不应该发生")
-                        elif isinstance(normalized_fields_db, str):
-                            try:
-                                normalized_fields = json.loads(normalized_fields_db)
-                                # #region agent log
-                                logger.info(f"🔍 DEBUG: normalized_fields字符串解析成功，字段数={len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-                                # #endregion
-                                logger.info(f"✅ normalized_fields 是字符串，已解析为字典，字段数: {len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-                                if isinstance(normalized_fields, dict) and len(normalized_fields) == 0:
-                                    logger.error(f"❌ 解析后的 normalized_fields 字典为空！")
-                            except Exception as e:
-                                # #region agent log
-                                logger.error(f"🔍 DEBUG: 解析normalized_fields字符串失败: {e}")
-                                # #endregion
-                                logger.warning(f"❌ 解析 normalized_fields 字符串失败: {e}")
-                        else:
-                            normalized_fields = normalized_fields_db
-                            # #region agent log
-                            logger.info(f"🔍 DEBUG: normalized_fields类型={type(normalized_fields_db)}, 值={str(normalized_fields_db)[:200]}")
-                            # #endregion
-                            logger.info(f"✅ normalized_fields 类型: {type(normalized_fields_db)}")
-                    else:
-                        # #region agent log
-                        logger.warning(f"🔍 DEBUG: normalized_fields_db为空或False")
-                        logger.warning(f"🔍 DEBUG: normalized_fields_db值={normalized_fields_db}, 类型={type(normalized_fields_db)}")
-                        # #endregion
-                        logger.warning(f"⚠️ normalized_fields_db 为空或为 False，将尝试从 raw_payload 提取")
-                    
-                    raw_payload = raw_payload_db
-                    raw_data = raw_data_db
-                    
-                    # 如果 normalized_fields 为空，尝试从 raw_payload 或 raw_data 中解析
-                    if not normalized_fields:
-                        
-                        logger.info(f"normalized_fields 为空，尝试从 raw_payload 或 raw_data 提取")
-                        logger.info(f"raw_payload 类型: {type(raw_payload)}, 值: {raw_payload[:200] if raw_payload and isinstance(raw_payload, str) else raw_payload}")
-                        logger.info(f"raw_data 类型: {type(raw_data)}, 值: {raw_data}")
-                        
-                        # 尝试从 raw_payload 解析（通常是 JSON 字符串）
-                        if raw_payload:
-                            try:
-                                import json
-                                raw_json = json.loads(raw_payload)
-                                logger.info(f"raw_payload 解析成功，类型: {type(raw_json)}, 键: {list(raw_json.keys()) if isinstance(raw_json, dict) else 'N/A'}")
-                                
-                                # 检查是否是 DIFY API 返回的格式
-                                if isinstance(raw_json, dict):
-                                    # 优先检查 data.outputs.text 路径（工作流返回的常见格式）
-                                    if 'data' in raw_json and isinstance(raw_json['data'], dict):
-                                        data = raw_json['data']
-                                        logger.info(f"✅ 找到 data 字段，键: {list(data.keys()) if isinstance(data, dict) else 'N/A'}")
-                                        if 'outputs' in data and isinstance(data['outputs'], dict):
-                                            logger.info(f"✅ 找到 data.outputs，键: {list(data['outputs'].keys()) if isinstance(data['outputs'], dict) else 'N/A'}")
-                                            if 'text' in data['outputs'] and isinstance(data['outputs']['text'], dict):
-                                                normalized_fields = data['outputs']['text']
-                                                logger.info(f"✅ 从 raw_payload.data.outputs.text 提取 normalized_fields，字段数: {len(normalized_fields)}")
-                                                logger.info(f"提取的数据键: {list(normalized_fields.keys())}")
-                                                if 'items' in normalized_fields:
-                                                    items = normalized_fields.get('items', [])
-                                                    logger.info(f"包含 items 数组，item数量: {len(items) if isinstance(items, list) else 'N/A'}")
-                                            else:
-                                                logger.warning(f"data.outputs 中不包含 'text' 字段")
-                                        else:
-                                            logger.warning(f"data 中不包含 'outputs' 字段")
-                                    # 其次检查顶层 text 字段
-                                    elif 'text' in raw_json and isinstance(raw_json['text'], dict):
-                                        normalized_fields = raw_json['text']
-                                        logger.info(f"✅ 从 raw_payload.text 提取 normalized_fields，字段数: {len(normalized_fields)}")
-                                    # 最后尝试直接使用 raw_json
-                                    else:
-                                        normalized_fields = raw_json
-                                        logger.info(f"从 raw_payload 直接提取 normalized_fields，字段数: {len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-                            except Exception as e:
-                                logger.error(f"解析 raw_payload 失败: {e}", exc_info=True)
-                        
-                        # 如果 raw_payload 解析失败，尝试使用 raw_data
-                        if not normalized_fields and raw_data:
-                            logger.info(f"尝试从 raw_data 提取")
-                            if isinstance(raw_data, dict):
-                                # 检查是否是 DIFY API 返回的格式
-                                if 'text' in raw_data and isinstance(raw_data['text'], dict):
-                                    normalized_fields = raw_data['text']
-                                    logger.info(f"从 raw_data.text 提取 normalized_fields，字段数: {len(normalized_fields)}")
-                                elif 'data' in raw_data and isinstance(raw_data['data'], dict):
-                                    data = raw_data['data']
-                                    if 'outputs' in data and isinstance(data['outputs'], dict):
-                                        if 'text' in data['outputs'] and isinstance(data['outputs']['text'], dict):
-                                            normalized_fields = data['outputs']['text']
-                                            logger.info(f"从 raw_data.data.outputs.text 提取 normalized_fields，字段数: {len(normalized_fields)}")
-                                else:
-                                    normalized_fields = raw_data
-                                    logger.info(f"从 raw_data 直接提取 normalized_fields，字段数: {len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-                        
-                        if normalized_fields:
-                            logger.info(f"成功提取 normalized_fields，字段: {list(normalized_fields.keys()) if isinstance(normalized_fields, dict) else 'N/A'}")
-                        else:
-                            logger.warning(f"无法从 raw_payload 或 raw_data 提取 normalized_fields")
-
-                            # ===== HOLE POSITION RECORD LOGIC START =====
-                            print("🚨🚨🚨 ENTERING HOLE POSITION RECORD LOGIC 🚨🚨🚨")
-                            print(f"🔥🔥🔥 HOLE POSITION RECORD LOGIC START - normalized_fields: {normalized_fields}, type: {type(normalized_fields)}")
-                            debug_info["hole_position_logic_executed"] = True
-                            import traceback
-                            print("Stack trace:")
-                            traceback.print_stack()
-                            # 如果 normalized_fields 为空，且模型是"尺寸/孔位类检验记录大模型"，尝试从 HolePositionRecord 和 HolePositionItem 表获取数据
-                            model_name = getattr(invoice, 'model_name', None)
-                            # #region agent log
-                            logger.info(f"🔍 DEBUG: 检查 HolePositionRecord 逻辑，model_name={model_name}, normalized_fields为空={not normalized_fields}, invoice.file_id={getattr(invoice, 'file_id', None)}")
-                            # 添加到调试信息
-                            debug_info["debug_hole_position_check"] = {
-                                "model_name": model_name,
-                                "normalized_fields_empty": not normalized_fields,
-                                "file_id": str(getattr(invoice, 'file_id', None))
-                            }
-                            # #endregion
-                            logger.info(f"检查是否需要从 HolePositionRecord 表获取数据: model_name={model_name}, normalized_fields为空={not normalized_fields}")
-                            if model_name and ('尺寸/孔位类检验记录大模型' in str(model_name) or '检验记录' in str(model_name)):
-                                # #region agent log
-                                logger.info(f"🔍 DEBUG: 满足 HolePositionRecord 查询条件，file_id={getattr(invoice, 'file_id', None)}")
-                                # #endregion
-                                logger.info(f"✅ 模型是检验记录表类型，尝试从 HolePositionRecord 表获取数据，file_id: {invoice.file_id}")
-                                try:
-                                    from app.models.models_invoice import HolePositionRecord, HolePositionItem
-                                    from sqlmodel import select
-                                    # 通过 file_id 查找记录
-                                    hole_position_record = session.exec(
-                                        select(HolePositionRecord).where(HolePositionRecord.file_id == invoice.file_id)
-                                    ).first()
-
-                                    # 添加到调试信息
-                                    debug_info["debug_hole_position_query"] = {
-                                        "file_id": str(invoice.file_id),
-                                        "found_record": hole_position_record is not None,
-                                        "record_id": str(hole_position_record.id) if hole_position_record else None,
-                                        "record_no": hole_position_record.record_no if hole_position_record else None
-                                    }
-
-                                    logger.info(f"HolePositionRecord 查询结果: {hole_position_record is not None}")
-                                    if hole_position_record:
-                                        logger.info(f"✅ 找到 HolePositionRecord 记录: {hole_position_record.id}, record_no: {hole_position_record.record_no}")
-                                        # 获取行项目
-                                        items = session.exec(
-                                            select(HolePositionItem)
-                                            .where(HolePositionItem.record_id == hole_position_record.id)
-                                            .order_by(HolePositionItem.item_no)
-                                        ).all()
-                                        
-                                        logger.info(f"找到 {len(items)} 个行项目")
-                                        
-                                        # 构建 normalized_fields
-                                        normalized_fields = {
-                                            "doc_type": hole_position_record.doc_type,
-                                            "form_title": hole_position_record.form_title,
-                                            "drawing_no": hole_position_record.drawing_no,
-                                            "part_name": hole_position_record.part_name,
-                                            "part_no": hole_position_record.part_no,
-                                            "date": hole_position_record.date.isoformat() if hole_position_record.date else None,
-                                            "inspector_name": hole_position_record.inspector_name,
-                                            "overall_result": hole_position_record.overall_result,
-                                            "remarks": hole_position_record.remarks,
-                                            "items": [
-                                                {
-                                                    "item_no": item.item_no,
-                                                    "inspection_item": item.inspection_item,
-                                                    "spec_requirement": item.spec_requirement,
-                                                    "actual_value": item.actual_value,
-                                                    "range_value": item.range_value,
-                                                    "judgement": item.judgement,
-                                                    "remarks": item.notes  # 注意：数据库字段是 notes，但 API 返回时使用 remarks
-                                                }
-                                                for item in items
-                                            ]
-                                        }
-                                        logger.info(f"✅ 从 HolePositionRecord 表构建 normalized_fields，字段数: {len(normalized_fields)}, items数量: {len(normalized_fields.get('items', []))}")
-                                        logger.info(f"normalized_fields 内容预览: {json.dumps(normalized_fields, ensure_ascii=False, indent=2)[:500]}...")
-                                    else:
-                                        logger.warning(f"⚠️ 未找到对应的 HolePositionRecord 记录，file_id: {invoice.file_id}")
-                                except Exception as e:
-                                    logger.error(f"❌ 从 HolePositionRecord 表获取数据失败: {str(e)}", exc_info=True)
-                                    import traceback
-                                    logger.error(f"完整错误堆栈: {traceback.format_exc()}")
-                    
-                    # 将字段快照从数组格式转换为对象格式（以 field_key 为键）
-                    field_defs_snapshot = None
-                    if field_defs_snapshot_raw:
-                        if isinstance(field_defs_snapshot_raw, list):
-                            # 数组格式转换为对象格式
-                            field_defs_snapshot = {
-                                field.get("field_key", ""): field
-                                for field in field_defs_snapshot_raw
-                                if field.get("field_key")
-                            }
-                        elif isinstance(field_defs_snapshot_raw, dict):
-                            # 已经是对象格式，直接使用
-                            field_defs_snapshot = field_defs_snapshot_raw
-                    
-                    # 获取版本号和模板名称
-                    if template_version_id:
-                        from app.models.models_invoice import TemplateVersion, Template
-                        version_obj = session.get(TemplateVersion, template_version_id)
-                        if version_obj:
-                            template_version = version_obj.version
-                            # 获取模板名称
-                            template_obj = session.get(Template, version_obj.template_id)
-                            if template_obj:
-                                template_name = template_obj.name
-            except Exception as e:
-                # 如果获取完整对象失败（可能是字段不存在），记录详细错误
-                logger.error(f"获取识别结果完整信息失败: {str(e)}", exc_info=True)
-                logger.error(f"异常类型: {type(e).__name__}")
-                import traceback
-                logger.error(f"完整堆栈: {traceback.format_exc()}")
-            else:
-                logger.warning(f"SQL 查询返回空结果，result_id: {latest_result_row[0] if latest_result_row else 'N/A'}")
-        else:
-            logger.warning(f"未找到识别结果记录，invoice_id: {invoice_id}")
-            # 尝试直接使用原始 SQL 查询
-            try:
-                logger.info("尝试使用原始 SQL 直接查询识别结果")
-                direct_result = session.execute(
-                    text("""
-                        SELECT id, normalized_fields, raw_payload, raw_data
-                        FROM recognition_result
-                        WHERE invoice_id = :invoice_id
-                        ORDER BY recognition_time DESC
-                        LIMIT 1
-                    """),
-                    {"invoice_id": str(invoice_id)}
-                ).fetchone()
-                
-                if direct_result:
-                    logger.info(f"直接 SQL 查询成功，找到记录")
-                    result_id, normalized_fields_db, raw_payload_db, raw_data_db = direct_result
-                    # 处理 normalized_fields
-                    if normalized_fields_db:
-                        if isinstance(normalized_fields_db, dict):
-                            normalized_fields = normalized_fields_db
-                        elif isinstance(normalized_fields_db, str):
-                            try:
-                                normalized_fields = json.loads(normalized_fields_db)
-                            except:
-                                pass
-                        if normalized_fields:
-                            logger.info(f"从直接查询获取到 normalized_fields，字段数: {len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-                else:
-                    logger.warning(f"直接 SQL 查询也未找到记录")
-            except Exception as e:
-                logger.error(f"直接 SQL 查询失败: {str(e)}", exc_info=True)
-    except Exception as e:
-        # 如果查询失败，记录日志但不影响主流程
-        logger.error(f"获取识别结果模板版本信息失败: {str(e)}", exc_info=True)
-    
-    # 添加调试日志
-    logger.info(f"=== 返回发票详情 ===")
-    logger.info(f"invoice_id: {invoice_id}")
-    logger.info(f"model_name: {getattr(invoice, 'model_name', None)}")
-    logger.info(f"normalized_fields 类型: {type(normalized_fields)}")
-    logger.info(f"normalized_fields 是否为空: {not normalized_fields if normalized_fields else True}")
-    if normalized_fields:
-        if isinstance(normalized_fields, dict):
-            logger.info(f"normalized_fields 是字典，字段数: {len(normalized_fields)}")
-            logger.info(f"normalized_fields 键: {list(normalized_fields.keys())}")
-            if 'items' in normalized_fields:
-                items = normalized_fields['items']
-                logger.info(f"normalized_fields.items 类型: {type(items)}, 长度: {len(items) if isinstance(items, list) else 'N/A'}")
-            logger.info(f"normalized_fields 内容预览: {json.dumps(normalized_fields, ensure_ascii=False, indent=2)[:500]}...")
-        else:
-            logger.warning(f"normalized_fields 不是字典: {type(normalized_fields)}, 值: {str(normalized_fields)[:200]}")
-    else:
-        logger.warning(f"normalized_fields 为空，无法返回给前端")
-    
-
-    # 在创建响应对象之前，再次确认 normalized_fields 的值
-    # #region agent log
-    logger.info(f"🔍 DEBUG: 创建响应对象前，normalized_fields={normalized_fields is not None}, 类型={type(normalized_fields)}")
-    if normalized_fields:
-        logger.info(f"🔍 DEBUG: normalized_fields字段数={len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}, 键={list(normalized_fields.keys()) if isinstance(normalized_fields, dict) else 'N/A'}")
-        if isinstance(normalized_fields, dict) and 'items' in normalized_fields:
-            logger.info(f"🔍 DEBUG: normalized_fields.items长度={len(normalized_fields['items']) if isinstance(normalized_fields['items'], list) else 'N/A'}")
-    # #endregion
-    logger.info(f"🔍 创建响应对象前检查：normalized_fields = {normalized_fields}")
-    logger.info(f"🔍 创建响应对象前检查：normalized_fields 类型 = {type(normalized_fields)}")
-    if normalized_fields:
-        field_count = len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'
-        field_keys = list(normalized_fields.keys()) if isinstance(normalized_fields, dict) else 'N/A'
-        logger.info(f"🔍 创建响应对象前检查：normalized_fields 字段数 = {field_count}")
-        logger.info(f"🔍 创建响应对象前检查：normalized_fields 键 = {field_keys}")
-        
-        # 如果 normalized_fields 只有 _debug_info，说明数据丢失了，需要重新查询
-        if isinstance(normalized_fields, dict) and len(normalized_fields) == 1 and '_debug_info' in normalized_fields:
-            logger.error(f"❌ normalized_fields 只有 _debug_info，数据丢失！尝试重新从数据库查询")
-            try:
-                direct_result = session.execute(
-                    text("""
-                        SELECT normalized_fields
-                        FROM recognition_result
-                        WHERE invoice_id = :invoice_id
-                        ORDER BY recognition_time DESC
-                        LIMIT 1
-                    """),
-                    {"invoice_id": str(invoice_id)}
-                ).fetchone()
-                
-                if direct_result and direct_result[0]:
-                    normalized_fields_db_recheck = direct_result[0]
-                    logger.info(f"✅ 重新查询到 normalized_fields")
-                    if isinstance(normalized_fields_db_recheck, dict) and len(normalized_fields_db_recheck) > 0:
-                        normalized_fields = normalized_fields_db_recheck.copy()
-                        logger.info(f"✅ 恢复 normalized_fields，字段数: {len(normalized_fields)}, 键: {list(normalized_fields.keys())}")
-                    elif isinstance(normalized_fields_db_recheck, str):
-                        try:
-                            import json
-                            normalized_fields = json.loads(normalized_fields_db_recheck)
-                            if isinstance(normalized_fields, dict) and len(normalized_fields) > 0:
-                                logger.info(f"✅ 恢复 normalized_fields（从字符串解析），字段数: {len(normalized_fields)}")
-                        except Exception as e:
-                            logger.error(f"❌ 解析失败: {e}")
-            except Exception as e:
-                logger.error(f"❌ 重新查询失败: {e}", exc_info=True)
-    else:
-        logger.warning(f"⚠️ 创建响应对象前检查：normalized_fields 为空！")
-    
-    # 构建响应对象
-    # #region agent log
-    logger.info(f"🔍 DEBUG: 构建响应对象，normalized_fields={normalized_fields is not None}")
-    if normalized_fields:
-        logger.info(f"🔍 DEBUG: 响应对象normalized_fields字段数={len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-    # #endregion
-
-    # 检查 normalized_fields 是否为空，如果为空则尝试从数据库直接查询
-    if not normalized_fields or (isinstance(normalized_fields, dict) and len(normalized_fields) == 0):
-        logger.warning(f"⚠️ normalized_fields 为空，尝试直接从数据库查询")
-        try:
-            direct_result = session.execute(
-                text("""
-                    SELECT normalized_fields
-                    FROM recognition_result
-                    WHERE invoice_id = :invoice_id
-                    ORDER BY recognition_time DESC
-                    LIMIT 1
-                """),
-                {"invoice_id": str(invoice_id)}
-            ).fetchone()
-            
-            if direct_result and direct_result[0]:
-                normalized_fields_db_direct = direct_result[0]
-                logger.info(f"✅ 直接从数据库查询到 normalized_fields")
-                if isinstance(normalized_fields_db_direct, dict):
-                    normalized_fields = normalized_fields_db_direct
-                    logger.info(f"✅ normalized_fields 是字典，字段数: {len(normalized_fields)}, 键: {list(normalized_fields.keys())}")
-                elif isinstance(normalized_fields_db_direct, str):
-                    try:
-                        import json
-                        normalized_fields = json.loads(normalized_fields_db_direct)
-                        logger.info(f"✅ normalized_fields 字符串解析成功，字段数: {len(normalized_fields) if isinstance(normalized_fields, dict) else 'N/A'}")
-                    except Exception as e:
-                        logger.error(f"❌ 解析 normalized_fields 字符串失败: {e}")
-        except Exception as e:
-            logger.error(f"❌ 直接从数据库查询失败: {e}", exc_info=True)
-    
-    # 如果 normalized_fields 仍然为空，设置为空字典（避免后续错误）
-    if normalized_fields is None:
-        normalized_fields = {}
-        logger.warning(f"⚠️ normalized_fields 仍为空，设置为空字典")
-
-    # 添加调试信息（但不覆盖现有数据）
-    debug_info = {
-        "debug_invoice_id": str(invoice_id),
-        "debug_model_name": getattr(invoice, 'model_name', None),
-        "debug_file_id": str(getattr(invoice, 'file_id', None)),
-        "debug_normalized_fields_null": normalized_fields is None,
-        "debug_normalized_fields_type": type(normalized_fields).__name__,
-        "debug_normalized_fields_len": len(normalized_fields) if hasattr(normalized_fields, '__len__') else 'N/A',
-        "debug_normalized_fields_keys": list(normalized_fields.keys()) if isinstance(normalized_fields, dict) else 'N/A',
-        "debug_recognition_status": getattr(invoice, 'recognition_status', None),
-        "debug_has_recognition_result": "checked"
-    }
-
-    # 只在 normalized_fields 不为空时才添加调试信息，避免覆盖数据
-    if normalized_fields and isinstance(normalized_fields, dict) and len(normalized_fields) > 0:
-        # 只在没有 _debug_info 时才添加，避免重复
-        if '_debug_info' not in normalized_fields:
-            normalized_fields['_debug_info'] = debug_info
-            logger.info(f"🔍 DEBUG: 调试信息已添加到 normalized_fields")
-    else:
-        # 如果 normalized_fields 为空，添加调试信息以便诊断
-        normalized_fields['_debug_info'] = debug_info
-        logger.warning(f"⚠️ normalized_fields 为空，仅添加调试信息: {debug_info}")
-
-    response = InvoiceResponse(
-        id=invoice.id,
-        invoice_no=invoice.invoice_no,
-        invoice_type=invoice.invoice_type,
-        invoice_date=invoice.invoice_date,
-        amount=invoice.amount,
-        tax_amount=invoice.tax_amount,
-        total_amount=invoice.total_amount,
-        currency=invoice.currency,
-        supplier_name=invoice.supplier_name,
-        supplier_tax_no=invoice.supplier_tax_no,
-        buyer_name=invoice.buyer_name,
-        buyer_tax_no=invoice.buyer_tax_no,
-        recognition_accuracy=invoice.recognition_accuracy,
-        recognition_status=invoice.recognition_status,
-        review_status=invoice.review_status,
-        company_id=invoice.company_id,
-        company_code=company_code,
-        create_time=invoice.create_time,
-        error_code=error_code,
-        error_message=error_message,
-        template_version_id=template_version_id,
-        field_defs_snapshot=field_defs_snapshot,
-        template_version=template_version,
-        normalized_fields=normalized_fields,  # 包含调试信息的 normalized_fields
-        template_name=template_name,
-        model_name=getattr(invoice, 'model_name', None)
-    )
-    # #region agent log
-    logger.info(f"🔍 DEBUG: 响应对象创建完成，response.normalized_fields={response.normalized_fields is not None}")
-    if response.normalized_fields:
-        logger.info(f"🔍 DEBUG: response.normalized_fields字段数={len(response.normalized_fields) if isinstance(response.normalized_fields, dict) else 'N/A'}")
-    # #endregion
-    
-    # 验证响应对象中的 normalized_fields
-    logger.info(f"响应对象创建完成，normalized_fields: {response.normalized_fields}")
-    logger.info(f"响应对象 normalized_fields 类型: {type(response.normalized_fields)}")
-    logger.info(f"响应对象 normalized_fields 是否为空: {not response.normalized_fields if response.normalized_fields else True}")
-    
-    # 尝试序列化 normalized_fields 以验证是否可以正确转换为 JSON
-    try:
-        if response.normalized_fields:
-            import json
-            json_str = json.dumps(response.normalized_fields, ensure_ascii=False, default=str)
-            logger.info(f"✅ normalized_fields 可以序列化为 JSON，长度: {len(json_str)}")
-            # 验证反序列化
-            parsed_back = json.loads(json_str)
-            logger.info(f"✅ normalized_fields JSON 可以反序列化，类型: {type(parsed_back)}")
-        else:
-            logger.warning(f"⚠️ normalized_fields 为空，无法序列化")
-    except Exception as e:
-        logger.error(f"❌ normalized_fields 序列化失败: {e}", exc_info=True)
-    
-    if response.normalized_fields:
-        logger.info(f"响应对象 normalized_fields 字段数: {len(response.normalized_fields) if isinstance(response.normalized_fields, dict) else 'N/A'}")
-        logger.info(f"响应对象 normalized_fields 键: {list(response.normalized_fields.keys()) if isinstance(response.normalized_fields, dict) else 'N/A'}")
-    else:
-        logger.error(f"⚠️ 响应对象中的 normalized_fields 为空！")
-    
-    # 在序列化之前，先保存原始的 normalized_fields 值
-    original_normalized_fields = normalized_fields
-    logger.info(f"🔍 序列化前检查：original_normalized_fields = {original_normalized_fields}")
-    logger.info(f"🔍 序列化前检查：original_normalized_fields 类型 = {type(original_normalized_fields)}")
-    logger.info(f"🔍 序列化前检查：response.normalized_fields = {response.normalized_fields}")
-    logger.info(f"🔍 序列化前检查：response.normalized_fields 类型 = {type(response.normalized_fields)}")
-    
-    # 使用 model_dump() 显式序列化，确保 normalized_fields 被正确包含
-    try:
-        response_dict = response.model_dump(mode='json', exclude_none=False)
-        logger.info(f"✅ 响应对象 model_dump() 成功")
-        logger.info(f"  model_dump() 中的 normalized_fields: {response_dict.get('normalized_fields')}")
-        logger.info(f"  model_dump() normalized_fields 类型: {type(response_dict.get('normalized_fields'))}")
-        
-        # 如果 model_dump() 中 normalized_fields 为空，但原始值不为空，强制设置
-        if not response_dict.get('normalized_fields') and original_normalized_fields:
-            logger.warning(f"⚠️ model_dump() 中的 normalized_fields 为空，但原始值不为空，强制设置")
-            logger.warning(f"  原始值类型: {type(original_normalized_fields)}")
-            logger.warning(f"  原始值内容: {str(original_normalized_fields)[:200]}")
-            response_dict['normalized_fields'] = original_normalized_fields
-            logger.info(f"  🔄 强制设置 normalized_fields 到响应字典")
-            logger.info(f"  设置后的值: {response_dict.get('normalized_fields')}")
-            logger.info(f"  设置后的类型: {type(response_dict.get('normalized_fields'))}")
-        
-        if response_dict.get('normalized_fields'):
-            logger.info(f"  model_dump() normalized_fields 字段数: {len(response_dict.get('normalized_fields')) if isinstance(response_dict.get('normalized_fields'), dict) else 'N/A'}")
-            logger.info(f"  model_dump() normalized_fields 键: {list(response_dict.get('normalized_fields').keys()) if isinstance(response_dict.get('normalized_fields'), dict) else 'N/A'}")
-        
-        # 使用 jsonable_encoder 确保 JSON 兼容性
-        from fastapi.encoders import jsonable_encoder
-        jsonable_response = jsonable_encoder(response_dict)
-        logger.info(f"✅ jsonable_encoder 处理完成")
-        logger.info(f"  jsonable_encoder 中的 normalized_fields: {jsonable_response.get('normalized_fields')}")
-        logger.info(f"  jsonable_encoder normalized_fields 类型: {type(jsonable_response.get('normalized_fields'))}")
-        
-        # 如果 jsonable_encoder 中 normalized_fields 为空，但原始值不为空，强制设置
-        if not jsonable_response.get('normalized_fields') and original_normalized_fields:
-            logger.warning(f"⚠️ jsonable_encoder 中 normalized_fields 为空，但原始值不为空，强制设置")
-            jsonable_response['normalized_fields'] = jsonable_encoder(original_normalized_fields)
-            logger.info(f"  ✅ 强制设置后，normalized_fields: {jsonable_response.get('normalized_fields')}")
-            logger.info(f"  强制设置后，normalized_fields 类型: {type(jsonable_response.get('normalized_fields'))}")
-        
-        # 确保 normalized_fields 在 jsonable_response 中
-        if original_normalized_fields and not jsonable_response.get('normalized_fields'):
-            logger.warning(f"⚠️ jsonable_response 中 normalized_fields 为空，强制设置原始值")
-            jsonable_response['normalized_fields'] = jsonable_encoder(original_normalized_fields)
-        
-        # 重新创建响应对象，确保 normalized_fields 被正确设置
-        # 这样可以保持类型安全，同时确保数据正确
-        try:
-            final_response = InvoiceResponse(**jsonable_response)
-            logger.info(f"✅ 重新创建响应对象完成")
-            logger.info(f"  final_response.normalized_fields: {final_response.normalized_fields}")
-            logger.info(f"  final_response.normalized_fields 类型: {type(final_response.normalized_fields)}")
-            logger.info(f"  final_response.normalized_fields 是否为空: {not final_response.normalized_fields if final_response.normalized_fields else True}")
-            
-            # 如果最终响应对象中 normalized_fields 仍然为空，但原始值不为空，最后一次强制设置
-            if not final_response.normalized_fields and original_normalized_fields:
-                logger.error(f"❌ 最终响应对象中 normalized_fields 仍然为空，但原始值不为空！")
-                logger.error(f"  原始值类型: {type(original_normalized_fields)}")
-                logger.error(f"  原始值内容预览: {str(original_normalized_fields)[:500]}")
-                # 直接修改响应对象的属性（如果 Pydantic 允许）
-                try:
-                    object.__setattr__(final_response, 'normalized_fields', original_normalized_fields)
-                    logger.info(f"  🔄 直接设置 final_response.normalized_fields 属性成功")
-                    logger.info(f"  设置后: {final_response.normalized_fields is not None}")
-                except Exception as e:
-                    logger.error(f"  ❌ 无法直接设置属性: {e}")
-                    # 如果无法直接设置，返回字典而不是对象
-                    jsonable_response['normalized_fields'] = jsonable_encoder(original_normalized_fields)
-                    logger.warning(f"  ⚠️ 返回字典而不是对象，以确保 normalized_fields 被包含")
-                    logger.info(f"  返回字典中的 normalized_fields: {jsonable_response.get('normalized_fields') is not None}")
-                    return jsonable_response
-            
-            # 最终检查：如果 normalized_fields 仍然为空，记录警告
-            if not final_response.normalized_fields:
-                logger.warning(f"⚠️ 最终响应对象中 normalized_fields 为空")
-                if original_normalized_fields:
-                    logger.error(f"  ❌ 原始值不为空，但最终响应中丢失了！")
-                    # 最后一次尝试：返回字典
-                    jsonable_response['normalized_fields'] = jsonable_encoder(original_normalized_fields)
-                    logger.warning(f"  ⚠️ 返回字典以确保 normalized_fields 被包含")
-                    return jsonable_response
-            
-            logger.info(f"✅ 最终响应对象创建成功，normalized_fields: {final_response.normalized_fields is not None}")
-            if final_response.normalized_fields:
-                logger.info(f"  normalized_fields 字段数: {len(final_response.normalized_fields) if isinstance(final_response.normalized_fields, dict) else 'N/A'}")
-            return final_response
-        except Exception as create_error:
-            logger.error(f"❌ 重新创建响应对象失败: {create_error}", exc_info=True)
-            # 如果创建失败，返回字典
-            if original_normalized_fields:
-                jsonable_response['normalized_fields'] = jsonable_encoder(original_normalized_fields)
-            logger.warning(f"⚠️ 返回字典作为备用方案")
-            return jsonable_response
-    except Exception as e:
-        logger.error(f"❌ 响应对象序列化失败: {e}", exc_info=True)
-        # 如果序列化失败，仍然返回原始响应对象
-        return response
+    return invoice_detail.to_response(detail)
 
 
 @router.get("/{invoice_id}/file")
@@ -2777,7 +1658,10 @@ def get_invoice_file(
         "file_path": invoice_file.file_path,
         "file_hash": invoice_file.file_hash,
         "mime_type": invoice_file.mime_type,
-        "file_type": invoice_file.file_type
+        "file_type": invoice_file.file_type,
+        "download_url": file_serving.download_url(invoice_id, invoice_file),
+        "thumbnail_url": file_serving.thumbnail_url(invoice_id, invoice_file.file_hash),
+        "preview_pages": len((read_manifest(invoice_file.file_path) or {}).get("pages") or [])
     }
 
 
@@ -2785,14 +1669,15 @@ def get_invoice_file(
 def download_invoice_file(
     *,
     session: SessionDep,
+    request: Request,
     invoice_id: UUID,
+    inline: bool = False,
     current_user: CurrentUser
 ):
     """
     下载票据关联的文件
+    按文件哈希返回强 ETag，支持 If-None-Match（304）与 Range 请求；inline=true 时用于页面内预览
     """
-    from fastapi.responses import FileResponse
-    
     invoice = session.get(Invoice, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="票据不存在")
@@ -2809,11 +1694,63 @@ def download_invoice_file(
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="文件不存在于服务器")
     
-    return FileResponse(
-        path=str(file_path),
-        filename=invoice_file.file_name,
-        media_type=invoice_file.mime_type
-    )
+    return file_serving.file_response(request, invoice_file, file_path, inline=inline)
+
+
+def _invoice_preview(session: SessionDep, invoice_id: UUID, current_user: CurrentUser, page: int | None):
+    """票据文件的缩略图（page 为空）或分页预览图，尚未生成时等待生成"""
+    invoice = session.get(Invoice, invoice_id)
+    if not invoice:
+        raise HTTPException(status_code=404, detail="票据不存在")
+    if not check_invoice_permission(invoice, current_user, session):
+        raise HTTPException(status_code=403, detail="无权访问此票据")
+    invoice_file = session.get(InvoiceFile, invoice.file_id)
+    if not invoice_file or not Path(invoice_file.file_path).exists():
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    manifest = preview_renderer.ensure(invoice_file.file_path, invoice_file.mime_type)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="预览图尚未生成")
+    if page is None:
+        name = manifest.get("thumbnail")
+    else:
+        pages = manifest.get("pages") or []
+        name = pages[page - 1] if 1 <= page <= len(pages) else None
+    if not name:
+        raise HTTPException(status_code=404, detail="预览页不存在")
+    path = preview_dir(invoice_file.file_path) / name
+    return invoice_file, path, manifest["media_type"]
+
+
+@router.get("/{invoice_id}/file/thumbnail")
+def get_invoice_file_thumbnail(
+    *,
+    session: SessionDep,
+    request: Request,
+    invoice_id: UUID,
+    current_user: CurrentUser
+):
+    """
+    票据文件缩略图（首页缩小图，WebP/JPEG）
+    """
+    invoice_file, path, media_type = _invoice_preview(session, invoice_id, current_user, None)
+    return file_serving.derived_file_response(request, invoice_file, path, media_type)
+
+
+@router.get("/{invoice_id}/file/preview/{page}")
+def get_invoice_file_preview(
+    *,
+    session: SessionDep,
+    request: Request,
+    invoice_id: UUID,
+    page: int,
+    current_user: CurrentUser
+):
+    """
+    票据文件分页预览图（页码从 1 开始）
+    """
+    invoice_file, path, media_type = _invoice_preview(session, invoice_id, current_user, page)
+    return file_serving.derived_file_response(request, invoice_file, path, media_type)
 
 
 @router.get("/{invoice_id}/items")
@@ -3004,6 +1941,14 @@ def get_pending_reviews(
             companies = session.exec(select(Company).where(Company.id.in_(list(company_ids)))).all()
             companies_dict = {c.id: c.code for c in companies}
         
+        # 批量获取文件哈希（缩略图地址带内容版本）
+        file_ids = [inv.file_id for inv in invoices if inv.file_id]
+        file_hashes = {}
+        if file_ids:
+            file_hashes = dict(session.exec(
+                select(InvoiceFile.id, InvoiceFile.file_hash).where(InvoiceFile.id.in_(file_ids))
+            ).all())
+        
         # 批量获取识别任务信息（用于获取template_name和model_name）
         invoice_ids = [inv.id for inv in invoices]
         tasks_dict = {}
@@ -3063,7 +2008,8 @@ def get_pending_reviews(
                 ).model_dump(),
                 "template_name": template_name,
                 "template_version": template_version,
-                "model_name": model_name
+                "model_name": model_name,
+                "thumbnail_url": file_serving.thumbnail_url(inv.id, file_hashes.get(inv.file_id))
             })
         
         return {
@@ -3189,6 +2135,34 @@ def reject_invoice(
         raise HTTPException(status_code=500, detail=f"审核失败: {str(e)}")
 
 
+@router.delete("/recognition-cache", dependencies=[Depends(get_current_active_superuser)])
+def clear_recognition_cache(
+    *,
+    session: SessionDep,
+    invoice_id: UUID | None = None,
+    file_hash: str | None = None,
+    model_config_id: UUID | None = None,
+    output_schema_id: UUID | None = None,
+    purge_all: bool = False,
+) -> Any:
+    """
+    清除识别结果缓存（仅超级管理员）
+    按票据、文件哈希、模型配置或输出Schema筛选；不指定条件时需 purge_all=true 才清除全部
+    """
+    if not any((invoice_id, file_hash, model_config_id, output_schema_id, purge_all)):
+        raise HTTPException(status_code=400, detail="请指定清除条件，或设置 purge_all=true 清除全部缓存")
+    removed = recognition_memo.invalidate(
+        session,
+        invoice_id=invoice_id,
+        file_hash=file_hash,
+        model_config_id=model_config_id,
+        output_schema_id=output_schema_id,
+        purge_all=purge_all,
+    )
+    session.commit()
+    return {"removed": removed}
+
+
 @router.get("/recognition-results")
 def get_recognition_results(
     *,
@@ -3214,50 +2188,20 @@ def get_recognition_results(
             RecognitionResult.recognition_time
         ]
         
-        # 如果不是超级用户，需要通过发票过滤识别结果
-        if not current_user.is_superuser:
-            if current_user.company_id:
-                # 用户有公司ID，只查询自己公司的发票的识别结果
-                # 先查询符合条件的发票ID列表
-                invoice_ids = session.exec(
-                    select(Invoice.id).where(Invoice.company_id == current_user.company_id)
-                ).all()
-                if invoice_ids:
-                    statement = select(*base_columns).where(RecognitionResult.invoice_id.in_(invoice_ids))
-                    if invoice_id:
-                        # 如果指定了invoice_id，还需要检查权限
-                        if invoice_id not in invoice_ids:
-                            raise HTTPException(status_code=403, detail="无权访问此票据的识别结果")
-                        statement = statement.where(RecognitionResult.invoice_id == invoice_id)
-                else:
-                    # 用户没有可访问的发票，返回空结果
-                    statement = select(*base_columns).where(RecognitionResult.id.is_(None))
-            else:
-                # 用户没有公司ID，返回空结果
-                statement = select(*base_columns).where(RecognitionResult.id.is_(None))
-        else:
-            # 超级用户可以查看所有识别结果
-            statement = select(*base_columns)
-            if invoice_id:
-                statement = statement.where(RecognitionResult.invoice_id == invoice_id)
-        
-        # 总数查询
+        # 如果不是超级用户，通过票据所属公司过滤识别结果（关联 invoice，EXISTS 关联 user_company）
+        statement = select(*base_columns)
         count_statement = select(func.count()).select_from(RecognitionResult)
-        if not current_user.is_superuser:
-            if current_user.company_id:
-                invoice_ids = session.exec(
-                    select(Invoice.id).where(Invoice.company_id == current_user.company_id)
-                ).all()
-                if invoice_ids:
-                    count_statement = count_statement.where(RecognitionResult.invoice_id.in_(invoice_ids))
-                    if invoice_id:
-                        if invoice_id not in invoice_ids:
-                            count_statement = count_statement.where(RecognitionResult.id.is_(None))
-                else:
-                    count_statement = count_statement.where(RecognitionResult.id.is_(None))
-            else:
-                count_statement = count_statement.where(RecognitionResult.id.is_(None))
-        elif invoice_id:
+        scope_condition = company_scope_condition(Invoice.company_id, current_user)
+        if scope_condition is not None:
+            if invoice_id:
+                # 如果指定了invoice_id，还需要检查权限
+                invoice = session.get(Invoice, invoice_id)
+                if not invoice or not invoice.company_id or not can_access_company(session, current_user, invoice.company_id):
+                    raise HTTPException(status_code=403, detail="无权访问此票据的识别结果")
+            statement = statement.join(Invoice, Invoice.id == RecognitionResult.invoice_id).where(scope_condition)
+            count_statement = count_statement.join(Invoice, Invoice.id == RecognitionResult.invoice_id).where(scope_condition)
+        if invoice_id:
+            statement = statement.where(RecognitionResult.invoice_id == invoice_id)
             count_statement = count_statement.where(RecognitionResult.invoice_id == invoice_id)
         
         total = session.exec(count_statement).one()
@@ -8,7 +8,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.api.deps import AsyncSessionDep, CurrentUser, SessionDep, get_current_active_superuser
 from app.core import security
 from app.core.config import settings
 from app.core.security import get_password_hash
@@ -144,7 +144,7 @@ def login_access_token(
 @router.post("/login/unified", response_model=UnifiedResponse)
 async def login_unified(
     request: UnifiedRequest,
-    session: SessionDep
+    session: AsyncSessionDep
 ) -> dict[str, Any]:
     """
     使用统一对象的登录验证
@@ -237,7 +237,7 @@ async def login_unified(
         # 断点8：用户验证
         logger.debug("断点8: 开始用户验证")
         logger.debug(f"断点8: 验证邮箱: {email}")
-        user = crud.authenticate(session=session, email=email, password=password)
+        user = await crud.aauthenticate(session=session, email=email, password=password)
         logger.debug(f"断点8: 用户验证结果 - 用户存在: {user is not None}")
         
         if not user:
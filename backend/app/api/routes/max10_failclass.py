@@ -3,40 +3,57 @@ import numpy as np
 from openpyxl import Workbook
 
 
-def MAX10Failclass(inputFile, NUMCLASS):
+def export_failclass_result(outputFile, T, TC, T_iter=None):
+    """
+    将分类结果导出到 Excel（可选步骤，套料流程中不再落盘）
+    工作表: 分类结果 / 分类数 / 循环分类结果（T_iter 不为空时）
+    """
+    with pd.ExcelWriter(outputFile, engine='openpyxl') as writer:
+        T.to_excel(writer, sheet_name='分类结果', index=False)
+        TC.to_excel(writer, sheet_name='分类数', index=False)
+        if T_iter is not None:
+            T_iter.to_excel(writer, sheet_name='循环分类结果', index=False)
+    print(f"分组结果已导出到 Excel 文件: {outputFile}")
+
+
+def MAX10Failclass(orders, NUMCLASS, outputFile=None):
     """
     Failclass - 分类函数（新增：保留Thickness列，按Thickness优先分类）
     输入:
-        inputFile - 输入的 Excel 文件名（如 'r_orders.xlsx'）
-        NUMCLASS  - 分组数参数，0 表示正常分组，每次加一后分组减半，直到组类为1
+        orders     - 待分类订单 DataFrame（兼容旧用法：传入 Excel 文件名时读取其 Sheet1）
+        NUMCLASS   - 分组数参数，0 表示正常分组，每次加一后分组减半，直到组类为1
+        outputFile - 可选，指定时将分类结果导出到该 Excel 文件（如 '分类数据.xlsx'）
     输出:
-        导出分类结果到 '分类数据.xlsx'，包含Thickness列，且按Thickness优先分类
+        (T, TC, T_iter) - 分类结果（含Thickness列，按Thickness优先分类）、各组数量、
+                          循环分组结果（NUMCLASS 为 0 时为 None）
+    异常:
+        ValueError - 输入参数无效、文件无法读取、订单数据为空或缺少 ProcessOrder 列
     """
     # --------------------- 输入参数验证 ---------------------
-    if not isinstance(inputFile, str):
-        raise ValueError("输入文件名必须为字符串类型。")
+    if not isinstance(orders, (str, pd.DataFrame)):
+        raise ValueError("输入必须为 DataFrame 或 Excel 文件名。")
     if not isinstance(NUMCLASS, int) or NUMCLASS < 0:
         raise ValueError("NUMCLASS 必须为非负整数。")
 
     # --------------------- 读取数据（新增：检查并读取Thickness列） ---------------------
-    try:
-        TT = pd.read_excel(inputFile, sheet_name='Sheet1')
-    except Exception as e:
-        print(f"无法读取文件: {inputFile}。错误信息: {str(e)}")
-        return
+    if isinstance(orders, pd.DataFrame):
+        TT = orders.copy()
+    else:
+        try:
+            TT = pd.read_excel(orders, sheet_name='Sheet1')
+        except Exception as e:
+            raise ValueError(f"无法读取文件: {orders}。错误信息: {str(e)}") from e
 
     # 检查表格是否为空
     if TT.empty:
-        print("Excel 文件为空，函数终止。")
-        return
+        raise ValueError("订单数据为空，函数终止。")
 
     # 移除第一列中包含 NaN 的行
     first_column_name = TT.columns[0]
     TT = TT.dropna(subset=[first_column_name])
     print(f"移除包含 NaN 的行后，表格剩余行数: {len(TT)}")
     if TT.empty:
-        print("移除 NaN 后，Excel 文件为空，函数终止。")
-        return
+        raise ValueError("移除 NaN 后，订单数据为空，函数终止。")
 
     # 新增：检查Thickness列是否存在
     if 'Thickness' not in TT.columns:
@@ -48,8 +65,7 @@ def MAX10Failclass(inputFile, NUMCLASS):
 
     # 提取ProcessOrder列（原有逻辑）
     if 'ProcessOrder' not in TT.columns:
-        print("Excel 表中缺少 ProcessOrder 列，函数终止。")
-        return
+        raise ValueError("Excel 表中缺少 ProcessOrder 列，函数终止。")
     C = TT['ProcessOrder'].astype(str)
 
     # --------------------- 核心修改：按Thickness优先分组 ---------------------
@@ -246,18 +262,10 @@ def MAX10Failclass(inputFile, NUMCLASS):
         'Number': number
     })
 
-    T = T.sort_values(by='Classify')
-
-    # 导出初始结果
-    excel_file_name = '分类数据.xlsx'
-    sheet_name_result = '分类结果'
-    sheet_name_count = '分类数'
-    with pd.ExcelWriter(excel_file_name, engine='openpyxl') as writer:
-        T.to_excel(writer, sheet_name=sheet_name_result, index=False)
-        TC.to_excel(writer, sheet_name=sheet_name_count, index=False)
-    print(f"初始分组结果已导出到 Excel 文件: {excel_file_name} 的工作表 {sheet_name_result} 和 {sheet_name_count}")
+    T = T.sort_values(by='Classify').reset_index(drop=True)
 
     # --------------------- 循环分组部分（同步更新Thickness列） ---------------------
+    T_iter = None
     if NUMCLASS > 0:
         # 准备循环分组所需的初始数据（基于全局分组）
         # 这里需要重新整理全局分组的索引和信息，逻辑与初始分组一致但需支持迭代合并
@@ -352,17 +360,16 @@ def MAX10Failclass(inputFile, NUMCLASS):
             'materialCode': materialCode_iter
         })
 
-        T_iter = T_iter.sort_values(by='Classify')
-        sheet_name_result_iter = '循环分类结果'
+        T_iter = T_iter.sort_values(by='Classify').reset_index(drop=True)
+
+    if outputFile:
+        export_failclass_result(outputFile, T, TC, T_iter)
 
-        # 追加写入循环结果
-        with pd.ExcelWriter(excel_file_name, engine='openpyxl', mode='a') as writer:
-            T_iter.to_excel(writer, sheet_name=sheet_name_result_iter, index=False)
-        print(f"循环分组结果已导出到 Excel 文件: {excel_file_name} 的工作表 {sheet_name_result_iter}")
+    return T, TC, T_iter
 
 
 # --------------------- 测试调用 ---------------------
 if __name__ == "__main__":
     inputFile = 'r_orders.xlsx'  # 确保该文件包含Thickness列
     NUMCLASS = 0  # 0=正常分组，可根据需求调整
-    MAX10Failclass(inputFile, NUMCLASS)
\ No newline at end of file
+    MAX10Failclass(inputFile, NUMCLASS, outputFile='分类数据.xlsx')
\ No newline at end of file
@@ -7,9 +7,10 @@ from typing import Any, List, Optional
 from datetime import datetime
 
 from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select, or_, text
+from sqlmodel import select
 
 from app.api.deps import CurrentUser, SessionDep
+from app.api.list_query import ListColumn, ListQuery, ListQueryError, model_columns
 from app.models import (
     UnifiedRequest,
     UnifiedResponse
@@ -21,6 +22,24 @@ from app.utils import get_server_datetime
 
 router = APIRouter(prefix="/operation", tags=["operation"])
 
+OPERATION_LIST_QUERY = ListQuery(
+    table="operation",
+    key="operation_id",
+    columns=model_columns(Operation, overrides={"operation_code": "exact", "processing_mode": "exact"}),
+    search=[
+        ListColumn("operation.operation_code", "contains"),
+        ListColumn("operation.operation_name", "contains"),
+    ],
+    default_sort=[("createDate", "desc")],
+    select="""
+        operation.operation_id, operation.operation_code, operation.operation_name, operation.operation_desc,
+        operation.std_tact_time, operation.unit_id_tact_time, operation.processing_mode,
+        operation.processing_catego, operation.loss_quantity, operation.unit_id_loss, operation.remark,
+        operation.approve_status, operation.approver, operation.approve_date, operation.creator,
+        operation.create_date, operation.modifier_last, operation.modify_date_last
+    """,
+)
+
 @router.post("/unified", response_model=UnifiedResponse)
 def unified_operation_operations(
     request: UnifiedRequest,
@@ -182,65 +201,8 @@ def _handle_unified_read(request: UnifiedRequest, session: SessionDep, current_u
 def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_user: CurrentUser) -> UnifiedResponse:
     """处理列表查询操作"""
     try:
-        page = request.page or 1
-        limit = request.limit or 10
-        filters = request.filters or {}
-        search = request.search or {}
-        
-        sql_template = """
-        SELECT 
-            operation_id, operation_code, operation_name, operation_desc,
-            std_tact_time, unit_id_tact_time, processing_mode, processing_catego,
-            loss_quantity, unit_id_loss, remark, approve_status, approver,
-            approve_date, creator, create_date, modifier_last, modify_date_last
-        FROM operation
-        WHERE 1=1
-        -- {filter_conditions}
-        -- {search_conditions}
-        -- {order_conditions}
-        -- {pagination_conditions}
-        """
-        
-        filter_conditions = []
-        if filters.get("operationCode"):
-            filter_conditions.append(f"AND operation_code = '{filters['operationCode']}'")
-        if filters.get("processingMode"):
-            filter_conditions.append(f"AND processing_mode = '{filters['processingMode']}'")
-        if filters.get("approveStatus"):
-            filter_conditions.append(f"AND approve_status = '{filters['approveStatus']}'")
-        
-        search_conditions = []
-        if search.get("keyword"):
-            keyword = search["keyword"]
-            search_conditions.append(f"AND (operation_code LIKE '%{keyword}%' OR operation_name LIKE '%{keyword}%')")
-        
-        order_conditions = ["create_date DESC"]
-        offset = (page - 1) * limit
-        pagination_conditions = f"LIMIT {limit} OFFSET {offset}"
-        
-        sql_query = sql_template.replace(
-            "-- {filter_conditions}", '\n'.join(filter_conditions)
-        ).replace(
-            "-- {search_conditions}", '\n'.join(search_conditions)
-        ).replace(
-            "-- {order_conditions}", f"ORDER BY {', '.join(order_conditions)}"
-        ).replace(
-            "-- {pagination_conditions}", pagination_conditions
-        )
-        
-        count_sql = f"""
-        SELECT COUNT(*) as total
-        FROM operation
-        WHERE 1=1
-        {' '.join(filter_conditions)}
-        {' '.join(search_conditions)}
-        """
-        
-        count_result = session.exec(text(count_sql)).one()
-        total = count_result[0] if count_result else 0
-        
-        result = session.exec(text(sql_query))
-        items = result.all()
+        page = OPERATION_LIST_QUERY.execute(session, request, default_limit=10)
+        items = page.rows
         
         items_dict = []
         for row in items:
@@ -254,17 +216,21 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             }
             items_dict.append(item_dict)
         
-        total_pages = (total + limit - 1) // limit
-        pagination = {
-            "page": page, "limit": limit, "total": total,
-            "total_pages": total_pages, "has_next": page < total_pages, "has_prev": page > 1
-        }
+        pagination = page.pagination()
+        total = page.total
         
         return UnifiedResponse(
             success=True, code=200, data=items_dict, pagination=pagination,
             message=f"查询成功，共{total}条记录"
         )
         
+    except ListQueryError as e:
+        return UnifiedResponse(
+            success=False,
+            code=400,
+            message=f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY"
+        )
     except Exception as e:
         return UnifiedResponse(
             success=False, code=500, message=f"查询失败: {str(e)}", error_code="QUERY_FAILED"
@@ -10,6 +10,7 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select, or_, text
 
 from app.api.deps import CurrentUser, SessionDep
+from app.api.list_query import ListQuery, ListQueryError, keys_param, model_columns
 from app.models import (
     UnifiedRequest,
     UnifiedResponse
@@ -24,6 +25,13 @@ from app.utils import get_server_datetime
 
 router = APIRouter(prefix="/productionOrder", tags=["productionOrder"])
 
+PRODUCTION_ORDER_LIST_QUERY = ListQuery(
+    table="production_order",
+    key="production_order_id",
+    columns=model_columns(ProductionOrder),
+    default_sort=[("createDate", "desc")],
+)
+
 def assemble_production_order_data(results: List[Any]) -> List[Dict[str, Any]]:
     """装配生产订单数据，将SQL查询结果转换为嵌套的数据结构"""
     production_order_map = {}
@@ -201,73 +209,36 @@ def _handle_unified_delete(request: UnifiedRequest, session: SessionDep, current
 def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_user: CurrentUser) -> UnifiedResponse:
     """处理列表查询操作"""
     try:
-        page = request.page if request.page else 1
-        limit = request.limit if request.limit else 50
-        offset = (page - 1) * limit
-        
-        base_sql = """
-        SELECT 
-            production_order.*,
-            production_order_d.*
-        FROM production_order
-        LEFT JOIN production_order_d 
-        ON production_order.production_order_id = production_order_d.production_order_id
-        """
-        
-        where_conditions = []
-        params = {}
-        
-        if request.filters:
-            for field, value in request.filters.items():
-                if value is not None:
-                    param_name = f"param_{field}"
-                    if isinstance(value, str) and value.startswith('%') and value.endswith('%'):
-                        where_conditions.append(f"production_order.{field} LIKE :{param_name}")
-                    else:
-                        where_conditions.append(f"production_order.{field} = :{param_name}")
-                    params[param_name] = value
-        
-        if where_conditions:
-            base_sql += " WHERE " + " AND ".join(where_conditions)
-        
-        if request.sort:
-            order_clauses = []
-            for field, direction in request.sort.items():
-                order_clauses.append(f"production_order.{field} {direction.upper()}")
-            
-            if order_clauses:
-                base_sql += " ORDER BY " + ", ".join(order_clauses)
+        # 分页与计数只作用于主表，明细按当前页主键查询
+        page = PRODUCTION_ORDER_LIST_QUERY.execute(session, request, default_limit=50)
+        results = []
+        if page.keys:
+            detail_sql = """
+            SELECT 
+                production_order.*,
+                production_order_d.*
+            FROM production_order
+            LEFT JOIN production_order_d 
+            ON production_order.production_order_id = production_order_d.production_order_id
+            WHERE production_order.production_order_id IN :keys
+            """
+            results = session.execute(keys_param(detail_sql), {"keys": page.keys}).fetchall()
         
-        base_sql += f" LIMIT {limit} OFFSET {offset}"
-        
-        result = session.exec(text(base_sql), **params if params else {})
-        results = result.all()
-        
-        count_sql = """
-        SELECT COUNT(DISTINCT production_order.production_order_id) as total
-        FROM production_order
-        LEFT JOIN production_order_d ON production_order.production_order_id = production_order_d.production_order_id
-        """
-        
-        if where_conditions:
-            count_sql += " WHERE " + " AND ".join(where_conditions)
-        
-        count_result = session.exec(text(count_sql), **params).first()
-        total = count_result[0] if count_result else 0
-        
-        data = assemble_production_order_data(results)
+        data = page.sort_by_keys(assemble_production_order_data(results), "productionOrderId")
         
         return UnifiedResponse(
             success=True,
             code=200,
             message="查询生产订单列表成功",
             data=data,
-            pagination={
-                "total": total,
-                "page": page,
-                "limit": limit,
-                "pages": (total + limit - 1) // limit
-            }
+            pagination={**page.pagination(), "pages": page.total_pages}
+        )
+    except ListQueryError as e:
+        return UnifiedResponse(
+            success=False,
+            code=400,
+            message=f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY"
         )
     except Exception as e:
         return UnifiedResponse(
@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select, or_, text
 
 from app.api.deps import CurrentUser, SessionDep
+from app.api.list_query import ListColumn, ListQuery, ListQueryError, keys_param, model_columns
 from app.models import (
     UnifiedRequest,
     UnifiedResponse
@@ -17,6 +18,31 @@ from app.models import (
 
 router = APIRouter(prefix="/salesOrderDocD", tags=["salesOrderDocD"])
 
+# 属性字段通过 EXISTS 过滤销售订单明细
+_SALES_ORDER_DOC_D_FEATURE_EXISTS = (
+    "SELECT 1 FROM sales_order_doc_d_feature "
+    "WHERE sales_order_doc_d_feature.sales_order_doc_d_id = sales_order_doc_d.sales_order_doc_d_id AND {condition}"
+)
+
+SALES_ORDER_DOC_D_LIST_QUERY = ListQuery(
+    table="sales_order_doc_d",
+    key="sales_order_doc_d_id",
+    columns={
+        **model_columns(SalesOrderDocD),
+        "featureId": ListColumn("sales_order_doc_d_feature.feature_id", "exact", _SALES_ORDER_DOC_D_FEATURE_EXISTS),
+        "featureValue": ListColumn(
+            "sales_order_doc_d_feature.feature_value", "contains", _SALES_ORDER_DOC_D_FEATURE_EXISTS
+        ),
+    },
+    search=[
+        ListColumn("sales_order_doc_d.doc_no", "contains"),
+        ListColumn("sales_order_doc_d.customer_full_name", "contains"),
+        ListColumn("sales_order_doc_d.material_code", "contains"),
+        ListColumn("sales_order_doc_d.material_description", "contains"),
+    ],
+    default_sort=[("createDate", "asc"), ("docNo", "asc"), ("sequence", "asc")],
+)
+
 
 @router.post("/unified", response_model=UnifiedResponse)
 def unified_sales_order_operations(
@@ -205,16 +231,19 @@ def _handle_unified_delete(request: UnifiedRequest, session: SessionDep, current
 def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_user: CurrentUser) -> UnifiedResponse:
     """处理统一列表查询操作 - 使用SQL文本执行"""
     try:
-        # 构建基础SQL查询 - 包含salesOrderDocDFeature数据
-        # 根据实际数据库表结构调整字段
-        base_sql = """
+        # 分页与计数只作用于销售订单明细表，属性条件通过 EXISTS 过滤
+        page = SALES_ORDER_DOC_D_LIST_QUERY.execute(session, request)
+        
+        # 查询当前页的属性数据（表面要求编码转换为描述）
+        detail_sql = """
         with tmp1 as (
             select sales_order_doc_d_feature.sales_order_doc_d_feature_id
               ,sales_order_doc_d_feature.sales_order_doc_d_id
               ,sales_order_doc_d_feature.position
               ,sales_order_doc_d_feature.feature_id
               ,regexp_split_to_table(sales_order_doc_d_feature.feature_value,'\|') as feature_value
-            from sales_order_doc_d_feature where feature_id = '1'
+            from sales_order_doc_d_feature
+            where feature_id = '1' and sales_order_doc_d_id IN :keys
         )
         ,tmp2 as (
             select tmp1.sales_order_doc_d_feature_id
@@ -238,6 +267,7 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
               ,sales_order_doc_d_feature.feature_value
             from sales_order_doc_d_feature
             where sales_order_doc_d_feature.feature_id <> '1'
+              and sales_order_doc_d_feature.sales_order_doc_d_id IN :keys
             union
             select sales_order_doc_d_feature_id
               ,sales_order_doc_d_id
@@ -258,38 +288,12 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
         LEFT JOIN sales_order_doc_d_feature 
         ON sales_order_doc_d.sales_order_doc_d_id = sales_order_doc_d_feature.sales_order_doc_d_id
         LEFT JOIN feature  ON sales_order_doc_d_feature.feature_id = feature.feature_id
+        WHERE sales_order_doc_d.sales_order_doc_d_id IN :keys
+        ORDER BY sales_order_doc_d.sales_order_doc_d_id, sales_order_doc_d_feature.position asc
         """
-        
-        # 构建WHERE条件
-        where_conditions = []
-        params = {}
-             
-        # 组合WHERE条件
-        if where_conditions:
-            base_sql += " WHERE " + " AND ".join(where_conditions)
-        
-        # 获取总数 - 需要去重，因为JOIN会产生重复行
-        count_sql = f"SELECT COUNT(DISTINCT sales_order_doc_d.sales_order_doc_d_id) as total FROM sales_order_doc_d "
-        if where_conditions:
-            count_sql += " WHERE " + " AND ".join(where_conditions)
-        count_result = session.execute(text(count_sql), params)
-        total = count_result.fetchone().total
-        
-        # 添加排序
-        base_sql += " ORDER BY sales_order_doc_d.create_date asc,sales_order_doc_d.doc_no asc,sales_order_doc_d.sequence asc,sales_order_doc_d_feature.position asc"
-        
-        # 应用分页
-        page = request.page or 1
-        limit = request.limit or 20
-        skip = (page - 1) * limit
-        
-        # 执行分页查询
-        paginated_sql = f"{base_sql} LIMIT :limit OFFSET :skip"
-        params['limit'] = limit
-        params['skip'] = skip
-        
-        result = session.execute(text(paginated_sql), params)
-        rows = result.fetchall()
+        rows = []
+        if page.keys:
+            rows = session.execute(keys_param(detail_sql), {"keys": page.keys}).fetchall()
         
         # 将查询结果组织成嵌套结构
         items_dict = {}  # 用于去重和分组
@@ -388,16 +392,9 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             }
             items.append(item_dict)
         
-        # 构建分页信息
-        total_pages = (total + limit - 1) // limit
-        pagination = {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
+        items = page.sort_by_keys(items, "salesOrderDocDId")
+        pagination = page.pagination()
+        total = page.total
         
         return UnifiedResponse(
             success=True,
@@ -405,6 +402,13 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             pagination=pagination,
             message=f"查询成功，共{total}条记录"
         )
+    except ListQueryError as e:
+        return UnifiedResponse(
+            success=False,
+            code=400,
+            message=f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY"
+        )
     except Exception as e:
         return UnifiedResponse(
             success=False,
@@ -10,6 +10,7 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select, or_, text
 
 from app.api.deps import CurrentUser, SessionDep
+from app.api.list_query import ListColumn, ListQuery, ListQueryError, model_columns
 from app.models import (
     UnifiedRequest,
     UnifiedResponse
@@ -21,8 +22,23 @@ from app.utils import get_server_datetime
 
 router = APIRouter(prefix="/surface-technology", tags=["surface-technology"])
 
-
-
+SURFACE_TECHNOLOGY_LIST_QUERY = ListQuery(
+    table="surface_technology",
+    key="surface_technology_id",
+    columns=model_columns(SurfaceTechnology),
+    search=[
+        ListColumn("surface_technology.surface_code", "contains"),
+        ListColumn("surface_technology.surface_desc", "contains"),
+        ListColumn("surface_technology.remark", "contains"),
+    ],
+    default_sort=[("surfaceCode", "asc")],
+    select="""
+        surface_technology.surface_technology_id, surface_technology.surface_code,
+        surface_technology.surface_desc, surface_technology.remark, surface_technology.approve_status,
+        surface_technology.approver, surface_technology.approve_date, surface_technology.creator,
+        surface_technology.create_date, surface_technology.modifier_last, surface_technology.modify_date_last
+    """,
+)
 
 
 @router.post("/unified", response_model=UnifiedResponse)
@@ -142,87 +158,8 @@ def _handle_unified_delete(request: UnifiedRequest, session: SessionDep, current
 def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_user: CurrentUser) -> UnifiedResponse:
     """处理列表查询操作 - 使用 SQL 文本执行"""
     try:
-        # SQL 查询模板
-        sql_template = """
-        SELECT 
-            distinct surface_technology.*
-        FROM surface_technology
-        left join surface_technology_d on surface_technology.surface_technology_id = surface_technology_d.surface_id
-        left join operation on surface_technology_d.operation_id = operation.operation_id
-        WHERE 1=1
-        -- {filter_conditions}
-        -- {search_conditions}
-        -- {order_conditions}
-        -- {pagination_conditions}
-        """
-        
-        # 构建过滤条件
-        filter_conditions = []
-        if request.filters:
-            for field, value in request.filters.items():
-                if value:
-                    # 将字段名转换为数据库字段名（驼峰转下划线）
-                    db_field = ''.join(['_' + c.lower() if c.isupper() else c for c in field]).lstrip('_')
-                    filter_conditions.append(f"AND {db_field} ILIKE '%{value}%'")
-        
-        # 构建搜索条件
-        search_conditions = []
-        if request.search:
-            search_term = f"%{request.search}%"
-            search_conditions.append(f"""AND (
-                surface_code ILIKE '{search_term}' OR 
-                surface_desc ILIKE '{search_term}' OR 
-                remark ILIKE '{search_term}'
-            )""")
-        
-        # 构建排序条件
-        order_conditions = []
-        if request.sort:
-            for field, direction in request.sort.items():
-                # 将字段名转换为数据库字段名
-                db_field = ''.join(['_' + c.lower() if c.isupper() else c for c in field]).lstrip('_')
-                order_direction = "DESC" if direction.lower() == "desc" else "ASC"
-                order_conditions.append(f"{db_field} {order_direction}")
-        else:
-            order_conditions.append("surface_code ASC")
-        
-        # 构建分页条件
-        page = request.page or 1
-        limit = request.limit or 20
-        offset = (page - 1) * limit
-        pagination_conditions = f"LIMIT {limit} OFFSET {offset}"
-        
-        # 替换 SQL 模板中的占位符
-        sql_query = sql_template.replace(
-            "-- {filter_conditions}", 
-            '\n'.join(filter_conditions)
-        ).replace(
-            "-- {search_conditions}", 
-            '\n'.join(search_conditions)
-        ).replace(
-            "-- {order_conditions}", 
-            f"ORDER BY {', '.join(order_conditions)}"
-        ).replace(
-            "-- {pagination_conditions}", 
-            pagination_conditions
-        )
-        
-        # 构建计数查询
-        count_sql = f"""
-        SELECT COUNT(*) as total
-        FROM surface_technology
-        WHERE 1=1
-        {' '.join(filter_conditions)}
-        {' '.join(search_conditions)}
-        """
-        
-        # 执行计数查询
-        count_result = session.exec(text(count_sql)).one()
-        total = count_result[0] if count_result else 0
-        
-        # 执行主查询
-        result = session.exec(text(sql_query))
-        items = result.all()
+        page = SURFACE_TECHNOLOGY_LIST_QUERY.execute(session, request)
+        items = page.rows
         
         # 转换为字典列表
         items_dict = []
@@ -243,16 +180,8 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             }
             items_dict.append(item_dict)
         
-        # 构建分页信息
-        total_pages = (total + limit - 1) // limit
-        pagination = {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        }
+        pagination = page.pagination()
+        total = page.total
         
         return UnifiedResponse(
             success=True,
@@ -262,6 +191,13 @@ def _handle_unified_list(request: UnifiedRequest, session: SessionDep, current_u
             message=f"查询成功，共{total}条记录"
         )
         
+    except ListQueryError as e:
+        return UnifiedResponse(
+            success=False,
+            code=400,
+            message=f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY"
+        )
     except Exception as e:
         return UnifiedResponse(
             success=False,
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import shutil
 import logging
@@ -13,9 +14,14 @@ import openpyxl
 from fastapi import APIRouter, Body, File, Form, HTTPException, UploadFile
 from sqlmodel import select
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import AsyncSessionDep, CurrentUser, SessionDep
 from app.models.models import Message
 from app.models.models_invoice import Template, TemplateField, TemplateVersion, LLMConfig
+from app.core.config import settings
+from app.services.dify_client import DifyWorkflowError, dify_client
+from app.services.dify_traffic import policy_for
+from app.services.document_preprocess import validate_config as validate_preprocess_config
+from app.services.dify_file_cache import DifyFileUploadError, content_hash, dify_file_cache, is_file_missing_error
 
 logger = logging.getLogger(__name__)
 
@@ -134,6 +140,12 @@ def update_template(
         # 更新 schema 字段（如果模型中有这个字段）
         if hasattr(template, 'schema'):
             template.schema = body["schema"]
+    if "preprocess_config" in body:
+        # 识别前预处理配置（null 表示使用全局默认值）
+        try:
+            template.preprocess_config = validate_preprocess_config(body["preprocess_config"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     # 更新字段（如果提供了fields字段）
     if "fields" in body and isinstance(body["fields"], list):
@@ -350,6 +362,7 @@ def get_template(
                 "sample_file_type": template.sample_file_type,
                 "prompt": getattr(template, 'prompt', None),  # 获取prompt字段
                 "schema": getattr(template, 'schema', None),  # 获取schema字段
+                "preprocess_config": template.preprocess_config,
                 "version": {
                     "id": str(version.id),
                     "version": version.version,
@@ -393,7 +406,7 @@ def get_template(
 @router.post("/{template_id}/upload-sample")
 async def upload_template_sample(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     template_id: UUID,
     current_user: CurrentUser,
     file: UploadFile = File(...),
@@ -406,7 +419,7 @@ async def upload_template_sample(
     
     try:
         # 1. 验证模板是否存在
-        template = session.get(Template, template_id)
+        template = await session.get(Template, template_id)
         if not template:
             raise HTTPException(status_code=404, detail="模板不存在")
         
@@ -432,9 +445,8 @@ async def upload_template_sample(
         unique_filename = f"{uuid4()}{file_ext}"
         file_path = TEMPLATE_SAMPLE_DIR / unique_filename
         
-        # 5. 保存文件（直接写入读取的内容）
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
+        # 5. 保存文件（在线程池中写入，不阻塞事件循环）
+        await asyncio.to_thread(file_path.write_bytes, file_content)
         
         # 6. 更新模板的示例文件路径
         sample_file_path = f"/uploads/templates/{unique_filename}"
@@ -445,8 +457,8 @@ async def upload_template_sample(
         template.sample_file_type = sample_file_type
         template.update_time = datetime.now()
         session.add(template)
-        session.commit()
-        session.refresh(template)
+        await session.commit()
+        await session.refresh(template)
         
         return {
             "message": "示例文件上传成功",
@@ -466,7 +478,7 @@ async def upload_template_sample(
 @router.delete("/{template_id}/sample-file")
 async def delete_template_sample(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     template_id: UUID,
     current_user: CurrentUser,
 ) -> Any:
@@ -479,7 +491,7 @@ async def delete_template_sample(
     
     try:
         # 1. 验证模板是否存在
-        template = session.get(Template, template_id)
+        template = await session.get(Template, template_id)
         if not template:
             raise HTTPException(status_code=404, detail="模板不存在")
         
@@ -512,8 +524,8 @@ async def delete_template_sample(
         template.sample_file_type = None
         template.update_time = datetime.now()
         session.add(template)
-        session.commit()
-        session.refresh(template)
+        await session.commit()
+        await session.refresh(template)
         
         return {
             "message": "示例文件删除成功",
@@ -531,7 +543,7 @@ async def delete_template_sample(
 @router.post("/{template_id}/extract")
 async def extract_fields_and_generate_prompt(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     template_id: UUID,
     current_user: CurrentUser,
     file: UploadFile = File(...),
@@ -547,7 +559,6 @@ async def extract_fields_and_generate_prompt(
     - prompt_only: 仅生成提示词
     """
     import logging
-    import httpx
     import tempfile
     import os
     
@@ -555,7 +566,7 @@ async def extract_fields_and_generate_prompt(
     
     try:
         # 验证模板是否存在
-        template = session.get(Template, template_id)
+        template = await session.get(Template, template_id)
         if not template:
             raise HTTPException(status_code=404, detail="模板不存在")
         
@@ -570,9 +581,9 @@ async def extract_fields_and_generate_prompt(
             raise HTTPException(status_code=400, detail="模式必须是 both/extract/prompt_only")
         
         # 获取活跃的LLM配置
-        llm_config = session.exec(
+        llm_config = (await session.exec(
             select(LLMConfig).where(LLMConfig.is_active == True)
-        ).first()
+        )).first()
         
         if not llm_config:
             raise HTTPException(status_code=400, detail="未找到活跃的LLM配置，请在系统配置中设置")
@@ -587,8 +598,7 @@ async def extract_fields_and_generate_prompt(
         try:
             # 读取文件内容
             file_content = await file.read()
-            with open(temp_file_path, "wb") as f:
-                f.write(file_content)
+            await asyncio.to_thread(temp_file_path.write_bytes, file_content)
             
             # 构建JSON Schema
             json_schema = _build_json_schema_from_fields(field_defs)
@@ -603,7 +613,7 @@ async def extract_fields_and_generate_prompt(
             }
             
             # 调用Dify API
-            # 注意：Dify的文件上传API仅支持图片，PDF需要先转换为图片或使用文档解析节点
+            # 图片与PDF均先上传到Dify再调用工作流（PDF需要工作流中配置文档解析节点）
             if file.content_type and file.content_type.startswith("image/"):
                 # 图片文件：直接上传到Dify
                 dify_result = await _call_dify_workflow_with_image(
@@ -612,8 +622,7 @@ async def extract_fields_and_generate_prompt(
                     inputs=workflow_inputs,
                 )
             elif file.content_type == "application/pdf":
-                # PDF文件：需要特殊处理（转换为图片或使用文档解析）
-                # 这里简化处理，直接读取PDF内容作为文本
+                # PDF文件：作为文档上传
                 dify_result = await _call_dify_workflow_with_pdf(
                     llm_config=llm_config,
                     pdf_path=temp_file_path,
@@ -902,7 +911,7 @@ def deprecate_version(
 @router.post("/{template_id}/generate-prompt")
 async def generate_prompt(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     template_id: UUID,
     current_user: CurrentUser,
     body: dict = Body(...),
@@ -920,7 +929,7 @@ async def generate_prompt(
     try:
         # 验证模板是否存在（如果template_id不是'new'）
         if str(template_id) != 'new':
-            template = session.get(Template, template_id)
+            template = await session.get(Template, template_id)
             if not template:
                 raise HTTPException(status_code=404, detail="模板不存在")
         else:
@@ -939,16 +948,16 @@ async def generate_prompt(
         if llm_config_id:
             # 如果指定了llm_config_id，使用指定的配置
             try:
-                llm_config = session.get(LLMConfig, UUID(llm_config_id))
+                llm_config = await session.get(LLMConfig, UUID(llm_config_id))
             except Exception:
                 llm_config = None
             if not llm_config:
                 raise HTTPException(status_code=400, detail=f"指定的LLM配置不存在: {llm_config_id}")
         else:
             # 否则使用活跃的LLM配置
-            llm_config = session.exec(
+            llm_config = (await session.exec(
                 select(LLMConfig).where(LLMConfig.is_active == True)
-            ).first()
+            )).first()
             if not llm_config:
                 raise HTTPException(status_code=400, detail="未找到活跃的LLM配置，请在系统配置中设置")
         
@@ -973,7 +982,7 @@ async def generate_prompt(
         
         workflow_payload = {
             "inputs": workflow_inputs,
-            "response_mode": "blocking",
+            "response_mode": settings.DIFY_RESPONSE_MODE,
             "user": str(current_user.id),
         }
         
@@ -985,40 +994,44 @@ async def generate_prompt(
         logger.info(f"调用Dify生成提示词API: {workflow_url}")
         logger.info(f"请求参数: {json.dumps(workflow_payload, ensure_ascii=False, indent=2)}")
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            workflow_response = await client.post(
-                workflow_url,
-                json=workflow_payload,
+        try:
+            workflow_result = await dify_client.arun_workflow(
+                llm_config.endpoint,
+                workflow_payload,
                 headers=workflow_headers,
                 timeout=120.0,
+                traffic=policy_for(llm_config),
             )
-            
-            if workflow_response.status_code != 200:
-                error_text = workflow_response.text
-                logger.error(f"Dify API调用失败: {workflow_response.status_code}, {error_text}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Dify API调用失败: {error_text}"
-                )
-            
-            workflow_result = workflow_response.json()
-            
-            # 解析工作流输出
-            output_data = workflow_result.get("data", {}).get("outputs", {})
-            prompt_suggestion = output_data.get("prompt_suggestion", "") or output_data.get("prompt", "")
-            
-            if not prompt_suggestion:
-                # 如果没有prompt_suggestion，尝试从其他字段获取
-                prompt_suggestion = output_data.get("result", "") or output_data.get("text", "")
-            
-            return {
-                "success": True,
-                "data": {
-                    "prompt": prompt_suggestion,
-                    "trace_id": workflow_result.get("id"),
-                }
+        except httpx.HTTPStatusError as e:
+            error_text = e.response.text
+            logger.error(f"Dify API调用失败: {e.response.status_code}, {error_text}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Dify API调用失败: {error_text}"
+            )
+        except DifyWorkflowError as e:
+            logger.error(f"Dify工作流执行失败: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Dify API调用失败: {str(e)}"
+            )
+        
+        # 解析工作流输出
+        output_data = workflow_result.get("data", {}).get("outputs", {})
+        prompt_suggestion = output_data.get("prompt_suggestion", "") or output_data.get("prompt", "")
+        
+        if not prompt_suggestion:
+            # 如果没有prompt_suggestion，尝试从其他字段获取
+            prompt_suggestion = output_data.get("result", "") or output_data.get("text", "")
+        
+        return {
+            "success": True,
+            "data": {
+                "prompt": prompt_suggestion,
+                "trace_id": workflow_result.get("id"),
             }
-            
+        }
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -1084,39 +1097,45 @@ async def _call_dify_workflow_with_image(
     inputs: dict,
 ) -> dict:
     """调用Dify工作流（图片文件）"""
-    import httpx
-    
+    return await _call_dify_workflow_with_file(llm_config, image_path, "image/jpeg", inputs)
+
+
+async def _call_dify_workflow_with_pdf(
+    llm_config: LLMConfig,
+    pdf_path: Path,
+    inputs: dict,
+) -> dict:
+    """调用Dify工作流（PDF文件）"""
+    return await _call_dify_workflow_with_file(llm_config, pdf_path, "application/pdf", inputs)
+
+
+async def _call_dify_workflow_with_file(
+    llm_config: LLMConfig,
+    file_path: Path,
+    mime_type: str,
+    inputs: dict,
+) -> dict:
+    """上传文件到Dify并调用工作流（使用共享连接池；同一文件已上传过时复用 upload_file_id）"""
     try:
-        # 1. 上传文件到Dify
-        upload_url = f"{llm_config.endpoint.rstrip('/')}/files/upload"
-        
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            # 上传文件
-            with open(image_path, "rb") as f:
-                files = {"file": (image_path.name, f, "image/jpeg")}
-                headers = {
-                    "Authorization": f"Bearer {llm_config.api_key}",
+        # 1. 获取文件在Dify中的ID（命中缓存时不再上传）
+        with open(file_path, "rb") as f:
+            file_content = f.read()
+        file_hash = content_hash(file_content)
+        
+        workflow_result = None
+        for attempt in range(2):
+            try:
+                file_id = await dify_file_cache.aupload_file_id(
+                    llm_config.endpoint, llm_config.api_key, file_content, file_path.name, mime_type,
+                    file_hash=file_hash, force=attempt > 0, traffic=policy_for(llm_config),
+                )
+            except DifyFileUploadError as e:
+                return {
+                    "success": False,
+                    "error_message": str(e),
                 }
-                upload_response = await client.post(upload_url, files=files, headers=headers)
-                
-                if upload_response.status_code != 200:
-                    return {
-                        "success": False,
-                        "error_message": f"文件上传失败: {upload_response.text}",
-                    }
-                
-                upload_result = upload_response.json()
-                file_id = upload_result.get("id")
-                
-                if not file_id:
-                    return {
-                        "success": False,
-                        "error_message": "文件上传成功但未返回文件ID",
-                    }
             
             # 2. 调用工作流
-            workflow_url = f"{llm_config.endpoint.rstrip('/')}/workflows/run"
-            
             workflow_inputs = {
                 **inputs,
                 "file": file_id,  # 使用上传后的文件ID
@@ -1124,63 +1143,50 @@ async def _call_dify_workflow_with_image(
             
             workflow_payload = {
                 "inputs": workflow_inputs,
-                "response_mode": "blocking",
+                "response_mode": settings.DIFY_RESPONSE_MODE,
                 "user": "system",
             }
             
-            workflow_headers = {
-                "Authorization": f"Bearer {llm_config.api_key}",
-                "Content-Type": "application/json",
-            }
-            
-            workflow_response = await client.post(
-                workflow_url,
-                json=workflow_payload,
-                headers=workflow_headers,
-                timeout=120.0,
-            )
-            
-            if workflow_response.status_code != 200:
+            try:
+                workflow_result = await dify_client.arun_workflow(
+                    llm_config.endpoint,
+                    workflow_payload,
+                    api_key=llm_config.api_key,
+                    timeout=120.0,
+                    traffic=policy_for(llm_config),
+                )
+                break
+            except (httpx.HTTPStatusError, DifyWorkflowError) as e:
+                error_text = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+                if attempt == 0 and is_file_missing_error(error_text):
+                    # 缓存的文件已被 Dify 清理：使缓存失效后重新上传再试一次
+                    logger.warning(f"Dify 上传文件已失效，重新上传: file_id={file_id}, 错误: {error_text[:200]}")
+                    await asyncio.to_thread(
+                        dify_file_cache.invalidate, llm_config.endpoint, file_hash
+                    )
+                    continue
                 return {
                     "success": False,
-                    "error_message": f"工作流调用失败: {workflow_response.text}",
+                    "error_message": f"工作流调用失败: {error_text}",
                 }
-            
-            workflow_result = workflow_response.json()
-            
-            # 解析工作流输出
-            output_data = workflow_result.get("data", {}).get("outputs", {})
-            
-            return {
-                "success": True,
-                "data": {
-                    "prompt_suggestion": output_data.get("prompt_suggestion", ""),
-                    "extracted_data": output_data.get("extracted_data", {}),
-                    "field_status": output_data.get("field_status", []),
-                    "warnings": output_data.get("warnings", []),
-                    "trace_id": workflow_result.get("id"),
-                },
-            }
-            
+        
+        # 解析工作流输出
+        output_data = workflow_result.get("data", {}).get("outputs", {})
+        
+        return {
+            "success": True,
+            "data": {
+                "prompt_suggestion": output_data.get("prompt_suggestion", ""),
+                "extracted_data": output_data.get("extracted_data", {}),
+                "field_status": output_data.get("field_status", []),
+                "warnings": output_data.get("warnings", []),
+                "trace_id": workflow_result.get("id"),
+            },
+        }
+        
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Dify API调用失败: {str(e)}", exc_info=True)
         return {
             "success": False,
             "error_message": str(e),
         }
-
-
-async def _call_dify_workflow_with_pdf(
-    llm_config: LLMConfig,
-    pdf_path: Path,
-    inputs: dict,
-) -> dict:
-    """调用Dify工作流（PDF文件）"""
-    # PDF处理：简化实现，实际应该转换为图片或使用文档解析节点
-    # 这里返回一个占位实现
-    return {
-        "success": False,
-        "error_message": "PDF文件处理功能待实现，请先使用图片文件",
-    }
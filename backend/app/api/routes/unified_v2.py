@@ -6,9 +6,10 @@
 import time
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select, func
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps import SessionDep, CurrentUser
+from app.api.deps import AsyncSessionDep, CurrentUser
 from app.models import UnifiedRequest, UnifiedResponse
 from app.utils import (
     create_unified_success_response, create_unified_error_response, 
@@ -24,7 +25,7 @@ router = APIRouter(prefix="/unified-v2", tags=["unified-v2"])
 @router.post("/api", response_model=UnifiedResponse)
 async def unified_api_endpoint(
     request: UnifiedRequest,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: CurrentUser | None = None
 ) -> dict[str, Any]:
     """
@@ -84,7 +85,7 @@ async def unified_api_endpoint(
 
 async def _handle_user_operations(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser | None,
     start_time: float
 ) -> dict[str, Any]:
@@ -117,7 +118,7 @@ async def _handle_user_operations(
 
 async def _handle_item_operations(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser,
     start_time: float
 ) -> dict[str, Any]:
@@ -147,7 +148,7 @@ async def _handle_item_operations(
 # 用户操作处理函数
 async def _handle_user_login(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     start_time: float
 ) -> dict[str, Any]:
     """处理用户登录"""
@@ -165,7 +166,7 @@ async def _handle_user_login(
             duration=(time.time() - start_time) * 1000
         )
     
-    user = crud.authenticate(session=session, email=email, password=password)
+    user = await crud.aauthenticate(session=session, email=email, password=password)
     if not user:
         return create_unified_error_response(
             message="邮箱或密码错误",
@@ -212,7 +213,7 @@ async def _handle_user_login(
 
 async def _handle_user_register(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     start_time: float
 ) -> dict[str, Any]:
     """处理用户注册"""
@@ -232,7 +233,7 @@ async def _handle_user_register(
         )
     
     # 检查用户是否已存在
-    existing_user = crud.get_user_by_email(session=session, email=email)
+    existing_user = await crud.aget_user_by_email(session=session, email=email)
     if existing_user:
         return create_unified_error_response(
             message="用户已存在",
@@ -248,7 +249,7 @@ async def _handle_user_register(
         full_name=full_name
     )
     
-    user = crud.create_user(session=session, user_create=user_create)
+    user = await crud.acreate_user(session=session, user_create=user_create)
     
     user_data = {
         "id": str(user.id),
@@ -268,7 +269,7 @@ async def _handle_user_register(
 
 async def _handle_user_list(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     start_time: float
 ) -> dict[str, Any]:
     """处理用户列表查询"""
@@ -295,7 +296,7 @@ async def _handle_user_list(
     
     # 获取总数
     count_query = select(func.count()).select_from(query.subquery())
-    total_count = session.exec(count_query).one()
+    total_count = (await session.exec(count_query)).one()
     
     # 应用分页
     skip = (page - 1) * limit
@@ -310,7 +311,7 @@ async def _handle_user_list(
                 else:
                     query = query.order_by(getattr(User, field))
     
-    users = session.exec(query).all()
+    users = (await session.exec(query)).all()
     
     # 转换为字典格式
     users_data = [
@@ -338,7 +339,7 @@ async def _handle_user_list(
 # 项目操作处理函数
 async def _handle_item_create(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser,
     start_time: float
 ) -> dict[str, Any]:
@@ -364,8 +365,8 @@ async def _handle_item_create(
     
     item = Item.model_validate(item_create, update={"owner_id": current_user.id})
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await session.commit()
+    await session.refresh(item)
     
     item_data = {
         "id": str(item.id),
@@ -384,7 +385,7 @@ async def _handle_item_create(
 
 async def _handle_item_read(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser,
     start_time: float
 ) -> dict[str, Any]:
@@ -402,7 +403,7 @@ async def _handle_item_read(
             duration=(time.time() - start_time) * 1000
         )
     
-    item = session.get(Item, item_id)
+    item = await session.get(Item, item_id)
     if not item:
         return create_unified_error_response(
             message="项目不存在",
@@ -436,7 +437,7 @@ async def _handle_item_read(
 
 async def _handle_item_update(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser,
     start_time: float
 ) -> dict[str, Any]:
@@ -456,7 +457,7 @@ async def _handle_item_update(
             duration=(time.time() - start_time) * 1000
         )
     
-    item = session.get(Item, item_id)
+    item = await session.get(Item, item_id)
     if not item:
         return create_unified_error_response(
             message="项目不存在",
@@ -480,8 +481,8 @@ async def _handle_item_update(
         item.description = description
     
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await session.commit()
+    await session.refresh(item)
     
     item_data = {
         "id": str(item.id),
@@ -500,7 +501,7 @@ async def _handle_item_update(
 
 async def _handle_item_delete(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser,
     start_time: float
 ) -> dict[str, Any]:
@@ -518,7 +519,7 @@ async def _handle_item_delete(
             duration=(time.time() - start_time) * 1000
         )
     
-    item = session.get(Item, item_id)
+    item = await session.get(Item, item_id)
     if not item:
         return create_unified_error_response(
             message="项目不存在",
@@ -535,8 +536,8 @@ async def _handle_item_delete(
             duration=(time.time() - start_time) * 1000
         )
     
-    session.delete(item)
-    session.commit()
+    await session.delete(item)
+    await session.commit()
     
     return create_unified_success_response(
         message="项目删除成功",
@@ -547,7 +548,7 @@ async def _handle_item_delete(
 
 async def _handle_item_list(
     request_data: dict[str, Any], 
-    session: Session, 
+    session: AsyncSession, 
     current_user: CurrentUser,
     start_time: float
 ) -> dict[str, Any]:
@@ -576,7 +577,7 @@ async def _handle_item_list(
     
     # 获取总数
     count_query = select(func.count()).select_from(query.subquery())
-    total_count = session.exec(count_query).one()
+    total_count = (await session.exec(count_query)).one()
     
     # 应用分页
     skip = (page - 1) * limit
@@ -591,7 +592,7 @@ async def _handle_item_list(
                 else:
                     query = query.order_by(getattr(Item, field))
     
-    items = session.exec(query).all()
+    items = (await session.exec(query)).all()
     
     # 转换为字典格式
     items_data = [
@@ -0,0 +1,696 @@
+"""
+向量化套料匹配引擎
+
+与 direct_matching / self_matching / two_sided_matching / failde_matching 输入输出一致，
+将逐钢卷 iterrows、逐订单、逐倍数 k（以及双订单组合、宽度方向）的 Python 循环
+改为按 订单 × 钢卷（× 组合）计算利用率矩阵，用数组运算选出最佳匹配：
+
+- 各匹配规则（阈值、严格大于时才替换、遍历顺序决定的并列取舍）与原函数保持一致
+- 原函数中钢卷长度判断使用的是匹配开始时的快照（两两匹配除外），此处同样如此
+- 只对最终匹配成功的订单逐条生成结果行，循环规模从 钢卷 × 订单 × k 降为 匹配数
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# 单次参与矩阵运算的订单数（控制 订单 × 钢卷 矩阵的内存占用）
+ORDER_CHUNK_SIZE = 2048
+
+
+# ==================== 公共工具 ====================
+
+def _process_strings(process_column: pd.Series) -> list:
+    """工艺列转字符串（NaN 视为空字符串），与原函数逐行处理方式一致"""
+    return ["" if pd.isna(value) else str(value) for value in process_column]
+
+
+def _brushed_mask(processes: list) -> np.ndarray:
+    """是否包含拉丝工艺（拉丝订单长宽不可调换）"""
+    return np.array(['Brushed' in process for process in processes], dtype=bool)
+
+
+def _as_float(values) -> np.ndarray:
+    return np.asarray(values, dtype=float)
+
+
+def _order_chunks(order_count: int):
+    for start in range(0, order_count, ORDER_CHUNK_SIZE):
+        yield slice(start, min(start + ORDER_CHUNK_SIZE, order_count))
+
+
+def _ratio(k: np.ndarray, order_w: np.ndarray, coil_w: np.ndarray) -> np.ndarray:
+    """宽度比 k * 订单宽度 / 钢卷宽度（运算顺序与原函数相同，保证浮点结果一致）"""
+    return k * order_w / coil_w
+
+
+def _multiplier_range(order_w: np.ndarray, coil_w: np.ndarray):
+    """
+    计算满足 0.95 < k * w / W < 1 且 1 <= k <= int(W / w) 的倍数区间 [lo, hi]
+
+    宽度比随 k 单调递增，因此合法倍数是连续区间；先按公式估计边界，
+    再用与原函数相同的表达式在估计值附近校验，避免浮点误差导致边界偏移。
+
+    Args:
+        order_w: 订单宽度，形状 (n, 1)
+        coil_w: 钢卷宽度，形状 (1, m)
+
+    Returns:
+        (lo, hi, non_empty)，形状均为 (n, m)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        positive = (order_w > 0) & (coil_w > 0)
+        safe_w = np.where(positive, order_w, 1.0)
+        k_max = np.where(positive, np.floor(coil_w / safe_w), 0.0)
+
+        # 下界：最小的 k 使宽度比 > 0.95
+        estimate = np.floor(0.95 * coil_w / safe_w)
+        lo = np.full(np.broadcast(order_w, coil_w).shape, np.inf)
+        for offset in (2, 1, 0, -1):
+            k = np.maximum(estimate + offset, 1.0)
+            lo = np.where(_ratio(k, safe_w, coil_w) > 0.95, np.minimum(lo, k), lo)
+
+        # 上界：不超过 k_max 的最大 k 使宽度比 < 1
+        hi = np.zeros_like(lo)
+        for offset in (1, 0):
+            k = k_max - offset
+            hi = np.where((k >= 1) & (_ratio(k, safe_w, coil_w) < 1), np.maximum(hi, k), hi)
+
+    non_empty = positive & (lo <= hi)
+    return lo, hi, non_empty
+
+
+def _best_multiplier_scan(lo, hi, eligible, best_k, best_coil, best_pass, pass_no):
+    """
+    按钢卷顺序模拟原函数的逐卷扫描：某钢卷存在比当前 best_k 更大的合法倍数时，
+    取该卷中第一个大于 best_k 的倍数（即 max(lo, best_k + 1)）
+    """
+    for coil_pos in range(lo.shape[1]):
+        take = eligible[:, coil_pos] & (hi[:, coil_pos] > best_k)
+        if not take.any():
+            continue
+        candidate = np.maximum(lo[:, coil_pos], best_k + 1)
+        best_k = np.where(take, candidate, best_k)
+        best_coil = np.where(take, coil_pos, best_coil)
+        best_pass = np.where(take, pass_no, best_pass)
+    return best_k, best_coil, best_pass
+
+
+def _subtract_lengths(MaterialInformation: pd.DataFrame, labels: list, amounts: list, clip: bool = False):
+    """按顺序扣减钢卷长度（等价于逐条 MaterialInformation.loc[label, 'Length'] -= amount）"""
+    for label, amount in zip(labels, amounts, strict=True):
+        MaterialInformation.loc[label, 'Length'] -= amount
+        if clip and MaterialInformation.loc[label, 'Length'] < 0:
+            MaterialInformation.loc[label, 'Length'] = 0
+
+
+# ==================== 直接匹配 ====================
+
+def vectorized_direct_matching(MaterialInformation, Orders):
+    """
+    直接匹配（宽度利用率100%），与 DirectMatching 输入输出一致
+
+    对每个订单取第一条宽度相等且（快照）长度足够的钢卷；
+    非拉丝订单宽度不匹配而长度匹配时交换订单长宽（与原函数相同，交换发生在查找钢卷之前）。
+    """
+    DirectFinalTable = pd.DataFrame()  # 套料数据
+    DirectUtilizationTable = pd.DataFrame()  # 材料利用率数据
+
+    SteelRollData = MaterialInformation[MaterialInformation['Material'] == '钢卷']
+    coil_w = _as_float(SteelRollData['Width'])
+    coil_l = _as_float(SteelRollData['Length'])
+
+    order_w = _as_float(Orders['Width'])
+    order_l = _as_float(Orders['Length'])
+    order_len = _as_float(Orders['Length'] * Orders['Quantity'])  # 订单总长度
+    brushed = _brushed_mask(_process_strings(Orders['ProcessOrder']))
+
+    width_hit = np.isin(order_w, coil_w)
+    length_hit = np.isin(order_l, coil_w)
+    swapped = ~brushed & ~width_hit & length_hit  # 以订单长度作为宽度
+    target_w = np.where(swapped, order_l, order_w)
+
+    matched_coil = np.full(len(Orders), -1)
+    for chunk in _order_chunks(len(Orders)):
+        fits = (coil_w[None, :] == target_w[chunk, None]) & (coil_l[None, :] >= order_len[chunk, None])
+        first = fits.argmax(axis=1)
+        matched_coil[chunk] = np.where(fits.any(axis=1), first, -1)
+
+    if swapped.any():
+        swap_labels = Orders.index[swapped]
+        widths = Orders.loc[swap_labels, 'Width'].copy()
+        Orders.loc[swap_labels, 'Width'] = Orders.loc[swap_labels, 'Length']
+        Orders.loc[swap_labels, 'Length'] = widths
+
+    matched = matched_coil >= 0
+    Rows = list(Orders.index[matched])  # 匹配成功的订单序号
+    coil_labels = list(SteelRollData.index[matched_coil[matched]])
+    Identifiers = list(SteelRollData['Identifier'].to_numpy()[matched_coil[matched]])
+    _subtract_lengths(MaterialInformation, coil_labels, list(order_len[matched]))
+
+    RightOrders = Orders.loc[Rows].copy()  # 直接匹配成功的订单
+    RightOrders['SteelRollIdentifier'] = Identifiers
+    RemainOrders = Orders.drop(Rows).reset_index(drop=True)  # 剩余待分类订单
+
+    # 构建FinalTable
+    if not RightOrders.empty:
+        DirectFinalTable = RightOrders[['SteelRollIdentifier', 'NO', 'docDate', 'Quantity', 'deliveryDate', 'materialCode',
+                                        'ProcessOrder',
+                                        'Width', 'Length', 'Width', 'Thickness']].copy()
+        DirectFinalTable['UsedLength'] = DirectFinalTable['Length'] * DirectFinalTable['Quantity']
+        DirectFinalTable['MatchMultiplier'] = 1  # 匹配倍数标识
+        DirectFinalTable.columns = ['SteelRollIdentifier', 'docNo', 'docDate', 'UsedQuantity', 'deliveryDate', 'materialCode',
+                                    'surfaceDescCombination',
+                                    'SteelWidth', 'Length', 'Width', 'Thickness', 'UsedLength', 'MatchMultiplier']
+        DirectFinalTable['dimensionsDesc'] = (
+                DirectFinalTable['Thickness'].astype(str) + '*' +
+                DirectFinalTable['Length'].astype(str) + '*' +
+                DirectFinalTable['SteelWidth'].astype(str)
+        )
+    # 构建 UtilizationTable
+    if not RightOrders.empty:
+        DirectUtilizationTable = RightOrders[['Width', 'NO']].copy()
+        DirectUtilizationTable['UsedLength'] = RightOrders['Length'] * RightOrders['Quantity']
+        DirectUtilizationTable['UsedWidth'] = DirectUtilizationTable['Width']
+        DirectUtilizationTable['MaterialUtilization'] = 100.0
+        DirectUtilizationTable.columns = ['SteelWidth', 'OrderSequence', 'UsedLength', 'UsedWidth',
+                                          'MaterialUtilization']
+
+    return RemainOrders, DirectFinalTable, DirectUtilizationTable, MaterialInformation
+
+
+# ==================== 单订单多倍数匹配 ====================
+
+def vectorized_self_matching(MaterialInformation, RemainOrders):
+    """
+    单订单多倍数匹配（宽度利用率 95%~100%），与 self_matching 输入输出一致
+
+    按 订单 × 钢卷 计算合法倍数区间，再按钢卷顺序（非拉丝订单先宽后长两个方向）
+    向量化地模拟原函数"取更大倍数"的扫描过程。
+    """
+    SelfFinalTable = pd.DataFrame()
+    utilization_data = []
+    matched_orders_data = []
+
+    SteelRollData = MaterialInformation[MaterialInformation['Material'] == '钢卷']
+    coil_w = _as_float(SteelRollData['Width'])
+    coil_l = _as_float(SteelRollData['Length'])
+
+    processes = _process_strings(RemainOrders['ProcessOrder'])
+    brushed = _brushed_mask(processes)
+    order_w = _as_float(RemainOrders['Width'])
+    order_l = _as_float(RemainOrders['Length'])
+    # 两个方向：'w' 以宽度排布，'l' 以长度排布（仅非拉丝订单）
+    passes = [
+        (order_w, _as_float(RemainOrders['Length'] * RemainOrders['Quantity']), np.ones(len(RemainOrders), dtype=bool)),
+        (order_l, _as_float(RemainOrders['Width'] * RemainOrders['Quantity']), ~brushed),
+    ]
+
+    best_k = np.zeros(len(RemainOrders))
+    best_coil = np.full(len(RemainOrders), -1)
+    best_pass = np.full(len(RemainOrders), -1)
+    for chunk in _order_chunks(len(RemainOrders)):
+        k, coil, pass_idx = best_k[chunk], best_coil[chunk], best_pass[chunk]
+        for pass_no, (width, need, active) in enumerate(passes):
+            lo, hi, non_empty = _multiplier_range(width[chunk, None], coil_w[None, :])
+            eligible = non_empty & (coil_l[None, :] >= need[chunk, None]) & active[chunk, None]
+            k, coil, pass_idx = _best_multiplier_scan(lo, hi, eligible, k, coil, pass_idx, pass_no)
+        best_k[chunk], best_coil[chunk], best_pass[chunk] = k, coil, pass_idx
+
+    for pos in np.flatnonzero(best_coil >= 0):
+        i = RemainOrders.index[pos]
+        OrderProcess = processes[pos]
+        steel_roll = SteelRollData.iloc[best_coil[pos]]
+        k = int(best_k[pos])
+
+        if brushed[pos]:
+            order_len = RemainOrders.loc[i, 'Length'] * RemainOrders.loc[i, 'Quantity']
+            used_length = math.ceil(RemainOrders.loc[i, 'Quantity'] / k) * RemainOrders.loc[i, 'Length']
+            order_width = RemainOrders.loc[i, 'Width']
+            order_length = RemainOrders.loc[i, 'Length']
+            used_quantity = RemainOrders.loc[i, 'Quantity']
+            steel_width = steel_roll['Width']
+
+            used_width = order_width * k
+            real_area = order_length * order_width * used_quantity
+            used_area = steel_width * used_length
+            material_utilization = 100.0 * real_area / used_area
+
+            if material_utilization > 95:
+                matched_orders_data.append({
+                    'SteelRollIdentifier': steel_roll['Identifier'],
+                    'docNo': RemainOrders.loc[i, 'NO'],
+                    'docDate': RemainOrders.loc[i, 'docDate'],
+                    'UsedQuantity': used_quantity,
+                    'deliveryDate': RemainOrders.loc[i, 'deliveryDate'],
+                    'materialCode': RemainOrders.loc[i, 'materialCode'],
+                    'surfaceDescCombination': OrderProcess,
+                    'SteelWidth': steel_width,
+                    'Length': order_length,
+                    'Width': order_width,
+                    'Thickness': RemainOrders.loc[i, 'Thickness'],
+                    'UsedLength': used_length,
+                    'MatchMultiplier': k
+                })
+                utilization_data.append({
+                    'SteelWidth': order_width,
+                    'OrderSequence': RemainOrders.loc[i, 'NO'],
+                    'UsedLength': used_length,
+                    'UsedWidth': used_width,
+                    'MaterialUtilization': material_utilization
+                })
+                MaterialInformation.loc[steel_roll.name, 'Length'] -= order_len
+        else:
+            ow1 = RemainOrders.loc[i, 'Width']
+            ow2 = RemainOrders.loc[i, 'Length']
+            order_w_i = ow1 if best_pass[pos] == 0 else ow2
+            order_l_i = ow2 if best_pass[pos] == 0 else ow1
+            order_len = order_l_i * RemainOrders.loc[i, 'Quantity']
+            used_quantity = RemainOrders.loc[i, 'Quantity']
+            steel_width = steel_roll['Width']
+            used_length = math.ceil(used_quantity / k) * order_l_i
+
+            used_width = order_w_i * k
+            real_area = order_l_i * order_w_i * used_quantity
+            used_area = steel_width * used_length
+            material_utilization = 100.0 * real_area / used_area
+
+            if material_utilization > 95:
+                MaterialInformation.loc[steel_roll.name, 'Length'] -= order_len
+                if best_pass[pos] == 1:
+                    # 若调换长宽，更新订单长宽
+                    RemainOrders.loc[i, 'Width'], RemainOrders.loc[i, 'Length'] = order_w_i, order_l_i
+
+                matched_orders_data.append({
+                    'SteelRollIdentifier': steel_roll['Identifier'],
+                    'docNo': RemainOrders.loc[i, 'NO'],
+                    'docDate': RemainOrders.loc[i, 'docDate'],
+                    'UsedQuantity': used_quantity,
+                    'deliveryDate': RemainOrders.loc[i, 'deliveryDate'],
+                    'materialCode': RemainOrders.loc[i, 'materialCode'],
+                    'surfaceDescCombination': OrderProcess,
+                    'SteelWidth': steel_width,
+                    'Length': order_l_i,
+                    'Width': order_w_i,
+                    'Thickness': RemainOrders.loc[i, 'Thickness'],
+                    'UsedLength': used_length,
+                    'MatchMultiplier': k
+                })
+                utilization_data.append({
+                    'SteelWidth': order_w_i,
+                    'OrderSequence': RemainOrders.loc[i, 'NO'],
+                    'UsedLength': used_length,
+                    'UsedWidth': used_width,
+                    'MaterialUtilization': material_utilization
+                })
+
+    SelfOrders = pd.DataFrame(matched_orders_data)
+    if SelfOrders.empty:
+        # 原函数此处会因缺少 docNo 列抛出 KeyError，这里直接返回全部剩余订单
+        r_orders = RemainOrders.reset_index(drop=True)
+    else:
+        matched_ids = SelfOrders['docNo'].unique()
+        r_orders = RemainOrders[~RemainOrders['NO'].isin(matched_ids)].reset_index(drop=True)
+
+    if not SelfOrders.empty:
+        SelfFinalTable = SelfOrders.copy()
+        SelfFinalTable['dimensionsDesc'] = (
+                SelfFinalTable['Thickness'].astype(str) + '*' +
+                SelfFinalTable['Length'].astype(str) + '*' +
+                SelfFinalTable['SteelWidth'].astype(str)
+        )
+
+    SelfUtilizationTable = pd.DataFrame(utilization_data)
+
+    return r_orders, SelfFinalTable, SelfUtilizationTable, MaterialInformation
+
+
+# ==================== 双订单组合匹配 ====================
+
+def _pair_options(orders: pd.DataFrame):
+    """
+    每个订单的两种排布方向：0 = (宽, 长)，1 = (长, 宽)；拉丝订单只有方向 0
+
+    Returns:
+        widths, lengths: 形状 (n, 2)；active: 形状 (n, 2)
+    """
+    brushed = _brushed_mask(_process_strings(orders['ProcessOrder']))
+    width = _as_float(orders['Width'])
+    length = _as_float(orders['Length'])
+    widths = np.stack([width, length], axis=1)
+    lengths = np.stack([length, width], axis=1)
+    active = np.stack([np.ones(len(orders), dtype=bool), ~brushed], axis=1)
+    return widths, lengths, active
+
+
+def vectorized_two_sided_matching(MaterialInformation, classifiedOrder):
+    """
+    双订单组合匹配（宽度利用率 90%~100%），与 two_sided_matching 输入输出一致
+
+    每个类别内按 钢卷 × 订单组合 × 宽度方向 计算面积利用率，
+    取第一个达到最大值（且大于 90%）的组合；类别之间按顺序实时扣减钢卷长度。
+    """
+    PairFinalTable = pd.DataFrame()
+    PairUtilizationTable = pd.DataFrame()
+    best_matches_data = []
+    matched_order_ids = set()
+
+    SteelRollData = MaterialInformation[MaterialInformation['Material'] == '钢卷'].copy()
+    if SteelRollData.empty:
+        print("无钢卷数据，直接返回所有订单为未匹配")
+        return classifiedOrder, pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), MaterialInformation
+
+    coil_w = _as_float(SteelRollData['Width'])
+    ClassifyTotal = classifiedOrder['Classify'].nunique()
+
+    for classIdx in range(1, ClassifyTotal + 1):
+        current_orders = classifiedOrder[classifiedOrder['Classify'] == classIdx].copy()
+        current_orders = current_orders[
+            current_orders['Quantity'].notna() & (current_orders['Quantity'] > 0)
+            ].reset_index(drop=True)
+        order_count = len(current_orders)
+        if order_count < 2:
+            continue
+
+        first, second = np.triu_indices(order_count, k=1)  # 与 itertools.combinations 顺序一致
+        widths, lengths, active = _pair_options(current_orders)
+        quantity = _as_float(current_orders['Quantity'])
+        coil_remaining = _as_float(SteelRollData['Length'])  # 当前类别开始时的剩余长度
+
+        # 组合 × 方向1 × 方向2，展开顺序与原函数 w1、w2 双层循环一致
+        w1 = widths[first][:, :, None]
+        len1 = lengths[first][:, :, None]
+        w2 = widths[second][:, None, :]
+        len2 = lengths[second][:, None, :]
+        q1 = quantity[first][:, None, None]
+        q2 = quantity[second][:, None, None]
+        valid_option = active[first][:, :, None] & active[second][:, None, :]
+
+        total_width = w1 + w2
+        used_length = np.maximum(len1 * q1, len2 * q2)
+        real_area = (w1 * len1 * q1) + (w2 * len2 * q2)
+
+        best_ratio = 0.90
+        best = None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for coil_pos, steel_width in enumerate(coil_w):
+                width_ratio = total_width / steel_width if steel_width != 0 else np.zeros_like(total_width)
+                steel_used_area = steel_width * used_length
+                total_ratio = np.where(steel_used_area != 0, real_area / steel_used_area, 0.0)
+                feasible = (
+                    valid_option
+                    & (width_ratio > 0.90) & (width_ratio <= 1.0)
+                    & (coil_remaining[coil_pos] >= used_length)
+                )
+                scores = np.where(feasible, total_ratio, -np.inf).ravel()
+                flat = int(scores.argmax())
+                if scores[flat] > best_ratio:
+                    best_ratio = scores[flat]
+                    best = (coil_pos, flat)
+
+        if best is None:
+            continue
+
+        coil_pos, flat = best
+        combo, a, b = np.unravel_index(flat, (len(first), 2, 2))
+        order1 = current_orders.iloc[first[combo]]
+        order2 = current_orders.iloc[second[combo]]
+        steel_idx = SteelRollData.index[coil_pos]
+        steel_roll = SteelRollData.loc[steel_idx]
+        steel_id = steel_roll['Identifier']
+        w1_best = order1['Width'] if a == 0 else order1['Length']
+        w2_best = order2['Width'] if b == 0 else order2['Length']
+        len1_best = order1['Length'] if w1_best == order1['Width'] else order1['Width']
+        len2_best = order2['Length'] if w2_best == order2['Width'] else order2['Width']
+        best_used_length = max(len1_best * order1['Quantity'], len2_best * order2['Quantity'])
+
+        # 1. 实时扣减钢卷长度
+        SteelRollData.loc[steel_idx, 'Length'] -= best_used_length
+        if SteelRollData.loc[steel_idx, 'Length'] < 0:
+            SteelRollData.loc[steel_idx, 'Length'] = 0
+
+        # 2. 记录匹配成功的订单
+        pairs = []
+        for order, w, length in ((order1, w1_best, len1_best), (order2, w2_best, len2_best)):
+            pairs.append({
+                'SteelRollIdentifier': steel_id,
+                'docNo': order['itemSeq'],
+                'docDate': order['docDate'],
+                'UsedQuantity': order['Quantity'],
+                'deliveryDate': order['deliveryDate'],
+                'materialCode': order['materialCode'],
+                'surfaceDescCombination': order['ProcessOrder'],
+                'SteelWidth': steel_roll['Width'],
+                'Length': length,
+                'Width': w,
+                'Thickness': order['Thickness'],
+                'UsedLength': best_used_length,
+                'MatchMultiplier': 1
+            })
+        PairFinalTable = pd.concat([PairFinalTable, pd.DataFrame(pairs)], ignore_index=True)
+
+        # 3. 利用率
+        total_used_width = w1_best * order1['Quantity'] + w2_best * order2['Quantity']
+        util_row = {
+            'SteelWidth': steel_roll['Width'],
+            'OrderSequence': f"{order1['itemSeq']}, {order2['itemSeq']}",
+            'UsedLength': best_used_length,
+            'UsedWidth': total_used_width,
+            'MaterialUtilization': round(best_ratio * 100, 2)
+        }
+        PairUtilizationTable = pd.concat([PairUtilizationTable, pd.DataFrame([util_row])], ignore_index=True)
+
+        # 4. 最佳匹配信息
+        best_matches_data.append({
+            'Classify': classIdx,
+            'CombinationOrders': f"{order1['itemSeq']}, {order2['itemSeq']}",
+            'SteelRollIdentifier': steel_id,
+            'SteelWidth': steel_roll['Width'],
+            'TotalWidth': total_used_width,
+            'UsedLength': best_used_length,
+            'MaterialUtilization': round(best_ratio * 100, 2),
+            'IsMatched': True
+        })
+
+        # 5. 标记已匹配订单
+        matched_order_ids.add(order1['itemSeq'])
+        matched_order_ids.add(order2['itemSeq'])
+
+    FailedOrders = classifiedOrder[~classifiedOrder['itemSeq'].isin(matched_order_ids)].reset_index(drop=True)
+    BestMatches = pd.DataFrame(best_matches_data)
+
+    MaterialInformation_updated = MaterialInformation.copy()
+    steel_index = SteelRollData.index.intersection(MaterialInformation_updated.index)
+    MaterialInformation_updated.loc[steel_index, 'Length'] = SteelRollData.loc[steel_index, 'Length']
+
+    return FailedOrders, BestMatches, PairFinalTable, PairUtilizationTable, MaterialInformation_updated
+
+
+# ==================== 失败订单匹配 ====================
+
+def _order_key(order: pd.Series):
+    return order['itemSeq'] if 'itemSeq' in order.index else order['NO']
+
+
+def vectorized_failed_matching(MaterialInformation_failed, FailedOrders):
+    """
+    失败订单匹配（无利用率阈值，取最高利用率），与 Failed_matching 输入输出一致
+
+    - 数量 > 1：利用率只取决于 ceil(数量 / k)，每卷的最优值在 k = int(钢卷宽 / 订单宽) 处取得，
+      按 订单 × 钢卷 矩阵取第一个最大值，再对选中钢卷求第一个达到该值的 k
+    - 数量 = 1：每个组合只保留其最优候选（贪心选择时同一组合的其余候选必然被跳过），
+      再按利用率降序、原遍历顺序升序贪心选择不重叠组合
+    """
+    matched_orders_data = []
+    utilization_data = []
+
+    MaterialInformation = MaterialInformation_failed.copy()
+    Orders = FailedOrders.copy()
+
+    SteelRollData = MaterialInformation[MaterialInformation['Material'] == '钢卷'].copy()
+    if SteelRollData.empty:
+        return pd.DataFrame(), pd.DataFrame(), MaterialInformation
+
+    coil_w = _as_float(SteelRollData['Width'])
+    coil_l = _as_float(SteelRollData['Length'])
+
+    single_orders = Orders[Orders['Quantity'] == 1].copy().reset_index(drop=True)
+    multi_orders = Orders[Orders['Quantity'] > 1].copy().reset_index(drop=True)
+
+    # ---------- 数量大于1的订单 ----------
+    if not multi_orders.empty:
+        processes = _process_strings(multi_orders['ProcessOrder'])
+        order_q = _as_float(multi_orders['Quantity'])
+        widths, lengths, active = _pair_options(multi_orders)
+
+        scores = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for orientation in (0, 1):
+                w = widths[:, orientation][:, None]
+                length = lengths[:, orientation][:, None]
+                q = order_q[:, None]
+                positive = w > 0
+                k_max = np.where(positive, np.floor(coil_w[None, :] / np.where(positive, w, 1.0)), 0.0)
+                used_length = np.ceil(q / np.maximum(k_max, 1.0)) * length
+                real_area = w * length * q
+                used_area = coil_w[None, :] * used_length
+                utilization = np.where(used_area != 0, real_area / used_area, 0.0)
+                feasible = (k_max >= 1) & (coil_l[None, :] >= length * q) & active[:, orientation][:, None]
+                scores.append(np.where(feasible, utilization, -np.inf))
+        scores = np.concatenate(scores, axis=1)  # 列顺序：方向 'w' 的全部钢卷，再方向 'l'
+        best_col = scores.argmax(axis=1)
+        best_utilization = scores[np.arange(len(multi_orders)), best_col]
+
+        for i in np.flatnonzero(best_utilization > 0):
+            orientation, coil_pos = divmod(int(best_col[i]), len(coil_w))
+            best_steel = SteelRollData.iloc[coil_pos]
+            if orientation == 0:
+                best_order_w = multi_orders.loc[i, 'Width']
+                best_order_l = multi_orders.loc[i, 'Length']
+            else:
+                best_order_w = multi_orders.loc[i, 'Length']
+                best_order_l = multi_orders.loc[i, 'Width']
+            order_q_i = multi_orders.loc[i, 'Quantity']
+
+            # 在选中钢卷上找第一个达到最高利用率的倍数（与原函数逐 k 比较的结果一致）
+            best_k, best_value = 0, -1
+            real_area = best_order_w * best_order_l * order_q_i
+            for k in range(1, int(best_steel['Width'] / best_order_w) + 1):
+                used_area = best_steel['Width'] * (math.ceil(order_q_i / k) * best_order_l)
+                utilization = real_area / used_area if used_area != 0 else 0
+                if utilization > best_value:
+                    best_k, best_value = k, utilization
+
+            used_length = math.ceil(multi_orders.loc[i, 'Quantity'] / best_k) * best_order_l
+            MaterialInformation.loc[best_steel.name, 'Length'] -= used_length
+            if MaterialInformation.loc[best_steel.name, 'Length'] < 0:
+                MaterialInformation.loc[best_steel.name, 'Length'] = 0
+
+            order_no = multi_orders.loc[i, 'itemSeq'] if 'itemSeq' in multi_orders.columns else multi_orders.loc[i, 'NO']
+            matched_orders_data.append({
+                'SteelRollIdentifier': best_steel['Identifier'],
+                'docNo': order_no,
+                'docDate': multi_orders.loc[i, 'docDate'],
+                'UsedQuantity': multi_orders.loc[i, 'Quantity'],
+                'deliveryDate': multi_orders.loc[i, 'deliveryDate'],
+                'materialCode': multi_orders.loc[i, 'materialCode'],
+                'surfaceDescCombination': processes[i],
+                'SteelWidth': best_steel['Width'],
+                'Length': best_order_l,
+                'Width': best_order_w,
+                'Thickness': multi_orders.loc[i, 'Thickness'],
+                'UsedLength': used_length,
+                'MatchMultiplier': best_k
+            })
+            utilization_data.append({
+                'SteelWidth': best_steel['Width'],
+                'OrderSequence': order_no,
+                'UsedLength': used_length,
+                'UsedWidth': best_order_w * best_k,
+                'MaterialUtilization': round(best_value * 100, 2)
+            })
+
+    # ---------- 数量为1的订单（两两组合） ----------
+    if len(single_orders) >= 2:
+        first, second = np.triu_indices(len(single_orders), k=1)
+        widths, lengths, active = _pair_options(single_orders)
+        w1 = widths[first][:, :, None]
+        len1 = lengths[first][:, :, None]
+        w2 = widths[second][:, None, :]
+        len2 = lengths[second][:, None, :]
+        valid_option = active[first][:, :, None] & active[second][:, None, :]
+        total_width = w1 + w2
+        used_length = np.maximum(len1, len2)
+        real_area = (w1 * len1) + (w2 * len2)
+
+        # 每个组合的最优候选：利用率最高，并列时取原遍历顺序（方向1、方向2、钢卷）最靠前者
+        coil_count = len(coil_w)
+        best_value = np.full(len(first), -np.inf)
+        best_pos = np.full(len(first), np.iinfo(np.int64).max)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for coil_pos in range(coil_count):
+                steel_width, steel_length = coil_w[coil_pos], coil_l[coil_pos]
+                if steel_length <= 0:
+                    continue
+                width_ratio = total_width / steel_width if steel_width != 0 else np.zeros_like(total_width)
+                steel_used_area = steel_width * used_length
+                ratio = np.where(steel_used_area != 0, real_area / steel_used_area, 0.0)
+                feasible = valid_option & (width_ratio <= 1.0) & (steel_length >= used_length)
+                value = np.where(feasible, ratio, -np.inf).reshape(len(first), 4)
+                pos = np.arange(4) * coil_count + coil_pos
+                for option in range(4):
+                    better = (value[:, option] > best_value) | (
+                        (value[:, option] == best_value) & (pos[option] < best_pos) & np.isfinite(value[:, option])
+                    )
+                    best_value = np.where(better, value[:, option], best_value)
+                    best_pos = np.where(better, pos[option], best_pos)
+
+        candidates = np.flatnonzero(np.isfinite(best_value))
+        order_pos = candidates * (4 * coil_count) + best_pos[candidates]
+        ranking = candidates[np.lexsort((order_pos, -best_value[candidates]))]
+
+        matched_indices = set()
+        for combo in ranking:
+            idx1, idx2 = int(first[combo]), int(second[combo])
+            if idx1 in matched_indices or idx2 in matched_indices:
+                continue
+            option, coil_pos = divmod(int(best_pos[combo]), coil_count)
+            a, b = divmod(option, 2)
+            steel = SteelRollData.iloc[coil_pos]
+            steel_idx = SteelRollData.index[coil_pos]
+            order1 = single_orders.iloc[idx1]
+            order2 = single_orders.iloc[idx2]
+            cw1 = order1['Width'] if a == 0 else order1['Length']
+            cw2 = order2['Width'] if b == 0 else order2['Length']
+            clen1 = order1['Length'] if cw1 == order1['Width'] else order1['Width']
+            clen2 = order2['Length'] if cw2 == order2['Width'] else order2['Width']
+            combo_used_length = max(clen1, clen2)
+            real = (cw1 * clen1) + (cw2 * clen2)
+            steel_used_area = steel['Width'] * combo_used_length
+            utilization = real / steel_used_area if steel_used_area != 0 else 0
+
+            MaterialInformation.loc[steel_idx, 'Length'] -= combo_used_length
+            if MaterialInformation.loc[steel_idx, 'Length'] < 0:
+                MaterialInformation.loc[steel_idx, 'Length'] = 0
+
+            for order, w, length in ((order1, cw1, clen1), (order2, cw2, clen2)):
+                matched_orders_data.append({
+                    'SteelRollIdentifier': steel['Identifier'],
+                    'docNo': _order_key(order),
+                    'docDate': order['docDate'],
+                    'UsedQuantity': 1,
+                    'deliveryDate': order['deliveryDate'],
+                    'materialCode': order['materialCode'],
+                    'surfaceDescCombination': order['ProcessOrder'],
+                    'SteelWidth': steel['Width'],
+                    'Length': length,
+                    'Width': w,
+                    'Thickness': order['Thickness'],
+                    'UsedLength': combo_used_length,
+                    'MatchMultiplier': 1
+                })
+            utilization_data.append({
+                'SteelWidth': steel['Width'],
+                'OrderSequence': f"{_order_key(order1)}, {_order_key(order2)}",
+                'UsedLength': combo_used_length,
+                'UsedWidth': cw1 + cw2,
+                'MaterialUtilization': round(utilization * 100, 2)
+            })
+
+            matched_indices.add(idx1)
+            matched_indices.add(idx2)
+            if len(matched_indices) >= len(single_orders) - 1:
+                break
+
+    FailedTable = pd.DataFrame(matched_orders_data)
+    FailedUtilizationTable = pd.DataFrame(utilization_data)
+
+    if not FailedTable.empty:
+        FailedTable['dimensionsDesc'] = (
+                FailedTable['Thickness'].astype(str) + '*' +
+                FailedTable['Length'].astype(str) + '*' +
+                FailedTable['SteelWidth'].astype(str)
+        )
+
+    return FailedTable, FailedUtilizationTable, MaterialInformation
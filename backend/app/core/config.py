@@ -72,6 +72,75 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str = ""
     REDIS_DB: int = 0
     
+    # 识别任务后台工作池配置
+    RECOGNITION_WORKER_ENABLED: bool = True  # 是否在应用进程内启动识别工作池
+    RECOGNITION_WORKER_CONCURRENCY: int = 4  # 同时执行的识别任务数（全局）
+    RECOGNITION_WORKER_PER_CONFIG_LIMIT: int = 2  # 单个 LLMConfig 默认并发上限（llm_config.max_concurrency 为空时使用）
+    RECOGNITION_WORKER_POLL_INTERVAL: float = 2.0  # 空闲时轮询间隔（秒）
+    RECOGNITION_WORKER_HEARTBEAT_INTERVAL: float = 30.0  # 运行中任务的心跳间隔（秒），同时按该间隔检查中断任务
+    RECOGNITION_WORKER_STALE_SECONDS: int = 120  # processing 任务心跳超过该时长未更新视为中断，重新入队
+    RECOGNITION_WORKER_MAX_ATTEMPTS: int = 3  # 同一任务最多领取执行的次数，达到后再次中断时标记为失败、不再入队
+    RECOGNITION_RESULT_CACHE_ENABLED: bool = True  # 相同文件/模板版本/Schema/模型配置/提示词的识别结果直接复用，不再调用 Dify
+
+    # Dify HTTP 客户端连接池配置（每个 endpoint 一个共享客户端）
+    DIFY_HTTP_MAX_CONNECTIONS: int = 100  # 单个 endpoint 最大连接数
+    DIFY_HTTP_MAX_KEEPALIVE: int = 20  # 单个 endpoint 最大空闲保持连接数
+    DIFY_HTTP_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保持时长（秒）
+    DIFY_HTTP_PER_ENDPOINT_CONCURRENCY: int = 64  # 单个后端同时进行的请求数上限（llm_config.max_concurrency 为空时使用）
+    # Dify 调用流量控制（令牌桶限速见 llm_config.rate_limit_per_minute，重试次数见 llm_config.max_retries）
+    DIFY_RETRY_BASE_DELAY: float = 0.5  # 重试退避基数（秒），第 n 次重试等待 [0, base * 2^n] 内的随机时间
+    DIFY_RETRY_MAX_DELAY: float = 20.0  # 单次重试等待上限（秒），也限制 Retry-After
+    DIFY_CIRCUIT_FAILURE_THRESHOLD: int = 5  # 连续失败（5xx/连接失败/超时）多少次后熔断
+    DIFY_CIRCUIT_OPEN_SECONDS: float = 30.0  # 熔断持续时间（秒），之后放行一个探测请求
+    DIFY_ADAPTIVE_LATENCY_TOLERANCE: float = 2.0  # 响应时间超过基线的倍数时下调并发上限
+    DIFY_HTTP_ENABLE_HTTP2: bool = True  # 安装了 h2 时启用 HTTP/2
+    DIFY_RESPONSE_MODE: str = "streaming"  # 工作流调用模式：streaming（SSE 事件流）/blocking
+    DIFY_FILE_UPLOAD_TTL_SECONDS: int = 86400  # 已上传文件ID的复用时长（秒），不超过 Dify 上传文件的保留时间
+
+    # 套料任务进程池配置
+    NESTING_JOB_WORKERS: int = 2  # 同时执行的套料计算进程数
+    NESTING_JOB_WAIT_SECONDS: float = 240.0  # create 操作同步等待结果的最长时间（秒），超时返回任务ID
+    NESTING_JOB_HEARTBEAT_INTERVAL: float = 30.0  # 本进程任务的心跳间隔（秒），同时按该间隔检查中断任务
+    NESTING_JOB_STALE_SECONDS: int = 120  # pending/running 任务心跳超过该时长未更新视为中断，标记为失败
+
+    # 统计看板配置
+    STATISTICS_CACHE_TTL_SECONDS: float = 30.0  # 概览/趋势查询结果的进程内缓存时长（秒）
+
+    # 权限配置
+    PERMISSION_SCOPE_TTL_SECONDS: float = 300.0  # 用户关联公司集合的进程内缓存时长（秒），本进程修改关联时立即失效
+
+    # Schema 校验配置
+    SCHEMA_REGISTRY_TTL_SECONDS: float = 60.0  # 已编译 Schema 校验器复核版本的间隔（秒），其他进程修改 Schema 后最迟在此时间后生效
+
+    # 文件上传配置
+    UPLOAD_MAX_FILE_SIZE_MB: int = 50  # 单个票据文件大小上限（MB），上传按块流式写盘，内存占用与文件大小无关
+    UPLOAD_BATCH_MAX_FILES: int = 500  # 批量上传单次最多文件数（含 zip 中的文件）
+    UPLOAD_BATCH_WORKERS: int = 8  # 批量上传并行暂存/计算哈希的线程数
+    # 票据文件交由反向代理发送（如 nginx 的 internal location 前缀 /protected-uploads/），
+    # 由 X-Accel-Redirect 指向 uploads 下的相对路径，代理使用 sendfile 零拷贝发送；为空时由应用发送
+    FILE_ACCEL_REDIRECT_PREFIX: str | None = None
+
+    # 票据预览图（缩略图与分页预览，上传后在进程池中生成，缓存在原文件旁）
+    PREVIEW_RENDER_ENABLED: bool = True
+    PREVIEW_RENDER_WORKERS: int = 2  # 生成预览图的进程数
+    PREVIEW_THUMBNAIL_SIZE: int = 320  # 缩略图长边（像素）
+    PREVIEW_PAGE_SIZE: int = 1600  # 分页预览长边（像素）
+    PREVIEW_MAX_PAGES: int = 20  # 每个文件最多生成的预览页数
+    PREVIEW_RENDER_WAIT_SECONDS: float = 15.0  # 请求时预览图尚未生成，等待生成的最长时间（秒）
+
+    # 识别前文档预处理（PDF 拆页渲染、缩放、去元数据、重新压缩后再上传工作流；模板 preprocess_config 可逐项覆盖）
+    PREPROCESS_ENABLED: bool = True
+    PREPROCESS_WORKERS: int = 2  # 预处理进程数
+    PREPROCESS_DPI: int = 200  # PDF 页面渲染分辨率
+    PREPROCESS_LONG_EDGE: int = 2048  # 页面图片长边上限（像素）
+    PREPROCESS_JPEG_QUALITY: int = 85
+    PREPROCESS_CROP_MARGINS: bool = False  # 是否裁掉空白边距
+    PREPROCESS_MAX_PAGES: int = 10  # 预处理的页数上限，页数更多的文件上传原始文件
+    PREPROCESS_TIMEOUT_SECONDS: float = 60.0  # 等待预处理的最长时间（秒），超时上传原始文件
+
+    # 性能指标（Prometheus 格式，GET /metrics；多 worker 时需设置环境变量 PROMETHEUS_MULTIPROC_DIR）
+    METRICS_ENABLED: bool = True
+
     # 邮件配置
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
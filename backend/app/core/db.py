@@ -1,6 +1,8 @@
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
+from app.core import metrics
 from app.core.config import settings
 from app.models import User, UserCreate
 
@@ -107,7 +109,9 @@ def create_db_engine():
         max_overflow=25,             # 最大溢出连接数（增加到25，总共最多40个连接）
         echo=False,                  # 关闭SQL日志
         connect_args=connect_args,
+        poolclass=metrics.InstrumentedQueuePool,  # 记录获取连接的等待时间
     )
+    metrics.instrument_engine(engine, "sync")
     
     # 添加连接断开自动重连的事件监听器
     @event.listens_for(engine, "connect")
@@ -117,17 +121,10 @@ def create_db_engine():
     
     @event.listens_for(engine, "checkout")
     def receive_checkout(dbapi_conn, connection_record, connection_proxy):
-        """从连接池获取连接时检查连接有效性"""
+        """从连接池获取连接时检查连接池使用率（连接数等指标见 /metrics）"""
         try:
             # 使用 pool_pre_ping 时，这里会自动检查连接
             pool = engine.pool
-            logger.debug(
-                f"从连接池获取连接 - "
-                f"池大小: {pool.size()}, "
-                f"已检出: {pool.checkedout()}, "
-                f"已归还: {pool.checkedin()}, "
-                f"溢出: {pool.overflow()}"
-            )
             # 如果连接池接近满载，记录警告
             if pool.checkedout() > pool.size() * 0.8:
                 logger.warning(
@@ -138,17 +135,6 @@ def create_db_engine():
             logger.warning(f"连接检查失败，将自动重连: {e}")
             raise DisconnectionError("连接已断开，需要重连")
     
-    @event.listens_for(engine, "checkin")
-    def receive_checkin(dbapi_conn, connection_record):
-        """连接归还到连接池"""
-        pool = engine.pool
-        logger.debug(
-            f"连接已归还到连接池 - "
-            f"池大小: {pool.size()}, "
-            f"已检出: {pool.checkedout()}, "
-            f"已归还: {pool.checkedin()}"
-        )
-    
     @event.listens_for(engine, "invalidate")
     def receive_invalidate(dbapi_conn, connection_record, exception):
         """连接失效时的处理"""
@@ -208,12 +194,51 @@ except Exception as e:
     raise
 
 
+# ==================== 异步引擎 ====================
+# 供 async def 路由使用（AsyncSessionDep），数据库往返不阻塞事件循环；连接池与同步引擎相互独立
+
+def _async_database_config() -> tuple[str, dict]:
+    """异步引擎连接串与连接参数：优先使用 asyncpg，未安装时使用 psycopg3 的异步模式
+    （psycopg3 异步模式在 Windows 上不支持 ProactorEventLoop）"""
+    try:
+        import asyncpg  # noqa: F401
+    except ImportError:
+        logger.info("未安装 asyncpg，异步引擎使用 psycopg3 异步模式")
+        return database_url, connect_args
+    return database_url.replace("postgresql+psycopg://", "postgresql+asyncpg://", 1), {
+        "timeout": 30,               # 连接超时（秒）
+        "command_timeout": 300,      # 语句超时（秒）
+        "server_settings": {"application_name": "invoice_pdf_api", "statement_timeout": "300000"},
+    }
+
+
+def create_async_db_engine() -> AsyncEngine:
+    """创建异步数据库引擎（不在创建时连接）"""
+    url, async_connect_args = _async_database_config()
+    async_db_engine = create_async_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_timeout=60,
+        pool_size=10,
+        max_overflow=20,
+        echo=False,
+        connect_args=async_connect_args,
+        poolclass=metrics.InstrumentedAsyncQueuePool,
+    )
+    metrics.instrument_engine(async_db_engine.sync_engine, "async")
+    return async_db_engine
+
+
+async_engine = create_async_db_engine()
+
+
 def reconnect_database():
     """
     手动重连数据库
     关闭现有连接池并重新创建引擎
     """
-    global engine
+    global engine, async_engine
     import logging
     logger = logging.getLogger(__name__)
     
@@ -230,6 +255,9 @@ def reconnect_database():
         
         # 重新创建引擎
         engine = create_db_engine()
+        # 异步连接池中的连接属于各自的事件循环，这里只丢弃连接池，不在当前线程关闭连接
+        async_engine.sync_engine.dispose(close=False)
+        async_engine = create_async_db_engine()
         logger.info("数据库引擎已重新创建")
         
         # 测试新连接
@@ -0,0 +1,210 @@
+"""
+性能指标（Prometheus 格式，GET /metrics）
+
+- 请求：按路由模板统计耗时、每个请求的 SQL 条数、SQL 总耗时与等待数据库连接的时间
+- 数据库连接池：获取连接的等待时间、已检出连接数，以及各路由当前占用的连接数与占用时长
+  （连接池耗尽前可看出是哪些路由长时间占着连接）
+- Dify 调用：按模型配置（LLMConfig.name）统计耗时与状态、进行中的请求数、熔断状态
+
+多 worker 部署（fastapi run --workers N）时，启动前设置环境变量 PROMETHEUS_MULTIPROC_DIR 为一个空目录，
+各 worker 的指标写入该目录，/metrics 返回所有 worker 汇总后的结果。
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request
+from prometheus_client import (
+    REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# 不在 HTTP 请求中执行时（识别工作池、后台任务）使用的路由标签
+BACKGROUND_ROUTE = "background"
+# 未匹配到路由（404）时使用的路由标签
+UNMATCHED_ROUTE = "unmatched"
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "请求耗时", ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "每个请求执行的 SQL 条数", ["method", "route"], buckets=_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "每个请求的 SQL 执行总耗时", ["method", "route"], buckets=_LATENCY_BUCKETS,
+)
+REQUEST_POOL_WAIT_SECONDS = Histogram(
+    "http_request_db_pool_wait_seconds", "每个请求等待数据库连接的总时间", ["method", "route"], buckets=_LATENCY_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "单条 SQL 耗时", ["engine"], buckets=_LATENCY_BUCKETS)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "从连接池获取连接的等待时间（含新建连接）", ["engine"], buckets=_LATENCY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "已检出的连接数", ["engine"], multiprocess_mode="livesum",
+)
+DB_CONNECTIONS_HELD = Gauge(
+    "db_connections_held", "各路由当前占用的连接数", ["engine", "route"], multiprocess_mode="livesum",
+)
+DB_CONNECTION_HOLD_SECONDS = Histogram(
+    "db_connection_hold_seconds", "连接从检出到归还的时间", ["engine", "route"], buckets=_LATENCY_BUCKETS,
+)
+DIFY_REQUEST_SECONDS = Histogram(
+    "dify_request_duration_seconds", "Dify 请求耗时（streaming 为整个事件流）", ["config", "path", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+DIFY_REQUESTS_REJECTED = Counter("dify_requests_rejected", "熔断期间未发送的 Dify 请求数", ["config"])
+DIFY_IN_FLIGHT = Gauge("dify_requests_in_flight", "进行中的 Dify 请求数", ["config"], multiprocess_mode="livesum")
+DIFY_CIRCUIT_OPEN = Gauge("dify_circuit_open", "Dify 后端是否已熔断（1 为熔断）", ["config"], multiprocess_mode="livemax")
+
+
+# ==================== 请求上下文 ====================
+
+@dataclass
+class RequestStats:
+    """单个请求的数据库使用情况（由 SQL/连接池事件累加）"""
+    scope: dict
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+
+
+# 同步路由与依赖在线程池中执行时会复制上下文，累加的是同一个 RequestStats 对象
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _route_label(scope: dict) -> str:
+    """路由模板（如 /api/v1/invoices/{invoice_id}），避免按实际路径产生大量标签"""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    if scope.get("endpoint") is not None:
+        # 挂载的子应用（如 /uploads 静态文件）
+        return f"{scope.get('root_path', '')}/*"
+    return UNMATCHED_ROUTE
+
+
+def current_route() -> str:
+    """当前请求的路由模板（路由匹配后 scope 中才有 route，之前为 unmatched）"""
+    stats = _request_stats.get()
+    return _route_label(stats.scope) if stats else BACKGROUND_ROUTE
+
+
+async def metrics_middleware(request: Request, call_next):
+    stats = RequestStats(scope=request.scope)
+    token = _request_stats.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        _request_stats.reset(token)
+        route = _route_label(request.scope)
+        REQUEST_DURATION.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+        REQUEST_DB_QUERIES.labels(request.method, route).observe(stats.db_queries)
+        REQUEST_DB_SECONDS.labels(request.method, route).observe(stats.db_seconds)
+        REQUEST_POOL_WAIT_SECONDS.labels(request.method, route).observe(stats.pool_wait_seconds)
+
+
+# ==================== 数据库 ====================
+
+def _record_pool_wait(engine_name: str, seconds: float) -> None:
+    DB_POOL_WAIT_SECONDS.labels(engine_name).observe(seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+class _PoolWaitMixin:
+    """记录获取连接的等待时间（标签名由 instrument_engine 设置，重建连接池时沿用）"""
+    metrics_name = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _record_pool_wait(self.metrics_name, time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class InstrumentedQueuePool(_PoolWaitMixin, QueuePool):
+    """同步引擎连接池"""
+
+
+class InstrumentedAsyncQueuePool(_PoolWaitMixin, AsyncAdaptedQueuePool):
+    """异步引擎连接池"""
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """注册 SQL 耗时与连接检出/归还统计（异步引擎传入 async_engine.sync_engine）"""
+    if isinstance(engine.pool, _PoolWaitMixin):
+        engine.pool.metrics_name = name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        DB_QUERY_SECONDS.labels(name).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "checkout")
+    def receive_checkout(dbapi_conn, connection_record, connection_proxy):
+        route = current_route()
+        # record_info 在连接失效重建后仍保留，保证归还时能对应上
+        connection_record.record_info["metrics_checkout"] = (route, time.perf_counter())
+        DB_CONNECTIONS_HELD.labels(name, route).inc()
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+
+    @event.listens_for(engine, "checkin")
+    def receive_checkin(dbapi_conn, connection_record):
+        checkout = connection_record.record_info.pop("metrics_checkout", None)
+        if checkout is not None:
+            route, started = checkout
+            DB_CONNECTIONS_HELD.labels(name, route).dec()
+            DB_CONNECTION_HOLD_SECONDS.labels(name, route).observe(time.perf_counter() - started)
+            DB_POOL_CHECKED_OUT.labels(name).dec()
+
+
+# ==================== 输出 ====================
+
+def _multiprocess_dir() -> Optional[str]:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+
+def render() -> bytes:
+    """Prometheus 文本格式的全部指标（多 worker 模式下汇总各 worker）"""
+    if _multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead() -> None:
+    """worker 退出时清理其 live* 仪表数据（仅多 worker 模式）"""
+    if _multiprocess_dir():
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
@@ -61,3 +62,13 @@ def get_password_hash(password: str) -> str:
     if len(password.encode('utf-8')) > 72:
         password = password[:72]
     return pwd_context.hash(password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """在线程池中验证密码（bcrypt 计算耗时较长，避免阻塞事件循环）"""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+
+async def aget_password_hash(password: str) -> str:
+    """在线程池中计算密码哈希"""
+    return await asyncio.to_thread(get_password_hash, password)
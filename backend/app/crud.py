@@ -3,18 +3,37 @@ from typing import Any
 import logging
 
 from sqlmodel import Session, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
+from app.core.security import aget_password_hash, averify_password, get_password_hash, verify_password
 from app.models import Item, ItemCreate, User, UserCreate, UserUpdate, UserCompany, Company
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
-def create_user(*, session: Session, user_create: UserCreate) -> User:
+def _user_companies(user_id: uuid.UUID, user_create: UserCreate) -> list[UserCompany]:
+    """按 company_ids/primary_company_id 构造用户公司关联"""
     # 提取公司关联信息
     company_ids = user_create.company_ids if hasattr(user_create, 'company_ids') and user_create.company_ids else []
     primary_company_id = user_create.primary_company_id if hasattr(user_create, 'primary_company_id') else None
+    if not company_ids:
+        return []
+    
+    # 验证主公司ID是否在company_ids中
+    if primary_company_id and primary_company_id not in company_ids:
+        raise ValueError("主公司ID必须在公司ID列表中")
     
+    # 如果没有指定主公司，使用第一个公司作为主公司
+    if not primary_company_id:
+        primary_company_id = company_ids[0]
+    
+    return [
+        UserCompany(user_id=user_id, company_id=company_id, is_primary=(company_id == primary_company_id))
+        for company_id in company_ids
+    ]
+
+
+def create_user(*, session: Session, user_create: UserCreate) -> User:
     # 创建用户（不包含公司信息）
     user_data = user_create.model_dump(exclude={'company_ids', 'primary_company_id'}, exclude_unset=True)
     db_obj = User.model_validate(
@@ -24,28 +43,27 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     session.flush()  # 先刷新以获取用户ID
     
     # 创建用户公司关联
-    if company_ids:
-        # 验证主公司ID是否在company_ids中
-        if primary_company_id and primary_company_id not in company_ids:
-            raise ValueError("主公司ID必须在公司ID列表中")
-        
-        # 如果没有指定主公司，使用第一个公司作为主公司
-        if not primary_company_id and company_ids:
-            primary_company_id = company_ids[0]
-        
-        for company_id in company_ids:
-            user_company = UserCompany(
-                user_id=db_obj.id,
-                company_id=company_id,
-                is_primary=(company_id == primary_company_id)
-            )
-            session.add(user_company)
+    session.add_all(_user_companies(db_obj.id, user_create))
     
     session.commit()
     session.refresh(db_obj)
     return db_obj
 
 
+async def acreate_user(*, session: AsyncSession, user_create: UserCreate) -> User:
+    """create_user 的异步版本（密码哈希在线程池中计算）"""
+    user_data = user_create.model_dump(exclude={'company_ids', 'primary_company_id'}, exclude_unset=True)
+    db_obj = User.model_validate(
+        user_data, update={"hashed_password": await aget_password_hash(user_create.password)}
+    )
+    session.add(db_obj)
+    await session.flush()
+    session.add_all(_user_companies(db_obj.id, user_create))
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
 def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     user_data = user_in.model_dump(exclude={'company_ids', 'primary_company_id'}, exclude_unset=True)
     extra_data = {}
@@ -144,6 +162,22 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     return db_user
 
 
+async def aget_user_by_email(*, session: AsyncSession, email: str) -> User | None:
+    return (await session.exec(select(User).where(User.email == email))).first()
+
+
+async def aauthenticate(*, session: AsyncSession, email: str, password: str) -> User | None:
+    """authenticate 的异步版本（密码校验在线程池中执行）"""
+    db_user = await aget_user_by_email(session=session, email=email)
+    if not db_user:
+        logger.debug(f"用户不存在: {email}")
+        return None
+    if not await averify_password(password, db_user.hashed_password):
+        logger.debug(f"密码验证失败: {email}")
+        return None
+    return db_user
+
+
 def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -> Item:
     db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
     session.add(db_item)
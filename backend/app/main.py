@@ -1,13 +1,16 @@
 import sentry_sdk
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
+from prometheus_client import CONTENT_TYPE_LATEST
 from starlette.middleware.cors import CORSMiddleware
 from pathlib import Path
+from contextlib import asynccontextmanager
 import asyncio
 import time
 
 from app.api.main import api_router
+from app.core import metrics
 from app.core.config import settings
 
 # 静态文件目录
@@ -54,10 +57,43 @@ async def timeout_middleware(request: Request, call_next):
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：读取数据库结构能力，启动/停止后台识别工作池与套料任务心跳，关闭 Dify 客户端连接池、异步数据库连接池、
+    套料进程池、预览图与识别前预处理进程池，清理本进程的多 worker 指标数据"""
+    from app.core import db
+    from app.services.dify_client import dify_client
+    from app.services.document_preprocess import document_preprocessor
+    from app.services.nesting_job_runner import nesting_job_runner
+    from app.services.preview_renderer import preview_renderer
+    from app.services.recognition_worker import recognition_worker_pool
+    from app.services.schema_capabilities import schema_capabilities
+
+    # 读取失败时使用默认字段列表，不影响启动
+    await asyncio.to_thread(schema_capabilities.refresh)
+    if settings.RECOGNITION_WORKER_ENABLED:
+        recognition_worker_pool.start()
+    # 所属进程已退出的套料任务标记为失败，之后定期刷新本进程任务的心跳
+    nesting_job_runner.start()
+    try:
+        yield
+    finally:
+        if recognition_worker_pool.is_running:
+            await asyncio.to_thread(recognition_worker_pool.stop)
+        await asyncio.to_thread(dify_client.close)
+        await db.async_engine.dispose()
+        await asyncio.to_thread(nesting_job_runner.stop)
+        await asyncio.to_thread(preview_renderer.stop)
+        await asyncio.to_thread(document_preprocessor.stop)
+        metrics.mark_process_dead()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -145,6 +181,15 @@ async def cors_exception_handler(request: Request, call_next):
 # 添加异常处理中间件（在 CORS 和超时之后）
 app.middleware("http")(cors_exception_handler)
 
+# 性能指标中间件（最外层，统计包含其他中间件在内的完整耗时与最终状态码）
+if settings.METRICS_ENABLED:
+    app.middleware("http")(metrics.metrics_middleware)
+
+    @app.get("/metrics", tags=["metrics"], include_in_schema=False)
+    def prometheus_metrics():
+        """Prometheus 指标（应只在内网或经反向代理限制访问）"""
+        return Response(metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
 # 添加请求验证错误处理器
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
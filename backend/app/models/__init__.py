@@ -99,6 +99,8 @@ from app.models.models_inventory import (
     Inventory,
     MaterialLotFeature,
     MaterialLot,
+    NestingCoilCandidate,
+    NestingCoilCandidateBuild,
 )
 
 # 导入表面工艺模型
@@ -117,6 +119,7 @@ from app.models.models_nesting_layout import (
     NestingLayout,
     NestingLayoutD,
     NestingLayoutSd,
+    NestingJob,
 )
 
 # 导入生产订单模型
@@ -144,6 +147,9 @@ from app.models.models_invoice import (
     OCRConfig,
     LLMConfig,
     RecognitionRule,
+    StatisticsDailyRollup,
+    DifyFileUpload,
+    RecognitionResultCache,
 )
 
 # 导入角色和权限模型
@@ -256,6 +262,8 @@ __all__ = [
     "Inventory",
     "MaterialLotFeature",
     "MaterialLot",
+    "NestingCoilCandidate",
+    "NestingCoilCandidateBuild",
     # 表面工艺
     "SurfaceTechnology",
     "SurfaceTechnologyD",
@@ -265,6 +273,7 @@ __all__ = [
     "NestingLayout",
     "NestingLayoutD",
     "NestingLayoutSd",
+    "NestingJob",
     # 生产订单
     "ProductionOrder",
     "ProductionOrderD",
@@ -286,6 +295,9 @@ __all__ = [
     "OCRConfig",
     "LLMConfig",
     "RecognitionRule",
+    "StatisticsDailyRollup",
+    "DifyFileUpload",
+    "RecognitionResultCache",
     # 类型别名
     "MaterialClassRequest",
     "MaterialClassListRequest",
@@ -2,7 +2,7 @@ import uuid
 from typing import Optional
 from datetime import datetime
 from sqlmodel import Field, Relationship, SQLModel
-from sqlalchemy import Column, DateTime, Table, ForeignKey
+from sqlalchemy import Column, DateTime, Table, ForeignKey, Index
 
 
 # ==================== 用户公司关联表（多对多）====================
@@ -10,6 +10,8 @@ from sqlalchemy import Column, DateTime, Table, ForeignKey
 class UserCompany(SQLModel, table=True):
     """用户公司关联表 - 实现用户和公司的多对多关系"""
     __tablename__ = "user_company"
+    # 权限过滤按（用户, 公司）EXISTS 查询
+    __table_args__ = (Index("ix_user_company_user_id_company_id", "user_id", "company_id"),)
     
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", description="用户ID")
@@ -17,7 +17,7 @@ Inventory 实体模型定义
 from typing import List, Optional, Annotated, Any
 from datetime import datetime
 from sqlmodel import SQLModel, Field, select
-from sqlalchemy import Column, String, DateTime, Text, Float
+from sqlalchemy import Column, String, DateTime, Text, Float, Integer, Index
 from sqlalchemy.sql import func
 
 # 批次属性表模型
@@ -29,7 +29,7 @@ class MaterialLotFeature(SQLModel, table=True):
     materialLotFeatureId: str = Field(max_length=200, sa_column=Column("material_lot_feature_id", String(200), primary_key=True))
     
     # 批次主键 (关联 inventory 表，但不创建外键约束)
-    materialLotId: str = Field(max_length=200, sa_column=Column("material_lot_id", String(200)))
+    materialLotId: str = Field(max_length=200, sa_column=Column("material_lot_id", String(200), index=True))
     
     # 属性ID
     featureId: str = Field(max_length=200, sa_column=Column("feature_id", String(200)))
@@ -181,6 +181,70 @@ class Inventory(SQLModel, table=True):
         # 这里可以处理设置逻辑
         pass
 
+# 套料钢卷候选索引表模型
+# 由 inventory 与 material_lot_feature（材质、公称厚度、宽度）行转列生成，按（材质, 厚度分桶）索引，
+# 库存或批次属性变更时按库存ID/批次ID增量刷新（见 app/services/coil_candidate_index.py）
+class NestingCoilCandidate(SQLModel, table=True):
+    __tablename__ = "nesting_coil_candidate"
+    __table_args__ = (
+        Index("ix_nesting_coil_candidate_material_thickness", "material", "thickness_bucket"),
+    )
+
+    # 库存ID（与 inventory 一一对应）
+    inventoryId: str = Field(max_length=200, sa_column=Column("inventory_id", String(200), primary_key=True))
+
+    # 物料批号ID
+    materialLotId: str = Field(max_length=200, sa_column=Column("material_lot_id", String(200), index=True))
+
+    # 材质（批次属性）
+    material: str = Field(max_length=40, sa_column=Column("material", String(40)))
+
+    # 公称厚度分桶（厚度 × 100 取整）
+    thicknessBucket: int = Field(sa_column=Column("thickness_bucket", Integer))
+
+    # 公称厚度(mm)
+    thickness: float = Field(sa_column=Column("thickness", Float))
+
+    # 宽度(mm)
+    width: float = Field(sa_column=Column("width", Float))
+
+    # 库存数量（重量kg）
+    stockQty: float = Field(default=0.0, sa_column=Column("stock_qty", Float))
+
+    # 物料编码
+    materialCode: Optional[str] = Field(default=None, max_length=40, sa_column=Column("material_code", String(40)))
+
+    # 物料描述
+    materialDesc: Optional[str] = Field(default=None, max_length=200, sa_column=Column("material_desc", String(200)))
+
+    # 批号
+    lotNo: Optional[str] = Field(default=None, max_length=20, sa_column=Column("lot_no", String(20)))
+
+    # 库位名称
+    binName: Optional[str] = Field(default=None, max_length=20, sa_column=Column("bin_name", String(20)))
+
+    # 仓库名称
+    warehouseName: Optional[str] = Field(default=None, max_length=20, sa_column=Column("warehouse_name", String(20)))
+
+    # 刷新时间
+    refreshDate: datetime = Field(default_factory=datetime.now, sa_column=Column("refresh_date", DateTime))
+
+
+# 套料钢卷候选索引构建记录
+# 全量构建后写入，存在即表示索引已构建（仓库中没有符合条件的钢卷、索引为空时也不再重复构建）
+class NestingCoilCandidateBuild(SQLModel, table=True):
+    __tablename__ = "nesting_coil_candidate_build"
+
+    # 索引名称（固定为 nesting_coil_candidate）
+    indexName: str = Field(max_length=100, sa_column=Column("index_name", String(100), primary_key=True))
+
+    # 最近一次全量构建时间
+    buildDate: datetime = Field(default_factory=datetime.now, sa_column=Column("build_date", DateTime))
+
+    # 全量构建写入的候选钢卷数
+    candidateCount: int = Field(default=0, sa_column=Column("candidate_count", Integer))
+
+
 # 查询示例函数
 def get_inventory_with_features(session, inventory: Inventory):
     """获取库存及其所有批次属性"""
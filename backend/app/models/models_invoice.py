@@ -2,7 +2,7 @@
 票据识别系统数据模型定义
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 from uuid import UUID, uuid4
 from sqlmodel import Field, SQLModel, Relationship
@@ -72,8 +72,8 @@ class Invoice(SQLModel, table=True):
     # 元数据
     remark: Optional[str] = Field(default=None, max_length=500, description="备注")
     creator_id: UUID = Field(foreign_key="user.id", description="创建人ID")
-    company_id: Optional[UUID] = Field(default=None, foreign_key="company.id", description="公司ID")
-    create_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime), description="创建时间")
+    company_id: Optional[UUID] = Field(default=None, foreign_key="company.id", index=True, description="公司ID")
+    create_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime, index=True), description="创建时间")
     update_time: Optional[datetime] = Field(default=None, sa_column=Column(DateTime), description="更新时间")
     
     # 关联关系
@@ -158,6 +158,14 @@ class RecognitionTask(SQLModel, table=True):
     start_time: Optional[datetime] = Field(default=None, sa_column=Column(DateTime), description="开始时间")
     end_time: Optional[datetime] = Field(default=None, sa_column=Column(DateTime), description="结束时间")
     duration: Optional[float] = Field(default=None, sa_column=Column(Float), description="耗时（秒）")
+    worker_id: Optional[str] = Field(default=None, max_length=100, description="执行任务的识别工作池实例（主机:进程:随机串）")
+    heartbeat_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime), description="工作池最近一次心跳时间，超时未更新视为中断")
+    attempts: int = Field(default=0, description="被工作池领取执行的次数（重新入队后再次领取时累加）")
+    
+    # 执行进度（streaming 模式下随工作流节点事件更新）
+    progress: int = Field(default=0, description="执行进度（0-100）")
+    current_node: Optional[str] = Field(default=None, max_length=200, description="当前执行的工作流节点")
+    node_events: Optional[list] = Field(default=None, sa_column=Column(JSON), description="工作流节点执行记录（节点、状态、耗时）")
     
     # 错误信息
     error_message: Optional[str] = Field(default=None, sa_column=Column(Text), description="错误信息")
@@ -170,7 +178,7 @@ class RecognitionTask(SQLModel, table=True):
     
     # 元数据
     operator_id: UUID = Field(foreign_key="user.id", description="操作人ID")
-    create_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime), description="创建时间")
+    create_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime, index=True), description="创建时间")
     
     # 关联关系
     result: Optional["RecognitionResult"] = Relationship(back_populates="task")
@@ -295,7 +303,10 @@ class LLMConfig(SQLModel, table=True):
     # 超时配置
     timeout: int = Field(default=300, description="请求超时时间（秒）")
     max_retries: int = Field(default=3, description="最大重试次数")
-    
+    max_concurrency: Optional[int] = Field(default=None, description="识别工作池中该配置的最大并发任务数（为空使用全局默认值）")
+    rate_limit_per_minute: Optional[int] = Field(default=None, description="每分钟最多请求数（为空不限速）")
+    rate_limit_burst: Optional[int] = Field(default=None, description="限速突发容量（为空时为每秒请求数）")
+
     # 状态
     is_active: bool = Field(default=True, description="是否启用")
     is_default: bool = Field(default=False, description="是否默认配置")
@@ -462,6 +473,72 @@ class SchemaValidationRecord(SQLModel, table=True):
     schema: Optional[OutputSchema] = Relationship(back_populates="validation_records")
 
 
+# ==================== 统计日汇总表 ====================
+class StatisticsDailyRollup(SQLModel, table=True):
+    """统计日汇总表 - 按创建日期、公司汇总票据与识别任务（统计看板只读本表，由票据/任务变更时增量刷新）"""
+    __tablename__ = "statistics_daily_rollup"
+    __table_args__ = (
+        sa.Index("ix_statistics_daily_rollup_date_company", "stat_date", "company_id"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    stat_date: date = Field(sa_column=Column(sa.Date, nullable=False), description="统计日期（票据/任务创建日期）")
+    company_id: Optional[UUID] = Field(default=None, index=True, description="公司ID（票据所属公司，任务按票据归属）")
+
+    # 票据
+    invoice_count: int = Field(default=0, description="票据数")
+    invoice_amount: float = Field(default=0.0, sa_column=Column(Float, nullable=False, default=0.0), description="票据合计金额")
+    review_pending: int = Field(default=0, description="待审核票据数")
+    review_approved: int = Field(default=0, description="审核通过票据数")
+    review_rejected: int = Field(default=0, description="审核拒绝票据数")
+
+    # 识别任务
+    task_count: int = Field(default=0, description="识别任务数")
+    task_pending: int = Field(default=0, description="待处理任务数")
+    task_processing: int = Field(default=0, description="处理中任务数")
+    task_completed: int = Field(default=0, description="已完成任务数")
+    task_failed: int = Field(default=0, description="失败任务数")
+
+    refresh_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime), description="刷新时间")
+
+
+class DifyFileUpload(SQLModel, table=True):
+    """Dify 文件上传缓存表 - 同一内容上传到同一 Dify 地址后复用 upload_file_id，过期或被清理时重新上传"""
+    __tablename__ = "dify_file_upload"
+    __table_args__ = (
+        sa.UniqueConstraint("file_hash", "endpoint", name="uq_dify_file_upload_hash_endpoint"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    file_hash: str = Field(max_length=64, description="文件内容哈希值（SHA256）")
+    endpoint: str = Field(max_length=500, description="Dify API 地址（LLMConfig.endpoint，去掉末尾斜杠）")
+    upload_file_id: str = Field(max_length=100, description="Dify 返回的上传文件ID")
+    file_name: Optional[str] = Field(default=None, max_length=255, description="上传时使用的文件名")
+    upload_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime), description="上传时间")
+    expires_at: datetime = Field(sa_column=Column(DateTime, nullable=False, index=True), description="过期时间")
+
+
+class RecognitionResultCache(SQLModel, table=True):
+    """识别结果缓存表 - 同一文件、模板版本、输出Schema、模型配置和提示词的识别结果复用（指向首次识别的结果）"""
+    __tablename__ = "recognition_result_cache"
+    model_config = ConfigDict(protected_namespaces=())
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    cache_key: str = Field(max_length=64, unique=True, description="缓存键（各组成部分的 SHA256）")
+    result_id: UUID = Field(
+        foreign_key="recognition_result.id", nullable=False, ondelete="CASCADE", index=True,
+        description="被复用的识别结果ID"
+    )
+    file_hash: str = Field(max_length=64, index=True, description="文件内容哈希值")
+    template_version_id: Optional[str] = Field(default=None, max_length=100, description="模板版本ID（或版本号）")
+    output_schema_id: Optional[str] = Field(default=None, max_length=100, index=True, description="输出Schema ID")
+    model_config_id: Optional[str] = Field(default=None, max_length=100, index=True, description="模型配置ID")
+    prompt_hash: str = Field(max_length=64, description="模板提示词哈希值")
+    hit_count: int = Field(default=0, description="命中次数")
+    create_time: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime), description="创建时间")
+    last_hit_time: Optional[datetime] = Field(default=None, sa_column=Column(DateTime), description="最近命中时间")
+
+
 # ==================== API 请求/响应模型 ====================
 
 # 票据创建模型
@@ -579,6 +656,7 @@ class RecognitionTaskParams(SQLModel):
     page_range: str = Field(default="all", description="页范围：all/1st/custom")
     enhance_options: str = Field(default="auto", description="图像增强策略：auto/none/strong")
     callback_url: Optional[str] = Field(default=None, description="完成回调URL")
+    use_result_cache: bool = Field(default=True, description="相同文件/模板版本/Schema/模型配置/提示词已有识别结果时直接复用（false 时强制重新识别）")
 
 
 # 识别任务创建模型
@@ -592,6 +670,7 @@ class RecognitionTaskCreate(SQLModel):
 class RecognitionTaskBatchCreate(SQLModel):
     uploaded_file_ids: list[UUID] = Field(description="文件ID列表")
     params: RecognitionTaskParams = Field(description="任务参数（同一批使用同一参数）")
+    enqueue: bool = Field(default=False, description="创建后直接入队，由后台识别工作池执行")
 
 
 # 识别任务响应模型
@@ -606,6 +685,8 @@ class RecognitionTaskResponse(SQLModel):
     provider: str
     recognition_mode: Optional[str] = None
     model_name: Optional[str] = None
+    progress: int = 0
+    current_node: Optional[str] = None
     start_time: Optional[datetime]
     end_time: Optional[datetime]
     create_time: datetime
@@ -636,6 +717,7 @@ class InvoiceFileListItem(SQLModel):
     file_type: str = Field(description="文件类型（pdf/jpg/png）")
     file_hash: Optional[str] = Field(default=None, description="文件哈希值")
     upload_time: datetime = Field(description="上传时间")
+    thumbnail_url: Optional[str] = Field(default=None, description="缩略图地址")
     
     # 票据基本信息
     invoice_id: UUID = Field(description="票据ID")
@@ -713,6 +795,9 @@ class Template(SQLModel, table=True):
     # Schema JSON（新增）
     schema: Optional[dict] = Field(default=None, sa_column=Column(JSON), description="模板 Schema JSON 定义")
     
+    # 识别前预处理配置（覆盖 PREPROCESS_* 全局默认值，见 app/services/document_preprocess.py）
+    preprocess_config: Optional[dict] = Field(default=None, sa_column=Column(JSON), description="识别前预处理配置")
+    
     # 版本管理
     current_version_id: Optional[UUID] = Field(default=None, foreign_key="template_version.id", description="当前版本ID")
     
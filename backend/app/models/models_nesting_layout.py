@@ -17,7 +17,7 @@ NestingLayout 实体模型定义
 from typing import List, Optional, Annotated, Any
 from datetime import datetime
 from sqlmodel import SQLModel, Field, select
-from sqlalchemy import Column, String, DateTime, Text, Numeric
+from sqlalchemy import Column, String, DateTime, Text, Numeric, Integer, JSON
 from sqlalchemy.sql import func
 
 # 套料订单明细表模型
@@ -82,7 +82,7 @@ class NestingLayoutD(SQLModel, table=True):
     nestingLayoutDId: str = Field(max_length=200, sa_column=Column("nesting_layout_d_id", String(200), primary_key=True))
     
     # 父键 (关联 nesting_layout 表，但不创建外键约束)
-    nestingLayoutId: str = Field(max_length=200, sa_column=Column("nesting_layout_id", String(200)))
+    nestingLayoutId: str = Field(max_length=200, sa_column=Column("nesting_layout_id", String(200), index=True))
     warehouseId: str = Field(max_length=200, sa_column=Column("warehouse_id", String(200)))
     binId: str = Field(max_length=200, sa_column=Column("bin_id", String(200)))
     # 物料相关字段
@@ -226,6 +226,49 @@ class NestingLayout(SQLModel, table=True):
         """设置套料排版的钢卷明细列表"""
         self._nesting_layout_d_list = value
 
+# 套料任务表模型（套料计算在后台进程池中执行，记录进度与结果）
+class NestingJob(SQLModel, table=True):
+    __tablename__ = "nesting_job"
+
+    # 任务ID
+    jobId: str = Field(max_length=200, sa_column=Column("job_id", String(200), primary_key=True))
+
+    # 任务状态 (pending/running/completed/failed/cancelled)
+    status: str = Field(default="pending", max_length=20, sa_column=Column("status", String(20), index=True))
+
+    # 执行进度 (0-100)
+    progress: int = Field(default=0, sa_column=Column("progress", Integer, nullable=False, server_default="0"))
+
+    # 当前执行阶段
+    stage: Optional[str] = Field(default=None, max_length=100, sa_column=Column("stage", String(100)))
+
+    # 请求参数（selectedSoData、nestingParams）
+    requestData: Optional[dict] = Field(default=None, sa_column=Column("request_data", JSON))
+
+    # 套料结果（与 create 操作的返回结构一致）
+    resultData: Optional[dict] = Field(default=None, sa_column=Column("result_data", JSON))
+
+    # 错误信息
+    message: Optional[str] = Field(default=None, sa_column=Column("message", Text))
+
+    # 创建人
+    creator: str = Field(max_length=200, sa_column=Column("creator", String(200), index=True))
+
+    # 创建日期
+    createDate: datetime = Field(default_factory=datetime.now, sa_column=Column("create_date", DateTime))
+
+    # 开始执行时间
+    startDate: Optional[datetime] = Field(default=None, sa_column=Column("start_date", DateTime))
+
+    # 结束时间
+    finishDate: Optional[datetime] = Field(default=None, sa_column=Column("finish_date", DateTime))
+
+    # 执行任务的进程（主机:进程:随机串）
+    owner: Optional[str] = Field(default=None, max_length=100, sa_column=Column("owner", String(100)))
+
+    # 所属进程最近一次心跳时间（超时未更新视为中断）
+    heartbeatDate: Optional[datetime] = Field(default=None, sa_column=Column("heartbeat_date", DateTime))
+
 # 查询示例函数
 def get_nesting_layout_with_details(session, nesting_layout: NestingLayout):
     """获取套料排版及其所有钢卷明细"""
@@ -147,7 +147,7 @@ class ProductionOrderD(SQLModel, table=True):
     __tablename__ = "production_order_d"
     
     # 父键
-    productionOrderId: str = Field(max_length=200, sa_column=Column("production_order_id", String(200)))
+    productionOrderId: str = Field(max_length=200, sa_column=Column("production_order_id", String(200), index=True))
     
     # 物理主键
     productionOrderDId: str = Field(max_length=200, sa_column=Column("production_order_d_id", String(200), primary_key=True))
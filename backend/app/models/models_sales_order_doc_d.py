@@ -20,7 +20,7 @@ class SalesOrderDocDFeature(SQLModel, table=True):
     # 外键关联
     salesOrderDocDId: str = Field(
         max_length=200,
-        sa_column=Column("sales_order_doc_d_id", String(200), ForeignKey("sales_order_doc_d.sales_order_doc_d_id")),
+        sa_column=Column("sales_order_doc_d_id", String(200), ForeignKey("sales_order_doc_d.sales_order_doc_d_id"), index=True),
         description="行项目ID"
     )
     
@@ -0,0 +1,214 @@
+"""
+套料钢卷候选索引
+将 inventory 与 material_lot_feature 中的 材质/公称厚度/宽度 在 SQL 中行转列，
+解析后写入 nesting_coil_candidate 表，按（材质, 厚度分桶）建索引。
+
+- 套料时只按订单的（材质, 厚度）组合查询候选钢卷，耗时与订单规模相关，与仓库规模无关
+- 库存或批次属性变更时按库存ID/批次ID增量刷新
+- 尚未全量构建过时（首次使用或迁移后）自动全量构建；构建记录保存在 nesting_coil_candidate_build，
+  没有符合条件的钢卷、索引为空时也不会在每次套料时重复构建
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, or_, text, tuple_
+from sqlmodel import Session, select
+
+from app.models import NestingCoilCandidate, NestingCoilCandidateBuild
+
+logger = logging.getLogger(__name__)
+
+# 构建记录中的索引名称
+INDEX_NAME = "nesting_coil_candidate"
+
+# 厚度匹配容差(mm)，与原套料逻辑一致
+THICKNESS_TOLERANCE = 0.01
+
+# 钢卷库存行转列：每条库存一行，批次属性取 材质/公称厚度/宽度
+_CANDIDATE_SOURCE_SQL = """
+    SELECT
+        inv.inventory_id,
+        inv.material_lot_id,
+        inv.material_code,
+        inv.material_desc,
+        inv.stock_qty,
+        inv.lot_no,
+        inv.bin_name,
+        inv.warehouse_name,
+        MAX(CASE WHEN mlf.feature_desc = '材质' THEN mlf.feature_value END) AS material,
+        MAX(CASE WHEN mlf.feature_desc = '公称厚度' THEN mlf.feature_value END) AS thickness,
+        MAX(CASE WHEN mlf.feature_desc = '宽度' THEN mlf.feature_value END) AS width
+    FROM inventory inv
+    JOIN material_lot_feature mlf ON inv.material_lot_id = mlf.material_lot_id
+    WHERE inv.material_desc LIKE '%钢卷%'
+      AND mlf.feature_desc IN ('材质', '公称厚度', '宽度')
+      AND mlf.feature_value IS NOT NULL AND mlf.feature_value <> ''
+      {scope}
+    GROUP BY inv.inventory_id, inv.material_lot_id, inv.material_code, inv.material_desc,
+             inv.stock_qty, inv.lot_no, inv.bin_name, inv.warehouse_name
+"""
+
+
+def thickness_bucket(thickness: float) -> int:
+    """厚度分桶（0.01mm 一档）"""
+    return int(round(thickness * 100))
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(str(value).strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def _build_candidates(rows) -> List[NestingCoilCandidate]:
+    """解析行转列结果，缺少材质/厚度/宽度/批次或数值无效的库存不进入索引"""
+    now = datetime.now()
+    candidates = []
+    for row in rows:
+        thickness = _to_float(row.thickness)
+        width = _to_float(row.width)
+        if not row.material or not row.material_lot_id or thickness is None or width is None:
+            continue
+        candidates.append(NestingCoilCandidate(
+            inventoryId=row.inventory_id,
+            materialLotId=row.material_lot_id,
+            material=row.material,
+            thicknessBucket=thickness_bucket(thickness),
+            thickness=thickness,
+            width=width,
+            stockQty=row.stock_qty or 0.0,
+            materialCode=row.material_code,
+            materialDesc=row.material_desc,
+            lotNo=row.lot_no,
+            binName=row.bin_name,
+            warehouseName=row.warehouse_name,
+            refreshDate=now,
+        ))
+    return candidates
+
+
+def refresh_coil_candidates(
+    session: Session,
+    inventory_ids: Optional[Iterable[str]] = None,
+    material_lot_ids: Optional[Iterable[str]] = None,
+    commit: bool = True,
+) -> int:
+    """
+    刷新钢卷候选索引
+
+    Args:
+        session: 数据库会话
+        inventory_ids: 需要刷新的库存ID（新增/修改/删除的库存）
+        material_lot_ids: 需要刷新的批次ID（批次属性变更）
+        commit: 是否提交事务（调用方在同一事务中写入库存时传 False）
+        两者都为 None 时全量重建
+
+    Returns:
+        写入索引的候选钢卷数
+    """
+    inventory_ids = [i for i in (inventory_ids or []) if i]
+    material_lot_ids = [i for i in (material_lot_ids or []) if i]
+    full_rebuild = not inventory_ids and not material_lot_ids
+
+    # 先写入会话中尚未 flush 的库存/批次属性，保证行转列查询能读到
+    session.flush()
+    params: Dict[str, object] = {}
+    if full_rebuild:
+        scope = ""
+        session.execute(delete(NestingCoilCandidate))
+    else:
+        conditions = []
+        delete_conditions = []
+        if inventory_ids:
+            conditions.append("inv.inventory_id IN :inventory_ids")
+            delete_conditions.append(NestingCoilCandidate.inventoryId.in_(inventory_ids))
+            params["inventory_ids"] = inventory_ids
+        if material_lot_ids:
+            conditions.append("inv.material_lot_id IN :material_lot_ids")
+            delete_conditions.append(NestingCoilCandidate.materialLotId.in_(material_lot_ids))
+            params["material_lot_ids"] = material_lot_ids
+        scope = "AND (" + " OR ".join(conditions) + ")"
+        session.execute(delete(NestingCoilCandidate).where(or_(*delete_conditions)))
+
+    stmt = text(_CANDIDATE_SOURCE_SQL.format(scope=scope))
+    for name in params:
+        stmt = stmt.bindparams(bindparam(name, expanding=True))
+    candidates = _build_candidates(session.execute(stmt, params).fetchall())
+    session.add_all(candidates)
+    if full_rebuild:
+        session.merge(NestingCoilCandidateBuild(
+            indexName=INDEX_NAME, buildDate=datetime.now(), candidateCount=len(candidates),
+        ))
+    if commit:
+        session.commit()
+    else:
+        session.flush()
+
+    if full_rebuild:
+        logger.info(f"钢卷候选索引已全量重建: {len(candidates)} 条")
+    return len(candidates)
+
+
+def _ensure_built(session: Session) -> None:
+    """尚未全量构建过时全量构建"""
+    if session.get(NestingCoilCandidateBuild, INDEX_NAME) is None:
+        refresh_coil_candidates(session)
+
+
+def find_coil_candidates(
+    session: Session,
+    pairs: Sequence[Tuple[str, float]],
+) -> List[Tuple[str, float, NestingCoilCandidate]]:
+    """
+    按订单的（材质, 厚度）组合查询可用钢卷
+
+    Args:
+        pairs: 订单中的（材质, 公称厚度）组合，按需要的输出顺序排列
+
+    Returns:
+        [(材质, 订单厚度, 候选钢卷)]，按组合顺序、库存ID排序（厚度差不超过 THICKNESS_TOLERANCE）
+    """
+    pairs = [(material, thickness) for material, thickness in pairs if material]
+    if not pairs:
+        return []
+    _ensure_built(session)
+
+    # 容差可能跨越相邻分桶，查询 bucket-1 ~ bucket+1
+    keys = {
+        (material, thickness_bucket(thickness) + offset)
+        for material, thickness in pairs
+        for offset in (-1, 0, 1)
+    }
+    rows = session.exec(
+        select(NestingCoilCandidate)
+        .where(tuple_(NestingCoilCandidate.material, NestingCoilCandidate.thicknessBucket).in_(sorted(keys)))
+        .where(NestingCoilCandidate.stockQty > 0)
+        .order_by(NestingCoilCandidate.inventoryId)
+    ).all()
+
+    by_material: Dict[str, List[NestingCoilCandidate]] = {}
+    for row in rows:
+        by_material.setdefault(row.material, []).append(row)
+
+    matched = []
+    for material, thickness in pairs:
+        for candidate in by_material.get(material, []):
+            if abs(candidate.thickness - thickness) <= THICKNESS_TOLERANCE:
+                matched.append((material, thickness, candidate))
+    return matched
+
+
+def main() -> None:
+    """手动全量重建：python -m app.services.coil_candidate_index"""
+    from app.core import db
+
+    logging.basicConfig(level=logging.INFO)
+    with Session(db.engine) as session:
+        refresh_coil_candidates(session)
+
+
+if __name__ == "__main__":
+    main()
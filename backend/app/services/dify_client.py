@@ -0,0 +1,461 @@
+"""
+Dify HTTP 客户端连接池
+按 LLMConfig.endpoint 复用进程级 httpx.AsyncClient，避免每次调用都重新建立 TCP/TLS 连接。
+
+- 所有客户端运行在同一个后台事件循环线程中（AsyncClient 绑定到创建它的事件循环），
+  同步调用方（识别工作池线程、同步路由）与异步路由共用同一组连接
+- 每个 endpoint 的连接数受 httpx.Limits 限制；每个后端（endpoint + API Key）的请求速率、并发、熔断与重试
+  由流量控制处理（见 dify_traffic.py），调用方传入 traffic=policy_for(LLMConfig) 时使用该配置的限额
+- 安装了 h2 时启用 HTTP/2
+- 工作流支持 streaming 模式：按 SSE 事件流逐条回调，最终汇总为与 blocking 模式相同的响应结构
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, Iterator, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.services.dify_traffic import (
+    RETRYABLE_STATUS_CODES, UNSENT_ERRORS, BackendTraffic, TrafficPolicy, TrafficRegistry,
+    backoff_delay, retry_after_seconds,
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 默认请求超时（秒），与原同步实现保持一致
+DEFAULT_TIMEOUT = 300.0
+
+# 事件流结束标记
+_STREAM_END = object()
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+
+class DifyWorkflowError(Exception):
+    """工作流执行失败（SSE error 事件或 workflow_finished 状态为 failed）"""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class WorkflowStreamCollector:
+    """
+    汇总工作流 SSE 事件，生成与 blocking 模式一致的响应：
+    {"workflow_run_id": ..., "task_id": ..., "data": {"status", "outputs", "elapsed_time", ...}}
+    """
+
+    def __init__(self) -> None:
+        self.workflow_run_id: Optional[str] = None
+        self.task_id: Optional[str] = None
+        self.data: Optional[Dict[str, Any]] = None
+        self.text_chunks: list[str] = []
+        self.error: Optional[Dict[str, Any]] = None
+
+    def feed(self, event: Dict[str, Any]) -> None:
+        event_type = event.get("event")
+        self.workflow_run_id = self.workflow_run_id or event.get("workflow_run_id")
+        self.task_id = self.task_id or event.get("task_id")
+        if event_type == "workflow_finished":
+            self.data = event.get("data") or {}
+        elif event_type == "text_chunk":
+            self.text_chunks.append((event.get("data") or {}).get("text") or "")
+        elif event_type == "error":
+            self.error = event
+
+    def result(self) -> Dict[str, Any]:
+        if self.error is not None:
+            raise DifyWorkflowError(
+                self.error.get("message") or "工作流执行失败", self.error.get("code")
+            )
+        if self.data is None:
+            raise DifyWorkflowError("事件流提前结束，未收到 workflow_finished 事件")
+        if self.data.get("status") == "failed":
+            raise DifyWorkflowError(self.data.get("error") or "工作流执行失败")
+        data = dict(self.data)
+        if not data.get("outputs") and self.text_chunks:
+            data["outputs"] = {"text": "".join(self.text_chunks)}
+        return {"workflow_run_id": self.workflow_run_id, "task_id": self.task_id, "data": data}
+
+
+def _parse_sse_line(line: str) -> Optional[Dict[str, Any]]:
+    """解析一行 SSE，返回 data 中的 JSON 事件（ping、注释行等返回 None）"""
+    if not line.startswith("data:"):
+        return None
+    payload = line[5:].strip()
+    if not payload:
+        return None
+    try:
+        event = json.loads(payload)
+    except json.JSONDecodeError:
+        logger.warning(f"无法解析的 SSE 数据: {payload[:200]}")
+        return None
+    return event if isinstance(event, dict) else None
+
+
+class DifyClientPool:
+    """按 endpoint 共享的 Dify 异步客户端池"""
+
+    def __init__(
+        self,
+        max_connections: int = settings.DIFY_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = settings.DIFY_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = settings.DIFY_HTTP_KEEPALIVE_EXPIRY,
+        per_endpoint_concurrency: int = settings.DIFY_HTTP_PER_ENDPOINT_CONCURRENCY,
+        http2: bool = settings.DIFY_HTTP_ENABLE_HTTP2,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.per_endpoint_concurrency = max(1, per_endpoint_concurrency)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.traffic = TrafficRegistry(self.per_endpoint_concurrency)
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # 以下状态（含 traffic）只在后台事件循环中访问
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    # ==================== 事件循环 ====================
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="dify-client-loop", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                logger.info(f"Dify 客户端事件循环已启动: HTTP/2={'启用' if self.http2 else '未启用'}")
+            return self._loop
+
+    def _submit(self, coro: Coroutine[Any, Any, T]) -> "Future[T]":
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """在客户端事件循环中执行协程并阻塞等待结果（供同步代码调用）"""
+        return self._submit(coro).result()
+
+    async def arun(self, coro: Coroutine[Any, Any, T]) -> T:
+        """在客户端事件循环中执行协程并异步等待结果（供异步路由调用）"""
+        return await asyncio.wrap_future(self._submit(coro))
+
+    # ==================== 客户端 ====================
+
+    @staticmethod
+    def _endpoint_key(endpoint: str) -> str:
+        return endpoint.strip().rstrip("/")
+
+    def _get_client(self, endpoint: str) -> httpx.AsyncClient:
+        key = self._endpoint_key(endpoint)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=key,
+                limits=self.limits,
+                http2=self.http2,
+                timeout=DEFAULT_TIMEOUT,
+            )
+            self._clients[key] = client
+        return client
+
+    def _get_traffic(self, endpoint: str, headers: Dict[str, str], policy: Optional[TrafficPolicy]) -> BackendTraffic:
+        api_key = (headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+        return self.traffic.get(endpoint, api_key, policy)
+
+    @staticmethod
+    def _retry_delay(backend: BackendTraffic, attempt: int, reason: str, retry_after: Optional[float] = None) -> Optional[float]:
+        """还可以重试时返回等待时间，否则返回 None"""
+        if attempt >= backend.policy.max_retries:
+            return None
+        backend.retried += 1
+        delay = backoff_delay(attempt, retry_after)
+        logger.warning(f"Dify 请求失败（{reason}），{delay:.2f} 秒后第 {attempt + 1} 次重试")
+        return delay
+
+    async def _request(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        traffic: Optional[TrafficPolicy] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        headers = dict(kwargs.pop("headers", None) or {})
+        if api_key:
+            headers.setdefault("Authorization", f"Bearer {api_key}")
+        client = self._get_client(endpoint)
+        backend = self._get_traffic(endpoint, headers, traffic)
+        attempt = 0
+        while True:
+            try:
+                async with backend.slot(path) as outcome:
+                    response = await client.request(
+                        method,
+                        path,
+                        headers=headers,
+                        timeout=timeout if timeout is not None else DEFAULT_TIMEOUT,
+                        **kwargs,
+                    )
+                    outcome.status_code = response.status_code
+            except UNSENT_ERRORS as e:
+                delay = self._retry_delay(backend, attempt, type(e).__name__)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                delay = self._retry_delay(
+                    backend, attempt, f"HTTP {response.status_code}", retry_after_seconds(response)
+                )
+                if delay is None:
+                    return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def request(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        traffic: Optional[TrafficPolicy] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        同步发送请求（阻塞当前线程，连接在后台事件循环中复用）
+
+        Args:
+            endpoint: Dify API 地址（LLMConfig.endpoint）
+            method: HTTP 方法
+            path: 相对 endpoint 的路径，如 /workflows/run
+            api_key: Dify API Key，传入时自动添加 Authorization 头
+            timeout: 请求超时（秒），为空时使用默认值
+            traffic: 后端流量策略（policy_for(LLMConfig)），为空时沿用该后端已有策略
+            **kwargs: 透传给 httpx 的参数（json、files、headers 等）
+
+        Raises:
+            DifyCircuitOpenError: 后端已熔断，请求未发送
+        """
+        return self.run(self._request(endpoint, method, path, api_key, timeout, traffic, **kwargs))
+
+    async def arequest(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        traffic: Optional[TrafficPolicy] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """异步发送请求，参数同 request"""
+        return await self.arun(self._request(endpoint, method, path, api_key, timeout, traffic, **kwargs))
+
+    # ==================== 工作流（SSE 事件流） ====================
+
+    async def _stream(
+        self,
+        endpoint: str,
+        path: str,
+        emit: EventCallback,
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        traffic: Optional[TrafficPolicy] = None,
+        **kwargs: Any,
+    ) -> None:
+        headers = dict(kwargs.pop("headers", None) or {})
+        if api_key:
+            headers.setdefault("Authorization", f"Bearer {api_key}")
+        headers.setdefault("Accept", "text/event-stream")
+        client = self._get_client(endpoint)
+        backend = self._get_traffic(endpoint, headers, traffic)
+        attempt = 0
+        while True:
+            # 只在收到事件前重试（已开始执行的工作流不重放）
+            delay = None
+            try:
+                async with backend.slot(path) as outcome:
+                    async with client.stream(
+                        "POST",
+                        path,
+                        headers=headers,
+                        timeout=timeout if timeout is not None else DEFAULT_TIMEOUT,
+                        **kwargs,
+                    ) as response:
+                        outcome.status_code = response.status_code
+                        if response.status_code in RETRYABLE_STATUS_CODES:
+                            delay = self._retry_delay(
+                                backend, attempt, f"HTTP {response.status_code}", retry_after_seconds(response)
+                            )
+                        if delay is None:
+                            if response.status_code >= 400:
+                                await response.aread()
+                                response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                event = _parse_sse_line(line)
+                                if event is not None:
+                                    emit(event)
+                            return
+            except UNSENT_ERRORS as e:
+                delay = self._retry_delay(backend, attempt, type(e).__name__)
+                if delay is None:
+                    raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def iter_events(self, endpoint: str, path: str, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        同步迭代 SSE 事件（事件在后台事件循环中读取，经队列交给调用线程）
+        提前退出迭代时会取消底层请求；请求异常在迭代结束时抛出
+        """
+        events: "queue.Queue[Any]" = queue.Queue()
+        future = self._submit(self._stream(endpoint, path, events.put, **kwargs))
+        future.add_done_callback(lambda _: events.put(_STREAM_END))
+        try:
+            while True:
+                item = events.get()
+                if item is _STREAM_END:
+                    break
+                yield item
+            future.result()
+        finally:
+            future.cancel()
+
+    async def aiter_events(self, endpoint: str, path: str, **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+        """异步迭代 SSE 事件，参数同 iter_events"""
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[Any]" = asyncio.Queue()
+
+        def emit(item: Any) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, item)
+
+        future = self._submit(self._stream(endpoint, path, emit, **kwargs))
+        future.add_done_callback(lambda _: emit(_STREAM_END))
+        try:
+            while True:
+                item = await events.get()
+                if item is _STREAM_END:
+                    break
+                yield item
+            await asyncio.wrap_future(future)
+        finally:
+            future.cancel()
+
+    def run_workflow(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_event: Optional[EventCallback] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        调用 /workflows/run 并返回 blocking 格式的响应
+
+        payload["response_mode"] 为 streaming 时按事件流读取，on_event 在调用线程中逐条回调；
+        为 blocking 时直接返回响应 JSON。HTTP 错误抛出 httpx.HTTPStatusError，
+        工作流执行失败（仅 streaming）抛出 DifyWorkflowError。
+        """
+        if payload.get("response_mode") != "streaming":
+            response = self.request(endpoint, "POST", "/workflows/run", api_key, timeout, json=payload, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+        collector = WorkflowStreamCollector()
+        for event in self.iter_events(endpoint, "/workflows/run", api_key=api_key, timeout=timeout, json=payload, **kwargs):
+            collector.feed(event)
+            if on_event is not None:
+                on_event(event)
+        return collector.result()
+
+    async def arun_workflow(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_event: Optional[EventCallback] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """异步调用 /workflows/run，参数同 run_workflow"""
+        if payload.get("response_mode") != "streaming":
+            response = await self.arequest(endpoint, "POST", "/workflows/run", api_key, timeout, json=payload, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+        collector = WorkflowStreamCollector()
+        async for event in self.aiter_events(endpoint, "/workflows/run", api_key=api_key, timeout=timeout, json=payload, **kwargs):
+            collector.feed(event)
+            if on_event is not None:
+                on_event(event)
+        return collector.result()
+
+    # ==================== 关闭 ====================
+
+    async def _aclose_clients(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭 Dify 客户端失败: {e}")
+
+    def close(self) -> None:
+        """关闭所有客户端并停止后台事件循环（幂等）"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._aclose_clients(), loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"关闭 Dify 客户端连接失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread:
+            thread.join(timeout=5)
+        loop.close()
+        logger.info("Dify 客户端事件循环已停止")
+
+    def stats(self) -> Dict[str, Any]:
+        """当前客户端池状态（用于健康检查）"""
+        return {
+            "running": self._loop is not None and not self._loop.is_closed(),
+            "http2": self.http2,
+            "endpoints": list(self._clients.keys()),
+            "per_endpoint_concurrency": self.per_endpoint_concurrency,
+            "backends": self.traffic.stats(),
+        }
+
+
+dify_client = DifyClientPool()
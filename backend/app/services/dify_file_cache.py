@@ -0,0 +1,220 @@
+"""
+Dify 文件上传缓存
+按（文件内容哈希, Dify 地址）缓存 /files/upload 返回的 upload_file_id，模板反复抽取、票据重新识别时
+不再重复上传同一文件。
+
+- 缓存保存在 dify_file_upload 表中，多个进程/识别工作池线程共用
+- 缓存有效期为 DIFY_FILE_UPLOAD_TTL_SECONDS，应不超过 Dify 上传文件的保留时间
+- 工作流返回“文件不存在/已失效”类错误时，调用方使缓存失效并强制重新上传后重试一次
+- 缓存读写使用独立的数据库会话，不影响调用方事务
+"""
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, select
+
+from app.core import db
+from app.core.config import settings
+from app.models import DifyFileUpload
+from app.services.dify_client import dify_client
+from app.services.dify_traffic import TrafficPolicy
+
+logger = logging.getLogger(__name__)
+
+# 上传使用固定的 Dify 用户标识，缓存的文件可被不同操作人的任务复用
+UPLOAD_USER = "system"
+
+# Dify 工作流因上传文件不存在或已被清理而失败时的错误信息特征（小写匹配）
+_FILE_MISSING_MARKERS = (
+    "invalid upload file",
+    "upload file not found",
+    "file not found",
+    "file not exist",
+    "file has expired",
+    "文件不存在",
+)
+
+
+class DifyFileUploadError(Exception):
+    """上传文件到 Dify 失败"""
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_file_missing_error(message: Optional[str]) -> bool:
+    """错误信息是否表示 Dify 中的上传文件不存在或已失效"""
+    if not message:
+        return False
+    lowered = str(message).lower()
+    return any(marker in lowered for marker in _FILE_MISSING_MARKERS)
+
+
+class DifyFileCache:
+    """（文件哈希, Dify 地址）到 upload_file_id 的缓存"""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self._ttl_seconds = ttl_seconds
+
+    @property
+    def ttl_seconds(self) -> int:
+        return self._ttl_seconds if self._ttl_seconds is not None else settings.DIFY_FILE_UPLOAD_TTL_SECONDS
+
+    @staticmethod
+    def _endpoint_key(endpoint: str) -> str:
+        return endpoint.strip().rstrip("/")
+
+    # ==================== 缓存读写 ====================
+
+    def lookup(self, endpoint: str, file_hash: str) -> Optional[str]:
+        """未过期的 upload_file_id，没有时返回 None"""
+        with Session(db.engine) as session:
+            return session.exec(
+                select(DifyFileUpload.upload_file_id).where(
+                    DifyFileUpload.file_hash == file_hash,
+                    DifyFileUpload.endpoint == self._endpoint_key(endpoint),
+                    DifyFileUpload.expires_at > datetime.now(),
+                )
+            ).first()
+
+    def store(self, endpoint: str, file_hash: str, upload_file_id: str, file_name: Optional[str] = None) -> None:
+        now = datetime.now()
+        values = {
+            "upload_file_id": upload_file_id,
+            "file_name": file_name,
+            "upload_time": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds),
+        }
+        key = self._endpoint_key(endpoint)
+        with Session(db.engine) as session:
+            for _ in range(2):
+                record = session.exec(
+                    select(DifyFileUpload).where(DifyFileUpload.file_hash == file_hash, DifyFileUpload.endpoint == key)
+                ).first()
+                if record is None:
+                    record = DifyFileUpload(file_hash=file_hash, endpoint=key, **values)
+                else:
+                    for field_name, value in values.items():
+                        setattr(record, field_name, value)
+                session.add(record)
+                try:
+                    session.commit()
+                    return
+                except IntegrityError:
+                    # 其他进程同时写入了同一文件，改为更新
+                    session.rollback()
+            logger.warning(f"保存 Dify 文件上传缓存失败: file_hash={file_hash}, endpoint={key}")
+
+    def invalidate(self, endpoint: str, file_hash: str) -> None:
+        with Session(db.engine) as session:
+            session.exec(
+                delete(DifyFileUpload).where(
+                    DifyFileUpload.file_hash == file_hash,
+                    DifyFileUpload.endpoint == self._endpoint_key(endpoint),
+                )
+            )
+            session.commit()
+
+    def purge_expired(self) -> int:
+        """删除已过期的缓存记录"""
+        with Session(db.engine) as session:
+            result = session.exec(delete(DifyFileUpload).where(DifyFileUpload.expires_at <= datetime.now()))
+            session.commit()
+            return result.rowcount or 0
+
+    # ==================== 上传 ====================
+
+    @staticmethod
+    def _parse_upload_response(response) -> str:
+        if response.status_code not in (200, 201):
+            raise DifyFileUploadError(f"文件上传失败: {response.text}")
+        upload_file_id = (response.json() or {}).get("id")
+        if not upload_file_id:
+            raise DifyFileUploadError("文件上传成功但未返回文件ID")
+        return str(upload_file_id)
+
+    def upload_file_id(
+        self,
+        endpoint: str,
+        api_key: str,
+        content: bytes,
+        file_name: str,
+        mime_type: str,
+        *,
+        file_hash: Optional[str] = None,
+        force: bool = False,
+        timeout: float = 120.0,
+        traffic: Optional[TrafficPolicy] = None,
+    ) -> str:
+        """
+        获取文件在 Dify 中的 upload_file_id：命中缓存时直接返回，否则上传并写入缓存
+
+        Args:
+            force: 忽略缓存强制重新上传（工作流报告文件不存在后重试时使用）
+            traffic: 所属模型配置的流量控制策略（见 dify_traffic.policy_for）
+
+        Raises:
+            DifyFileUploadError: 上传失败
+        """
+        file_hash = file_hash or content_hash(content)
+        if not force:
+            cached = self.lookup(endpoint, file_hash)
+            if cached:
+                logger.info(f"复用已上传的 Dify 文件: upload_file_id={cached}, file_hash={file_hash}")
+                return cached
+
+        response = dify_client.request(
+            endpoint, "POST", "/files/upload",
+            api_key=api_key,
+            files={"file": (file_name, content, mime_type)},
+            data={"user": UPLOAD_USER},
+            timeout=timeout,
+            traffic=traffic,
+        )
+        upload_file_id = self._parse_upload_response(response)
+        self.store(endpoint, file_hash, upload_file_id, file_name)
+        logger.info(f"文件已上传到 Dify: upload_file_id={upload_file_id}, file_hash={file_hash}")
+        return upload_file_id
+
+    async def aupload_file_id(
+        self,
+        endpoint: str,
+        api_key: str,
+        content: bytes,
+        file_name: str,
+        mime_type: str,
+        *,
+        file_hash: Optional[str] = None,
+        force: bool = False,
+        timeout: float = 120.0,
+        traffic: Optional[TrafficPolicy] = None,
+    ) -> str:
+        """异步获取 upload_file_id，参数同 upload_file_id（缓存读写在线程中执行）"""
+        file_hash = file_hash or content_hash(content)
+        if not force:
+            cached = await asyncio.to_thread(self.lookup, endpoint, file_hash)
+            if cached:
+                logger.info(f"复用已上传的 Dify 文件: upload_file_id={cached}, file_hash={file_hash}")
+                return cached
+
+        response = await dify_client.arequest(
+            endpoint, "POST", "/files/upload",
+            api_key=api_key,
+            files={"file": (file_name, content, mime_type)},
+            data={"user": UPLOAD_USER},
+            timeout=timeout,
+            traffic=traffic,
+        )
+        upload_file_id = self._parse_upload_response(response)
+        await asyncio.to_thread(self.store, endpoint, file_hash, upload_file_id, file_name)
+        logger.info(f"文件已上传到 Dify: upload_file_id={upload_file_id}, file_hash={file_hash}")
+        return upload_file_id
+
+
+dify_file_cache = DifyFileCache()
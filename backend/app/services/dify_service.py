@@ -16,9 +16,15 @@ except ImportError:
     date_parser = None
 
 from app.models.models_invoice import (
-    RecognitionTask, RecognitionResult, Invoice, InvoiceFile,
+    RecognitionTask, RecognitionResult, RecognitionField, Invoice, InvoiceFile,
     OutputSchema, LLMConfig, InvoiceItem
 )
+from app.core.config import settings
+from app.services.dify_client import DifyWorkflowError, dify_client
+from app.services.dify_traffic import DifyCircuitOpenError, policy_for
+from app.services.dify_file_cache import DifyFileUploadError, dify_file_cache, is_file_missing_error
+from app.services import document_preprocess, recognition_memo, recognition_payload
+from app.services.document_preprocess import document_preprocessor
 from app.services.schema_validation_service import schema_validation_service
 from app.services.schema_mismatch_handler import schema_mismatch_handler
 from app.services.schema_monitoring_service import schema_monitoring_service
@@ -31,6 +37,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# 任务上保留的工作流节点事件数上限（循环/迭代节点可能产生大量事件）
+MAX_NODE_EVENTS = 200
+
 
 class SyntaxService:
     """SYNTAX服务类（基于Dify API规范）"""
@@ -90,12 +99,30 @@ class SyntaxService:
                 self._mark_task_failed(task, "FILE_NOT_FOUND", "文件路径不存在")
                 return False
             
+            # 相同文件、模板版本、Schema、模型配置与提示词已识别成功时直接复用结果
+            memo_key = None
+            if recognition_memo.is_enabled(task):
+                memo_key = recognition_memo.build_key(self.session, task, file)
+                cached = recognition_memo.lookup(self.session, memo_key)
+                if cached is not None:
+                    logger.info(f"命中识别结果缓存: task_id={task_id}, source_task_id={cached.task_id}")
+                    self._save_result(task, invoice, recognition_memo.replay_data(cached))
+                    self._mark_task_completed(task)
+                    return True
+            
             # 调用Dify API
             result = self._call_dify_api(task, model_config, file)
+            if not result["success"] and is_file_missing_error(result.get("error_message")):
+                # Dify 中的上传文件已被清理：使缓存失效，重新上传后重试一次
+                logger.warning(f"Dify 上传文件已失效，重新上传后重试: task_id={task_id}")
+                dify_file_cache.invalidate(model_config.endpoint, file.file_hash)
+                result = self._call_dify_api(task, model_config, file, force_upload=True)
             
             if result["success"]:
                 # 保存识别结果
                 self._save_result(task, invoice, result["data"])
+                if memo_key is not None:
+                    self._record_memo(task, memo_key)
                 self._mark_task_completed(task)
                 return True
             else:
@@ -116,7 +143,8 @@ class SyntaxService:
         self,
         task: RecognitionTask,
         model_config: LLMConfig,
-        file: InvoiceFile
+        file: InvoiceFile,
+        force_upload: bool = False
     ) -> Dict[str, Any]:
         """
         调用SYNTAX API（使用workflows/run接口）
@@ -125,6 +153,7 @@ class SyntaxService:
             task: 识别任务
             model_config: 模型配置
             file: 文件信息
+            force_upload: 忽略上传缓存与 external_file_id，重新上传文件
             
         Returns:
             dict: 包含success、data或error_code、error_message
@@ -156,17 +185,41 @@ class SyntaxService:
             logger.info(f"MIME类型: {file.mime_type}")
             logger.info(f"外部文件ID (external_file_id): {file.external_file_id}")
             
-            if not file.external_file_id:
-                logger.error("文件缺少外部文件ID，无法调用外部API")
-                return {
-                    "success": False,
-                    "error_code": "FILE_ID_ERROR",
-                    "error_message": "文件缺少外部文件ID，请使用模型配置上传"
-                }
+            # 识别前预处理（渲染/缩放/重新压缩），未启用或失败时上传原始文件
+            prepared = document_preprocessor.prepare(file, document_preprocess.options_for_task(self.session, task))
+            if prepared:
+                logger.info(f"使用预处理文件: {prepared.path}, 页数: {prepared.pages}")
+                upload_path, upload_name, upload_mime = prepared.path, prepared.file_name, prepared.mime_type
+                upload_hash = prepared.content_hash
+            else:
+                upload_path, upload_name = Path(file.file_path), file.file_name
+                upload_mime, upload_hash = file.mime_type or "application/pdf", file.file_hash
+
+            # 获取 Dify 上传文件ID：优先使用（文件哈希, endpoint）缓存，其次使用上传时获得的 external_file_id
+            # （仅对应原始文件），都没有时上传文件并写入缓存
+            upload_file_id = None if force_upload else dify_file_cache.lookup(endpoint, upload_hash)
+            if not upload_file_id and not force_upload and not prepared:
+                upload_file_id = file.external_file_id
+            if not upload_file_id:
+                try:
+                    upload_file_id = dify_file_cache.upload_file_id(
+                        endpoint, api_key, upload_path.read_bytes(), upload_name, upload_mime,
+                        file_hash=upload_hash, force=force_upload, traffic=policy_for(model_config),
+                    )
+                except (DifyFileUploadError, httpx.HTTPError, OSError) as e:
+                    logger.error(f"上传文件到Dify失败: {e}")
+                    return {
+                        "success": False,
+                        "error_code": "FILE_ID_ERROR",
+                        "error_message": f"上传文件到Dify失败: {str(e)}"
+                    }
+            logger.info(f"Dify 上传文件ID: {upload_file_id}")
             
             # 根据文件类型确定type
             file_type_lower = file.file_type.lower() if file.file_type else ""
-            if file_type_lower == "pdf":
+            if prepared:
+                file_type_value = "image" if prepared.is_image else "document"
+            elif file_type_lower == "pdf":
                 file_type_value = "document"
             elif file_type_lower in ["jpg", "jpeg", "png", "gif", "bmp"]:
                 file_type_value = "image"
@@ -245,7 +298,7 @@ class SyntaxService:
                 "InvoiceFile": {
                     "transfer_method": "local_file",
                     "type": file_type_value,
-                    "upload_file_id": file.external_file_id  # 使用invoice_file表中的external_file_id
+                    "upload_file_id": upload_file_id
                 }
             }
             
@@ -344,9 +397,10 @@ class SyntaxService:
             else:
                 logger.info("未获取到模板提示词，Input_Pro 字段将不会添加到请求中")
             
+            response_mode = settings.DIFY_RESPONSE_MODE
             payload = {
                 "inputs": inputs,
-                "response_mode": "blocking",
+                "response_mode": response_mode,
                 "user": user_id
             }
             
@@ -360,27 +414,39 @@ class SyntaxService:
             logger.info(f"URL: {url}")
             logger.info(f"请求头: {json.dumps({k: ('***' if k.lower() == 'authorization' else v) for k, v in headers.items()}, ensure_ascii=False)}")
             logger.info(f"请求报文: {json.dumps(payload, ensure_ascii=False, indent=2)}")
-            logger.info(f"使用的external_file_id: {file.external_file_id}")
+            logger.info(f"使用的upload_file_id: {upload_file_id}")
             logger.info("=" * 80)
             
             # 发送请求
             start_time = datetime.now()
             try:
-                with httpx.Client(timeout=300.0) as client:  # 5分钟超时
+                if response_mode == "streaming":
+                    # SSE 事件流：节点事件实时写入任务进度与部分结果
+                    logger.info("开始发送HTTP请求（streaming）...")
+                    result = self._run_workflow_streaming(task, endpoint_clean, payload, headers, model_config)
+                    elapsed_time = (datetime.now() - start_time).total_seconds()
+                    logger.info(f"事件流结束，耗时: {elapsed_time:.2f} 秒")
+                else:
+                    # 使用按 endpoint 共享的连接池，超时取模型配置（默认5分钟）
                     logger.info("开始发送HTTP请求...")
-                    response = client.post(url, json=payload, headers=headers)
+                    response = dify_client.request(
+                        endpoint_clean, "POST", "/workflows/run",
+                        json=payload, headers=headers,
+                        timeout=float(model_config.timeout or 300),
+                        traffic=policy_for(model_config),
+                    )
                     elapsed_time = (datetime.now() - start_time).total_seconds()
-                    
+                
                     logger.info("=" * 80)
                     logger.info("=== SYNTAX API 响应 ===")
                     logger.info(f"HTTP状态码: {response.status_code}")
                     logger.info(f"响应时间: {elapsed_time:.2f} 秒")
                     logger.info(f"响应头: {dict(response.headers)}")
-                    
+                
                     # 检查HTTP状态码 - 只有2xx才认为是成功
                     status_code = response.status_code
                     logger.info(f"HTTP状态码: {status_code}")
-                    
+                
                     # 如果HTTP状态码不是2xx，直接返回失败
                     if not (200 <= status_code < 300):
                         logger.error("=" * 80)
@@ -403,7 +469,7 @@ class SyntaxService:
                             logger.error(f"错误响应文本: {response.text[:1000]}")
                             error_message = response.text[:500] if response.text else f"HTTP错误: {status_code}"
                         logger.error("=" * 80)
-                        
+                    
                         # 根据状态码返回相应的错误信息
                         if status_code == 401:
                             return {
@@ -423,16 +489,16 @@ class SyntaxService:
                                 "error_code": "DIFY_HTTP_ERROR",
                                 "error_message": error_message
                             }
-                    
+                
                     # HTTP状态码为2xx，继续处理响应
                     logger.info("HTTP状态码为2xx，继续处理响应")
-                    
+                
                     # 尝试解析响应
                     try:
                         result = response.json()
                         logger.info("响应类型: JSON")
                         logger.info(f"完整响应内容: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                        
+                    
                         # 提取关键信息
                         if isinstance(result, dict):
                             logger.info("--- 响应关键字段 ---")
@@ -462,7 +528,7 @@ class SyntaxService:
                         logger.warning(f"响应不是有效的JSON格式: {str(e)}")
                         logger.info(f"原始响应文本: {response.text[:1000]}")  # 只显示前1000字符
                         result = {"raw_text": response.text}
-                    
+                
             except httpx.HTTPStatusError as e:
                 elapsed_time = (datetime.now() - start_time).total_seconds()
                 logger.error("=" * 80)
@@ -552,6 +618,20 @@ class SyntaxService:
                 "error_code": "DIFY_TIMEOUT",
                 "error_message": "Dify请求超时"
             }
+        except DifyCircuitOpenError as e:
+            logger.warning(f"Dify 调用已熔断: {str(e)}")
+            return {
+                "success": False,
+                "error_code": "DIFY_CIRCUIT_OPEN",
+                "error_message": str(e)
+            }
+        except DifyWorkflowError as e:
+            logger.error(f"Dify工作流执行失败: {str(e)}")
+            return {
+                "success": False,
+                "error_code": "DIFY_WORKFLOW_FAILED",
+                "error_message": str(e)
+            }
         except Exception as e:
             logger.error(f"调用Dify API失败: {str(e)}", exc_info=True)
             return {
@@ -890,7 +970,13 @@ class SyntaxService:
             ).first()
             
             if existing_result:
+                # streaming 模式下已写入部分结果，此处以最终结果覆盖
                 result = existing_result
+                result.total_fields = total_fields
+                result.recognized_fields = recognized_fields
+                result.accuracy = accuracy
+                result.confidence = confidence
+                result.status = "success"
             else:
                 result = RecognitionResult(
                     invoice_id=invoice.id,
@@ -906,8 +992,13 @@ class SyntaxService:
             # 更新结果数据
             result.raw_payload = result_data.get("raw_payload")
             result.raw_response_uri = result_data.get("raw_response_uri")
-            result.normalized_fields = normalized_fields
+            # 详情展示的字段在写入时确定，读取时不再解析原始响应
+            result.normalized_fields = recognition_payload.storage_fields(
+                normalized_fields, result.raw_payload, result.raw_data
+            )
             result.model_usage = result_data.get("model_usage")
+            if isinstance(processed_data, dict) and processed_data:
+                self._upsert_recognition_fields(result, processed_data)
             
             # 更新任务信息
             if result_data.get("request_id"):
@@ -1051,12 +1142,11 @@ class SyntaxService:
             # 1. Schema验证
             validation_start = datetime.now()
             try:
-                import asyncio
-                validation_result = asyncio.run(schema_validation_service.validate_output(
+                validation_result = schema_validation_service.validate_output_sync(
                     output_data=output_data,
                     schema_id=schema_id,
                     model_config_id=str(model_config.id)
-                ))
+                )
             except Exception as e:
                 logger.error(f"Schema验证失败: {str(e)}")
                 validation_result = type('ValidationResult', (), {
@@ -1069,16 +1159,16 @@ class SyntaxService:
             logger.info(f"警告数量: {len(validation_result.warnings)}")
             logger.info(f"验证耗时: {validation_time_ms:.2f}ms")
 
-            # 记录验证指标（异步调用）
+            # 记录验证指标
             try:
-                asyncio.run(schema_monitoring_service.record_validation(
+                schema_monitoring_service.record_validation_sync(
                     model_config_id=str(model_config.id),
                     schema_id=schema_id,
                     is_valid=validation_result.is_valid,
                     error_count=len(validation_result.errors),
                     warning_count=len(validation_result.warnings),
                     validation_time_ms=validation_time_ms
-                ))
+                )
             except Exception as e:
                 logger.error(f"记录验证指标失败: {str(e)}")
 
@@ -1089,12 +1179,12 @@ class SyntaxService:
 
             # 2. 使用 Schema 不匹配处理器进行统一处理
             logger.info("Schema验证失败，使用不匹配处理器处理")
-            mismatch_result = asyncio.run(schema_mismatch_handler.handle_mismatch(
+            mismatch_result = schema_mismatch_handler.handle_mismatch_sync(
                 output_data=output_data,
                 schema_id=schema_id,
                 model_config_id=str(model_config.id),
                 handling_strategy="auto"
-            ))
+            )
 
             logger.info(f"不匹配处理完成:")
             logger.info(f"  - 不匹配项数量: {len(mismatch_result.mismatch_items)}")
@@ -1158,9 +1248,184 @@ class SyntaxService:
             # 返回原始数据，确保流程继续
             return output_data
     
+    def _run_workflow_streaming(
+        self,
+        task: RecognitionTask,
+        endpoint: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        model_config: LLMConfig
+    ) -> Dict[str, Any]:
+        """
+        以 streaming 模式调用工作流，节点事件到达时更新任务进度并保存部分结果
+        
+        Returns:
+            dict: 与 blocking 模式一致的响应结构
+        """
+        task.progress = 0
+        task.current_node = None
+        task.node_events = []
+        self.session.add(task)
+        self.session.commit()
+        
+        state = {"finished_nodes": 0}
+        
+        def on_event(event: Dict[str, Any]) -> None:
+            try:
+                self._on_workflow_event(task, event, state)
+            except Exception as e:
+                # 进度写入失败不影响识别本身
+                logger.warning(f"记录工作流事件失败: {str(e)}")
+                self.session.rollback()
+        
+        return dify_client.run_workflow(
+            endpoint,
+            payload,
+            headers=headers,
+            timeout=float(model_config.timeout or 300),
+            on_event=on_event,
+            traffic=policy_for(model_config),
+        )
+    
+    def _on_workflow_event(self, task: RecognitionTask, event: Dict[str, Any], state: Dict[str, int]):
+        """处理单条工作流 SSE 事件：记录节点耗时、更新进度、保存部分结果"""
+        event_type = event.get("event")
+        data = event.get("data") or {}
+        
+        if event_type == "workflow_started":
+            task.request_id = event.get("workflow_run_id") or data.get("id") or task.request_id
+            task.progress = max(task.progress or 0, 5)
+        elif event_type == "node_started":
+            task.current_node = str(data.get("title") or data.get("node_type") or "")[:200] or None
+            node_events = list(task.node_events or [])
+            node_events.append({
+                "node_id": data.get("node_id"),
+                "node_type": data.get("node_type"),
+                "title": data.get("title"),
+                "status": "running",
+                "started_at": data.get("created_at"),
+            })
+            task.node_events = node_events[-MAX_NODE_EVENTS:]
+        elif event_type == "node_finished":
+            node_events = [dict(item) for item in task.node_events or []]
+            for item in reversed(node_events):
+                if item.get("node_id") == data.get("node_id") and item.get("status") == "running":
+                    item["status"] = data.get("status")
+                    item["elapsed_time"] = data.get("elapsed_time")
+                    break
+            task.node_events = node_events
+            # 工作流节点总数未知，进度按已完成节点数渐近增长，完成时置为100
+            state["finished_nodes"] += 1
+            finished = state["finished_nodes"]
+            task.progress = max(task.progress or 0, 5 + int(90 * finished / (finished + 2)))
+            
+            partial_fields = self._extract_partial_fields(data.get("outputs"))
+            if partial_fields:
+                self._save_partial_result(task, partial_fields)
+        elif event_type == "workflow_finished":
+            task.current_node = None
+        else:
+            # ping、text_chunk 等事件不落库
+            return
+        
+        self.session.add(task)
+        self.session.commit()
+    
+    @staticmethod
+    def _extract_partial_fields(outputs: Any) -> Optional[Dict[str, Any]]:
+        """从节点输出中提取结构化字段（LLM 节点的 text/structured_output 为 JSON 对象时）"""
+        if not isinstance(outputs, dict):
+            return None
+        for key in ("structured_output", "text"):
+            value = outputs.get(key)
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except (json.JSONDecodeError, TypeError):
+                    continue
+            if isinstance(value, dict) and value:
+                return value
+        return None
+    
+    def _save_partial_result(self, task: RecognitionTask, fields: Dict[str, Any]):
+        """保存部分识别结果（status=partial），最终结果由 _save_result 覆盖"""
+        result = self.session.exec(
+            select(RecognitionResult).where(RecognitionResult.task_id == task.id)
+        ).first()
+        if result is None:
+            result = RecognitionResult(
+                invoice_id=task.invoice_id,
+                task_id=task.id,
+                accuracy=0.0,
+                confidence=0.0,
+                status="partial"
+            )
+        elif result.status != "partial":
+            return
+        
+        result.normalized_fields = fields
+        result.total_fields = len(fields)
+        result.recognized_fields = sum(1 for v in fields.values() if v is not None and v != "")
+        self.session.add(result)
+        self.session.flush()
+        self._upsert_recognition_fields(result, fields)
+    
+    def _upsert_recognition_fields(self, result: RecognitionResult, fields: Dict[str, Any]):
+        """按字段名写入识别字段（已手动修正的字段不覆盖）"""
+        existing = {
+            field.field_name: field
+            for field in self.session.exec(
+                select(RecognitionField).where(RecognitionField.result_id == result.id)
+            ).all()
+        }
+        for name, value in fields.items():
+            field_name = str(name)[:100]
+            if value is None or isinstance(value, str):
+                field_value = value
+            else:
+                field_value = json.dumps(value, ensure_ascii=False)
+            
+            field = existing.get(field_name)
+            if field is None:
+                field = RecognitionField(
+                    invoice_id=result.invoice_id,
+                    result_id=result.id,
+                    field_name=field_name,
+                    field_value=field_value,
+                    original_value=field_value,
+                    confidence=result.confidence or 0.0,
+                    accuracy=result.accuracy or 0.0
+                )
+                existing[field_name] = field
+            elif not field.is_manual_corrected:
+                field.field_value = field_value
+                field.original_value = field_value
+                field.confidence = result.confidence or 0.0
+                field.accuracy = result.accuracy or 0.0
+            else:
+                continue
+            self.session.add(field)
+    
+    def _record_memo(self, task: RecognitionTask, memo_key: "recognition_memo.MemoKey"):
+        """将任务的识别结果写入识别结果缓存（失败不影响任务完成）"""
+        try:
+            result_id = self.session.exec(
+                select(RecognitionResult.id).where(
+                    RecognitionResult.task_id == task.id, RecognitionResult.status == "success"
+                )
+            ).first()
+            if result_id:
+                recognition_memo.record(self.session, memo_key, result_id)
+                self.session.commit()
+        except Exception as e:
+            logger.warning(f"写入识别结果缓存失败: task_id={task.id}, 错误: {str(e)}")
+            self.session.rollback()
+    
     def _mark_task_completed(self, task: RecognitionTask):
         """标记任务为完成"""
         task.status = "completed"
+        task.progress = 100
+        task.current_node = None
         task.end_time = datetime.now()
         if task.start_time:
             duration = (task.end_time - task.start_time).total_seconds()
@@ -1171,6 +1436,7 @@ class SyntaxService:
     def _mark_task_failed(self, task: RecognitionTask, error_code: str, error_message: str):
         """标记任务为失败"""
         task.status = "failed"
+        task.current_node = None
         task.end_time = datetime.now()
         task.error_code = error_code
         task.error_message = error_message
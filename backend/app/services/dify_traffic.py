@@ -0,0 +1,388 @@
+"""
+Dify 调用流量控制
+Dify 或上游模型限流时，按每个后端（LLMConfig：endpoint + API Key）控制请求速率与并发，
+让持续吞吐跟随后端实际能承受的量，而不是压垮已饱和的后端或让容量闲置。
+
+- 令牌桶：llm_config.rate_limit_per_minute / rate_limit_burst 限制请求速率（为空不限速）
+- AIMD 自适应并发：正常响应且延迟未明显升高时并发上限缓慢增加（每轮 +1），
+  429/5xx/超时时减半，延迟超过基线 DIFY_ADAPTIVE_LATENCY_TOLERANCE 倍时小幅下调；
+  上限为 llm_config.max_concurrency（为空使用 DIFY_HTTP_PER_ENDPOINT_CONCURRENCY）
+- 熔断：连续 DIFY_CIRCUIT_FAILURE_THRESHOLD 次 5xx/连接失败/超时后熔断 DIFY_CIRCUIT_OPEN_SECONDS 秒，
+  期间请求直接抛出 DifyCircuitOpenError；到期后放行一个探测请求，成功则恢复
+- 重试：仅重试确定未被后端处理或可安全重放的失败（429、502/503/504、连接失败），
+  次数取 llm_config.max_retries，退避为带全抖动的指数退避，优先遵循 Retry-After
+
+所有状态只在 Dify 客户端的后台事件循环中访问（见 dify_client.py），不需要线程锁。
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import httpx
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 可重试的 HTTP 状态码（请求未被处理或后端明确要求稍后重试）
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+# 计入熔断的状态码
+_FAILURE_STATUS_CODES = frozenset({500, 502, 503, 504})
+# 请求确定未发送到后端的传输错误（可安全重放）
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 延迟基线（EWMA）的平滑系数
+_LATENCY_ALPHA = 0.1
+
+
+class DifyCircuitOpenError(httpx.RequestError):
+    """后端已熔断，请求未发送"""
+
+
+@dataclass(frozen=True)
+class TrafficPolicy:
+    """单个后端的流量策略"""
+    rate_per_minute: Optional[int] = None
+    burst: Optional[int] = None
+    max_concurrency: Optional[int] = None
+    max_retries: int = 3
+    # 指标标签（LLMConfig.name）
+    name: Optional[str] = None
+
+
+def policy_for(config: Any) -> TrafficPolicy:
+    """由 LLMConfig 构造流量策略"""
+    return TrafficPolicy(
+        rate_per_minute=getattr(config, "rate_limit_per_minute", None) or None,
+        burst=getattr(config, "rate_limit_burst", None) or None,
+        max_concurrency=getattr(config, "max_concurrency", None) or None,
+        max_retries=max(0, config.max_retries if config.max_retries is not None else 3),
+        name=getattr(config, "name", None) or None,
+    )
+
+
+def backend_key(endpoint: str, api_key: Optional[str]) -> str:
+    """后端标识：endpoint 与 API Key 摘要（同一 Dify 应用的调用共用一组限流状态）"""
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    return f"{endpoint.strip().rstrip('/')}#{key_digest}"
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第 attempt 次重试前的等待时间（全抖动指数退避，不小于 Retry-After）"""
+    ceiling = min(settings.DIFY_RETRY_MAX_DELAY, settings.DIFY_RETRY_BASE_DELAY * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.DIFY_RETRY_MAX_DELAY))
+    return delay
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """解析 Retry-After（仅支持秒数）"""
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """令牌桶（允许令牌透支，按透支量排队等待，保证先到先得）"""
+
+    def __init__(self, rate_per_second: float, capacity: float, clock=time.monotonic):
+        self._clock = clock
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = clock()
+
+    def configure(self, rate_per_second: float, capacity: float) -> None:
+        self._refill()
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = min(self._tokens, capacity)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """取一个令牌，返回需要等待的秒数"""
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AdaptiveLimiter:
+    """AIMD 并发上限"""
+
+    def __init__(self, max_limit: int, clock=time.monotonic):
+        self._clock = clock
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.latency_baseline: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    def configure(self, max_limit: int) -> None:
+        self.max_limit = max(1, max_limit)
+        self.limit = min(self.limit, self.max_limit)
+        self._wake()
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已分配到名额但调用方被取消，归还名额
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def on_success(self, latency: float) -> None:
+        baseline = self.latency_baseline
+        self.latency_baseline = latency if baseline is None else baseline + _LATENCY_ALPHA * (latency - baseline)
+        if baseline is not None and latency > baseline * settings.DIFY_ADAPTIVE_LATENCY_TOLERANCE:
+            self._decrease(0.9)
+        else:
+            # 加性增：每个“窗口”（约 limit 个成功请求）上限 +1
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_overload(self) -> None:
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float) -> None:
+        # 同一轮拥塞中并发请求的多次失败只下调一次
+        now = self._clock()
+        if now - self._last_decrease < (self.latency_baseline or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(1.0, self.limit * factor)
+
+
+class CircuitBreaker:
+    """连续失败熔断"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= settings.DIFY_CIRCUIT_OPEN_SECONDS:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= settings.DIFY_CIRCUIT_FAILURE_THRESHOLD:
+            if self.opened_at is None or self._probing:
+                logger.warning(f"Dify 后端熔断 {settings.DIFY_CIRCUIT_OPEN_SECONDS} 秒（连续失败 {self.failures} 次）")
+            self.opened_at = self._clock()
+            self._probing = False
+
+    def on_neutral(self) -> None:
+        """结果不说明后端健康状况（如 4xx），结束探测但不改变失败计数"""
+        self._probing = False
+
+
+class BackendTraffic:
+    """单个后端的令牌桶、自适应并发与熔断状态"""
+
+    def __init__(self, key: str, policy: TrafficPolicy, default_concurrency: int):
+        self.key = key
+        self.policy = policy
+        self.default_concurrency = default_concurrency
+        self.bucket: Optional[TokenBucket] = None
+        self.limiter = AdaptiveLimiter(self._max_concurrency(policy))
+        self.breaker = CircuitBreaker()
+        self.throttled = 0
+        self.rejected = 0
+        self.retried = 0
+        self.configure(policy)
+
+    @property
+    def label(self) -> str:
+        """指标标签：模型配置名称，未知时为 endpoint"""
+        return self.policy.name or self.key.split("#")[0]
+
+    def _max_concurrency(self, policy: TrafficPolicy) -> int:
+        return policy.max_concurrency or self.default_concurrency
+
+    def configure(self, policy: TrafficPolicy) -> None:
+        """配置修改后更新限额（保留当前的自适应与熔断状态）"""
+        self.policy = policy
+        self.limiter.configure(self._max_concurrency(policy))
+        if not policy.rate_per_minute:
+            self.bucket = None
+            return
+        rate = policy.rate_per_minute / 60.0
+        capacity = float(policy.burst or max(1, policy.rate_per_minute // 60))
+        if self.bucket is None:
+            self.bucket = TokenBucket(rate, capacity)
+        else:
+            self.bucket.configure(rate, capacity)
+
+    @asynccontextmanager
+    async def slot(self, path: str = "") -> AsyncIterator["SlotOutcome"]:
+        """
+        获取一次请求的发送名额（熔断检查、令牌、并发），退出时按结果调整并记录指标
+
+        Args:
+            path: 请求路径（指标标签）
+
+        Raises:
+            DifyCircuitOpenError: 后端已熔断
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            metrics.DIFY_REQUESTS_REJECTED.labels(self.label).inc()
+            raise DifyCircuitOpenError(f"Dify 后端暂时不可用（已熔断）: {self.key.split('#')[0]}")
+        try:
+            if self.bucket is not None:
+                wait = self.bucket.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await self.limiter.acquire()
+        except BaseException:
+            # 等待令牌或名额时被取消：请求未发送，结束可能已占用的半开探测
+            self.breaker.on_neutral()
+            raise
+        label = self.label
+        metrics.DIFY_IN_FLIGHT.labels(label).inc()
+        outcome = SlotOutcome()
+        status = "error"
+        started = time.monotonic()
+        try:
+            yield outcome
+        except httpx.TransportError as e:
+            # 连接失败、超时、连接中断
+            status = type(e).__name__
+            self.limiter.on_overload()
+            self.breaker.on_failure()
+            raise
+        except BaseException:
+            if outcome.status_code is not None:
+                status = str(outcome.status_code)
+                self._record(outcome.status_code, time.monotonic() - started)
+            else:
+                self.breaker.on_neutral()
+            raise
+        else:
+            status = str(outcome.status_code)
+            self._record(outcome.status_code, time.monotonic() - started)
+        finally:
+            self.limiter.release()
+            metrics.DIFY_IN_FLIGHT.labels(label).dec()
+            metrics.DIFY_REQUEST_SECONDS.labels(label, path, status).observe(time.monotonic() - started)
+            metrics.DIFY_CIRCUIT_OPEN.labels(label).set(0 if self.breaker.opened_at is None else 1)
+
+    def _record(self, status_code: Optional[int], latency: float) -> None:
+        if status_code in _FAILURE_STATUS_CODES:
+            self.limiter.on_overload()
+            self.breaker.on_failure()
+        elif status_code == 429:
+            self.throttled += 1
+            self.limiter.on_overload()
+            self.breaker.on_neutral()
+        elif status_code is not None and status_code < 400:
+            self.limiter.on_success(latency)
+            self.breaker.on_success()
+        else:
+            self.breaker.on_neutral()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.key.split("#")[0],
+            "circuit": self.breaker.state,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "max_concurrency": self.limiter.max_limit,
+            "in_flight": self.limiter.in_flight,
+            "queued": self.limiter.queued,
+            "latency_baseline": round(self.limiter.latency_baseline, 3) if self.limiter.latency_baseline else None,
+            "rate_per_minute": self.policy.rate_per_minute,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "retried": self.retried,
+        }
+
+
+class SlotOutcome:
+    """请求结果（由调用方在 slot 内设置响应状态码）"""
+
+    def __init__(self) -> None:
+        self.status_code: Optional[int] = None
+
+
+class TrafficRegistry:
+    """后端标识到流量状态的映射"""
+
+    def __init__(self, default_concurrency: int = settings.DIFY_HTTP_PER_ENDPOINT_CONCURRENCY):
+        # 未配置 max_concurrency 的后端的并发上限
+        self.default_concurrency = max(1, default_concurrency)
+        self._backends: Dict[str, BackendTraffic] = {}
+
+    def get(self, endpoint: str, api_key: Optional[str], policy: Optional[TrafficPolicy] = None) -> BackendTraffic:
+        """后端流量状态；传入策略时更新限额，未传入时沿用已有策略（没有时使用默认策略）"""
+        key = backend_key(endpoint, api_key)
+        backend = self._backends.get(key)
+        if backend is None:
+            backend = BackendTraffic(key, policy or TrafficPolicy(), self.default_concurrency)
+            self._backends[key] = backend
+        elif policy is not None and policy != backend.policy:
+            backend.configure(policy)
+        return backend
+
+    def clear(self) -> None:
+        self._backends.clear()
+
+    def stats(self) -> list:
+        return [backend.stats() for backend in list(self._backends.values())]
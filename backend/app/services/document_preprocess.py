@@ -0,0 +1,333 @@
+"""
+识别前文档预处理
+原始上传文件（多页 PDF、整张手机照片）直接提交工作流时，上传耗时与大模型视觉推理耗时随像素数增长；
+识别前先把文件处理为分辨率受控、体积更小的版本再上传。
+
+- PDF 逐页按 DPI 渲染为图片，图片按 EXIF 方向转正；长边缩放到不超过 long_edge
+- 重新编码为 JPEG（不写入 EXIF/ICC 等元数据），可选裁掉空白边距
+- 单页结果上传 JPEG 图片；多页结果（工作流 InvoiceFile 只接收一个文件）重新打包为仅含页面图片的 PDF
+- 页数超过 max_pages 的文件不预处理、上传原始文件（不丢弃后面页面上的行项目）
+- 在进程池中执行（CPU 密集，spawn 方式启动子进程），结果按（文件哈希, 预处理配置）缓存在原文件旁的
+  <原文件名>.preprocessed/ 目录，相同内容、相同配置的文件只处理一次
+- 全局默认值见 PREPROCESS_* 配置，模板 preprocess_config 可逐项覆盖；任务参数 preprocess=false 时不预处理
+- 依赖 Pillow（图片）与 pypdfium2（PDF），未安装或处理失败时上传原始文件
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models.models_invoice import InvoiceFile, RecognitionTask, Template
+from app.services.preview_renderer import PreviewUnavailable, count_pages, iter_pages
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_DIR_SUFFIX = ".preprocessed"
+# 处理逻辑变化时递增，使已缓存的结果失效
+PREPROCESS_VERSION = 2
+# 裁边时视为空白的灰度阈值与保留的边距（像素）
+_BLANK_THRESHOLD = 245
+_CROP_PADDING = 16
+
+
+class PageLimitExceeded(ValueError):
+    """文件页数超过预处理页数上限（上传原始文件）"""
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """预处理配置"""
+    enabled: bool = True
+    dpi: int = 200
+    long_edge: int = 2048
+    quality: int = 85
+    crop_margins: bool = False
+    max_pages: int = 10
+
+    @property
+    def digest(self) -> str:
+        """配置指纹（用作缓存文件名与识别结果缓存键的一部分）"""
+        payload = json.dumps({"version": PREPROCESS_VERSION, **asdict(self)}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class PreparedDocument:
+    """预处理后的上传文件"""
+    path: Path
+    file_name: str
+    mime_type: str
+    # 上传缓存键（原文件哈希与配置指纹的 SHA256）
+    content_hash: str
+    pages: int
+
+    @property
+    def is_image(self) -> bool:
+        return self.mime_type.startswith("image/")
+
+
+def default_options() -> PreprocessOptions:
+    return PreprocessOptions(
+        enabled=settings.PREPROCESS_ENABLED,
+        dpi=settings.PREPROCESS_DPI,
+        long_edge=settings.PREPROCESS_LONG_EDGE,
+        quality=settings.PREPROCESS_JPEG_QUALITY,
+        crop_margins=settings.PREPROCESS_CROP_MARGINS,
+        max_pages=settings.PREPROCESS_MAX_PAGES,
+    )
+
+
+def validate_config(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    校验模板 preprocess_config（只允许 PreprocessOptions 中的字段）
+
+    Raises:
+        ValueError: 字段或取值不合法
+    """
+    if config is None:
+        return None
+    if not isinstance(config, dict):
+        raise ValueError("预处理配置必须是对象")
+    types = {item.name: item.type for item in fields(PreprocessOptions)}
+    unknown = set(config) - set(types)
+    if unknown:
+        raise ValueError(f"不支持的预处理配置: {', '.join(sorted(unknown))}")
+    for name, value in config.items():
+        if types[name] is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"预处理配置 {name} 必须是布尔值")
+        elif isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise ValueError(f"预处理配置 {name} 必须是正整数")
+    if not 1 <= config.get("quality", 85) <= 100:
+        raise ValueError("预处理配置 quality 取值范围为 1-100")
+    return config
+
+
+def resolve_options(template: Optional[Template]) -> PreprocessOptions:
+    """全局默认值叠加模板配置（模板配置不合法时忽略）"""
+    options = default_options()
+    config = getattr(template, "preprocess_config", None) if template else None
+    if not config:
+        return options
+    try:
+        return replace(options, **validate_config(config))
+    except ValueError as e:
+        logger.warning(f"模板 {template.id} 预处理配置无效，使用默认配置: {e}")
+        return options
+
+
+def options_for_task(session: Session, task: RecognitionTask) -> PreprocessOptions:
+    """任务使用的预处理配置（模板与 SyntaxService._call_dify_api 的来源一致）"""
+    params = task.params or {}
+    if params.get("preprocess", True) is False:
+        return replace(default_options(), enabled=False)
+    template_id = task.template_id or params.get("template_id")
+    template = None
+    if template_id:
+        try:
+            template = session.get(Template, UUID(str(template_id)))
+        except ValueError:
+            template = None
+    return resolve_options(template)
+
+
+def preprocess_dir(file_path: str) -> Path:
+    path = Path(file_path)
+    return path.with_name(path.name + PREPROCESS_DIR_SUFFIX)
+
+
+def _read_meta(file_path: str, digest: str) -> Optional[Dict[str, Any]]:
+    try:
+        meta = json.loads((preprocess_dir(file_path) / f"{digest}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return meta if (preprocess_dir(file_path) / meta.get("output", "")).is_file() else None
+
+
+# ==================== 子进程 ====================
+
+def _crop_blank_margins(image):
+    """裁掉接近白色的边距（保留少量留白）"""
+    mask = image.convert("L").point(lambda value: 255 if value < _BLANK_THRESHOLD else 0)
+    box = mask.getbbox()
+    if not box:
+        return image
+    left, top, right, bottom = box
+    return image.crop((
+        max(left - _CROP_PADDING, 0),
+        max(top - _CROP_PADDING, 0),
+        min(right + _CROP_PADDING, image.width),
+        min(bottom + _CROP_PADDING, image.height),
+    ))
+
+
+def preprocess_document(source: str, mime_type: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    预处理文件并写入缓存目录（进程池入口，也可在当前进程直接调用）
+
+    Args:
+        options: PreprocessOptions 的字段（asdict）
+
+    Returns:
+        处理结果信息（同 <digest>.json）
+    """
+    opts = PreprocessOptions(**options)
+    source_pages = count_pages(source, mime_type)
+    if source_pages > opts.max_pages:
+        raise PageLimitExceeded(f"文件共 {source_pages} 页，超过预处理页数上限 {opts.max_pages}")
+    pages = []
+    for image in iter_pages(source, mime_type, opts.long_edge, opts.max_pages, dpi=opts.dpi):
+        # 重新构造 RGB 图像，不带原图的 EXIF/ICC/XMP 等元数据
+        image = image.convert("RGB")
+        if opts.crop_margins:
+            image = _crop_blank_margins(image)
+        image.thumbnail((opts.long_edge, opts.long_edge))
+        pages.append(image)
+    if not pages:
+        raise ValueError("文件中没有可处理的页面")
+
+    target = preprocess_dir(source)
+    target.mkdir(parents=True, exist_ok=True)
+    digest = opts.digest
+    if len(pages) == 1:
+        output, output_mime = f"{digest}.jpg", "image/jpeg"
+        save_args = {"format": "JPEG", "quality": opts.quality, "optimize": True}
+    else:
+        output, output_mime = f"{digest}.pdf", "application/pdf"
+        save_args = {"format": "PDF", "save_all": True, "append_images": pages[1:],
+                     "resolution": float(opts.dpi), "quality": opts.quality}
+    temp = target / f".{output}.{os.getpid()}.tmp"
+    pages[0].save(temp, **save_args)
+    os.replace(temp, target / output)
+
+    meta = {
+        "output": output,
+        "mime_type": output_mime,
+        "pages": len(pages),
+        "source_pages": source_pages,
+        "size": (target / output).stat().st_size,
+        "original_size": Path(source).stat().st_size,
+    }
+    temp = target / f".{digest}.json.{os.getpid()}.tmp"
+    temp.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(temp, target / f"{digest}.json")
+    return meta
+
+
+# ==================== 进程池 ====================
+
+class DocumentPreprocessor:
+    """预处理进程池（按需创建；同一文件同一配置同时只处理一次）"""
+
+    def __init__(self, max_workers: int = settings.PREPROCESS_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 正在处理的文件：(file_path, digest) -> Future
+        self._futures: Dict[tuple, Future] = {}
+        # 缺少预处理依赖时不再提交任务
+        self._unavailable: Optional[str] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _submit(self, file_path: str, mime_type: str, options: PreprocessOptions) -> Future:
+        key = (file_path, options.digest)
+        with self._lock:
+            future = self._futures.get(key)
+        if future is not None:
+            return future
+        args = (preprocess_document, file_path, mime_type, asdict(options))
+        try:
+            future = self._get_executor().submit(*args)
+        except BrokenProcessPool:
+            logger.warning("预处理进程池已损坏，重新创建")
+            self.stop()
+            future = self._get_executor().submit(*args)
+        with self._lock:
+            existing = self._futures.setdefault(key, future)
+        if existing is not future:
+            future.cancel()
+            return existing
+        future.add_done_callback(lambda f: self._forget(key))
+        return future
+
+    def _forget(self, key: tuple) -> None:
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def prepare(
+        self,
+        file: InvoiceFile,
+        options: PreprocessOptions,
+        timeout: Optional[float] = None,
+    ) -> Optional[PreparedDocument]:
+        """
+        预处理后的上传文件（已缓存时直接返回）
+
+        Returns:
+            未启用、依赖缺失、页数超过上限、处理失败或超时时返回 None，调用方上传原始文件
+        """
+        if not options.enabled or not file.file_hash or self._unavailable:
+            return None
+        file_path = file.file_path
+        meta = _read_meta(file_path, options.digest)
+        if meta is None:
+            if not Path(file_path).exists():
+                return None
+            future = self._submit(file_path, file.mime_type or "", options)
+            try:
+                meta = future.result(timeout=settings.PREPROCESS_TIMEOUT_SECONDS if timeout is None else timeout)
+            except PreviewUnavailable as e:
+                self._unavailable = str(e)
+                logger.warning(f"不进行识别前预处理: {e}")
+                return None
+            except PageLimitExceeded as e:
+                logger.warning(f"{e}，上传原始文件: {file_path}")
+                return None
+            except FutureTimeoutError:
+                logger.warning(f"预处理超时，上传原始文件: {file_path}")
+                return None
+            except Exception as e:
+                logger.warning(f"预处理失败，上传原始文件: {file_path}, 错误: {e}")
+                return None
+
+        stem = Path(file.file_name or "invoice").stem
+        return PreparedDocument(
+            path=preprocess_dir(file_path) / meta["output"],
+            file_name=f"{stem}{Path(meta['output']).suffix}",
+            mime_type=meta["mime_type"],
+            content_hash=hashlib.sha256(f"{file.file_hash}:{options.digest}".encode("utf-8")).hexdigest(),
+            pages=meta["pages"],
+        )
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures.values())
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+document_preprocessor = DocumentPreprocessor()
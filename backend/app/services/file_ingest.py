@@ -0,0 +1,409 @@
+"""
+票据文件流式入库
+上传文件按块读取，边计算 SHA-256 边写入临时文件，单次上传的内存占用与文件大小无关：
+
+- 存储按内容寻址分片：uploads/ab/cd/<sha256>（ab、cd 为哈希前四位），同一内容在磁盘上只有一份
+- 哈希去重在临时文件改名到正式位置之前完成，重复文件不会落盘
+- 文件记录与票据记录在同一个事务中提交，失败时删除本次新写入的文件
+- 单文件大小上限为 UPLOAD_MAX_FILE_SIZE_MB，超过上限时立即停止读取
+- 批量上传（多文件或 zip 压缩包）在线程池中并行暂存与计算哈希，用一条 IN 查询去重，
+  全部文件记录与票据记录批量插入、一次提交，并返回逐个文件的结果
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from fastapi import UploadFile
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import User, UserCompany
+from app.models.models_invoice import Invoice, InvoiceFile
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).parent.parent.parent
+UPLOAD_ROOT = BACKEND_DIR / "uploads"
+# 临时文件与正式文件在同一文件系统，改名是原子操作
+INCOMING_DIR = UPLOAD_ROOT / ".incoming"
+
+CHUNK_SIZE = 1024 * 1024
+
+ALLOWED_MIME_TYPES = ("application/pdf", "image/jpeg", "image/png", "image/jpg")
+ZIP_MIME_TYPES = ("application/zip", "application/x-zip-compressed")
+
+
+class UploadRejected(Exception):
+    """上传校验失败（携带 HTTP 状态码）"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StagedFile:
+    """已写入临时文件、尚未放到正式位置的上传文件"""
+    temp_path: Path
+    file_hash: str
+    file_size: int
+
+    def discard(self) -> None:
+        try:
+            self.temp_path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"删除临时文件失败: {self.temp_path}, 错误: {e}")
+
+
+def max_upload_bytes() -> int:
+    return settings.UPLOAD_MAX_FILE_SIZE_MB * 1024 * 1024
+
+
+def content_path(file_hash: str) -> Path:
+    """内容寻址存储路径：uploads/ab/cd/<sha256>"""
+    return UPLOAD_ROOT / file_hash[:2] / file_hash[2:4] / file_hash
+
+
+def stage_stream(stream: BinaryIO, max_bytes: Optional[int] = None) -> StagedFile:
+    """
+    按块读取上传流，边计算哈希边写入临时文件
+
+    Raises:
+        UploadRejected: 文件为空或超过大小上限（临时文件已删除）
+    """
+    max_bytes = max_upload_bytes() if max_bytes is None else max_bytes
+    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_name = tempfile.mkstemp(dir=INCOMING_DIR, prefix="upload-")
+    staged = StagedFile(temp_path=Path(temp_name), file_hash="", file_size=0)
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(400, f"文件大小不能超过 {max_bytes // (1024 * 1024)}MB")
+                digest.update(chunk)
+                temp_file.write(chunk)
+        if size == 0:
+            raise UploadRejected(400, "文件内容为空")
+    except BaseException:
+        staged.discard()
+        raise
+    staged.file_hash = digest.hexdigest()
+    staged.file_size = size
+    return staged
+
+
+def store_staged(staged: StagedFile) -> Tuple[Path, bool]:
+    """
+    将临时文件放到内容寻址位置
+
+    Returns:
+        (正式路径, 是否本次新写入)；同内容文件已在磁盘上时直接丢弃临时文件
+    """
+    target = content_path(staged.file_hash)
+    if target.exists():
+        staged.discard()
+        return target, False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staged.temp_path, target)
+    return target, True
+
+
+def find_duplicate(session: Session, file_hash: str) -> Optional[InvoiceFile]:
+    return session.exec(select(InvoiceFile).where(InvoiceFile.file_hash == file_hash)).first()
+
+
+def duplicate_message(existing: InvoiceFile, user: User) -> str:
+    if existing.uploader_id == user.id:
+        return (
+            f"该文件已上传过，文件名: {existing.file_name}，"
+            f"上传时间: {existing.upload_time.strftime('%Y-%m-%d %H:%M:%S')}"
+        )
+    return "该文件已被其他用户上传，不能重复上传"
+
+
+def default_company_id(session: Session, user: User) -> Optional[UUID]:
+    """新票据所属公司：用户的主公司，没有主公司时取任一关联公司"""
+    rows = session.exec(
+        select(UserCompany.company_id, UserCompany.is_primary).where(UserCompany.user_id == user.id)
+    ).all()
+    primary = next((company_id for company_id, is_primary in rows if is_primary), None)
+    return primary or (rows[0][0] if rows else None)
+
+
+def ingest_upload(
+    session: Session,
+    upload: UploadFile,
+    user: User,
+    *,
+    external_file_id: Optional[str] = None,
+) -> Tuple[InvoiceFile, Invoice]:
+    """
+    校验并保存上传文件，在同一事务中创建文件记录与票据记录
+
+    Raises:
+        UploadRejected: 文件类型不支持、大小超限或内容重复
+    """
+    if upload.content_type not in ALLOWED_MIME_TYPES:
+        raise UploadRejected(400, f"不支持的文件类型: {upload.content_type}，仅支持 PDF、JPG、PNG")
+
+    staged = stage_stream(upload.file)
+    logger.info(f"文件已暂存: 大小={staged.file_size} 字节, 哈希值={staged.file_hash}")
+
+    existing = find_duplicate(session, staged.file_hash)
+    if existing:
+        staged.discard()
+        logger.warning(f"文件已存在，哈希值: {staged.file_hash}, 文件ID: {existing.id}")
+        raise UploadRejected(400, duplicate_message(existing, user))
+
+    file_path, created = store_staged(staged)
+    try:
+        file_ext = Path(upload.filename).suffix if upload.filename else ".pdf"
+        invoice_file = InvoiceFile(
+            file_name=upload.filename or "unknown",
+            file_path=str(file_path),
+            file_size=staged.file_size,
+            file_type=file_ext[1:] if file_ext else "pdf",
+            mime_type=upload.content_type or "application/pdf",
+            file_hash=staged.file_hash,
+            uploader_id=user.id,
+            status="uploaded",
+            external_file_id=external_file_id,
+        )
+        invoice = Invoice(
+            invoice_no=f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}-{str(uuid4())[:8]}",
+            invoice_type="未知",
+            file_id=invoice_file.id,
+            creator_id=user.id,
+            company_id=default_company_id(session, user),
+            recognition_status="pending",
+            review_status="pending",
+        )
+        session.add(invoice_file)
+        session.add(invoice)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        if created:
+            file_path.unlink(missing_ok=True)
+        raise
+    session.refresh(invoice_file)
+    session.refresh(invoice)
+    logger.info(f"文件与票据已创建: 文件ID={invoice_file.id}, 票据编号={invoice.invoice_no}, 路径={file_path}")
+    return invoice_file, invoice
+
+
+# ==================== 批量上传 ====================
+
+@dataclass
+class UploadSource:
+    """批量上传中的单个文件（multipart 文件或 zip 中的条目）"""
+    file_name: str
+    content_type: Optional[str]
+    stream: BinaryIO
+
+
+@dataclass
+class BatchItemResult:
+    """批量上传中单个文件的处理结果"""
+    file_name: str
+    status: str  # created / duplicate / rejected
+    message: str = ""
+    file_hash: Optional[str] = None
+    file_id: Optional[UUID] = None
+    invoice_id: Optional[UUID] = None
+    invoice_no: Optional[str] = None
+    content_type: Optional[str] = field(default=None, repr=False)
+    staged: Optional[StagedFile] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_name": self.file_name,
+            "status": self.status,
+            "message": self.message,
+            "file_hash": self.file_hash,
+            "file_id": str(self.file_id) if self.file_id else None,
+            "invoice_id": str(self.invoice_id) if self.invoice_id else None,
+            "invoice_no": self.invoice_no,
+        }
+
+
+def is_zip_upload(upload: UploadFile) -> bool:
+    return upload.content_type in ZIP_MIME_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+
+def _zip_entry_name(info: zipfile.ZipInfo) -> str:
+    """zip 条目文件名：未标记 UTF-8 的条目按 GBK 解码（Windows 中文系统打包的压缩包）"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def expand_uploads(uploads: List[UploadFile], archives: List[zipfile.ZipFile]) -> Iterator[UploadSource]:
+    """
+    展开上传的文件列表：普通文件原样返回，zip 压缩包逐个返回其中的文件（忽略目录与隐藏文件）
+
+    打开的压缩包追加到 archives，由调用方在处理完成后关闭
+
+    Raises:
+        UploadRejected: 文件总数超过 UPLOAD_BATCH_MAX_FILES，或压缩包解压后的总大小超过
+            UPLOAD_BATCH_MAX_FILES * 单文件上限（只读取压缩包目录判断，不打开其中的文件）
+    """
+    max_files = settings.UPLOAD_BATCH_MAX_FILES
+    count = 0
+    for upload in uploads:
+        if not is_zip_upload(upload):
+            count += 1
+            if count > max_files:
+                raise UploadRejected(400, f"单次最多上传 {max_files} 个文件")
+            yield UploadSource(upload.filename or "unknown", upload.content_type, upload.file)
+            continue
+        archive = zipfile.ZipFile(upload.file)
+        archives.append(archive)
+        entries = []
+        for info in archive.infolist():
+            name = Path(_zip_entry_name(info)).name
+            if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            entries.append((name, info))
+        count += len(entries)
+        if count > max_files:
+            raise UploadRejected(400, f"单次最多上传 {max_files} 个文件（压缩包 {upload.filename} 含 {len(entries)} 个文件）")
+        if sum(info.file_size for _, info in entries) > max_files * max_upload_bytes():
+            raise UploadRejected(400, f"压缩包 {upload.filename} 解压后的总大小超过上限")
+        for name, info in entries:
+            content_type, _ = mimetypes.guess_type(name)
+            yield UploadSource(name, content_type, archive.open(info))
+
+
+def _stage_source(source: UploadSource, max_bytes: int) -> BatchItemResult:
+    """校验类型并暂存单个文件（在线程池中执行）"""
+    result = BatchItemResult(file_name=source.file_name, status="rejected", content_type=source.content_type)
+    if source.content_type not in ALLOWED_MIME_TYPES:
+        result.message = f"不支持的文件类型: {source.content_type}，仅支持 PDF、JPG、PNG"
+        return result
+    try:
+        result.staged = stage_stream(source.stream, max_bytes)
+        result.file_hash = result.staged.file_hash
+        result.status = "staged"
+    except UploadRejected as e:
+        result.message = e.detail
+    except Exception as e:
+        logger.error(f"暂存文件失败: {source.file_name}, 错误: {e}", exc_info=True)
+        result.message = f"保存文件失败: {str(e)}"
+    return result
+
+
+def ingest_batch(session: Session, sources: List[UploadSource], user: User) -> List[BatchItemResult]:
+    """
+    批量保存上传文件，一次提交创建全部文件记录与票据记录
+
+    - 文件在线程池中并行暂存（边写边算哈希）
+    - 与数据库中已有文件、以及批次内部按哈希去重（一条 IN 查询）
+    - 单个文件失败不影响其他文件；提交失败时删除本次新写入的文件并抛出异常
+    """
+    if len(sources) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise UploadRejected(400, f"单次最多上传 {settings.UPLOAD_BATCH_MAX_FILES} 个文件")
+
+    max_bytes = max_upload_bytes()
+    workers = max(1, min(settings.UPLOAD_BATCH_WORKERS, len(sources)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload-ingest") as executor:
+        results = list(executor.map(lambda source: _stage_source(source, max_bytes), sources))
+
+    staged_results = [result for result in results if result.status == "staged"]
+    existing = {
+        invoice_file.file_hash: invoice_file
+        for invoice_file in session.exec(
+            select(InvoiceFile).where(InvoiceFile.file_hash.in_({r.file_hash for r in staged_results}))
+        ).all()
+    } if staged_results else {}
+
+    company_id = default_company_id(session, user)
+    batch_hashes: Dict[str, BatchItemResult] = {}
+    new_paths: List[Path] = []
+    invoice_files: List[InvoiceFile] = []
+    invoices: List[Invoice] = []
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    try:
+        for result in staged_results:
+            staged = result.staged
+            duplicate_of = existing.get(staged.file_hash)
+            if duplicate_of is not None or staged.file_hash in batch_hashes:
+                staged.discard()
+                result.status = "duplicate"
+                if duplicate_of is not None:
+                    result.message = duplicate_message(duplicate_of, user)
+                    result.file_id = duplicate_of.id
+                else:
+                    result.message = f"与本批次中的文件 {batch_hashes[staged.file_hash].file_name} 内容相同"
+                continue
+            batch_hashes[staged.file_hash] = result
+
+            file_path, created = store_staged(staged)
+            if created:
+                new_paths.append(file_path)
+            file_ext = Path(result.file_name).suffix
+            invoice_file = InvoiceFile(
+                file_name=result.file_name,
+                file_path=str(file_path),
+                file_size=staged.file_size,
+                file_type=file_ext[1:] if file_ext else "pdf",
+                mime_type=result.content_type or "application/pdf",
+                file_hash=staged.file_hash,
+                uploader_id=user.id,
+                status="uploaded",
+            )
+            invoice = Invoice(
+                invoice_no=f"INV-{stamp}-{str(uuid4())[:8]}",
+                invoice_type="未知",
+                file_id=invoice_file.id,
+                creator_id=user.id,
+                company_id=company_id,
+                recognition_status="pending",
+                review_status="pending",
+            )
+            invoice_files.append(invoice_file)
+            invoices.append(invoice)
+            result.status = "created"
+            result.message = "上传成功"
+            result.file_id = invoice_file.id
+            result.invoice_id = invoice.id
+            result.invoice_no = invoice.invoice_no
+
+        # 同类对象由 ORM 合并为多行 INSERT
+        session.add_all(invoice_files)
+        session.add_all(invoices)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        for path in new_paths:
+            path.unlink(missing_ok=True)
+        for result in staged_results:
+            if result.staged is not None:
+                result.staged.discard()
+        raise
+
+    logger.info(
+        f"批量上传完成: 共 {len(results)} 个文件, 新建 {len(invoices)}, "
+        f"重复 {sum(r.status == 'duplicate' for r in results)}, 失败 {sum(r.status == 'rejected' for r in results)}"
+    )
+    return results
@@ -0,0 +1,123 @@
+"""
+票据文件发送
+下载/预览接口按文件内容哈希生成强 ETag，支持条件请求与 Range 请求，审核界面反复打开同一文件时不再重复下载。
+
+- ETag 为 InvoiceFile.file_hash；If-None-Match 匹配时返回 304
+- 带 v=<file_hash> 的地址内容不会变化，长期缓存（immutable）；不带版本的地址每次重新验证
+- Range/If-Range 由 FileResponse 处理（206 分段响应），PDF 阅读器可按需读取页面
+- 配置 FILE_ACCEL_REDIRECT_PREFIX 时通过 X-Accel-Redirect 交由反向代理以 sendfile 零拷贝发送，
+  应用只返回响应头；未配置时由应用分块发送
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.core.config import settings
+from app.models.models_invoice import InvoiceFile
+from app.services.file_ingest import UPLOAD_ROOT
+
+# 版本化地址（内容寻址，地址不变内容就不变）
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# 未带版本的地址：允许缓存，使用前用 ETag 重新验证
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def strong_etag(file_hash: str) -> str:
+    return f'"{file_hash}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否匹配（按 RFC 9110 使用弱比较）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _accel_redirect_path(file_path: Path) -> Optional[str]:
+    """文件在 uploads 目录下时返回 X-Accel-Redirect 地址"""
+    prefix = settings.FILE_ACCEL_REDIRECT_PREFIX
+    if not prefix:
+        return None
+    try:
+        relative = file_path.resolve().relative_to(UPLOAD_ROOT.resolve())
+    except ValueError:
+        return None
+    return f"{prefix.rstrip('/')}/{quote(relative.as_posix())}"
+
+
+def _content_disposition(file_name: str, disposition: str) -> str:
+    quoted = quote(file_name)
+    if quoted != file_name:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{file_name}"'
+
+
+def _validator_headers(request: Request, file_hash: Optional[str], etag_value: Optional[str] = None) -> Dict[str, str]:
+    """ETag 与 Cache-Control（file_hash 为空时不设置）"""
+    if not file_hash:
+        return {}
+    versioned = request.query_params.get("v") == file_hash
+    return {
+        "ETag": strong_etag(etag_value or file_hash),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+    }
+
+
+def _not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    return "ETag" in headers and etag_matches(request.headers.get("if-none-match"), headers["ETag"])
+
+
+def file_response(
+    request: Request,
+    invoice_file: InvoiceFile,
+    file_path: Path,
+    *,
+    inline: bool = False,
+) -> Response:
+    """发送票据文件（调用方已检查权限与文件存在）"""
+    disposition = "inline" if inline else "attachment"
+    headers = _validator_headers(request, invoice_file.file_hash)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    media_type = invoice_file.mime_type or "application/octet-stream"
+    accel_path = _accel_redirect_path(file_path)
+    if accel_path:
+        headers["X-Accel-Redirect"] = accel_path
+        headers["Content-Disposition"] = _content_disposition(invoice_file.file_name, disposition)
+        return Response(headers=headers, media_type=media_type)
+
+    return FileResponse(
+        path=str(file_path),
+        filename=invoice_file.file_name,
+        media_type=media_type,
+        headers=headers,
+        content_disposition_type=disposition,
+    )
+
+
+def derived_file_response(request: Request, invoice_file: InvoiceFile, path: Path, media_type: str) -> Response:
+    """发送由票据文件生成的预览图（ETag 为文件哈希加预览图名，内容随原文件确定）"""
+    headers = _validator_headers(request, invoice_file.file_hash, f"{invoice_file.file_hash}-{path.name}")
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=str(path), media_type=media_type, headers=headers, content_disposition_type="inline")
+
+
+def download_url(invoice_id, invoice_file: InvoiceFile) -> str:
+    """带内容版本的下载地址（可长期缓存）"""
+    url = f"{settings.API_V1_STR}/invoices/{invoice_id}/file/download"
+    return f"{url}?v={invoice_file.file_hash}" if invoice_file.file_hash else url
+
+
+def thumbnail_url(invoice_id, file_hash: Optional[str]) -> str:
+    """缩略图地址（带内容版本时可长期缓存）"""
+    url = f"{settings.API_V1_STR}/invoices/{invoice_id}/file/thumbnail"
+    return f"{url}?v={file_hash}" if file_hash else url
@@ -0,0 +1,166 @@
+"""
+票据详情查询
+一条关联查询读取票据、公司代码、最新识别结果（标准化字段与模板版本快照）、模板版本与模板名称，
+以及识别失败时最新失败任务的错误信息。
+
+- 识别结果的 normalized_fields 在写入时已标准化（见 recognition_payload），这里不读取原始响应
+- 尚未补全的历史记录（normalized_fields 为空）单独读取该条原始响应提取字段，不回写
+- recognition_result 的模板快照列、invoice.model_name 为可选列，按数据库结构能力决定是否查询
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import JSON, and_, column, literal_column, null, table
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+from app.models.models_company import Company
+from app.models.models_invoice import (
+    Invoice, InvoiceResponse, RecognitionResult, RecognitionTask, Template, TemplateVersion,
+)
+from app.services.recognition_payload import extract_fields
+from app.services.schema_capabilities import schema_capabilities
+
+
+@dataclass
+class InvoiceDetail:
+    invoice: Invoice
+    company_code: Optional[str] = None
+    result_id: Optional[UUID] = None
+    normalized_fields: Optional[Dict[str, Any]] = None
+    template_version_id: Optional[UUID] = None
+    field_defs_snapshot: Optional[Any] = None
+    template_version: Optional[str] = None
+    template_name: Optional[str] = None
+    model_name: Optional[str] = None
+    error_code: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+def _snapshot_by_key(snapshot: Any) -> Optional[Dict[str, Any]]:
+    """字段快照从数组格式转换为以 field_key 为键的对象格式"""
+    if isinstance(snapshot, list):
+        return {field["field_key"]: field for field in snapshot if isinstance(field, dict) and field.get("field_key")}
+    if isinstance(snapshot, dict):
+        return snapshot
+    return None
+
+
+def load_invoice_detail(session: Session, invoice_id: UUID) -> Optional[InvoiceDetail]:
+    """一条查询读取票据详情，票据不存在时返回 None"""
+    capabilities = schema_capabilities.get()
+    with_snapshot = capabilities.result_has_template_snapshot
+
+    result_columns = [column("id"), column("normalized_fields", JSON)]
+    if with_snapshot:
+        result_columns += [column("template_version_id"), column("field_defs_snapshot", JSON)]
+    latest_result = table("recognition_result", *result_columns).alias("latest_result")
+    failed_task = aliased(RecognitionTask, name="failed_task")
+
+    latest_result_id = (
+        select(RecognitionResult.id)
+        .where(RecognitionResult.invoice_id == Invoice.id)
+        .order_by(RecognitionResult.recognition_time.desc())
+        .limit(1)
+        .correlate(Invoice)
+        .scalar_subquery()
+    )
+    latest_failed_id = (
+        select(RecognitionTask.id)
+        .where(RecognitionTask.invoice_id == Invoice.id, RecognitionTask.status == "failed")
+        .order_by(RecognitionTask.create_time.desc())
+        .limit(1)
+        .correlate(Invoice)
+        .scalar_subquery()
+    )
+
+    model_name = (
+        literal_column("invoice.model_name") if capabilities.has_column("invoice", "model_name") else null()
+    )
+    statement = (
+        select(
+            Invoice,
+            Company.code,
+            latest_result.c.id,
+            latest_result.c.normalized_fields,
+            latest_result.c.template_version_id if with_snapshot else null(),
+            latest_result.c.field_defs_snapshot if with_snapshot else null(),
+            TemplateVersion.version if with_snapshot else null(),
+            Template.name if with_snapshot else null(),
+            model_name,
+            failed_task.error_code,
+            failed_task.error_message,
+        )
+        .select_from(Invoice)
+        .outerjoin(Company, Company.id == Invoice.company_id)
+        .outerjoin(latest_result, latest_result.c.id == latest_result_id)
+        .outerjoin(failed_task, and_(Invoice.recognition_status == "failed", failed_task.id == latest_failed_id))
+    )
+    if with_snapshot:
+        statement = (
+            statement
+            .outerjoin(TemplateVersion, TemplateVersion.id == latest_result.c.template_version_id)
+            .outerjoin(Template, Template.id == TemplateVersion.template_id)
+        )
+
+    row = session.exec(statement.where(Invoice.id == invoice_id)).first()
+    if row is None:
+        return None
+    (invoice, company_code, result_id, normalized_fields, template_version_id, snapshot,
+     template_version, template_name, model_name_value, error_code, error_message) = row
+
+    if result_id is not None and not normalized_fields:
+        # 尚未补全的历史记录
+        raw = session.exec(
+            select(RecognitionResult.raw_payload, RecognitionResult.raw_data).where(RecognitionResult.id == result_id)
+        ).first()
+        if raw is not None:
+            normalized_fields = extract_fields(*raw)
+
+    return InvoiceDetail(
+        invoice=invoice,
+        company_code=company_code,
+        result_id=result_id,
+        normalized_fields=normalized_fields if isinstance(normalized_fields, dict) else None,
+        template_version_id=template_version_id,
+        field_defs_snapshot=_snapshot_by_key(snapshot),
+        template_version=template_version,
+        template_name=template_name,
+        model_name=model_name_value,
+        error_code=error_code,
+        error_message=error_message,
+    )
+
+
+def to_response(detail: InvoiceDetail) -> InvoiceResponse:
+    invoice = detail.invoice
+    return InvoiceResponse(
+        id=invoice.id,
+        invoice_no=invoice.invoice_no,
+        invoice_type=invoice.invoice_type,
+        invoice_date=invoice.invoice_date,
+        amount=invoice.amount,
+        tax_amount=invoice.tax_amount,
+        total_amount=invoice.total_amount,
+        currency=invoice.currency,
+        supplier_name=invoice.supplier_name,
+        supplier_tax_no=invoice.supplier_tax_no,
+        buyer_name=invoice.buyer_name,
+        buyer_tax_no=invoice.buyer_tax_no,
+        recognition_accuracy=invoice.recognition_accuracy,
+        recognition_status=invoice.recognition_status,
+        review_status=invoice.review_status,
+        company_id=invoice.company_id,
+        company_code=detail.company_code,
+        create_time=invoice.create_time,
+        error_code=detail.error_code,
+        error_message=detail.error_message,
+        template_version_id=detail.template_version_id,
+        field_defs_snapshot=detail.field_defs_snapshot,
+        template_version=detail.template_version,
+        normalized_fields=detail.normalized_fields or {},
+        template_name=detail.template_name,
+        model_name=detail.model_name,
+    )
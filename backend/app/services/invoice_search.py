@@ -0,0 +1,41 @@
+"""
+票据/文件搜索条件
+票据编号、供应商、采购方、文件名的模糊查询统一在这里生成条件：
+
+- PostgreSQL：LIKE '%x%' 由 pg_trgm GIN 索引（gin_trgm_ops）支持，不再全表扫描
+  （索引由迁移 add_invoice_search_indexes 创建，数据库未提供 pg_trgm 时退回顺序扫描，结果不变）
+- 供应商/采购方关键词：按空白拆分，每个词在供应商或采购方名称中出现即可（子串匹配，同样使用三元组索引）；
+  名称为不分词的中文公司名，“有限公司”、城市名等出现在名称中间的词也能匹配
+- 用户输入中的 % 和 _ 按字面值匹配
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.models_invoice import Invoice
+
+
+def contains(column, value: str) -> ColumnElement:
+    """子串匹配（LIKE '%value%'，% 和 _ 转义）"""
+    return column.contains(value, autoescape=True)
+
+
+def party_terms(keyword: str) -> List[str]:
+    """关键词按空白拆分"""
+    return (keyword or "").split()
+
+
+def party_condition(keyword: str) -> Optional[ColumnElement]:
+    """
+    供应商/采购方关键词搜索
+
+    每个词在供应商或采购方名称中出现（全部命中），所有数据库行为一致
+    """
+    terms = party_terms(keyword)
+    if not terms:
+        return None
+    return and_(*[
+        or_(contains(Invoice.supplier_name, term), contains(Invoice.buyer_name, term)) for term in terms
+    ])
@@ -0,0 +1,398 @@
+"""
+套料任务进程池
+套料计算（库存加载、直接/单订单/两两/失败匹配、失败订单分类、坐标生成）是 CPU 密集的 pandas 运算，
+在独立进程中执行，避免在请求线程中长时间持有 GIL、拖慢其他请求。
+
+- 任务状态、进度与结果存储在 nesting_job 表中，任意 API 进程都可以查询
+- 子进程在各阶段检查点更新进度，同时检查任务是否已被取消（协作式取消）
+- 尚未开始执行的任务取消时直接从进程池中撤回
+- 提交任务时记录所属进程（owner），进程内的心跳线程定期刷新本进程任务的 heartbeatDate；
+  心跳超过 NESTING_JOB_STALE_SECONDS 未更新的 pending/running 任务（所属进程已退出或崩溃）标记为失败，
+  启动时与之后每个心跳周期各检查一次
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, update
+from sqlmodel import Session
+
+from app.core import db
+from app.core.config import settings
+from app.models import NestingJob
+
+logger = logging.getLogger(__name__)
+
+# 任务状态（pending -> running -> completed/failed，pending/running 可被 cancelled）
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+ACTIVE_STATUSES = (JOB_STATUS_PENDING, JOB_STATUS_RUNNING)
+
+
+class NestingJobCancelled(Exception):
+    """套料任务已被取消（在进度检查点抛出，终止计算）"""
+
+
+def _json_safe(value: Any) -> Any:
+    """转换为可写入 JSON 列的值（numpy 标量、NaN、Decimal、时间等）"""
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [_json_safe(v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is pd.NaT:
+        return None
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def job_to_dict(job: NestingJob, include_result: bool = False) -> Dict[str, Any]:
+    """任务信息（接口返回结构）"""
+    data = {
+        "jobId": job.jobId,
+        "status": job.status,
+        "progress": job.progress,
+        "stage": job.stage,
+        "message": job.message,
+        "creator": job.creator,
+        "createDate": job.createDate,
+        "startDate": job.startDate,
+        "finishDate": job.finishDate,
+    }
+    if include_result:
+        data["result"] = job.resultData
+    return data
+
+
+def _update_active_job(session: Session, job_id: str, **values: Any) -> bool:
+    """仅当任务仍处于 pending/running 时更新，返回是否更新成功"""
+    result = session.execute(
+        update(NestingJob)
+        .where(NestingJob.jobId == job_id, NestingJob.status.in_(ACTIVE_STATUSES))
+        .values(**values)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _mark_failed(job_id: str, message: str) -> None:
+    try:
+        with Session(db.engine) as session:
+            _update_active_job(
+                session, job_id,
+                status=JOB_STATUS_FAILED, message=message, stage=None, finishDate=datetime.now(),
+            )
+    except Exception as e:
+        logger.error(f"更新套料任务失败状态出错: {job_id}, {e}")
+
+
+# ==================== 子进程 ====================
+
+class JobProgress:
+    """子进程中的进度回调：更新进度与阶段，任务已取消时抛出 NestingJobCancelled"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def __call__(self, progress: int, stage: str) -> None:
+        with Session(db.engine) as session:
+            result = session.execute(
+                update(NestingJob)
+                .where(NestingJob.jobId == self.job_id, NestingJob.status == JOB_STATUS_RUNNING)
+                .values(progress=progress, stage=stage, heartbeatDate=datetime.now())
+            )
+            session.commit()
+        if result.rowcount != 1:
+            raise NestingJobCancelled(self.job_id)
+
+
+def run_nesting_job(job_id: str) -> str:
+    """
+    执行套料任务（进程池入口，也可在当前进程直接调用）
+
+    Returns:
+        任务最终状态
+    """
+    from app.api.routes.nesting_layout import run_nesting_pipeline
+
+    with Session(db.engine) as session:
+        started = session.execute(
+            update(NestingJob)
+            .where(NestingJob.jobId == job_id, NestingJob.status == JOB_STATUS_PENDING)
+            .values(status=JOB_STATUS_RUNNING, startDate=datetime.now(), stage="开始执行")
+        )
+        session.commit()
+        job = session.get(NestingJob, job_id)
+        if job is None:
+            return JOB_STATUS_FAILED
+        if started.rowcount != 1:
+            # 已被取消或已由其他进程执行
+            return job.status
+
+        try:
+            response = run_nesting_pipeline(session, job.requestData or {}, JobProgress(job_id))
+        except NestingJobCancelled:
+            session.rollback()
+            logger.info(f"套料任务已取消: {job_id}")
+            return JOB_STATUS_CANCELLED
+        except Exception as e:
+            session.rollback()
+            logger.error(f"套料任务执行异常: {job_id}, 错误: {e}", exc_info=True)
+            _mark_failed(job_id, f"套料计算失败: {str(e)}")
+            return JOB_STATUS_FAILED
+
+        status = JOB_STATUS_COMPLETED if response.success else JOB_STATUS_FAILED
+        values: Dict[str, Any] = {
+            "status": status,
+            "stage": None,
+            "resultData": _json_safe(response.model_dump()),
+            "message": None if response.success else response.message,
+            "finishDate": datetime.now(),
+        }
+        if response.success:
+            values["progress"] = 100
+        if not _update_active_job(session, job_id, **values):
+            return JOB_STATUS_CANCELLED
+        return status
+
+
+# ==================== 进程池 ====================
+
+class NestingJobRunner:
+    """套料任务进程池（按需创建，spawn 方式启动子进程）"""
+
+    def __init__(
+        self,
+        max_workers: int = settings.NESTING_JOB_WORKERS,
+        heartbeat_interval: float = settings.NESTING_JOB_HEARTBEAT_INTERVAL,
+        stale_seconds: float = settings.NESTING_JOB_STALE_SECONDS,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.heartbeat_interval = heartbeat_interval
+        # 至少允许错过两次心跳，避免数据库短暂变慢时误判
+        self.stale_seconds = max(stale_seconds, heartbeat_interval * 3)
+        # 当前进程标识（写入 nesting_job.owner）
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # 本进程提交且尚未结束的任务：job_id -> Future
+        self._futures: Dict[str, Future] = {}
+        # 任务所在的进程池（进程池损坏时只处理其中的任务）：job_id -> ProcessPoolExecutor
+        self._future_pools: Dict[str, ProcessPoolExecutor] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return self._executor is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn：子进程不继承父进程中的线程、数据库连接与事件循环
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """启动心跳线程（幂等）：先将无主的 pending/running 任务标记为失败，之后定期刷新本进程任务的心跳"""
+        with self._lock:
+            if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
+                return
+            self._stopping.clear()
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name="nesting-job-heartbeat", daemon=True
+            )
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self) -> None:
+        self.fail_orphaned_jobs()
+        while not self._stopping.wait(self.heartbeat_interval):
+            self._heartbeat()
+            self.fail_orphaned_jobs()
+
+    def _heartbeat(self) -> None:
+        """刷新本进程提交且尚未结束的任务的心跳时间"""
+        with self._lock:
+            job_ids = list(self._futures)
+        if not job_ids:
+            return
+        try:
+            with Session(db.engine) as session:
+                session.execute(
+                    update(NestingJob)
+                    .where(
+                        NestingJob.jobId.in_(job_ids),
+                        NestingJob.owner == self.owner_id,
+                        NestingJob.status.in_(ACTIVE_STATUSES),
+                    )
+                    .values(heartbeatDate=datetime.now())
+                )
+                session.commit()
+        except Exception as e:
+            logger.warning(f"更新套料任务心跳失败: {e}")
+
+    def fail_orphaned_jobs(self) -> int:
+        """将心跳超时的 pending/running 任务标记为失败（没有心跳的旧任务按开始/创建时间判断），返回任务数"""
+        cutoff = datetime.now() - timedelta(seconds=self.stale_seconds)
+        try:
+            with Session(db.engine) as session:
+                result = session.execute(
+                    update(NestingJob)
+                    .where(
+                        NestingJob.status.in_(ACTIVE_STATUSES),
+                        func.coalesce(NestingJob.heartbeatDate, NestingJob.startDate, NestingJob.createDate) < cutoff,
+                    )
+                    .values(
+                        status=JOB_STATUS_FAILED, stage=None, finishDate=datetime.now(),
+                        message="执行任务的服务已停止或异常退出，任务已中断",
+                    )
+                )
+                session.commit()
+        except Exception as e:
+            logger.warning(f"检查中断的套料任务失败: {e}")
+            return 0
+        if result.rowcount:
+            logger.warning(f"已将 {result.rowcount} 个中断的套料任务标记为失败")
+        return result.rowcount
+
+    def submit(self, session: Session, request_data: Dict[str, Any], creator: str) -> NestingJob:
+        """创建套料任务并提交到进程池"""
+        job = NestingJob(
+            jobId=str(uuid.uuid4()),
+            status=JOB_STATUS_PENDING,
+            stage="排队中",
+            requestData=_json_safe(request_data),
+            creator=creator,
+            owner=self.owner_id,
+            heartbeatDate=datetime.now(),
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        self.start()
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(run_nesting_job, job.jobId)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，替换后重试一次
+            logger.warning("套料进程池已损坏，重新创建")
+            self._replace_broken_executor(executor)
+            executor = self._get_executor()
+            future = executor.submit(run_nesting_job, job.jobId)
+
+        with self._lock:
+            self._futures[job.jobId] = future
+            self._future_pools[job.jobId] = executor
+        future.add_done_callback(lambda f, job_id=job.jobId: self._on_done(job_id, f))
+        return job
+
+    def _replace_broken_executor(self, broken: ProcessPoolExecutor) -> None:
+        """
+        丢弃已损坏的进程池（下次提交时重新创建），其中未开始的任务标记为失败；
+        心跳线程与其他进程池中的任务不受影响
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+            futures = [
+                (job_id, future) for job_id, future in self._futures.items()
+                if self._future_pools.get(job_id) is broken
+            ]
+        broken.shutdown(wait=False)
+        # 执行中的任务由进程池设置异常，在完成回调中标记为失败
+        for job_id, future in futures:
+            if future.cancel():
+                _mark_failed(job_id, "套料进程池异常退出，任务未执行")
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._future_pools.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(f"套料进程异常: {job_id}, 错误: {error}")
+            _mark_failed(job_id, f"套料进程异常退出: {error}")
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        """等待本进程提交的任务结束，返回是否已结束（超时返回 False）"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None:
+            return True
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        except Exception:
+            pass
+        return True
+
+    def cancel(self, session: Session, job: NestingJob) -> NestingJob:
+        """取消任务：未开始的任务从进程池撤回，执行中的任务在下一个进度检查点停止"""
+        if job.status in ACTIVE_STATUSES:
+            _update_active_job(
+                session, job.jobId,
+                status=JOB_STATUS_CANCELLED, stage=None, finishDate=datetime.now(),
+            )
+            with self._lock:
+                future = self._futures.get(job.jobId)
+            if future is not None:
+                future.cancel()
+        session.refresh(job)
+        return job
+
+    def stop(self) -> None:
+        """关闭进程池与心跳线程，未开始的任务标记为失败（执行中的任务心跳停止后由存活进程标记为失败）"""
+        self._stopping.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures.items())
+        # Future.cancel 会同步触发完成回调（回调中需要获取锁），因此在锁外调用
+        pending = [job_id for job_id, future in futures if future.cancel()]
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for job_id in pending:
+            _mark_failed(job_id, "服务停止，任务未执行")
+
+    def stats(self) -> Dict[str, object]:
+        """当前进程池状态（用于健康检查）"""
+        with self._lock:
+            return {
+                "running": self.is_running,
+                "owner": self.owner_id,
+                "workers": self.max_workers,
+                "inflight": len(self._futures),
+            }
+
+
+nesting_job_runner = NestingJobRunner()
@@ -0,0 +1,113 @@
+"""
+用户公司权限范围
+普通用户只能访问自己关联公司（user_company）的数据，超级用户不受限制。
+
+- 列表/计数查询的公司过滤使用 EXISTS 子查询关联 user_company，由数据库按索引完成，
+  不再把用户可访问的公司ID或票据ID先查到 Python 再拼成 IN 列表
+- 单条记录的权限检查使用缓存的用户公司集合（PERMISSION_SCOPE_TTL_SECONDS 秒）
+- 通过 ORM 增删改 user_company 时，在事务提交后使相关用户的缓存失效；
+  其他进程或原生 SQL 的修改最迟在缓存过期后生效
+"""
+
+import logging
+from typing import FrozenSet, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import event, exists, inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import User, UserCompany
+
+logger = logging.getLogger(__name__)
+
+company_scope_cache = TTLCache(settings.PERMISSION_SCOPE_TTL_SECONDS)
+
+_PENDING_USERS_KEY = "permission_scope_pending_users"
+
+
+def user_company_set(session: Session, user_id: UUID) -> FrozenSet[UUID]:
+    """用户关联的公司ID集合（带缓存）"""
+    company_ids = company_scope_cache.get(user_id)
+    if company_ids is None:
+        company_ids = frozenset(
+            session.exec(select(UserCompany.company_id).where(UserCompany.user_id == user_id)).all()
+        )
+        company_scope_cache.set(user_id, company_ids)
+    return company_ids
+
+
+def get_user_company_ids(session: Session, user_id: UUID) -> list[UUID]:
+    """用户关联的公司ID列表（带缓存）"""
+    return list(user_company_set(session, user_id))
+
+
+def can_access_company(session: Session, user: User, company_id: Optional[UUID]) -> bool:
+    """
+    单条记录的公司权限
+    规则：超级用户可以访问所有记录；记录没有公司ID时允许访问（向后兼容）；
+    否则记录的公司必须在用户的公司列表中
+    """
+    if user.is_superuser or not company_id:
+        return True
+    return company_id in user_company_set(session, user.id)
+
+
+def company_scope_condition(company_column, user: User) -> Optional[ColumnElement]:
+    """
+    列表查询的公司过滤条件：EXISTS (user_company 中有该用户与该公司的关联)
+
+    超级用户返回 None（不过滤）；没有关联公司的用户自然匹配不到任何记录，
+    没有公司ID的记录不会出现在普通用户的列表中
+    """
+    if user.is_superuser:
+        return None
+    return exists().where(UserCompany.user_id == user.id, UserCompany.company_id == company_column)
+
+
+def scoped(statement, company_column, user: User):
+    """为查询添加公司过滤条件"""
+    condition = company_scope_condition(company_column, user)
+    return statement if condition is None else statement.where(condition)
+
+
+def invalidate_user_scope(user_id: Optional[UUID] = None) -> None:
+    """使用户公司缓存失效（user_id 为空时清空全部）"""
+    if user_id is None:
+        company_scope_cache.clear()
+    else:
+        company_scope_cache.pop(user_id)
+
+
+# ==================== 缓存失效 ====================
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_membership_changes(session: OrmSession, flush_context) -> None:
+    user_ids: Set[UUID] = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, UserCompany):
+            continue
+        if obj.user_id:
+            user_ids.add(obj.user_id)
+        # 关联改到其他用户时，原用户的缓存也要失效
+        user_ids.update(inspect(obj).attrs.user_id.history.deleted or ())
+    if user_ids:
+        session.info.setdefault(_PENDING_USERS_KEY, set()).update(user_ids)
+        # 本事务内后续的权限检查读取最新关联
+        for user_id in user_ids:
+            invalidate_user_scope(user_id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_after_commit(session: OrmSession) -> None:
+    for user_id in session.info.pop(_PENDING_USERS_KEY, ()):
+        invalidate_user_scope(user_id)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _invalidate_after_rollback(session: OrmSession) -> None:
+    for user_id in session.info.pop(_PENDING_USERS_KEY, ()):
+        invalidate_user_scope(user_id)
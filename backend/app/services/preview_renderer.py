@@ -0,0 +1,263 @@
+"""
+票据预览图生成
+列表与审核界面展示缩小后的缩略图和分页预览，不再下载原始 PDF/图片。
+
+- 上传成功后提交到进程池生成（PDF 逐页渲染、图片缩放，CPU 密集，不占用请求线程与 GIL）
+- 预览图缓存在原文件旁的 <原文件名>.previews/ 目录：thumb.webp、page-1.webp ...；
+  内容寻址存储下相同内容的文件共用一份预览
+- manifest.json 最后写入（原子改名），存在即表示预览已完整生成
+- 优先 WebP，Pillow 不支持 WebP 编码时使用 JPEG
+- 依赖 Pillow（图片）与 pypdfium2（PDF），未安装时不生成预览，接口返回 404
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+PREVIEW_DIR_SUFFIX = ".previews"
+
+
+class PreviewUnavailable(Exception):
+    """缺少预览依赖（Pillow/pypdfium2），不生成预览"""
+
+
+def preview_dir(file_path: str) -> Path:
+    path = Path(file_path)
+    return path.with_name(path.name + PREVIEW_DIR_SUFFIX)
+
+
+def read_manifest(file_path: str) -> Optional[Dict[str, Any]]:
+    """已生成的预览信息，未生成时返回 None"""
+    try:
+        return json.loads((preview_dir(file_path) / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+# ==================== 子进程 ====================
+
+def count_pages(source: str, mime_type: str) -> int:
+    """文件页数（PDF 页数，多帧图片为帧数）"""
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise PreviewUnavailable("未安装 Pillow") from e
+
+    if mime_type == "application/pdf" or source.lower().endswith(".pdf"):
+        try:
+            import pypdfium2 as pdfium
+        except ImportError as e:
+            raise PreviewUnavailable("未安装 pypdfium2") from e
+        document = pdfium.PdfDocument(source)
+        try:
+            return len(document)
+        finally:
+            document.close()
+
+    with Image.open(source) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def iter_pages(source: str, mime_type: str, page_size: int, max_pages: int, dpi: Optional[int] = None):
+    """逐页产生 PIL 图像（PDF 按长边 page_size 渲染；指定 dpi 时按该分辨率渲染，长边不超过 page_size）"""
+    try:
+        from PIL import Image, ImageOps, ImageSequence
+    except ImportError as e:
+        raise PreviewUnavailable("未安装 Pillow") from e
+
+    if mime_type == "application/pdf" or source.lower().endswith(".pdf"):
+        try:
+            import pypdfium2 as pdfium
+        except ImportError as e:
+            raise PreviewUnavailable("未安装 pypdfium2") from e
+        document = pdfium.PdfDocument(source)
+        try:
+            for index in range(min(len(document), max_pages)):
+                page = document[index]
+                width, height = page.get_size()
+                scale = page_size / max(width, height, 1)
+                if dpi:
+                    scale = min(scale, dpi / 72)
+                bitmap = page.render(scale=scale)
+                yield bitmap.to_pil()
+                page.close()
+        finally:
+            document.close()
+        return
+
+    with Image.open(source) as image:
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            if index >= max_pages:
+                break
+            yield ImageOps.exif_transpose(frame.copy())
+
+
+def render_previews(
+    source: str,
+    mime_type: str,
+    thumbnail_size: int,
+    page_size: int,
+    max_pages: int,
+) -> Dict[str, Any]:
+    """
+    生成缩略图与分页预览（进程池入口，也可在当前进程直接调用）
+
+    Returns:
+        预览信息（同 manifest.json）
+    """
+    try:
+        from PIL import features
+    except ImportError as e:
+        raise PreviewUnavailable("未安装 Pillow") from e
+
+    image_format, extension, media_type = (
+        ("WEBP", "webp", "image/webp") if features.check("webp") else ("JPEG", "jpg", "image/jpeg")
+    )
+    target = preview_dir(source)
+    target.mkdir(parents=True, exist_ok=True)
+
+    def save(image, name: str, size: int) -> None:
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        temp = target / f".{name}.{os.getpid()}.tmp"
+        image.save(temp, image_format, quality=80)
+        os.replace(temp, target / name)
+
+    pages = 0
+    for index, image in enumerate(iter_pages(source, mime_type, page_size, max_pages)):
+        if index == 0:
+            save(image, f"thumb.{extension}", thumbnail_size)
+        save(image, f"page-{index + 1}.{extension}", page_size)
+        pages += 1
+
+    manifest = {
+        "media_type": media_type,
+        "thumbnail": f"thumb.{extension}" if pages else None,
+        "pages": [f"page-{index}.{extension}" for index in range(1, pages + 1)],
+    }
+    temp = target / f".{MANIFEST_NAME}.{os.getpid()}.tmp"
+    temp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(temp, target / MANIFEST_NAME)
+    return manifest
+
+
+# ==================== 进程池 ====================
+
+class PreviewRenderer:
+    """预览图生成进程池（按需创建，spawn 方式启动子进程；同一文件同时只生成一次）"""
+
+    def __init__(self, max_workers: int = settings.PREVIEW_RENDER_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 正在生成的文件：file_path -> Future
+        self._futures: Dict[str, Future] = {}
+        # 缺少预览依赖时不再提交任务
+        self._unavailable: Optional[str] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._executor is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _submit_job(self, file_path: str, mime_type: str) -> Future:
+        args = (
+            render_previews, file_path, mime_type,
+            settings.PREVIEW_THUMBNAIL_SIZE, settings.PREVIEW_PAGE_SIZE, settings.PREVIEW_MAX_PAGES,
+        )
+        try:
+            return self._get_executor().submit(*args)
+        except BrokenProcessPool:
+            logger.warning("预览图进程池已损坏，重新创建")
+            self.stop()
+            return self._get_executor().submit(*args)
+
+    def submit(self, file_path: str, mime_type: Optional[str]) -> Optional[Future]:
+        """提交生成任务；已生成、未启用或文件不存在时返回 None"""
+        if not settings.PREVIEW_RENDER_ENABLED or self._unavailable:
+            return None
+        if not Path(file_path).exists() or read_manifest(file_path):
+            return None
+        with self._lock:
+            future = self._futures.get(file_path)
+        if future is not None:
+            return future
+
+        future = self._submit_job(file_path, mime_type or "")
+        with self._lock:
+            # 其他线程可能同时提交了同一文件，保留先提交的任务
+            existing = self._futures.setdefault(file_path, future)
+        if existing is not future:
+            future.cancel()
+            return existing
+        future.add_done_callback(lambda f, path=file_path: self._on_done(path, f))
+        return future
+
+    def _on_done(self, file_path: str, future: Future) -> None:
+        with self._lock:
+            self._futures.pop(file_path, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, PreviewUnavailable):
+            self._unavailable = str(error)
+            logger.warning(f"不生成预览图: {error}")
+        elif error is not None:
+            logger.warning(f"生成预览图失败: {file_path}, 错误: {error}")
+
+    def ensure(self, file_path: str, mime_type: Optional[str], timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """返回预览信息，尚未生成时提交并等待（最长 timeout 秒）"""
+        manifest = read_manifest(file_path)
+        if manifest is not None:
+            return manifest
+        future = self.submit(file_path, mime_type)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=settings.PREVIEW_RENDER_WAIT_SECONDS if timeout is None else timeout)
+        except FutureTimeoutError:
+            return None
+        except Exception:
+            return None
+
+    def stats(self) -> Dict[str, object]:
+        """当前进程池状态（用于健康检查）"""
+        with self._lock:
+            return {
+                "running": self.is_running,
+                "workers": self.max_workers,
+                "inflight": len(self._futures),
+                "unavailable": self._unavailable,
+            }
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures.values())
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+preview_renderer = PreviewRenderer()
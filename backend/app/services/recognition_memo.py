@@ -0,0 +1,186 @@
+"""
+识别结果缓存
+同一文件在相同模板版本、输出Schema、模型配置和提示词下重新识别（审核拒绝后重跑、脚本重置任务等）时，
+直接复用已有的识别结果，不再调用 Dify 工作流。
+
+- 缓存键：（文件哈希, 模板版本, 输出Schema ID, 模型配置ID, 提示词哈希）的 SHA256，提示词哈希包含识别前预处理配置
+- 命中时用原结果的原始响应重放 SyntaxService._save_result，为新任务生成识别结果、字段与行项目，
+  model_usage 中记录 cache_hit 与来源任务，不重复计入模型用量
+- 绕过：全局开关 RECOGNITION_RESULT_CACHE_ENABLED，单个任务参数 use_result_cache=false
+  （审核拒绝不清除缓存，需要重新调用模型时由重跑的任务传入 use_result_cache=false）
+- 失效：模型配置、输出Schema 修改或删除时按 ID 失效；
+  也可通过 DELETE /invoices/recognition-cache 按条件清除
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.models.models_invoice import (
+    InvoiceFile, RecognitionResult, RecognitionResultCache, RecognitionTask, Template,
+)
+from app.services import document_preprocess
+from app.services.schema_capabilities import schema_capabilities
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MemoKey:
+    """识别结果缓存键"""
+    file_hash: str
+    template_version_id: Optional[str]
+    output_schema_id: Optional[str]
+    model_config_id: Optional[str]
+    prompt_hash: str
+
+    @property
+    def digest(self) -> str:
+        parts = (self.file_hash, self.template_version_id, self.output_schema_id, self.model_config_id, self.prompt_hash)
+        return hashlib.sha256("|".join(part or "" for part in parts).encode("utf-8")).hexdigest()
+
+
+def is_enabled(task: RecognitionTask) -> bool:
+    """任务是否使用识别结果缓存"""
+    return settings.RECOGNITION_RESULT_CACHE_ENABLED and (task.params or {}).get("use_result_cache", True) is not False
+
+
+def _task_template_version_id(session: Session, task: RecognitionTask) -> Optional[str]:
+    """template_version_id 列不在 ORM 模型中，存在该列时单独读取"""
+    if not schema_capabilities.get().task_has_template_version_id:
+        return None
+    value = session.execute(
+        text("SELECT template_version_id FROM recognition_task WHERE id = :task_id"),
+        {"task_id": str(task.id)},
+    ).scalar()
+    return str(value) if value else None
+
+
+def build_key(session: Session, task: RecognitionTask, file: InvoiceFile) -> MemoKey:
+    """按与 SyntaxService._call_dify_api 相同的优先级确定输出Schema与提示词来源"""
+    params = task.params or {}
+    template_id = task.template_id or params.get("template_id")
+    template_version = _task_template_version_id(session, task) or params.get("template_version")
+
+    output_schema_id = params.get("output_schema_id")
+    if not output_schema_id and template_id:
+        template = session.get(Template, UUID(str(template_id)))
+        output_schema_id = template.default_schema_id if template else None
+
+    # 任务参数中没有提示词时调用方从模板读取，以模板ID标识；
+    # 提交给工作流的文件随预处理配置变化，预处理配置指纹一并计入
+    preprocess = document_preprocess.options_for_task(session, task)
+    prompt = (
+        f"template:{template_id or ''}\n{params.get('template_prompt') or ''}"
+        f"\npreprocess:{preprocess.digest if preprocess.enabled else ''}"
+    )
+    return MemoKey(
+        file_hash=file.file_hash,
+        template_version_id=str(template_version) if template_version else None,
+        output_schema_id=str(output_schema_id) if output_schema_id else None,
+        model_config_id=str(params["model_config_id"]) if params.get("model_config_id") else None,
+        prompt_hash=hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+    )
+
+
+def lookup(session: Session, key: MemoKey) -> Optional[RecognitionResult]:
+    """已缓存且状态为成功的识别结果"""
+    row = session.exec(
+        select(RecognitionResultCache, RecognitionResult)
+        .join(RecognitionResult, RecognitionResult.id == RecognitionResultCache.result_id)
+        .where(RecognitionResultCache.cache_key == key.digest, RecognitionResult.status == "success")
+    ).first()
+    if row is None:
+        return None
+    entry, result = row
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_hit_time = datetime.now()
+    session.add(entry)
+    return result
+
+
+def replay_data(result: RecognitionResult) -> Dict[str, Any]:
+    """由已有识别结果构造 _save_result 的输入（与调用 Dify 成功时的结构一致）"""
+    try:
+        full_response = json.loads(result.raw_payload) if result.raw_payload else {}
+    except (TypeError, ValueError):
+        full_response = {}
+    return {
+        "raw_payload": result.raw_payload,
+        "raw_response_uri": result.raw_response_uri,
+        "normalized_fields": result.normalized_fields or {},
+        "model_usage": {
+            "cache_hit": True,
+            "source_result_id": str(result.id),
+            "source_task_id": str(result.task_id),
+        },
+        "accuracy": result.accuracy,
+        "confidence": result.confidence,
+        "full_response": full_response,
+    }
+
+
+def record(session: Session, key: MemoKey, result_id: UUID) -> None:
+    """记录识别结果（同一缓存键已存在时指向最新结果；在调用方事务中执行，不提交）"""
+    entry = session.exec(
+        select(RecognitionResultCache).where(RecognitionResultCache.cache_key == key.digest)
+    ).first()
+    if entry is None:
+        entry = RecognitionResultCache(
+            cache_key=key.digest,
+            result_id=result_id,
+            file_hash=key.file_hash,
+            template_version_id=key.template_version_id,
+            output_schema_id=key.output_schema_id,
+            model_config_id=key.model_config_id,
+            prompt_hash=key.prompt_hash,
+        )
+    else:
+        entry.result_id = result_id
+        entry.create_time = datetime.now()
+        entry.hit_count = 0
+        entry.last_hit_time = None
+    session.add(entry)
+
+
+def invalidate(
+    session: Session,
+    *,
+    invoice_id: Optional[UUID] = None,
+    file_hash: Optional[str] = None,
+    model_config_id: Optional[Any] = None,
+    output_schema_id: Optional[Any] = None,
+    purge_all: bool = False,
+) -> int:
+    """
+    按条件清除缓存（多个条件同时满足；在调用方事务中执行，不提交）
+
+    Returns:
+        清除的条目数
+    """
+    statement = delete(RecognitionResultCache)
+    conditions = []
+    if invoice_id is not None:
+        conditions.append(RecognitionResultCache.result_id.in_(
+            select(RecognitionResult.id).where(RecognitionResult.invoice_id == invoice_id)
+        ))
+    if file_hash:
+        conditions.append(RecognitionResultCache.file_hash == file_hash)
+    if model_config_id is not None:
+        conditions.append(RecognitionResultCache.model_config_id == str(model_config_id))
+    if output_schema_id is not None:
+        conditions.append(RecognitionResultCache.output_schema_id == str(output_schema_id))
+    if not conditions and not purge_all:
+        return 0
+    removed = session.exec(statement.where(*conditions)).rowcount or 0
+    if removed:
+        logger.info(f"已清除 {removed} 条识别结果缓存")
+    return removed
@@ -0,0 +1,122 @@
+"""
+识别结果字段标准化
+票据详情展示的 normalized_fields 在写入识别结果时一次确定，详情接口直接读取，不再解析原始响应，
+读取耗时与原始响应大小无关。
+
+- SyntaxService._save_result 写入前调用 storage_fields：标准化结果为空时从原始响应提取
+  （依次尝试 data.outputs.text、text、整个响应，raw_data 同理）
+- 历史数据执行 python -m app.services.recognition_payload 补全（可重复执行，只处理 normalized_fields 为空的记录）
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import String, cast, or_, update
+from sqlmodel import Session, select
+
+from app.models.models_invoice import RecognitionResult
+
+logger = logging.getLogger(__name__)
+
+# 补全时每批处理的记录数
+BACKFILL_BATCH_SIZE = 500
+
+
+def _workflow_text(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """工作流返回的 data.outputs.text"""
+    data = payload.get("data")
+    outputs = data.get("outputs") if isinstance(data, dict) else None
+    text = outputs.get("text") if isinstance(outputs, dict) else None
+    return text if isinstance(text, dict) else None
+
+
+def extract_fields(raw_payload: Optional[str], raw_data: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+    """从原始响应中提取票据字段，无法提取时返回 None"""
+    if raw_payload:
+        try:
+            payload = json.loads(raw_payload)
+        except (TypeError, ValueError):
+            logger.warning("解析 raw_payload 失败，尝试使用 raw_data")
+            payload = None
+        if isinstance(payload, dict):
+            if isinstance(payload.get("data"), dict):
+                fields = _workflow_text(payload)
+            elif isinstance(payload.get("text"), dict):
+                fields = payload["text"]
+            else:
+                fields = payload
+            if fields:
+                return fields
+
+    if isinstance(raw_data, dict):
+        if isinstance(raw_data.get("text"), dict):
+            return raw_data["text"] or None
+        if isinstance(raw_data.get("data"), dict):
+            return _workflow_text(raw_data)
+        return raw_data or None
+    return None
+
+
+def storage_fields(
+    normalized_fields: Optional[Dict[str, Any]],
+    raw_payload: Optional[str],
+    raw_data: Optional[Any] = None,
+) -> Optional[Dict[str, Any]]:
+    """识别结果写入时保存的 normalized_fields"""
+    if normalized_fields:
+        return normalized_fields
+    return extract_fields(raw_payload, raw_data) or normalized_fields
+
+
+def _missing_condition():
+    """normalized_fields 为空（NULL、JSON null 或空对象）"""
+    text_value = cast(RecognitionResult.normalized_fields, String)
+    return or_(RecognitionResult.normalized_fields.is_(None), text_value.in_(("null", "{}")))
+
+
+def backfill_normalized_fields(session: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    补全历史识别结果的 normalized_fields（按主键分批，每批提交一次）
+
+    Returns:
+        补全的记录数
+    """
+    updated = 0
+    last_id: Optional[UUID] = None
+    while True:
+        statement = select(RecognitionResult.id, RecognitionResult.raw_payload, RecognitionResult.raw_data).where(
+            _missing_condition(), or_(RecognitionResult.raw_payload.is_not(None), RecognitionResult.raw_data.is_not(None))
+        )
+        if last_id is not None:
+            statement = statement.where(RecognitionResult.id > last_id)
+        rows = session.exec(statement.order_by(RecognitionResult.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        values: List[Dict[str, Any]] = []
+        for result_id, raw_payload, raw_data in rows:
+            fields = extract_fields(raw_payload, raw_data)
+            if fields:
+                values.append({"id": result_id, "normalized_fields": fields})
+        if values:
+            session.execute(update(RecognitionResult), values)
+            session.commit()
+            updated += len(values)
+        logger.info(f"识别结果字段补全: 本批 {len(rows)} 条，已补全 {updated} 条")
+    return updated
+
+
+def main() -> None:
+    """补全历史数据：python -m app.services.recognition_payload"""
+    from app.core import db
+
+    logging.basicConfig(level=logging.INFO)
+    with Session(db.engine) as session:
+        backfill_normalized_fields(session)
+
+
+if __name__ == "__main__":
+    main()
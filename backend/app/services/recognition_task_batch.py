@@ -0,0 +1,200 @@
+"""
+识别任务批量创建
+大批量文件（数百个）一次创建识别任务时使用集合操作，往返次数与文件数无关：
+
+- 一次查询解析全部文件对应的票据及文件状态
+- 一条多行 INSERT 写入全部任务（按 INSERT_CHUNK_SIZE 分块，避免超出参数个数上限）
+- 票据/文件的模型与模板信息各用一条 UPDATE 更新
+- 可选直接以 queued 状态写入并唤醒识别工作池，省去逐个调用 start 接口
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from uuid import UUID, uuid4
+
+from sqlalchemy import JSON, column, insert, table, update
+from sqlmodel import Session, select
+
+from app.models import User
+from app.models.models_invoice import Invoice, InvoiceFile
+from app.services.permission_scope import can_access_company
+from app.services.schema_capabilities import SchemaCapabilities, schema_capabilities
+from app.services.statistics_rollup import refresh_rollup_for_tasks
+
+logger = logging.getLogger(__name__)
+
+# 单条 INSERT 的最大行数（每行约 11 个参数，PostgreSQL 单条语句参数上限 65535）
+INSERT_CHUNK_SIZE = 1000
+
+# 已识别成功的文件不再创建任务
+FILE_STATUS_PROCESSED = "processed"
+
+
+class BatchTaskError(Exception):
+    """批量创建任务的校验错误（携带 HTTP 状态码）"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class ResolvedBatch:
+    """解析后的批次：需要创建任务的票据（按请求顺序）与跳过的文件"""
+    invoices: List[Invoice] = field(default_factory=list)
+    skipped_file_ids: List[UUID] = field(default_factory=list)
+
+
+def resolve_invoices(session: Session, file_ids: Sequence[UUID], user: User) -> ResolvedBatch:
+    """
+    一次查询解析文件对应的票据并检查权限
+
+    - 文件状态为 processed 的跳过
+    - 文件没有对应票据时报 404，无权访问时报 403（与逐个校验时的错误一致）
+    - 重复的文件ID只创建一个任务
+    """
+    unique_ids = list(dict.fromkeys(file_ids))
+    if not unique_ids:
+        return ResolvedBatch()
+
+    rows = session.exec(
+        select(Invoice, InvoiceFile.status)
+        .outerjoin(InvoiceFile, InvoiceFile.id == Invoice.file_id)
+        .where(Invoice.file_id.in_(unique_ids))
+        .order_by(Invoice.create_time)
+    ).all()
+    by_file: Dict[UUID, tuple] = {}
+    for invoice, file_status in rows:
+        by_file.setdefault(invoice.file_id, (invoice, file_status))
+
+    batch = ResolvedBatch()
+    for file_id in unique_ids:
+        found = by_file.get(file_id)
+        if found is None:
+            raise BatchTaskError(404, f"文件ID {file_id} 对应的票据不存在")
+        invoice, file_status = found
+        if file_status == FILE_STATUS_PROCESSED:
+            batch.skipped_file_ids.append(file_id)
+            continue
+        if not can_access_company(session, user, invoice.company_id):
+            raise BatchTaskError(403, f"无权访问文件ID {file_id} 对应的票据")
+        batch.invoices.append(invoice)
+    return batch
+
+
+def _task_table(capabilities: SchemaCapabilities, with_template_version: bool):
+    """只包含本次写入字段的 recognition_task 轻量表对象（不存在的可选列不会出现在 INSERT 中）"""
+    columns = [
+        column("id"), column("task_no"), column("invoice_id"), column("params", JSON),
+        column("status"), column("priority"), column("operator_id"), column("provider"), column("create_time"),
+    ]
+    if capabilities.task_has_template_id:
+        columns.append(column("template_id"))
+    if capabilities.has_column("recognition_task", "progress"):
+        columns.append(column("progress"))
+    if capabilities.has_column("recognition_task", "attempts"):
+        columns.append(column("attempts"))
+    if with_template_version:
+        columns.append(column("template_version_id"))
+    return table("recognition_task", *columns)
+
+
+def insert_tasks(
+    session: Session,
+    invoices: Iterable[Invoice],
+    params: Dict[str, Any],
+    operator_id: UUID,
+    *,
+    template_id: Optional[UUID] = None,
+    template_version_id: Optional[UUID] = None,
+    status: str = "pending",
+    capabilities: Optional[SchemaCapabilities] = None,
+) -> List[Dict[str, Any]]:
+    """
+    多行 INSERT 创建识别任务（在调用方事务中执行，不提交）
+
+    Returns:
+        写入的任务行（id/task_no/invoice_id/status/create_time 等），供直接构造响应
+    """
+    capabilities = capabilities or schema_capabilities.get()
+    with_template_version = bool(
+        capabilities.task_has_template_version_id and template_id and template_version_id
+    )
+    task_table = _task_table(capabilities, with_template_version)
+    now = datetime.now()
+    stamp = now.strftime('%Y%m%d%H%M%S')
+
+    rows: List[Dict[str, Any]] = []
+    for invoice in invoices:
+        task_id = uuid4()
+        row: Dict[str, Any] = {
+            "id": task_id,
+            "task_no": f"TASK-{stamp}-{task_id.hex[:8]}",
+            "invoice_id": invoice.id,
+            "params": params,
+            "status": status,
+            "priority": 0,
+            "operator_id": operator_id,
+            "provider": "dify",
+            "create_time": now,
+        }
+        if capabilities.task_has_template_id:
+            row["template_id"] = template_id
+        if capabilities.has_column("recognition_task", "progress"):
+            row["progress"] = 0
+        if capabilities.has_column("recognition_task", "attempts"):
+            row["attempts"] = 0
+        if with_template_version:
+            row["template_version_id"] = template_version_id
+        rows.append(row)
+
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        session.execute(insert(task_table).values(rows[start:start + INSERT_CHUNK_SIZE]))
+    refresh_rollup_for_tasks(session, [row["id"] for row in rows])
+    return rows
+
+
+def apply_model_template_info(
+    session: Session,
+    invoices: Sequence[Invoice],
+    *,
+    model_name: Optional[str] = None,
+    template_name: Optional[str] = None,
+    template_version: Optional[str] = None,
+    recognition_status: Optional[str] = None,
+    capabilities: Optional[SchemaCapabilities] = None,
+) -> None:
+    """
+    批量更新票据与文件上的模型名称、模板名称和版本（各一条 UPDATE）
+
+    这几列不在 ORM 模型中，只在已执行相应迁移的数据库上存在，按表结构能力决定是否更新；
+    值为空的字段不更新
+    """
+    if not invoices:
+        return
+    capabilities = capabilities or schema_capabilities.get()
+    values = {
+        key: value for key, value in (
+            ("model_name", model_name),
+            ("template_name", template_name),
+            ("template_version", template_version),
+        ) if value
+    }
+    for table_name, id_column, ids in (
+        ("invoice_file", "id", [invoice.file_id for invoice in invoices]),
+        ("invoice", "id", [invoice.id for invoice in invoices]),
+    ):
+        table_values = {key: value for key, value in values.items() if capabilities.has_column(table_name, key)}
+        if not table_values:
+            continue
+        target = table(table_name, column(id_column), *(column(key) for key in table_values))
+        session.execute(update(target).where(target.c[id_column].in_(ids)).values(**table_values))
+
+    if recognition_status:
+        # 票据已加载在会话中，直接修改属性由 ORM 批量 flush（同时触发统计汇总的变更跟踪）
+        for invoice in invoices:
+            invoice.recognition_status = recognition_status
+            session.add(invoice)
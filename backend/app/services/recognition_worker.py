@@ -0,0 +1,394 @@
+"""
+识别任务后台工作池
+从 recognition_task 表中领取已入队（queued）的任务，在独立线程中执行 SyntaxService.process_task，
+避免在 HTTP 请求内同步调用 Dify 占用 uvicorn worker 和连接池。
+
+出队规则：
+- 按 priority 降序、create_time 升序
+- PostgreSQL 下使用 FOR UPDATE SKIP LOCKED，多进程/多实例部署时不会重复领取
+- 全局并发受 RECOGNITION_WORKER_CONCURRENCY 限制
+- 单个 LLMConfig 并发受 llm_config.max_concurrency（为空时使用 RECOGNITION_WORKER_PER_CONFIG_LIMIT）限制，
+  已满的配置在出队时被排除，不会阻塞其他配置的任务
+
+中断恢复：
+- 领取任务时记录工作池实例（worker_id）与心跳时间（heartbeat_at），执行期间调度线程定期刷新心跳
+- 调度线程同时定期检查心跳超过 RECOGNITION_WORKER_STALE_SECONDS 未更新的 processing 任务并重新入队
+  （所属进程已退出或被杀死）；其他存活实例正在执行的任务心跳持续更新，不会被重复执行
+- 每次领取时 attempts 加 1；已领取 RECOGNITION_WORKER_MAX_ATTEMPTS 次仍中断的任务标记为失败，
+  避免会导致进程崩溃或卡死的任务（超大文件、预处理/渲染中的原生库崩溃）被无限重新入队
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import bindparam, text
+from sqlmodel import Session
+
+from app.core import db
+from app.core.config import settings
+from app.models.models_invoice import Invoice, LLMConfig
+from app.services.statistics_rollup import refresh_rollup_for_tasks
+
+logger = logging.getLogger(__name__)
+
+# 任务入队后的状态（pending -> queued -> processing -> completed/failed）
+TASK_STATUS_QUEUED = "queued"
+
+
+class RecognitionWorkerPool:
+    """识别任务工作池（调度线程 + 执行线程池）"""
+
+    def __init__(
+        self,
+        concurrency: int = settings.RECOGNITION_WORKER_CONCURRENCY,
+        per_config_limit: int = settings.RECOGNITION_WORKER_PER_CONFIG_LIMIT,
+        poll_interval: float = settings.RECOGNITION_WORKER_POLL_INTERVAL,
+        heartbeat_interval: float = settings.RECOGNITION_WORKER_HEARTBEAT_INTERVAL,
+        stale_seconds: float = settings.RECOGNITION_WORKER_STALE_SECONDS,
+        max_attempts: int = settings.RECOGNITION_WORKER_MAX_ATTEMPTS,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.per_config_limit = max(1, per_config_limit)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        # 至少允许错过两次心跳，避免数据库短暂变慢时误判
+        self.stale_seconds = max(stale_seconds, heartbeat_interval * 3)
+        self.max_attempts = max(1, max_attempts)
+        # 当前工作池实例标识（写入 recognition_task.worker_id）
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._next_maintenance = 0.0
+
+        # 运行中的任务：task_id -> model_config_id
+        self._inflight: Dict[str, str] = {}
+        # 各配置的并发上限缓存：model_config_id -> limit
+        self._config_limits: Dict[str, int] = {}
+
+    # ==================== 生命周期 ====================
+
+    @property
+    def is_running(self) -> bool:
+        return self._dispatcher is not None and self._dispatcher.is_alive()
+
+    def start(self) -> None:
+        """启动工作池（幂等）"""
+        if self.is_running:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="recognition-worker"
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop, name="recognition-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+        logger.info(
+            f"识别工作池已启动: 并发={self.concurrency}, 单配置默认上限={self.per_config_limit}, "
+            f"轮询间隔={self.poll_interval}s"
+        )
+
+    def stop(self, wait: bool = True) -> None:
+        """停止工作池，正在执行的任务会执行完毕"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._dispatcher:
+            self._dispatcher.join(timeout=self.poll_interval * 2)
+            self._dispatcher = None
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        logger.info("识别工作池已停止")
+
+    def notify(self) -> None:
+        """有新任务入队时唤醒调度线程，避免等待下一个轮询周期"""
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, object]:
+        """当前工作池状态（用于健康检查）"""
+        with self._lock:
+            per_config: Dict[str, int] = {}
+            for config_id in self._inflight.values():
+                per_config[config_id] = per_config.get(config_id, 0) + 1
+            return {
+                "running": self.is_running,
+                "worker_id": self.worker_id,
+                "concurrency": self.concurrency,
+                "inflight": len(self._inflight),
+                "inflight_per_config": per_config,
+            }
+
+    # ==================== 调度 ====================
+
+    def _dispatch_loop(self) -> None:
+        while not self._stopping.is_set():
+            if time.monotonic() >= self._next_maintenance:
+                self._heartbeat()
+                self._requeue_stale_tasks()
+                self._next_maintenance = time.monotonic() + self.heartbeat_interval
+
+            claimed = None
+            try:
+                if self._free_slots() > 0:
+                    claimed = self._claim_next_task()
+            except Exception as e:
+                logger.error(f"识别任务出队失败: {e}", exc_info=True)
+
+            if claimed:
+                task_id, config_id = claimed
+                with self._lock:
+                    self._inflight[task_id] = config_id
+                self._executor.submit(self._run_task, task_id, config_id)
+                # 领取成功后立即尝试领取下一个
+                continue
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _free_slots(self) -> int:
+        with self._lock:
+            return self.concurrency - len(self._inflight)
+
+    def _saturated_configs(self) -> list[str]:
+        """返回已达到并发上限的 model_config_id 列表"""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for config_id in self._inflight.values():
+                counts[config_id] = counts.get(config_id, 0) + 1
+
+        saturated = []
+        for config_id, count in counts.items():
+            if count >= self._get_config_limit(config_id):
+                saturated.append(config_id)
+        return saturated
+
+    def _get_config_limit(self, config_id: str) -> int:
+        limit = self._config_limits.get(config_id)
+        if limit is None:
+            limit = self.per_config_limit
+            try:
+                with Session(db.engine) as session:
+                    model_config = session.get(LLMConfig, UUID(config_id))
+                    if model_config and model_config.max_concurrency:
+                        limit = max(1, model_config.max_concurrency)
+            except Exception as e:
+                logger.warning(f"读取模型配置并发上限失败: {config_id}, {e}")
+            self._config_limits[config_id] = limit
+        return limit
+
+    def _claim_next_task(self) -> Optional[Tuple[str, str]]:
+        """
+        领取一个已入队任务并将其置为 processing
+
+        Returns:
+            (task_id, model_config_id)，没有可领取任务时返回 None
+        """
+        saturated = self._saturated_configs()
+        with Session(db.engine) as session:
+            exclude_clause = ""
+            params: Dict[str, object] = {
+                "queued": TASK_STATUS_QUEUED,
+                "processing": "processing",
+                "now": datetime.now(),
+                "worker_id": self.worker_id,
+            }
+            if saturated:
+                exclude_clause = "AND COALESCE(params->>'model_config_id', '') NOT IN :saturated"
+                params["saturated"] = saturated
+
+            if session.bind.dialect.name == "postgresql":
+                stmt = text(f"""
+                    UPDATE recognition_task
+                    SET status = :processing, start_time = :now, worker_id = :worker_id, heartbeat_at = :now,
+                        attempts = COALESCE(attempts, 0) + 1
+                    WHERE id = (
+                        SELECT id FROM recognition_task
+                        WHERE status = :queued {exclude_clause}
+                        ORDER BY priority DESC, create_time ASC
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, params->>'model_config_id'
+                """)
+                if saturated:
+                    stmt = stmt.bindparams(bindparam("saturated", expanding=True))
+                row = session.execute(stmt, params).fetchone()
+                if row:
+                    refresh_rollup_for_tasks(session, [row[0]])
+                session.commit()
+                if not row:
+                    return None
+                return str(row[0]), row[1] or ""
+
+            # 非 PostgreSQL（如 SQLite 测试环境）：先查询再按状态条件更新，rowcount 为 0 表示被抢占
+            select_stmt = text("""
+                SELECT id, params FROM recognition_task
+                WHERE status = :queued
+                ORDER BY priority DESC, create_time ASC
+            """)
+            for task_id, task_params in session.execute(select_stmt, params).fetchall():
+                if isinstance(task_params, str):
+                    task_params = json.loads(task_params or "{}")
+                config_id = (task_params or {}).get("model_config_id") or ""
+                if config_id in saturated:
+                    continue
+                updated = session.execute(
+                    text("""
+                        UPDATE recognition_task
+                        SET status = :processing, start_time = :now, worker_id = :worker_id, heartbeat_at = :now,
+                            attempts = COALESCE(attempts, 0) + 1
+                        WHERE id = :task_id AND status = :queued
+                    """),
+                    {**params, "task_id": task_id},
+                )
+                if updated.rowcount == 1:
+                    refresh_rollup_for_tasks(session, [task_id])
+                session.commit()
+                if updated.rowcount == 1:
+                    return str(task_id), config_id
+            return None
+
+    def _run_task(self, task_id: str, config_id: str) -> None:
+        from app.services.dify_service import SyntaxService
+
+        try:
+            with Session(db.engine) as session:
+                SyntaxService(session).process_task(UUID(task_id))
+        except Exception as e:
+            logger.error(f"识别任务执行异常: {task_id}, 错误: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._inflight.pop(task_id, None)
+            self._wakeup.set()
+
+    def _heartbeat(self) -> None:
+        """刷新本实例正在执行的任务的心跳时间"""
+        with self._lock:
+            task_ids = list(self._inflight)
+        if not task_ids:
+            return
+        try:
+            with Session(db.engine) as session:
+                session.execute(
+                    text("""
+                        UPDATE recognition_task SET heartbeat_at = :now
+                        WHERE id IN :task_ids AND worker_id = :worker_id AND status = 'processing'
+                    """).bindparams(bindparam("task_ids", expanding=True)),
+                    {"now": datetime.now(), "task_ids": task_ids, "worker_id": self.worker_id},
+                )
+                session.commit()
+        except Exception as e:
+            logger.warning(f"更新识别任务心跳失败: {e}")
+
+    def _requeue_stale_tasks(self) -> None:
+        """
+        将心跳超时的 processing 任务重新入队（所属进程已退出或被杀死）；没有心跳的旧任务按开始时间判断。
+        已领取 max_attempts 次的任务（处理过程会导致进程崩溃或卡死）标记为失败，不再入队
+        """
+        try:
+            now = datetime.now()
+            params = {
+                "queued": TASK_STATUS_QUEUED,
+                "cutoff": now - timedelta(seconds=self.stale_seconds),
+                "max_attempts": self.max_attempts,
+                "now": now,
+                "message": f"识别任务已执行 {self.max_attempts} 次均中断（执行进程退出或无响应），不再重试",
+            }
+            stale = "status = 'processing' AND COALESCE(heartbeat_at, start_time, create_time) < :cutoff"
+            with Session(db.engine) as session:
+                failed = session.execute(
+                    text(f"""
+                        UPDATE recognition_task
+                        SET status = 'failed', worker_id = NULL, heartbeat_at = NULL, current_node = NULL,
+                            end_time = :now, error_code = 'WORKER_INTERRUPTED', error_message = :message
+                        WHERE {stale} AND COALESCE(attempts, 0) >= :max_attempts
+                        RETURNING id, invoice_id
+                    """),
+                    params,
+                ).fetchall()
+                if failed:
+                    session.execute(
+                        text("UPDATE invoice SET recognition_status = 'failed' WHERE id IN :invoice_ids")
+                        .bindparams(bindparam("invoice_ids", expanding=True)),
+                        {"invoice_ids": list({row[1] for row in failed})},
+                    )
+                task_ids = [row[0] for row in session.execute(
+                    text(f"""
+                        UPDATE recognition_task SET status = :queued, worker_id = NULL, heartbeat_at = NULL
+                        WHERE {stale}
+                        RETURNING id
+                    """),
+                    params,
+                ).fetchall()]
+                refresh_rollup_for_tasks(session, [row[0] for row in failed] + task_ids)
+                session.commit()
+                if failed:
+                    logger.error(f"已将 {len(failed)} 个多次中断的识别任务标记为失败")
+                if task_ids:
+                    logger.warning(f"已将 {len(task_ids)} 个中断的识别任务重新入队")
+                    self._wakeup.set()
+        except Exception as e:
+            logger.warning(f"重新入队中断任务失败: {e}")
+
+    def invalidate_config_limit(self, config_id: Optional[str] = None) -> None:
+        """模型配置更新后清除并发上限缓存"""
+        if config_id is None:
+            self._config_limits.clear()
+        else:
+            self._config_limits.pop(str(config_id), None)
+
+
+def enqueue_task(session: Session, task_id: UUID, invoice: Optional[Invoice] = None) -> None:
+    """
+    将任务置为 queued 并唤醒工作池（调用方负责校验任务状态；重新入队的任务领取次数从 0 开始）
+
+    Args:
+        session: 数据库会话
+        task_id: 任务ID
+        invoice: 对应票据（传入时同步更新 recognition_status 为 processing）
+    """
+    session.execute(
+        text("UPDATE recognition_task SET status = :queued, attempts = 0 WHERE id = :task_id"),
+        {"queued": TASK_STATUS_QUEUED, "task_id": str(task_id)},
+    )
+    refresh_rollup_for_tasks(session, [task_id])
+    if invoice is not None:
+        invoice.recognition_status = "processing"
+        session.add(invoice)
+    session.commit()
+    recognition_worker_pool.notify()
+
+
+recognition_worker_pool = RecognitionWorkerPool()
+
+
+def main() -> None:
+    """
+    独立进程运行工作池：python -m app.services.recognition_worker
+    部署多个 API 实例时可将 RECOGNITION_WORKER_ENABLED 设为 false，改由独立进程消费任务
+    """
+    logging.basicConfig(level=logging.INFO)
+    recognition_worker_pool.start()
+    try:
+        while recognition_worker_pool.is_running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recognition_worker_pool.stop()
+
+
+if __name__ == "__main__":
+    main()
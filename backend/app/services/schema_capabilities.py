@@ -0,0 +1,167 @@
+"""
+数据库结构能力注册表
+部分部署的数据库尚未执行全部迁移，recognition_task.template_version_id、invoice.template_name 等可选列可能不存在。
+这里在启动时一次性读取相关表的列，之后请求直接使用缓存的列开关与预先拼好的字段列表，不再每次请求查询系统目录。
+
+- 应用启动时刷新；执行 Alembic 升级后可通过 POST /health/schema-capabilities/refresh 手动刷新
+- 读取表结构失败时使用不含可选列的默认字段列表（与原先的降级逻辑一致），下次刷新时重试
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import inspect
+
+from app.core.db import engine
+
+logger = logging.getLogger(__name__)
+
+# recognition_task 查询字段（template_version_id 存在时插在 template_id 之后）
+RECOGNITION_TASK_BASE_FIELDS = (
+    "id", "task_no", "invoice_id", "template_id", "params", "status",
+    "priority", "start_time", "end_time", "duration", "error_message",
+    "error_code", "provider", "request_id", "trace_id", "operator_id", "create_time",
+)
+RECOGNITION_TASK_MINIMAL_FIELDS = ("id", "task_no", "invoice_id", "template_id", "params", "status")
+
+# invoice 查询字段及可选字段
+INVOICE_BASE_FIELDS = (
+    "id", "invoice_no", "invoice_type", "invoice_date", "amount", "tax_amount",
+    "total_amount", "currency", "supplier_name", "supplier_tax_no",
+    "buyer_name", "buyer_tax_no", "file_id", "recognition_accuracy",
+    "recognition_status", "review_status", "reviewer_id", "review_time",
+    "review_comment", "remark", "creator_id", "company_id", "create_time", "update_time",
+)
+INVOICE_OPTIONAL_FIELDS = ("template_name", "template_version", "model_name")
+
+INVOICE_FILE_DEFAULT_FIELDS = (
+    "id", "file_name", "file_path", "file_size", "file_type", "mime_type", "file_hash",
+    "status", "uploader_id", "upload_time",
+)
+
+RECOGNITION_RESULT_DEFAULT_FIELDS = (
+    "id", "invoice_id", "task_id", "total_fields", "recognized_fields", "accuracy", "confidence",
+    "status", "raw_data", "raw_payload", "raw_response_uri", "normalized_fields", "model_usage",
+    "recognition_time", "create_time",
+)
+
+# 读取结构失败时使用的默认列（不含可选列）
+_DEFAULT_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "recognition_task": RECOGNITION_TASK_BASE_FIELDS,
+    "invoice": INVOICE_BASE_FIELDS,
+    "invoice_file": INVOICE_FILE_DEFAULT_FIELDS,
+    "recognition_result": RECOGNITION_RESULT_DEFAULT_FIELDS,
+}
+
+
+@dataclass(frozen=True)
+class SchemaCapabilities:
+    """某一时刻的数据库结构能力"""
+    columns: Mapping[str, Tuple[str, ...]]
+    introspected: bool
+    # recognition_task 可安全查询的字段
+    recognition_task_fields: Tuple[str, ...]
+    # invoice 可安全查询的字段（基本字段 + 存在的可选字段）
+    invoice_fields: Tuple[str, ...]
+    refreshed_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, Tuple[str, ...]], introspected: bool) -> "SchemaCapabilities":
+        """根据各表的列预先拼好查询字段"""
+        task_columns = columns.get("recognition_task", ())
+        base_fields = list(RECOGNITION_TASK_BASE_FIELDS)
+        if "template_version_id" in task_columns:
+            base_fields.insert(4, "template_version_id")
+        task_fields = tuple(f for f in base_fields if f in task_columns) or RECOGNITION_TASK_MINIMAL_FIELDS
+
+        invoice_columns = columns.get("invoice", ())
+        invoice_fields = INVOICE_BASE_FIELDS + tuple(f for f in INVOICE_OPTIONAL_FIELDS if f in invoice_columns)
+        return cls(
+            columns=columns,
+            introspected=introspected,
+            recognition_task_fields=task_fields,
+            invoice_fields=invoice_fields,
+        )
+
+    def table_columns(self, table: str) -> Tuple[str, ...]:
+        return self.columns.get(table, ())
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in self.table_columns(table)
+
+    @property
+    def task_has_template_id(self) -> bool:
+        return self.has_column("recognition_task", "template_id")
+
+    @property
+    def task_has_template_version_id(self) -> bool:
+        return self.has_column("recognition_task", "template_version_id")
+
+    @property
+    def result_has_template_snapshot(self) -> bool:
+        """recognition_result 是否有模板版本快照列（template_version_id/field_defs_snapshot）"""
+        return self.has_column("recognition_result", "template_version_id") and self.has_column(
+            "recognition_result", "field_defs_snapshot"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "introspected": self.introspected,
+            "refreshed_at": self.refreshed_at.isoformat(),
+            "features": {
+                "task_has_template_id": self.task_has_template_id,
+                "task_has_template_version_id": self.task_has_template_version_id,
+                "result_has_template_snapshot": self.result_has_template_snapshot,
+                "invoice_optional_fields": [f for f in INVOICE_OPTIONAL_FIELDS if self.has_column("invoice", f)],
+            },
+            "columns": {table: list(columns) for table, columns in self.columns.items()},
+        }
+
+
+class SchemaCapabilityRegistry:
+    """数据库结构能力注册表（首次使用或显式刷新时读取表结构）"""
+
+    TABLES = ("recognition_task", "invoice", "invoice_file", "recognition_result")
+    # 读取表结构失败后，间隔多久在下次使用时重试（秒）
+    RETRY_SECONDS = 30.0
+
+    def __init__(self, bind=None):
+        self._bind = bind
+        self._lock = threading.Lock()
+        self._current: Optional[SchemaCapabilities] = None
+
+    def get(self) -> SchemaCapabilities:
+        current = self._current
+        if current is None or (
+            not current.introspected
+            and (datetime.now() - current.refreshed_at).total_seconds() >= self.RETRY_SECONDS
+        ):
+            current = self.refresh()
+        return current
+
+    def refresh(self, bind=None) -> SchemaCapabilities:
+        """重新读取表结构"""
+        bind = bind or self._bind or engine
+        try:
+            inspector = inspect(bind)
+            columns = {
+                table: tuple(column["name"] for column in inspector.get_columns(table))
+                for table in self.TABLES
+            }
+            capabilities = SchemaCapabilities.from_columns(columns, introspected=True)
+            logger.info(
+                f"数据库结构能力已刷新: template_version_id={capabilities.task_has_template_version_id}, "
+                f"invoice 可选字段={[f for f in INVOICE_OPTIONAL_FIELDS if capabilities.has_column('invoice', f)]}"
+            )
+        except Exception as e:
+            logger.warning(f"无法获取表结构，使用默认字段列表: {e}")
+            capabilities = SchemaCapabilities.from_columns(dict(_DEFAULT_COLUMNS), introspected=False)
+        with self._lock:
+            self._current = capabilities
+        return capabilities
+
+
+schema_capabilities = SchemaCapabilityRegistry()
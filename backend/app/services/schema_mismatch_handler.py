@@ -89,9 +89,19 @@ class SchemaMismatchHandler:
         schema_id: Optional[str] = None,
         model_config_id: Optional[str] = None,
         handling_strategy: str = "auto"
+    ) -> SchemaMismatchResult:
+        """处理 Schema 不匹配"""
+        return self.handle_mismatch_sync(output_data, schema_id, model_config_id, handling_strategy)
+
+    def handle_mismatch_sync(
+        self,
+        output_data: Dict[str, Any],
+        schema_id: Optional[str] = None,
+        model_config_id: Optional[str] = None,
+        handling_strategy: str = "auto"
     ) -> SchemaMismatchResult:
         """
-        处理 Schema 不匹配
+        处理 Schema 不匹配（同步版本，供线程中的识别流程直接调用，不新建事件循环）
         
         Args:
             output_data: 大模型返回的原始数据
@@ -106,7 +116,7 @@ class SchemaMismatchHandler:
         
         try:
             # 1. 执行 Schema 验证
-            validation_result = await schema_validation_service.validate_output(
+            validation_result = schema_validation_service.validate_output_sync(
                 output_data=output_data,
                 schema_id=schema_id,
                 model_config_id=model_config_id
@@ -142,7 +152,7 @@ class SchemaMismatchHandler:
             # 5. 尝试自动修复
             repair_result = None
             if handling_strategy == "auto" and not validation_result.is_valid:
-                repair_result = await schema_validation_service.repair_output(
+                repair_result = schema_validation_service.repair_output_sync(
                     output_data=output_data,
                     validation_result=validation_result,
                     schema_id=schema_id,
@@ -161,7 +171,7 @@ class SchemaMismatchHandler:
             if repair_result and repair_result.success:
                 final_data = repair_result.repaired_data
             elif requires_manual_review or (repair_result and not repair_result.success):
-                fallback_result = await schema_validation_service.fallback_output(
+                fallback_result = schema_validation_service.fallback_output_sync(
                     output_data=output_data,
                     validation_result=validation_result,
                     repair_result=repair_result or RepairResult(
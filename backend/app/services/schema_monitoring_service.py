@@ -94,9 +94,23 @@ class SchemaMonitoringService:
         error_count: int = 0,
         warning_count: int = 0,
         validation_time_ms: float = 0.0
+    ) -> str:
+        """记录验证操作"""
+        return self.record_validation_sync(
+            model_config_id, schema_id, is_valid, error_count, warning_count, validation_time_ms
+        )
+
+    def record_validation_sync(
+        self,
+        model_config_id: Optional[str],
+        schema_id: Optional[str],
+        is_valid: bool,
+        error_count: int = 0,
+        warning_count: int = 0,
+        validation_time_ms: float = 0.0
     ) -> str:
         """
-        记录验证操作
+        记录验证操作（同步版本，供线程中的识别流程直接调用）
 
         Args:
             model_config_id: 模型配置ID
@@ -128,7 +142,7 @@ class SchemaMonitoringService:
             )
 
             # 更新缓存的统计信息
-            await self._update_metrics_cache("global", record)
+            self._update_metrics_cache("global", record)
 
             return record.id
 
@@ -169,7 +183,7 @@ class SchemaMonitoringService:
             )
 
             # 更新缓存的统计信息
-            await self._update_metrics_cache("global", repair_record=record)
+            self._update_metrics_cache("global", repair_record=record)
 
             return record.id
 
@@ -210,7 +224,7 @@ class SchemaMonitoringService:
             )
 
             # 更新缓存的统计信息
-            await self._update_metrics_cache("global", fallback_record=record)
+            self._update_metrics_cache("global", fallback_record=record)
 
             return record.id
 
@@ -252,7 +266,7 @@ class SchemaMonitoringService:
 
         return metrics
 
-    async def _update_metrics_cache(
+    def _update_metrics_cache(
         self,
         cache_key: str,
         validation_record: Optional[ValidationRecord] = None,
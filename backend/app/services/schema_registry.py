@@ -0,0 +1,157 @@
+"""
+Schema 校验器注册表
+按 OutputSchema 的 ID 与版本缓存已编译的 JSON Schema 校验器（Draft*Validator），
+校验识别结果时不再每次查库、检查 Schema 并重新构建校验器。
+
+- 配置接口新增/修改/删除 Schema 后调用 invalidate 使缓存失效
+- 其他进程修改的 Schema：缓存项超过 SCHEMA_REGISTRY_TTL_SECONDS 后按 版本 + 更新时间 复核，未变化则继续使用
+- 指定的 Schema 不存在或未启用时使用默认 Schema（is_default 且 is_active）
+"""
+
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.models_invoice import OutputSchema
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CompiledSchema:
+    """已编译的 Schema"""
+    schema_id: str
+    version: str
+    update_time: Optional[datetime]
+    definition: Dict[str, Any]
+    validator: Any
+
+    def first_error(self, instance: Any) -> Optional[ValidationError]:
+        """与 jsonschema.validate 抛出的错误相同（best_match），无错误返回 None"""
+        return best_match(self.validator.iter_errors(instance))
+
+
+def compile_schema(schema: OutputSchema) -> CompiledSchema:
+    """检查 Schema 并构建校验器（Schema 不符合规范时抛出 SchemaError）"""
+    definition = schema.schema_definition
+    validator_class = validator_for(definition)
+    validator_class.check_schema(definition)
+    return CompiledSchema(
+        schema_id=str(schema.id),
+        version=schema.version,
+        update_time=schema.update_time,
+        definition=definition,
+        validator=validator_class(definition),
+    )
+
+
+class SchemaRegistry:
+    """已编译 Schema 的进程内缓存"""
+
+    def __init__(self, ttl_seconds: float = settings.SCHEMA_REGISTRY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # schema_id -> (复核时间, 已编译 Schema)
+        self._entries: Dict[str, Tuple[float, CompiledSchema]] = {}
+        # (复核时间, 默认 Schema ID)
+        self._default: Optional[Tuple[float, Optional[str]]] = None
+
+    def _session(self, session: Optional[Session]):
+        return nullcontext(session) if session is not None else Session(engine)
+
+    def _expired(self, checked_at: float) -> bool:
+        return time.monotonic() - checked_at >= self.ttl_seconds
+
+    def get(self, schema_id: Optional[Any] = None, session: Optional[Session] = None) -> Optional[CompiledSchema]:
+        """
+        获取已编译的 Schema
+
+        Args:
+            schema_id: Schema ID，为空或不可用时使用默认 Schema
+            session: 可选的数据库会话（缓存未命中时查询），为空时使用独立会话
+        """
+        if schema_id:
+            compiled = self._get_by_id(str(schema_id), session)
+            if compiled is not None:
+                return compiled
+        default_id = self._default_id(session)
+        if default_id:
+            return self._get_by_id(default_id, session)
+        return None
+
+    def _get_by_id(self, schema_id: str, session: Optional[Session]) -> Optional[CompiledSchema]:
+        with self._lock:
+            entry = self._entries.get(schema_id)
+        if entry is not None and not self._expired(entry[0]):
+            return entry[1]
+
+        try:
+            uuid_value = UUID(schema_id)
+        except ValueError:
+            return None
+
+        with self._session(session) as db:
+            if entry is not None:
+                cached = entry[1]
+                row = db.exec(
+                    select(OutputSchema.version, OutputSchema.update_time, OutputSchema.is_active)
+                    .where(OutputSchema.id == uuid_value)
+                ).first()
+                if row is not None and row.is_active and (row.version, row.update_time) == (
+                    cached.version, cached.update_time
+                ):
+                    self._store(schema_id, cached)
+                    return cached
+
+            schema = db.get(OutputSchema, uuid_value)
+            if schema is None or not schema.is_active:
+                self.invalidate(schema_id)
+                return None
+            compiled = compile_schema(schema)
+
+        self._store(schema_id, compiled)
+        logger.info(f"已编译 Schema 校验器: {schema_id} (版本 {compiled.version})")
+        return compiled
+
+    def _store(self, schema_id: str, compiled: CompiledSchema) -> None:
+        with self._lock:
+            self._entries[schema_id] = (time.monotonic(), compiled)
+
+    def _default_id(self, session: Optional[Session]) -> Optional[str]:
+        with self._lock:
+            default = self._default
+        if default is not None and not self._expired(default[0]):
+            return default[1]
+
+        with self._session(session) as db:
+            default_id = db.exec(
+                select(OutputSchema.id).where(OutputSchema.is_default == True, OutputSchema.is_active == True)
+            ).first()
+        default_id = str(default_id) if default_id else None
+        with self._lock:
+            self._default = (time.monotonic(), default_id)
+        return default_id
+
+    def invalidate(self, schema_id: Optional[Any] = None) -> None:
+        """Schema 变更后使缓存失效（schema_id 为空时清空全部）；默认 Schema 总是重新查询"""
+        with self._lock:
+            if schema_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(schema_id), None)
+            self._default = None
+
+
+schema_registry = SchemaRegistry()
@@ -7,14 +7,9 @@ import json
 import logging
 from typing import Dict, Any, Optional, Tuple, List
 from datetime import datetime
-from jsonschema import validate, ValidationError, Draft7Validator
 from pydantic import BaseModel, Field
-import uuid
 
-from app.core.db import engine
-from sqlmodel import Session
-from app.models.models_invoice import OutputSchema, LLMConfig
-from sqlmodel import select
+from app.services.schema_registry import CompiledSchema, schema_registry
 
 logger = logging.getLogger(__name__)
 
@@ -66,18 +61,66 @@ class SchemaValidationService:
         Returns:
             ValidationResult: 验证结果
         """
+        return self.validate_output_sync(output_data, schema_id, model_config_id)
+
+    def validate_output_sync(
+        self,
+        output_data: Dict[str, Any],
+        schema_id: Optional[str] = None,
+        model_config_id: Optional[str] = None
+    ) -> ValidationResult:
+        """验证输出数据是否符合Schema（同步版本，供线程/进程中的识别流程直接调用）"""
+        return self.validate_outputs_sync([output_data], schema_id, model_config_id)[0]
+
+    def validate_outputs_sync(
+        self,
+        outputs: List[Dict[str, Any]],
+        schema_id: Optional[str] = None,
+        model_config_id: Optional[str] = None
+    ) -> List[ValidationResult]:
+        """
+        批量验证：多条输出数据使用同一个已编译的Schema
+
+        Returns:
+            List[ValidationResult]: 与 outputs 顺序一致的验证结果
+        """
         start_time = datetime.now()
 
         try:
-            # 获取Schema定义
-            schema_def = await self._get_schema_definition(schema_id, model_config_id)
-            if not schema_def:
-                self.logger.warning(f"No schema found for schema_id: {schema_id}, model_config_id: {model_config_id}")
-                return ValidationResult(
+            compiled = schema_registry.get(schema_id)
+        except Exception as e:
+            self.logger.error(f"Schema validation error: {str(e)}")
+            return [
+                ValidationResult(
+                    is_valid=False,
+                    errors=[{"field": "system", "message": f"Validation system error: {str(e)}"}],
+                    validation_time=start_time
+                )
+                for _ in outputs
+            ]
+
+        if compiled is None:
+            self.logger.warning(f"No schema found for schema_id: {schema_id}, model_config_id: {model_config_id}")
+            return [
+                ValidationResult(
                     is_valid=True,  # 如果没有Schema，认为是有效的
                     warnings=[{"message": "No schema defined for validation"}],
                     validation_time=start_time
                 )
+                for _ in outputs
+            ]
+
+        return [self._validate_compiled(compiled, output_data, start_time) for output_data in outputs]
+
+    def _validate_compiled(
+        self,
+        compiled: CompiledSchema,
+        output_data: Any,
+        start_time: datetime
+    ) -> ValidationResult:
+        """使用已编译的Schema验证单条输出数据"""
+        try:
+            schema_def = compiled.definition
 
             # 验证JSON格式
             if not isinstance(output_data, dict):
@@ -89,9 +132,8 @@ class SchemaValidationService:
 
             # 验证Schema
             errors = []
-            try:
-                validate(instance=output_data, schema=schema_def)
-            except ValidationError as e:
+            e = compiled.first_error(output_data)
+            if e is not None:
                 errors.append({
                     "field": ".".join(str(p) for p in e.absolute_path) if e.absolute_path else "root",
                     "message": e.message,
@@ -134,9 +176,19 @@ class SchemaValidationService:
         validation_result: ValidationResult,
         schema_id: Optional[str] = None,
         model_config_id: Optional[str] = None
+    ) -> RepairResult:
+        """尝试修复不符合Schema的数据"""
+        return self.repair_output_sync(output_data, validation_result, schema_id, model_config_id)
+
+    def repair_output_sync(
+        self,
+        output_data: Dict[str, Any],
+        validation_result: ValidationResult,
+        schema_id: Optional[str] = None,
+        model_config_id: Optional[str] = None
     ) -> RepairResult:
         """
-        尝试修复不符合Schema的数据
+        尝试修复不符合Schema的数据（同步版本，供线程中的识别流程直接调用）
 
         Args:
             output_data: 原始输出数据
@@ -152,7 +204,7 @@ class SchemaValidationService:
 
         try:
             # 获取Schema定义
-            schema_def = await self._get_schema_definition(schema_id, model_config_id)
+            schema_def = self._get_schema_definition(schema_id, model_config_id)
             if not schema_def:
                 return RepairResult(
                     success=False,
@@ -229,7 +281,7 @@ class SchemaValidationService:
                     })
 
             # 再次验证修复后的数据
-            final_validation = await self.validate_output(repaired_data, schema_id, model_config_id)
+            final_validation = self.validate_output_sync(repaired_data, schema_id, model_config_id)
 
             return RepairResult(
                 success=final_validation.is_valid,
@@ -252,9 +304,19 @@ class SchemaValidationService:
         validation_result: ValidationResult,
         repair_result: RepairResult,
         fallback_strategy: str = "auto"
+    ) -> FallbackResult:
+        """根据策略生成降级返回结果"""
+        return self.fallback_output_sync(output_data, validation_result, repair_result, fallback_strategy)
+
+    def fallback_output_sync(
+        self,
+        output_data: Dict[str, Any],
+        validation_result: ValidationResult,
+        repair_result: RepairResult,
+        fallback_strategy: str = "auto"
     ) -> FallbackResult:
         """
-        根据策略生成降级返回结果
+        根据策略生成降级返回结果（同步版本）
 
         Args:
             output_data: 原始输出数据
@@ -343,37 +405,17 @@ class SchemaValidationService:
                 fallback_time=start_time
             )
 
-    async def _get_schema_definition(
+    def _get_schema_definition(
         self,
         schema_id: Optional[str] = None,
         model_config_id: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """获取Schema定义"""
+        # 注意：LLMConfig 没有 default_schema_id 字段，model_config_id 暂不参与查找
         try:
-            with Session(engine) as session:
-                if schema_id:
-                    # 直接通过Schema ID获取
-                    schema_obj = session.get(OutputSchema, schema_id)
-                    if schema_obj and schema_obj.is_active:
-                        return schema_obj.schema_definition
-
-                if model_config_id:
-                    # 注意：LLMConfig 没有 default_schema_id 字段
-                    # 如果需要通过模型配置获取默认Schema，需要从任务参数中获取 output_schema_id
-                    # 这里暂时跳过，因为 LLMConfig 不包含默认 schema 信息
-                    pass
-
-                # 返回默认的发票Schema（如果存在）
-                default_schema = session.exec(
-                    select(OutputSchema).where(
-                        OutputSchema.is_default == True,
-                        OutputSchema.is_active == True
-                    )
-                ).first()
-
-                if default_schema:
-                    return default_schema.schema_definition
-
+            compiled = schema_registry.get(schema_id)
+            if compiled:
+                return compiled.definition
         except Exception as e:
             self.logger.error(f"Error getting schema definition: {str(e)}")
 
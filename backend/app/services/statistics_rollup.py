@@ -0,0 +1,449 @@
+"""
+统计日汇总
+票据与识别任务按（创建日期, 公司）汇总到 statistics_daily_rollup 表，统计看板只读汇总表，
+查询次数与历史数据量无关。
+
+- 票据/任务通过 ORM 写入时，在 after_flush 中按受影响的（日期, 公司）重新汇总，与业务写入同一事务
+- 通过原生 SQL 修改任务状态的地方（识别工作池）调用 refresh_rollup_for_tasks
+- 汇总表为空时（首次使用或迁移后）自动全量构建，也可执行 python -m app.services.statistics_rollup 手动重建
+- 看板查询结果在进程内缓存 STATISTICS_CACHE_TTL_SECONDS 秒
+- 已入队等待识别工作池领取（queued）的任务计入 pending
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import and_, delete, event, false, func, insert, inspect, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import Invoice, RecognitionTask, StatisticsDailyRollup
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[date, Optional[UUID]]
+
+# 计入 pending 的任务状态（queued：已入队，等待识别工作池领取）
+PENDING_TASK_STATUSES = ("pending", "queued")
+
+ROLLUP_COUNT_FIELDS = (
+    "invoice_count", "invoice_amount", "review_pending", "review_approved", "review_rejected",
+    "task_count", "task_pending", "task_processing", "task_completed", "task_failed",
+)
+
+# 变更后需要重新汇总的字段
+_INVOICE_TRACKED_FIELDS = ("company_id", "create_time", "total_amount", "review_status")
+_TASK_TRACKED_FIELDS = ("invoice_id", "create_time", "status")
+
+
+# ==================== 查询缓存 ====================
+
+statistics_cache = TTLCache(settings.STATISTICS_CACHE_TTL_SECONDS)
+
+
+# ==================== 汇总 ====================
+
+def _day_expr(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        return func.date_trunc("day", column)
+    return func.date(column)
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_uuid(value) -> Optional[UUID]:
+    if value is None or isinstance(value, UUID):
+        return value
+    return UUID(str(value))
+
+
+def _key_condition(day_column, company_column, key: RollupKey):
+    day, company_id = key
+    start = datetime.combine(day, datetime.min.time())
+    return and_(
+        day_column >= start,
+        day_column < start + timedelta(days=1),
+        company_column.is_not_distinct_from(company_id),
+    )
+
+
+def _aggregate(connection: Connection, keys: Optional[List[RollupKey]] = None) -> Dict[RollupKey, Dict[str, Any]]:
+    """
+    按（日期, 公司）分组汇总票据与任务（各一条分组查询）
+
+    Args:
+        keys: 只汇总这些（日期, 公司），为 None 时汇总全部
+    """
+    dialect_name = connection.dialect.name
+    invoice_day = _day_expr(Invoice.create_time, dialect_name).label("day")
+    invoice_stmt = select(
+        invoice_day,
+        Invoice.company_id,
+        func.count().label("invoice_count"),
+        func.coalesce(func.sum(Invoice.total_amount), 0).label("invoice_amount"),
+        func.count().filter(Invoice.review_status == "pending").label("review_pending"),
+        func.count().filter(Invoice.review_status == "approved").label("review_approved"),
+        func.count().filter(Invoice.review_status == "rejected").label("review_rejected"),
+    ).group_by(invoice_day, Invoice.company_id)
+
+    task_day = _day_expr(RecognitionTask.create_time, dialect_name).label("day")
+    task_stmt = select(
+        task_day,
+        Invoice.company_id,
+        func.count().label("task_count"),
+        func.count().filter(RecognitionTask.status.in_(PENDING_TASK_STATUSES)).label("task_pending"),
+        func.count().filter(RecognitionTask.status == "processing").label("task_processing"),
+        func.count().filter(RecognitionTask.status == "completed").label("task_completed"),
+        func.count().filter(RecognitionTask.status == "failed").label("task_failed"),
+    ).join(Invoice, RecognitionTask.invoice_id == Invoice.id).group_by(task_day, Invoice.company_id)
+
+    if keys is not None:
+        invoice_stmt = invoice_stmt.where(
+            or_(*[_key_condition(Invoice.create_time, Invoice.company_id, key) for key in keys])
+        )
+        task_stmt = task_stmt.where(
+            or_(*[_key_condition(RecognitionTask.create_time, Invoice.company_id, key) for key in keys])
+        )
+
+    rows: Dict[RollupKey, Dict[str, Any]] = {}
+    for stmt in (invoice_stmt, task_stmt):
+        for row in connection.execute(stmt).mappings():
+            key = (_to_date(row["day"]), _to_uuid(row["company_id"]))
+            values = rows.setdefault(key, {field: 0 for field in ROLLUP_COUNT_FIELDS})
+            for field, value in row.items():
+                if field in values:
+                    values[field] = float(value) if field == "invoice_amount" else int(value)
+    return rows
+
+
+def _lock_keys(connection: Connection, keys: List[RollupKey]) -> None:
+    """
+    PostgreSQL 下按（日期, 公司）加事务级咨询锁：并发事务刷新同一汇总行时串行执行，
+    后获得锁的事务重新汇总时能看到先提交事务的数据
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for day, company_id in keys:
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+            {"key": f"statistics_rollup:{day.isoformat()}:{company_id or ''}"},
+        )
+
+
+def _write_rollup(connection: Connection, keys: Optional[List[RollupKey]]) -> int:
+    table = StatisticsDailyRollup.__table__
+    if keys is None:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("LOCK TABLE statistics_daily_rollup IN EXCLUSIVE MODE"))
+        connection.execute(delete(table))
+    else:
+        keys = sorted(set(keys), key=lambda key: (key[0], str(key[1] or "")))
+        if not keys:
+            return 0
+        _lock_keys(connection, keys)
+        connection.execute(
+            delete(table).where(or_(*[
+                and_(table.c.stat_date == day, table.c.company_id.is_not_distinct_from(company_id))
+                for day, company_id in keys
+            ]))
+        )
+
+    aggregated = _aggregate(connection, keys)
+    now = datetime.now()
+    rows = [
+        {
+            "id": uuid4(),
+            "stat_date": day,
+            "company_id": company_id,
+            "refresh_time": now,
+            **values,
+        }
+        for (day, company_id), values in aggregated.items()
+    ]
+    if rows:
+        connection.execute(insert(table), rows)
+    statistics_cache.clear()
+    return len(rows)
+
+
+def rebuild_rollup(session: Session, commit: bool = True) -> int:
+    """全量重建统计日汇总，返回汇总行数"""
+    count = _write_rollup(session.connection(), None)
+    if commit:
+        session.commit()
+    logger.info(f"统计日汇总已全量重建: {count} 行")
+    return count
+
+
+def refresh_rollup(session: Session, keys: Iterable[RollupKey]) -> int:
+    """按（日期, 公司）重新汇总（在调用方事务中执行，不提交）"""
+    return _write_rollup(session.connection(), list(keys))
+
+
+def _task_keys(connection: Connection, task_ids: Iterable) -> Set[RollupKey]:
+    task_ids = [str(task_id) for task_id in task_ids if task_id]
+    if not task_ids:
+        return set()
+    rows = connection.execute(
+        select(RecognitionTask.create_time, Invoice.company_id)
+        .join(Invoice, RecognitionTask.invoice_id == Invoice.id)
+        .where(RecognitionTask.id.in_([UUID(task_id) for task_id in task_ids]))
+    ).all()
+    return {(_to_date(create_time), _to_uuid(company_id)) for create_time, company_id in rows if create_time}
+
+
+def refresh_rollup_for_tasks(session: Session, task_ids: Iterable) -> None:
+    """原生 SQL 修改任务状态后刷新对应汇总（在调用方事务中执行，不提交）"""
+    keys = _task_keys(session.connection(), task_ids)
+    if keys:
+        refresh_rollup(session, keys)
+
+
+def ensure_rollup_built(session: Session) -> None:
+    """汇总表为空而已有票据时全量构建"""
+    if session.exec(select(StatisticsDailyRollup.id).limit(1)).first() is not None:
+        return
+    if session.exec(select(Invoice.id).limit(1)).first() is not None:
+        rebuild_rollup(session)
+
+
+# ==================== ORM 变更跟踪 ====================
+
+def _attr_values(obj, field: str) -> List[Any]:
+    """属性当前值及本次 flush 前的旧值"""
+    history = inspect(obj).attrs[field].history
+    values = list(history.added) + list(history.unchanged) + list(history.deleted)
+    if not values:
+        values = [getattr(obj, field, None)]
+    return values
+
+
+def _changed(obj, fields: Iterable[str]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _collect_keys(session: OrmSession) -> Set[RollupKey]:
+    keys: Set[RollupKey] = set()
+    invoice_companies: Dict[UUID, Set[Optional[UUID]]] = {}
+    task_days: Dict[UUID, Set[date]] = {}
+    moved_invoices: Dict[UUID, Set[Optional[UUID]]] = {}
+
+    for obj, is_dirty in (
+        *[(obj, False) for obj in session.new],
+        *[(obj, True) for obj in session.dirty],
+        *[(obj, False) for obj in session.deleted],
+    ):
+        if isinstance(obj, Invoice):
+            if is_dirty and not _changed(obj, _INVOICE_TRACKED_FIELDS):
+                continue
+            companies = {_to_uuid(value) for value in _attr_values(obj, "company_id")}
+            invoice_companies[obj.id] = companies
+            for create_time in _attr_values(obj, "create_time"):
+                if create_time:
+                    keys.update((_to_date(create_time), company_id) for company_id in companies)
+            if is_dirty and inspect(obj).attrs["company_id"].history.has_changes():
+                # 票据公司变更时，其识别任务也随之改变归属
+                moved_invoices[obj.id] = companies
+        elif isinstance(obj, RecognitionTask):
+            if is_dirty and not _changed(obj, _TASK_TRACKED_FIELDS):
+                continue
+            for invoice_id in _attr_values(obj, "invoice_id"):
+                if invoice_id:
+                    task_days.setdefault(invoice_id, set()).update(
+                        _to_date(value) for value in _attr_values(obj, "create_time") if value
+                    )
+
+    if not task_days and not moved_invoices:
+        return keys
+
+    connection = session.connection()
+    unknown = [invoice_id for invoice_id in task_days if invoice_id not in invoice_companies]
+    if unknown:
+        for invoice_id, company_id in connection.execute(
+            select(Invoice.id, Invoice.company_id).where(Invoice.id.in_(unknown))
+        ).all():
+            invoice_companies[invoice_id] = {_to_uuid(company_id)}
+    for invoice_id, days in task_days.items():
+        for company_id in invoice_companies.get(invoice_id, {None}):
+            keys.update((day, company_id) for day in days)
+
+    if moved_invoices:
+        for invoice_id, create_time in connection.execute(
+            select(RecognitionTask.invoice_id, RecognitionTask.create_time)
+            .where(RecognitionTask.invoice_id.in_(list(moved_invoices)))
+        ).all():
+            if create_time:
+                keys.update((_to_date(create_time), company_id) for company_id in moved_invoices[invoice_id])
+    return keys
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _refresh_rollup_after_flush(session: OrmSession, flush_context) -> None:
+    if not any(
+        isinstance(obj, (Invoice, RecognitionTask))
+        for objects in (session.new, session.dirty, session.deleted)
+        for obj in objects
+    ):
+        return
+    try:
+        connection = session.connection()
+        # 汇总失败（如迁移尚未执行）只回滚到保存点，不影响业务写入
+        with connection.begin_nested():
+            keys = _collect_keys(session)
+            if keys:
+                _write_rollup(connection, list(keys))
+    except Exception as e:
+        logger.warning(f"刷新统计日汇总失败: {e}")
+
+
+# ==================== 看板查询 ====================
+
+def _scope_condition(company_ids: Optional[List[UUID]]):
+    """company_ids 为 None 表示不限公司（超级用户），空列表表示无权查看任何数据"""
+    if company_ids is None:
+        return None
+    if not company_ids:
+        return false()
+    return StatisticsDailyRollup.company_id.in_(company_ids)
+
+
+def _scoped(stmt, company_ids: Optional[List[UUID]]):
+    condition = _scope_condition(company_ids)
+    return stmt if condition is None else stmt.where(condition)
+
+
+def _scope_key(company_ids: Optional[List[UUID]]) -> Hashable:
+    return None if company_ids is None else tuple(sorted(str(company_id) for company_id in company_ids))
+
+
+def _daily_rows(session: Session, company_ids: Optional[List[UUID]], start: date, end: date) -> Dict[date, Any]:
+    rollup = StatisticsDailyRollup
+    stmt = _scoped(
+        select(
+            rollup.stat_date,
+            func.sum(rollup.invoice_count).label("invoices"),
+            func.sum(rollup.invoice_amount).label("amount"),
+            func.sum(rollup.task_count).label("tasks"),
+        )
+        .where(rollup.stat_date >= start, rollup.stat_date < end)
+        .group_by(rollup.stat_date),
+        company_ids,
+    )
+    return {_to_date(row.stat_date): row for row in session.exec(stmt).all()}
+
+
+def _daily_series(rows: Dict[date, Any], start: date, days: int, include_tasks: bool) -> List[Dict[str, Any]]:
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        item = {
+            "date": day.strftime("%Y-%m-%d"),
+            "invoices": int(row.invoices or 0) if row else 0,
+            "amount": float(row.amount or 0) if row else 0.0,
+        }
+        if include_tasks:
+            item["tasks"] = int(row.tasks or 0) if row else 0
+        series.append(item)
+    return series
+
+
+def get_overview(session: Session, company_ids: Optional[List[UUID]]) -> Dict[str, Any]:
+    """统计概览：汇总表一条聚合查询 + 近 7 天一条分组查询 + 模板一条查询"""
+    from app.models.models_invoice import Template
+
+    cache_key = ("overview", _scope_key(company_ids), date.today())
+    cached = statistics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    ensure_rollup_built(session)
+    today = date.today()
+    rollup = StatisticsDailyRollup
+    is_today = rollup.stat_date == today
+    totals = session.exec(_scoped(
+        select(*[func.coalesce(func.sum(getattr(rollup, field)), 0).label(field) for field in ROLLUP_COUNT_FIELDS],
+               func.coalesce(func.sum(rollup.invoice_count).filter(is_today), 0).label("today_invoices"),
+               func.coalesce(func.sum(rollup.invoice_amount).filter(is_today), 0).label("today_amount"),
+               func.coalesce(func.sum(rollup.task_count).filter(is_today), 0).label("today_tasks")),
+        company_ids,
+    )).one()
+    templates = session.exec(
+        select(func.count().label("total"), func.count().filter(Template.status == "enabled").label("active"))
+        .select_from(Template)
+    ).one()
+
+    start = today - timedelta(days=6)
+    daily_stats = _daily_series(
+        _daily_rows(session, company_ids, start, today + timedelta(days=1)), start, 7, include_tasks=False
+    )
+
+    result = {
+        "overview": {
+            "total_invoices": int(totals.invoice_count),
+            "today_invoices": int(totals.today_invoices),
+            "total_tasks": int(totals.task_count),
+            "today_tasks": int(totals.today_tasks),
+            "total_templates": int(templates.total),
+            "active_templates": int(templates.active),
+            "total_amount": float(totals.invoice_amount),
+            "today_amount": float(totals.today_amount),
+        },
+        "task_status": {
+            "pending": int(totals.task_pending),
+            "processing": int(totals.task_processing),
+            "completed": int(totals.task_completed),
+            "failed": int(totals.task_failed),
+        },
+        "review_status": {
+            "pending": int(totals.review_pending),
+            "approved": int(totals.review_approved),
+            "rejected": int(totals.review_rejected),
+        },
+        "daily_stats": daily_stats,
+    }
+    statistics_cache.set(cache_key, result)
+    return result
+
+
+def get_trends(session: Session, company_ids: Optional[List[UUID]], days: int) -> Dict[str, Any]:
+    """最近 N 天（不含今天）的票据数、金额与任务数：汇总表一条分组查询"""
+    cache_key = ("trends", _scope_key(company_ids), date.today(), days)
+    cached = statistics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    ensure_rollup_built(session)
+    end = date.today()
+    start = end - timedelta(days=days)
+    result = {
+        "trends": _daily_series(_daily_rows(session, company_ids, start, end), start, max(days, 0), include_tasks=True),
+        "days": days,
+    }
+    statistics_cache.set(cache_key, result)
+    return result
+
+
+def main() -> None:
+    """手动全量重建：python -m app.services.statistics_rollup"""
+    from app.core import db
+
+    logging.basicConfig(level=logging.INFO)
+    with Session(db.engine) as session:
+        rebuild_rollup(session)
+
+
+if __name__ == "__main__":
+    main()
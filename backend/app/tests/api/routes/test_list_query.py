@@ -0,0 +1,106 @@
+"""
+/unified 列表查询构建测试
+"""
+
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.api.list_query import ListQueryError
+from app.api.routes.inventory import INVENTORY_LIST_QUERY
+from app.models import UnifiedRequest
+
+
+@pytest.fixture
+def inventories(db: Session):
+    """5 条库存：物料编码 LQ-<tag>-0 ~ 4，偶数行的批次带 材质=LQ304"""
+    tag = uuid4().hex[:6]
+    inventory_ids = []
+    for i in range(5):
+        inventory_id = f"LQ-INV-{tag}-{i}"
+        lot_id = f"LQ-LOT-{tag}-{i}"
+        db.execute(
+            text("""
+                INSERT INTO inventory (inventory_id, material_id, material_code, material_desc, material_lot_id, stock_qty)
+                VALUES (:inventory_id, 'M-1', :code, :desc, :lot_id, :qty)
+            """),
+            {"inventory_id": inventory_id, "code": f"LQ-{tag}-{i}", "desc": f"列表测试 50%_{i}",
+             "lot_id": lot_id, "qty": i},
+        )
+        db.execute(
+            text("""
+                INSERT INTO material_lot_feature (material_lot_feature_id, material_lot_id, feature_desc, feature_value)
+                VALUES (:id, :lot_id, '材质', :value)
+            """),
+            {"id": uuid4().hex, "lot_id": lot_id, "value": "LQ304" if i % 2 == 0 else "LQ316"},
+        )
+        inventory_ids.append(inventory_id)
+    db.commit()
+    yield tag, inventory_ids
+
+    db.execute(text("DELETE FROM material_lot_feature WHERE material_lot_id LIKE :p"), {"p": f"LQ-LOT-{tag}-%"})
+    db.execute(text("DELETE FROM inventory WHERE inventory_id LIKE :p"), {"p": f"LQ-INV-{tag}-%"})
+    db.commit()
+
+
+def _list(db: Session, **kwargs):
+    return INVENTORY_LIST_QUERY.execute(db, UnifiedRequest(action="list", module="inventory", **kwargs))
+
+
+def test_filters_match_by_column_kind(db: Session, inventories):
+    tag, inventory_ids = inventories
+
+    # 编码前缀匹配（不区分大小写），按物料编码排序
+    page = _list(db, filters={"materialCode": f"LQ-{tag}"})
+    assert page.keys == inventory_ids
+    assert page.total == 5 and not page.has_next
+    assert _list(db, filters={"materialCode": f"lq-{tag}-3"}).keys == [inventory_ids[3]]
+
+    # 描述模糊匹配，_ 按字面值处理；自带 % 的值按原样作为 LIKE 模式
+    assert _list(db, filters={"materialCode": f"LQ-{tag}", "materialDesc": "_3"}).keys == [inventory_ids[3]]
+    assert _list(db, filters={"materialCode": f"LQ_{tag}"}).keys == []
+    assert _list(db, filters={"materialDesc": "%测试 50%_3"}).keys == [inventory_ids[3]]
+
+    # 批次属性通过 EXISTS 过滤，不会因为多条属性产生重复行
+    page = _list(db, filters={"materialCode": f"LQ-{tag}", "featureValue": "LQ304"})
+    assert page.keys == [inventory_ids[0], inventory_ids[2], inventory_ids[4]]
+
+    # 列表按 IN 匹配；搜索同时覆盖主表与批次属性
+    assert _list(db, filters={"inventoryId": inventory_ids[1:3]}).keys == inventory_ids[1:3]
+    assert _list(db, search="LQ316", filters={"materialCode": f"LQ-{tag}"}).keys == inventory_ids[1::2]
+
+
+def test_offset_and_cursor_pages(db: Session, inventories):
+    tag, inventory_ids = inventories
+    filters = {"materialCode": f"LQ-{tag}"}
+    sort = {"stockQty": "desc"}
+
+    first = _list(db, filters=filters, sort=sort, limit=2)
+    assert first.keys == [inventory_ids[4], inventory_ids[3]]
+    assert first.total == 5 and first.has_next and first.next_cursor
+
+    # 游标翻页与 OFFSET 翻页结果一致且不重叠
+    keys = list(first.keys)
+    cursor = first.next_cursor
+    while cursor:
+        page = _list(db, filters=filters, sort=sort, limit=2, params={"cursor": cursor, "countMode": "none"})
+        assert page.total is None
+        keys.extend(page.keys)
+        cursor = page.next_cursor
+    assert keys == inventory_ids[::-1]
+
+    last = _list(db, filters=filters, sort=sort, limit=2, page=3)
+    assert last.keys == [inventory_ids[0]]
+    assert last.pagination() == {
+        "page": 3, "limit": 2, "total": 5, "total_pages": 3, "has_next": False, "has_prev": True,
+        "next_cursor": None, "total_estimated": False,
+    }
+
+
+def test_unknown_fields_are_rejected(db: Session):
+    with pytest.raises(ListQueryError):
+        _list(db, filters={"inventory_id; DROP TABLE inventory": "1"})
+    with pytest.raises(ListQueryError):
+        _list(db, sort={"featureValue": "asc"})
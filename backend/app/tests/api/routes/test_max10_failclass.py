@@ -0,0 +1,55 @@
+"""
+MAX10Failclass 内存分类测试
+"""
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from app.api.routes.max10_failclass import MAX10Failclass
+
+
+def _orders() -> pd.DataFrame:
+    return pd.DataFrame({
+        "itemSeq": [f"SO-{i}" for i in range(14)],
+        "ProcessOrder": ["Brushed|Film"] * 12 + ["Mirror", "Film"],
+        "Thickness": [1.0] * 13 + [2.0],
+        "Width": [100.0 + i for i in range(14)],
+        "Length": [1000.0] * 14,
+        "Quantity": [1] * 14,
+        "docDate": ["2025-01-01"] * 14,
+        "deliveryDate": ["2025-02-01"] * 14,
+        "materialCode": ["304"] * 14,
+    })
+
+
+def test_classify_in_memory_without_writing_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    T, TC, T_iter = MAX10Failclass(_orders(), 0)
+
+    assert list(tmp_path.iterdir()) == []
+    assert T_iter is None
+    # 同一厚度、同一工艺的 12 条订单按每组最多 10 条拆分
+    assert T.groupby("Classify").size().tolist() == TC["Number"].tolist() == [10, 2, 1, 1]
+    assert set(T[T["Thickness"] == 2.0]["itemSeq"]) == {"SO-13"}
+
+
+def test_optional_excel_export_matches_returned_frames(tmp_path):
+    output = tmp_path / "分类数据.xlsx"
+
+    T, _, T_iter = MAX10Failclass(_orders(), 1, outputFile=str(output))
+
+    assert T_iter["Classify"].nunique() == 2
+    exported = pd.read_excel(output, sheet_name="分类结果")
+    assert_frame_equal(exported[["Classify", "itemSeq", "Width"]], T[["Classify", "itemSeq", "Width"]], check_dtype=False)
+    assert set(pd.ExcelFile(output).sheet_names) == {"分类结果", "分类数", "循环分类结果"}
+
+
+def test_invalid_orders_raise_value_error():
+    orders = _orders()
+    orders["itemSeq"] = None
+    with pytest.raises(ValueError, match="移除 NaN 后"):
+        MAX10Failclass(orders, 0)
+    with pytest.raises(ValueError, match="缺少 ProcessOrder"):
+        MAX10Failclass(_orders().drop(columns=["ProcessOrder"]), 0)
@@ -0,0 +1,94 @@
+"""
+向量化套料匹配与原逐行实现的一致性测试
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from app.api.routes.direct_matching import DirectMatching
+from app.api.routes.failde_matching import Failed_matching
+from app.api.routes.self_matching import self_matching
+from app.api.routes.two_sided_matching import two_sided_matching
+from app.api.routes.vectorized_matching import (
+    vectorized_direct_matching,
+    vectorized_failed_matching,
+    vectorized_self_matching,
+    vectorized_two_sided_matching,
+)
+
+PROCESSES = ["Brushed", "Polished", "Brushed+Film", None, "Film"]
+
+
+def _random_orders(rng: np.random.Generator, count: int) -> pd.DataFrame:
+    widths = rng.choice([100.0, 150.0, 240.0, 300.0, 480.0, 610.0, 1219.0], size=count)
+    lengths = rng.choice([240.0, 500.0, 610.0, 1000.0, 1219.0, 2438.0], size=count)
+    return pd.DataFrame({
+        "NO": [f"SO-{i:04d}" for i in range(count)],
+        "itemSeq": [f"SO-{i:04d}-1" for i in range(count)],
+        "docDate": "2025-01-01",
+        "deliveryDate": "2025-02-01",
+        "materialCode": "304",
+        "ProcessOrder": rng.choice(np.array(PROCESSES, dtype=object), size=count),
+        "Width": widths,
+        "Length": lengths,
+        "Thickness": rng.choice([1.0, 1.5], size=count),
+        "Quantity": rng.choice([1, 1, 2, 3, 5, 8], size=count),
+    })
+
+
+def _random_materials(rng: np.random.Generator, count: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Identifier": [f"COIL-{i:03d}" for i in range(count)],
+        "Material": rng.choice(["钢卷", "钢卷", "钢卷", "钢板"], size=count),
+        "Width": rng.choice([300.0, 480.0, 500.0, 610.0, 1000.0, 1219.0, 1250.0], size=count),
+        "Length": rng.choice([0.0, 2000.0, 5000.0, 20000.0, 100000.0], size=count),
+        "Thickness": 1.0,
+    })
+
+
+def _assert_same(expected, actual):
+    for left, right in zip(expected, actual):
+        assert_frame_equal(left, right)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_vectorized_pipeline_matches_row_by_row(seed: int):
+    rng = np.random.default_rng(seed)
+    orders = _random_orders(rng, 60)
+    materials = _random_materials(rng, 25)
+
+    legacy_orders, legacy_materials = orders.copy(), materials.copy()
+    legacy = DirectMatching(legacy_materials, legacy_orders)
+    vector = vectorized_direct_matching(materials.copy(), orders.copy())
+    _assert_same(legacy, vector)
+
+    remain, _, _, materials_after = legacy
+    legacy = self_matching(materials_after.copy(), remain.copy())
+    vector = vectorized_self_matching(materials_after.copy(), remain.copy())
+    _assert_same(legacy, vector)
+
+    remain, _, _, materials_after = legacy
+    classified = remain.copy()
+    classified["Classify"] = rng.integers(1, 4, size=len(classified))
+    legacy = two_sided_matching(materials_after.copy(), classified.copy())
+    vector = vectorized_two_sided_matching(materials_after.copy(), classified.copy())
+    _assert_same(legacy, vector)
+
+    failed, _, _, _, materials_after = legacy
+    legacy = Failed_matching(materials_after.copy(), failed.copy())
+    vector = vectorized_failed_matching(materials_after.copy(), failed.copy())
+    _assert_same(legacy, vector)
+
+
+def test_vectorized_self_matching_without_matches_returns_all_orders():
+    materials = pd.DataFrame({
+        "Identifier": ["COIL-1"], "Material": ["钢卷"], "Width": [1000.0], "Length": [10.0], "Thickness": [1.0]
+    })
+    orders = _random_orders(np.random.default_rng(0), 5)
+
+    remain, final_table, utilization, _ = vectorized_self_matching(materials, orders.copy())
+
+    assert list(remain["NO"]) == list(orders["NO"])
+    assert final_table.empty and utilization.empty
@@ -1,8 +1,10 @@
+import asyncio
+
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
 
 from app import crud
-from app.core.security import verify_password
+from app.core.security import aget_password_hash, verify_password
 from app.models import User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -89,3 +91,29 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+async def _async_authenticate(email: str, password: str):
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from app.core import db as core_db
+
+    try:
+        async with AsyncSession(core_db.async_engine, expire_on_commit=False) as session:
+            authenticated = await crud.aauthenticate(session=session, email=email, password=password)
+            wrong_password = await crud.aauthenticate(session=session, email=email, password=password + "x")
+            return authenticated, wrong_password
+    finally:
+        # 连接属于 asyncio.run 创建的事件循环，结束前释放
+        await core_db.async_engine.dispose()
+
+
+def test_async_authenticate_user(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = User(email=email, hashed_password=asyncio.run(aget_password_hash(password)))
+    db.add(user)
+    db.commit()
+    authenticated, wrong_password = asyncio.run(_async_authenticate(email, password))
+    assert authenticated is not None and authenticated.id == user.id
+    assert wrong_password is None
@@ -0,0 +1,101 @@
+"""
+套料钢卷候选索引测试
+"""
+
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.models import NestingCoilCandidateBuild
+from app.services import coil_candidate_index
+from app.services.coil_candidate_index import INDEX_NAME, find_coil_candidates, refresh_coil_candidates
+
+
+def _insert_coil(db: Session, material: str, thickness: str, width: str = "1000", stock_qty: float = 1000) -> str:
+    lot_id = f"LOT-{uuid4().hex[:8]}"
+    inventory_id = f"INV-{uuid4().hex[:8]}"
+    db.execute(
+        text("""
+            INSERT INTO inventory (inventory_id, material_id, material_desc, material_lot_id, lot_no, stock_qty)
+            VALUES (:inventory_id, 'M-1', '不锈钢钢卷', :lot_id, 'L-1', :stock_qty)
+        """),
+        {"inventory_id": inventory_id, "lot_id": lot_id, "stock_qty": stock_qty},
+    )
+    for desc, value in (("材质", material), ("公称厚度", thickness), ("宽度", width)):
+        db.execute(
+            text("""
+                INSERT INTO material_lot_feature (material_lot_feature_id, material_lot_id, feature_desc, feature_value)
+                VALUES (:id, :lot_id, :desc, :value)
+            """),
+            {"id": uuid4().hex, "lot_id": lot_id, "desc": desc, "value": value},
+        )
+    return inventory_id
+
+
+def _delete_coils(db: Session, inventory_ids: list) -> None:
+    for inventory_id in inventory_ids:
+        db.execute(
+            text("""
+                DELETE FROM material_lot_feature
+                WHERE material_lot_id = (SELECT material_lot_id FROM inventory WHERE inventory_id = :inventory_id)
+            """),
+            {"inventory_id": inventory_id},
+        )
+        db.execute(text("DELETE FROM inventory WHERE inventory_id = :inventory_id"), {"inventory_id": inventory_id})
+    refresh_coil_candidates(db, inventory_ids=inventory_ids)
+
+
+@pytest.fixture
+def coils(db: Session):
+    inventory_ids = {
+        "exact": _insert_coil(db, "IDX304", "1.0"),
+        "tolerance": _insert_coil(db, "IDX304", "1.005"),
+        "too_thick": _insert_coil(db, "IDX304", "1.02"),
+        "other_material": _insert_coil(db, "IDX316", "1.0"),
+        "empty_stock": _insert_coil(db, "IDX304", "1.0", stock_qty=0),
+        "bad_width": _insert_coil(db, "IDX304", "1.0", width="N/A"),
+    }
+    db.commit()
+    refresh_coil_candidates(db, inventory_ids=list(inventory_ids.values()))
+    yield inventory_ids
+    _delete_coils(db, list(inventory_ids.values()))
+
+
+def test_find_candidates_by_material_and_thickness(db: Session, coils: dict):
+    matched = find_coil_candidates(db, [("IDX316", 1.0), ("IDX304", 1.0)])
+
+    assert [(m, t, c.inventoryId) for m, t, c in matched] == [
+        ("IDX316", 1.0, coils["other_material"]),
+        *sorted(
+            [("IDX304", 1.0, coils["exact"]), ("IDX304", 1.0, coils["tolerance"])],
+            key=lambda item: item[2],
+        ),
+    ]
+    candidate = matched[0][2]
+    assert (candidate.thickness, candidate.width, candidate.stockQty) == (1.0, 1000.0, 1000.0)
+
+
+def test_incremental_refresh_removes_deleted_inventory(db: Session, coils: dict):
+    _delete_coils(db, [coils["exact"]])
+
+    matched = find_coil_candidates(db, [("IDX304", 1.0)])
+    assert [c.inventoryId for _, _, c in matched] == [coils["tolerance"]]
+
+
+def test_full_build_recorded_even_without_candidates(db: Session, monkeypatch):
+    marker = db.get(NestingCoilCandidateBuild, INDEX_NAME)
+    if marker is not None:
+        db.delete(marker)
+        db.commit()
+
+    assert find_coil_candidates(db, [("IDX-NONE", 1.0)]) == []
+    marker = db.get(NestingCoilCandidateBuild, INDEX_NAME)
+    assert marker is not None and marker.buildDate is not None
+
+    # 已有构建记录时不再全量构建（即使没有匹配的钢卷）
+    rebuilds: list = []
+    monkeypatch.setattr(coil_candidate_index, "refresh_coil_candidates", lambda *args, **kwargs: rebuilds.append(args))
+    assert find_coil_candidates(db, [("IDX-NONE", 1.0)]) == []
+    assert rebuilds == []
@@ -0,0 +1,84 @@
+"""
+Dify 客户端连接池测试
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.dify_client import DifyClientPool, DifyWorkflowError
+
+
+def _make_pool(requests: list) -> DifyClientPool:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"path": request.url.path})
+
+    pool = DifyClientPool(per_endpoint_concurrency=2)
+    pool._clients["http://dify.local/v1"] = httpx.AsyncClient(
+        base_url="http://dify.local/v1", transport=httpx.MockTransport(handler)
+    )
+    return pool
+
+
+def test_sync_and_async_requests_share_endpoint_client():
+    requests: list = []
+    pool = _make_pool(requests)
+    try:
+        response = pool.request("http://dify.local/v1/", "POST", "/workflows/run", api_key="key", json={})
+        assert response.json() == {"path": "/v1/workflows/run"}
+
+        response = asyncio.run(pool.arequest("http://dify.local/v1", "GET", "/info", api_key="key"))
+        assert response.json() == {"path": "/v1/info"}
+
+        assert len(requests) == 2
+        assert all(r.headers["Authorization"] == "Bearer key" for r in requests)
+        assert pool.stats()["endpoints"] == ["http://dify.local/v1"]
+    finally:
+        pool.close()
+    assert pool.stats()["running"] is False
+
+
+def test_streaming_workflow_collects_blocking_shaped_result():
+    sse_body = "\n\n".join([
+        'data: {"event": "workflow_started", "workflow_run_id": "run-1", "task_id": "t-1", "data": {"id": "run-1"}}',
+        "event: ping",
+        'data: {"event": "node_finished", "workflow_run_id": "run-1", "data": {"node_id": "llm", "outputs": {"text": "{}"}}}',
+        'data: {"event": "workflow_finished", "workflow_run_id": "run-1", '
+        '"data": {"id": "run-1", "status": "succeeded", "outputs": {"text": {"invoice_no": "001"}}}}',
+    ]) + "\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=sse_body, headers={"Content-Type": "text/event-stream"})
+
+    pool = DifyClientPool()
+    pool._clients["http://dify.local/v1"] = httpx.AsyncClient(
+        base_url="http://dify.local/v1", transport=httpx.MockTransport(handler)
+    )
+    events: list = []
+    try:
+        result = pool.run_workflow(
+            "http://dify.local/v1", {"inputs": {}, "response_mode": "streaming", "user": "u"}, on_event=events.append
+        )
+    finally:
+        pool.close()
+
+    assert [e["event"] for e in events] == ["workflow_started", "node_finished", "workflow_finished"]
+    assert result["workflow_run_id"] == "run-1"
+    assert result["data"]["outputs"] == {"text": {"invoice_no": "001"}}
+
+
+def test_streaming_workflow_error_event_raises():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text='data: {"event": "error", "code": "x", "message": "boom"}\n\n')
+
+    pool = DifyClientPool()
+    pool._clients["http://dify.local/v1"] = httpx.AsyncClient(
+        base_url="http://dify.local/v1", transport=httpx.MockTransport(handler)
+    )
+    try:
+        with pytest.raises(DifyWorkflowError, match="boom"):
+            pool.run_workflow("http://dify.local/v1", {"inputs": {}, "response_mode": "streaming"})
+    finally:
+        pool.close()
@@ -0,0 +1,77 @@
+"""
+Dify 文件上传缓存测试
+"""
+
+from uuid import uuid4
+
+import httpx
+import pytest
+
+from app.services import dify_file_cache as cache_module
+from app.services.dify_file_cache import DifyFileCache, DifyFileUploadError, content_hash, is_file_missing_error
+
+ENDPOINT = "https://dify.example.com/v1/"
+
+# 缓存记录保存在数据库中
+pytestmark = pytest.mark.usefixtures("db")
+
+
+@pytest.fixture
+def cache():
+    cache = DifyFileCache(ttl_seconds=3600)
+    yield cache
+    cache.purge_expired()
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """记录 /files/upload 调用，每次返回新的文件ID"""
+    calls = []
+
+    def fake_request(endpoint, method, path, **kwargs):
+        calls.append((endpoint, method, path, kwargs["files"]["file"][0]))
+        return httpx.Response(201, json={"id": f"upload-{len(calls)}"})
+
+    monkeypatch.setattr(cache_module.dify_client, "request", fake_request)
+    return calls
+
+
+def test_upload_reused_per_hash_and_endpoint(cache, uploads):
+    content = uuid4().bytes
+    file_hash = content_hash(content)
+    try:
+        first = cache.upload_file_id(ENDPOINT, "key", content, "a.pdf", "application/pdf")
+        assert cache.upload_file_id(ENDPOINT.rstrip("/"), "key", content, "b.pdf", "application/pdf") == first
+        assert len(uploads) == 1
+
+        other = cache.upload_file_id("https://other.example.com/v1", "key", content, "a.pdf", "application/pdf")
+        assert other != first and len(uploads) == 2
+
+        forced = cache.upload_file_id(ENDPOINT, "key", content, "a.pdf", "application/pdf", force=True)
+        assert forced != first and cache.lookup(ENDPOINT, file_hash) == forced
+
+        cache.invalidate(ENDPOINT, file_hash)
+        assert cache.lookup(ENDPOINT, file_hash) is None
+    finally:
+        cache.invalidate(ENDPOINT, file_hash)
+        cache.invalidate("https://other.example.com/v1", file_hash)
+
+
+def test_expired_entries_are_ignored():
+    cache = DifyFileCache(ttl_seconds=-1)
+    file_hash = content_hash(uuid4().bytes)
+    cache.store(ENDPOINT, file_hash, "stale-id")
+    assert cache.lookup(ENDPOINT, file_hash) is None
+    assert cache.purge_expired() >= 1
+
+
+def test_upload_failure_and_error_detection(cache, monkeypatch):
+    monkeypatch.setattr(
+        cache_module.dify_client, "request",
+        lambda *args, **kwargs: httpx.Response(413, text="file too large"),
+    )
+    with pytest.raises(DifyFileUploadError):
+        cache.upload_file_id(ENDPOINT, "key", uuid4().bytes, "a.pdf", "application/pdf")
+
+    assert is_file_missing_error('{"code": "invalid_param", "message": "Invalid upload file id"}')
+    assert not is_file_missing_error("Dify请求频率限制")
@@ -0,0 +1,84 @@
+"""
+streaming 模式下任务进度与部分结果写入测试
+"""
+
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.security import get_password_hash
+from app.models import User
+from app.models.models_invoice import (
+    Invoice, InvoiceFile, RecognitionField, RecognitionResult, RecognitionTask
+)
+from app.services.dify_service import SyntaxService
+
+
+@pytest.fixture
+def processing_task(db: Session):
+    user = db.exec(select(User).where(User.email == "stream-test@example.com")).first()
+    if not user:
+        user = User(email="stream-test@example.com", hashed_password=get_password_hash("changethis"))
+        db.add(user)
+        db.commit()
+
+    invoice_file = InvoiceFile(
+        file_name="stream.pdf", file_path="/tmp/stream.pdf", file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id
+    )
+    db.add(invoice_file)
+    db.commit()
+    invoice = Invoice(invoice_no=f"STREAM-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id, creator_id=user.id)
+    db.add(invoice)
+    db.commit()
+    task = RecognitionTask(
+        task_no=f"TASK-{uuid4().hex[:12]}", invoice_id=invoice.id, params={}, status="processing", operator_id=user.id
+    )
+    db.add(task)
+    db.commit()
+    yield task
+
+    for result in db.exec(select(RecognitionResult).where(RecognitionResult.task_id == task.id)).all():
+        for field in db.exec(select(RecognitionField).where(RecognitionField.result_id == result.id)).all():
+            db.delete(field)
+        db.commit()
+        db.delete(result)
+    db.commit()
+    db.delete(task)
+    db.commit()
+    db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.commit()
+
+
+def test_node_events_update_progress_and_partial_result(db: Session, processing_task: RecognitionTask):
+    service = SyntaxService(db)
+    state = {"finished_nodes": 0}
+    events = [
+        {"event": "workflow_started", "workflow_run_id": "run-1", "data": {"id": "run-1"}},
+        {"event": "node_started", "data": {"node_id": "llm", "node_type": "llm", "title": "票据抽取"}},
+        {"event": "node_finished", "data": {
+            "node_id": "llm", "status": "succeeded", "elapsed_time": 1.5,
+            "outputs": {"text": '{"invoice_no": "001", "currency": "CNY", "remarks": ""}'},
+        }},
+    ]
+    for event in events:
+        service._on_workflow_event(processing_task, event, state)
+
+    db.refresh(processing_task)
+    assert processing_task.request_id == "run-1"
+    assert 5 < processing_task.progress < 100
+    assert processing_task.node_events == [{
+        "node_id": "llm", "node_type": "llm", "title": "票据抽取", "status": "succeeded",
+        "started_at": None, "elapsed_time": 1.5,
+    }]
+
+    result = db.exec(select(RecognitionResult).where(RecognitionResult.task_id == processing_task.id)).one()
+    assert result.status == "partial"
+    assert (result.total_fields, result.recognized_fields) == (3, 2)
+    fields = {f.field_name: f.field_value for f in db.exec(
+        select(RecognitionField).where(RecognitionField.result_id == result.id)
+    ).all()}
+    assert fields == {"invoice_no": "001", "currency": "CNY", "remarks": ""}
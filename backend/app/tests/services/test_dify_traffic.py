@@ -0,0 +1,145 @@
+"""
+Dify 调用流量控制测试（令牌桶、自适应并发、熔断、重试）
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services import dify_traffic
+from app.services.dify_client import DifyClientPool
+from app.services.dify_traffic import (
+    AdaptiveLimiter, CircuitBreaker, DifyCircuitOpenError, TokenBucket, TrafficPolicy,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(dify_traffic.settings, "DIFY_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(dify_traffic.settings, "DIFY_RETRY_MAX_DELAY", 0.01)
+    monkeypatch.setattr(dify_traffic.settings, "DIFY_CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(dify_traffic.settings, "DIFY_CIRCUIT_OPEN_SECONDS", 60.0)
+
+
+def test_token_bucket_queues_beyond_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_second=2.0, capacity=2.0, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.now += 2.0
+    assert bucket.reserve() == 0.0
+
+
+def test_adaptive_limiter_aimd():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(max_limit=8, clock=clock)
+    limiter.on_overload()
+    assert limiter.limit == 4.0
+    # 同一轮拥塞只下调一次
+    limiter.on_overload()
+    assert limiter.limit == 4.0
+
+    for _ in range(40):
+        limiter.on_success(0.2)
+    assert limiter.limit == 8.0
+    # 响应时间明显变慢时下调
+    clock.now += 10
+    limiter.on_success(5.0)
+    assert limiter.limit == pytest.approx(7.2)
+
+
+@pytest.mark.usefixtures("fast_retry")
+def test_circuit_breaker_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(clock=clock)
+    breaker.on_failure()
+    assert breaker.state == "closed"
+    breaker.on_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 60
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()  # 只放行一个探测请求
+    breaker.on_failure()
+    assert breaker.state == "open"
+
+    clock.now += 60
+    assert breaker.allow()
+    breaker.on_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def _make_pool(handler) -> DifyClientPool:
+    pool = DifyClientPool(per_endpoint_concurrency=4)
+    pool._clients["http://dify.local/v1"] = httpx.AsyncClient(
+        base_url="http://dify.local/v1", transport=httpx.MockTransport(handler)
+    )
+    return pool
+
+
+@pytest.mark.usefixtures("fast_retry")
+def test_retry_then_circuit_open():
+    statuses = [503, 200]
+    calls: list = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(statuses.pop(0) if statuses else 500)
+
+    pool = _make_pool(handler)
+    try:
+        response = pool.request("http://dify.local/v1", "POST", "/workflows/run", api_key="key", json={})
+        assert response.status_code == 200 and len(calls) == 2
+
+        # 500 不重试（请求可能已被执行），连续失败后熔断，之后的请求不再发送
+        policy = TrafficPolicy(max_retries=0)
+        for _ in range(2):
+            assert pool.request("http://dify.local/v1", "POST", "/workflows/run", api_key="key", traffic=policy).status_code == 500
+        with pytest.raises(DifyCircuitOpenError):
+            pool.request("http://dify.local/v1", "POST", "/workflows/run", api_key="key", json={})
+        assert len(calls) == 4
+
+        backend = pool.stats()["backends"][0]
+        assert backend["circuit"] == "open"
+        assert (backend["retried"], backend["rejected"]) == (1, 1)
+
+        # 未传入配置名称时按 endpoint 统计
+        labels = {"config": "http://dify.local/v1"}
+        assert REGISTRY.get_sample_value("dify_requests_rejected_total", labels) >= 1
+        assert REGISTRY.get_sample_value("dify_circuit_open", labels) == 1
+        assert REGISTRY.get_sample_value(
+            "dify_request_duration_seconds_count", {**labels, "path": "/workflows/run", "status": "503"}
+        ) >= 1
+    finally:
+        pool.close()
+
+
+@pytest.mark.usefixtures("fast_retry")
+def test_cancelled_probe_releases_half_open():
+    backend = dify_traffic.BackendTraffic("http://dify.local/v1#key", TrafficPolicy(max_concurrency=1), 1)
+    clock = FakeClock()
+    backend.breaker = CircuitBreaker(clock=clock)
+    backend.breaker.on_failure()
+    backend.breaker.on_failure()
+    clock.now += 60
+
+    async def probe_while_slot_busy():
+        await backend.limiter.acquire()  # 占满并发，探测请求只能排队等待
+        with pytest.raises(asyncio.TimeoutError):
+            async with asyncio.timeout(0.01):
+                async with backend.slot("/workflows/run"):
+                    pass
+        backend.limiter.release()
+
+    asyncio.run(probe_while_slot_busy())
+    # 被取消的探测不占用半开名额，下一个请求仍可作为探测发送
+    assert backend.breaker.state == "half_open" and backend.breaker.allow()
@@ -0,0 +1,131 @@
+"""
+识别前文档预处理测试
+"""
+
+import importlib.util
+import sys
+from concurrent.futures import Future
+from dataclasses import asdict
+from uuid import uuid4
+
+import pytest
+
+from app.models.models_invoice import InvoiceFile, Template
+from app.services.document_preprocess import (
+    DocumentPreprocessor, PageLimitExceeded, PreprocessOptions, default_options, preprocess_document, resolve_options,
+    validate_config,
+)
+from app.services.preview_renderer import PreviewUnavailable
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+
+def _template(config):
+    return Template(name="预处理", template_type="发票", creator_id=uuid4(), preprocess_config=config)
+
+
+def test_template_config_overrides_defaults():
+    assert validate_config(None) is None
+    for invalid in ({"unknown": 1}, {"dpi": 0}, {"dpi": "200"}, {"crop_margins": 1}, {"quality": 101}, []):
+        with pytest.raises(ValueError):
+            validate_config(invalid)
+
+    options = resolve_options(_template({"dpi": 150, "crop_margins": True}))
+    assert (options.dpi, options.crop_margins) == (150, True)
+    assert options.long_edge == default_options().long_edge
+    assert options.digest != default_options().digest
+    # 配置无效时使用默认值
+    assert resolve_options(_template({"dpi": -1})) == default_options()
+    assert resolve_options(None) == default_options()
+
+
+def _invoice_file(path, mime_type="image/png"):
+    return InvoiceFile(
+        file_name="scan.png", file_path=str(path), file_size=path.stat().st_size, file_type="png",
+        mime_type=mime_type, file_hash=uuid4().hex, uploader_id=uuid4(),
+    )
+
+
+class InlineExecutor:
+    """在当前进程中执行提交的任务（使对导入的替换对处理过程生效）"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def test_missing_dependency_uploads_original(tmp_path, monkeypatch):
+    # 模拟未安装 Pillow
+    monkeypatch.setitem(sys.modules, "PIL", None)
+    source = tmp_path / "scan.png"
+    source.write_bytes(b"not processed")
+    with pytest.raises(PreviewUnavailable):
+        preprocess_document(str(source), "image/png", asdict(PreprocessOptions()))
+
+    preprocessor = DocumentPreprocessor(max_workers=1)
+    monkeypatch.setattr(preprocessor, "_get_executor", InlineExecutor)
+    try:
+        assert preprocessor.prepare(_invoice_file(source), PreprocessOptions(), timeout=60) is None
+        assert preprocessor._unavailable
+        assert preprocessor.prepare(_invoice_file(source), PreprocessOptions(enabled=False)) is None
+    finally:
+        preprocessor.stop()
+
+
+@pytest.mark.skipif(not HAS_PILLOW, reason="未安装 Pillow")
+def test_downscale_crop_and_cache(tmp_path):
+    from PIL import Image
+
+    source = tmp_path / "scan.png"
+    image = Image.new("RGB", (4000, 3000), "white")
+    image.paste((0, 0, 0), (1000, 1000, 3000, 2000))
+    image.save(source)
+    invoice_file = _invoice_file(source)
+    options = PreprocessOptions(long_edge=1000, crop_margins=True)
+
+    preprocessor = DocumentPreprocessor(max_workers=1)
+    try:
+        prepared = preprocessor.prepare(invoice_file, options, timeout=60)
+        assert prepared.mime_type == "image/jpeg" and prepared.is_image and prepared.pages == 1
+        with Image.open(prepared.path) as output:
+            assert max(output.size) <= 1000
+            # 空白边距已裁掉：4000x3000 中 2000x1000 的内容区域，裁边后宽高比约为 2:1
+            assert output.size[1] < output.size[0] * 0.6
+            assert "exif" not in output.info
+        # 已缓存：再次获取不重新处理
+        mtime = prepared.path.stat().st_mtime_ns
+        again = preprocessor.prepare(invoice_file, options, timeout=60)
+        assert again == prepared and prepared.path.stat().st_mtime_ns == mtime
+    finally:
+        preprocessor.stop()
+
+
+@pytest.mark.skipif(not HAS_PILLOW, reason="未安装 Pillow")
+def test_document_over_page_limit_uploads_original(tmp_path, monkeypatch):
+    from PIL import Image
+
+    source = tmp_path / "scan.tiff"
+    frames = [Image.new("RGB", (400, 300), color) for color in ("white", "gray", "black")]
+    frames[0].save(source, save_all=True, append_images=frames[1:])
+    invoice_file = _invoice_file(source, mime_type="image/tiff")
+
+    # 超过页数上限时不截断页面，上传原始文件
+    with pytest.raises(PageLimitExceeded):
+        preprocess_document(str(source), "image/tiff", asdict(PreprocessOptions(max_pages=2)))
+    preprocessor = DocumentPreprocessor(max_workers=1)
+    monkeypatch.setattr(preprocessor, "_get_executor", InlineExecutor)
+    try:
+        assert preprocessor.prepare(invoice_file, PreprocessOptions(max_pages=2), timeout=60) is None
+        assert not preprocessor._unavailable
+
+        prepared = preprocessor.prepare(invoice_file, PreprocessOptions(max_pages=3), timeout=60)
+        assert prepared.mime_type == "application/pdf" and prepared.pages == 3
+    finally:
+        preprocessor.stop()
+
+    meta = preprocess_document(str(source), "image/tiff", asdict(PreprocessOptions(max_pages=3)))
+    assert (meta["pages"], meta["source_pages"]) == (3, 3)
@@ -0,0 +1,155 @@
+"""
+票据文件流式入库测试
+"""
+
+import hashlib
+import io
+import zipfile
+from uuid import uuid4
+
+import pytest
+from fastapi import UploadFile
+from sqlmodel import Session, delete, select
+from starlette.datastructures import Headers
+
+from app.core.security import get_password_hash
+from app.models import Company, User, UserCompany
+from app.models.models_invoice import Invoice, InvoiceFile
+from app.services import file_ingest
+from app.services.file_ingest import (
+    UploadRejected,
+    content_path,
+    expand_uploads,
+    ingest_batch,
+    ingest_upload,
+    stage_stream,
+)
+
+
+@pytest.fixture(autouse=True)
+def upload_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_ingest, "UPLOAD_ROOT", tmp_path)
+    monkeypatch.setattr(file_ingest, "INCOMING_DIR", tmp_path / ".incoming")
+    monkeypatch.setattr(file_ingest, "CHUNK_SIZE", 1024)
+    return tmp_path
+
+
+def _upload(content: bytes, content_type: str = "application/pdf", filename: str = "票据.pdf") -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type})
+    )
+
+
+@pytest.fixture
+def uploader(db: Session):
+    user = User(email=f"ingest-{uuid4().hex[:8]}@example.com", hashed_password=get_password_hash("changethis"))
+    company = Company(name="入库测试", code=f"INGEST-{uuid4().hex[:8]}")
+    db.add(user)
+    db.add(company)
+    db.commit()
+    db.add(UserCompany(user_id=user.id, company_id=company.id, is_primary=True))
+    db.commit()
+    yield user, company
+
+    file_ids = db.exec(select(InvoiceFile.id).where(InvoiceFile.uploader_id == user.id)).all()
+    db.exec(delete(Invoice).where(Invoice.creator_id == user.id))
+    db.exec(delete(InvoiceFile).where(InvoiceFile.id.in_(file_ids)))
+    db.exec(delete(UserCompany).where(UserCompany.user_id == user.id))
+    db.commit()
+    db.delete(company)
+    db.delete(user)
+    db.commit()
+
+
+def test_stage_stream_hashes_in_chunks(upload_root):
+    content = bytes(range(256)) * 40
+    staged = stage_stream(io.BytesIO(content), max_bytes=len(content))
+    assert staged.file_hash == hashlib.sha256(content).hexdigest()
+    assert staged.file_size == len(content)
+    assert staged.temp_path.read_bytes() == content
+
+    with pytest.raises(UploadRejected):
+        stage_stream(io.BytesIO(content), max_bytes=len(content) - 1)
+    assert len(list((upload_root / ".incoming").iterdir())) == 1
+
+
+def test_ingest_creates_file_and_invoice(db: Session, uploader, upload_root):
+    user, company = uploader
+    content = uuid4().bytes * 100
+    file_hash = hashlib.sha256(content).hexdigest()
+    invoice_file, invoice = ingest_upload(db, _upload(content), user, external_file_id="ext-1")
+
+    stored = content_path(file_hash)
+    assert stored == upload_root / file_hash[:2] / file_hash[2:4] / file_hash
+    assert stored.read_bytes() == content
+    assert invoice_file.file_path == str(stored) and invoice_file.external_file_id == "ext-1"
+    assert invoice.file_id == invoice_file.id and invoice.company_id == company.id
+
+    with pytest.raises(UploadRejected, match="已上传过"):
+        ingest_upload(db, _upload(content), user)
+    with pytest.raises(UploadRejected, match="不支持的文件类型"):
+        ingest_upload(db, _upload(content, "text/plain"), user)
+    assert list((upload_root / ".incoming").iterdir()) == []
+
+
+def test_ingest_batch_from_files_and_zip(db: Session, uploader, upload_root):
+    user, company = uploader
+    existing = uuid4().bytes * 10
+    ingest_upload(db, _upload(existing), user)
+
+    first, second = uuid4().bytes * 10, uuid4().bytes * 10
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("扫描/second.png", second)
+        zf.writestr("扫描/copy.pdf", first)
+        zf.writestr("notes.txt", b"skip me")
+    archive.seek(0)
+    uploads = [
+        _upload(first, filename="first.pdf"),
+        _upload(existing, filename="again.pdf"),
+        _upload(archive.getvalue(), "application/zip", "batch.zip"),
+    ]
+    archives = []
+    results = ingest_batch(db, list(expand_uploads(uploads, archives)), user)
+
+    assert [(r.file_name, r.status) for r in results] == [
+        ("first.pdf", "created"),
+        ("again.pdf", "duplicate"),
+        ("second.png", "created"),
+        ("copy.pdf", "duplicate"),
+        ("notes.txt", "rejected"),
+    ]
+    created = db.exec(select(InvoiceFile).where(InvoiceFile.id.in_([r.file_id for r in results[::2][:2]]))).all()
+    assert {f.mime_type for f in created} == {"application/pdf", "image/png"}
+    invoice = db.get(Invoice, results[2].invoice_id)
+    assert invoice.company_id == company.id and invoice.invoice_no == results[2].invoice_no
+    assert content_path(hashlib.sha256(second).hexdigest()).read_bytes() == second
+    assert list((upload_root / ".incoming").iterdir()) == []
+
+
+def test_oversized_archive_rejected_before_opening_members(monkeypatch):
+    def make_zip(entries):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            for name, content in entries:
+                zf.writestr(name, content)
+        return _upload(archive.getvalue(), "application/zip", "batch.zip")
+
+    too_many = make_zip([(f"{i}.pdf", b"x") for i in range(3)])
+    mixed = [_upload(b"x"), make_zip([("a.pdf", b"x"), ("b.pdf", b"x")])]
+    too_large = make_zip([("a.pdf", b"x" * 15), ("b.pdf", b"x" * 15)])
+
+    monkeypatch.setattr(file_ingest.settings, "UPLOAD_BATCH_MAX_FILES", 2)
+    monkeypatch.setattr(file_ingest, "max_upload_bytes", lambda: 10)
+    opened = []
+    original_open = zipfile.ZipFile.open
+    monkeypatch.setattr(zipfile.ZipFile, "open", lambda self, *a, **kw: opened.append(a) or original_open(self, *a, **kw))
+
+    with pytest.raises(UploadRejected, match="最多上传 2 个文件"):
+        list(expand_uploads([too_many], []))
+    # 压缩包条目计入普通文件之后的总数
+    with pytest.raises(UploadRejected):
+        list(expand_uploads(mixed, []))
+    with pytest.raises(UploadRejected, match="总大小"):
+        list(expand_uploads([too_large], []))
+    assert opened == []
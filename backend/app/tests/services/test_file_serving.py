@@ -0,0 +1,96 @@
+"""
+票据文件发送测试（ETag、304、Range、X-Accel-Redirect）
+"""
+
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.models.models_invoice import InvoiceFile
+from app.services import file_serving
+
+CONTENT = b"%PDF-1.4 " + bytes(range(256)) * 8
+
+
+@pytest.fixture
+def client(tmp_path):
+    file_hash = uuid4().hex * 2
+    path = tmp_path / "stored.pdf"
+    path.write_bytes(CONTENT)
+    invoice_file = InvoiceFile(
+        file_name="票据.pdf", file_path=str(path), file_size=len(CONTENT), file_type="pdf",
+        mime_type="application/pdf", file_hash=file_hash, uploader_id=uuid4(),
+    )
+    app = FastAPI()
+
+    @app.get("/file")
+    def serve(request: Request, inline: bool = False):
+        return file_serving.file_response(request, invoice_file, Path(invoice_file.file_path), inline=inline)
+
+    return TestClient(app), invoice_file
+
+
+def test_etag_and_conditional_requests(client):
+    http, invoice_file = client
+    etag = f'"{invoice_file.file_hash}"'
+
+    response = http.get("/file")
+    assert response.status_code == 200 and response.content == CONTENT
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == file_serving.REVALIDATE_CACHE_CONTROL
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-disposition"].startswith("attachment;")
+
+    not_modified = http.get("/file", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    versioned = http.get(f"/file?v={invoice_file.file_hash}&inline=true")
+    assert versioned.headers["cache-control"] == file_serving.IMMUTABLE_CACHE_CONTROL
+    assert versioned.headers["content-disposition"].startswith("inline;")
+
+
+def test_range_requests(client):
+    http, invoice_file = client
+    partial = http.get("/file", headers={"Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == CONTENT[100:200]
+    assert partial.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+    # If-Range 与当前 ETag 不一致时返回完整内容
+    stale = http.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == CONTENT
+
+
+def test_derived_file_etag(tmp_path):
+    preview = tmp_path / "thumb.webp"
+    preview.write_bytes(b"webp")
+    invoice_file = InvoiceFile(
+        file_name="a.pdf", file_path=str(tmp_path / "a.pdf"), file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash="abc", uploader_id=uuid4(),
+    )
+    app = FastAPI()
+
+    @app.get("/thumb")
+    def serve(request: Request):
+        return file_serving.derived_file_response(request, invoice_file, preview, "image/webp")
+
+    http = TestClient(app)
+    response = http.get("/thumb?v=abc")
+    assert response.content == b"webp" and response.headers["etag"] == '"abc-thumb.webp"'
+    assert response.headers["cache-control"] == file_serving.IMMUTABLE_CACHE_CONTROL
+    assert http.get("/thumb", headers={"If-None-Match": '"abc-thumb.webp"'}).status_code == 304
+
+
+def test_accel_redirect(client, monkeypatch, tmp_path):
+    http, invoice_file = client
+    monkeypatch.setattr(file_serving, "UPLOAD_ROOT", tmp_path)
+    monkeypatch.setattr(file_serving.settings, "FILE_ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+    response = http.get("/file")
+    assert response.status_code == 200 and response.content == b""
+    assert response.headers["x-accel-redirect"] == "/protected-uploads/stored.pdf"
+    assert response.headers["content-type"] == "application/pdf"
+    assert "filename*=utf-8''" in response.headers["content-disposition"]
@@ -0,0 +1,108 @@
+"""
+票据详情查询与识别结果字段标准化测试
+"""
+
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, delete
+
+from app.core.security import get_password_hash
+from app.models import Company, User
+from app.models.models_invoice import Invoice, InvoiceFile, RecognitionResult, RecognitionTask
+from app.services.invoice_detail import load_invoice_detail, to_response
+from app.services.recognition_payload import backfill_normalized_fields, extract_fields, storage_fields
+
+WORKFLOW_PAYLOAD = {"data": {"outputs": {"text": {"invoice_no": "DETAIL-001", "items": [{"name": "钢卷"}]}}}}
+
+
+def test_extract_fields_paths():
+    assert extract_fields(json.dumps(WORKFLOW_PAYLOAD)) == WORKFLOW_PAYLOAD["data"]["outputs"]["text"]
+    assert extract_fields(json.dumps({"text": {"a": 1}})) == {"a": 1}
+    assert extract_fields(json.dumps({"a": 1})) == {"a": 1}
+    assert extract_fields(json.dumps({"data": {"outputs": {}}}), {"text": {"b": 2}}) == {"b": 2}
+    assert extract_fields("not json", WORKFLOW_PAYLOAD) == WORKFLOW_PAYLOAD["data"]["outputs"]["text"]
+    assert extract_fields(None) is None
+
+    assert storage_fields({"kept": 1}, json.dumps(WORKFLOW_PAYLOAD)) == {"kept": 1}
+    assert storage_fields({}, json.dumps(WORKFLOW_PAYLOAD))["invoice_no"] == "DETAIL-001"
+
+
+@pytest.fixture
+def detail_data(db: Session):
+    user = User(email=f"detail-{uuid4().hex[:8]}@example.com", hashed_password=get_password_hash("changethis"))
+    company = Company(name="详情测试", code=f"DETAIL-{uuid4().hex[:8]}")
+    db.add_all([user, company])
+    db.commit()
+    invoice_file = InvoiceFile(
+        file_name="detail.pdf", file_path="/tmp/detail.pdf", file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id,
+    )
+    db.add(invoice_file)
+    db.commit()
+    invoice = Invoice(invoice_no=f"DETAIL-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                      creator_id=user.id, company_id=company.id, recognition_status="failed")
+    db.add(invoice)
+    db.commit()
+    now = datetime.now()
+    tasks = [
+        RecognitionTask(task_no=f"DETAIL-{uuid4().hex[:12]}", invoice_id=invoice.id, operator_id=user.id,
+                        status=status, error_code=code, error_message=code, create_time=now + timedelta(seconds=i))
+        for i, (status, code) in enumerate((("completed", None), ("failed", "OLD"), ("failed", "LATEST")))
+    ]
+    db.add_all(tasks)
+    db.commit()
+    results = [
+        RecognitionResult(invoice_id=invoice.id, task_id=tasks[0].id, accuracy=0.9, confidence=0.9,
+                          normalized_fields={"invoice_no": "OLDER"}, recognition_time=now - timedelta(days=1)),
+        RecognitionResult(invoice_id=invoice.id, task_id=tasks[1].id, accuracy=0.9, confidence=0.9,
+                          raw_payload=json.dumps(WORKFLOW_PAYLOAD), recognition_time=now),
+    ]
+    db.add_all(results)
+    db.commit()
+    yield invoice, company, results
+
+    db.exec(delete(RecognitionResult).where(RecognitionResult.invoice_id == invoice.id))
+    db.exec(delete(RecognitionTask).where(RecognitionTask.invoice_id == invoice.id))
+    db.commit()
+    db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.delete(company)
+    db.delete(user)
+    db.commit()
+
+
+def test_backfill_then_single_query_detail(db: Session, detail_data):
+    invoice, company, results = detail_data
+    assert load_invoice_detail(db, uuid4()) is None
+
+    # 未补全时从原始响应提取
+    detail = load_invoice_detail(db, invoice.id)
+    assert detail.normalized_fields["invoice_no"] == "DETAIL-001"
+
+    assert backfill_normalized_fields(db, batch_size=1) >= 1
+    db.refresh(results[1])
+    assert results[1].normalized_fields["invoice_no"] == "DETAIL-001"
+    assert backfill_normalized_fields(db) == 0
+
+    invoice_id = invoice.id
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        db.expire_all()
+        detail = load_invoice_detail(db, invoice_id)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+    assert detail.result_id == results[1].id
+    assert detail.company_code == company.code
+    assert (detail.error_code, detail.error_message) == ("LATEST", "LATEST")
+    response = to_response(detail)
+    assert response.normalized_fields["items"] == [{"name": "钢卷"}]
+    assert response.company_code == company.code
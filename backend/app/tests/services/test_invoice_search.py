@@ -0,0 +1,77 @@
+"""
+票据搜索条件测试
+"""
+
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import Session, select
+
+from app.core.security import get_password_hash
+from app.models import User
+from app.models.models_invoice import Invoice, InvoiceFile
+from app.services.invoice_search import contains, party_condition, party_terms
+
+
+@pytest.fixture
+def invoices(db: Session):
+    user = db.exec(select(User).where(User.email == "search-test@example.com")).first()
+    if not user:
+        user = User(email="search-test@example.com", hashed_password=get_password_hash("changethis"))
+        db.add(user)
+        db.commit()
+    invoice_file = InvoiceFile(
+        file_name="search.pdf", file_path="/tmp/search.pdf", file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id
+    )
+    db.add(invoice_file)
+    db.commit()
+    tag = uuid4().hex[:8]
+    invoices = [
+        Invoice(invoice_no=f"S{tag}-100%", invoice_type="未知", file_id=invoice_file.id, creator_id=user.id,
+                supplier_name="上海甲方贸易有限公司", buyer_name=f"ACME {tag} Ltd."),
+        Invoice(invoice_no=f"S{tag}-1000", invoice_type="未知", file_id=invoice_file.id, creator_id=user.id,
+                supplier_name="北京乙方科技", buyer_name=f"Contoso {tag}"),
+    ]
+    db.add_all(invoices)
+    db.commit()
+    yield tag, invoices
+
+    for invoice in invoices:
+        db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.commit()
+
+
+def _invoice_nos(db: Session, condition) -> list:
+    return sorted(db.exec(select(Invoice.invoice_no).where(condition)).all())
+
+
+def test_contains_escapes_wildcards(db: Session, invoices):
+    tag, _ = invoices
+    assert _invoice_nos(db, contains(Invoice.invoice_no, f"S{tag}-100")) == [f"S{tag}-100%", f"S{tag}-1000"]
+    assert _invoice_nos(db, contains(Invoice.invoice_no, f"{tag}-100%")) == [f"S{tag}-100%"]
+    assert _invoice_nos(db, contains(Invoice.invoice_no, f"{tag}-10_0")) == []
+
+
+def test_party_keyword_matches_substrings(db: Session, invoices):
+    tag, _ = invoices
+    assert party_terms("  ACME   Ltd ") == ["ACME", "Ltd"]
+    assert party_condition("   ") is None
+
+    # 不分词的中文公司名：名称中间的词也能匹配
+    assert _invoice_nos(db, party_condition("有限公司")) == [f"S{tag}-100%"]
+    assert _invoice_nos(db, party_condition(f"甲方贸易 {tag}")) == [f"S{tag}-100%"]
+    # 每个词在供应商或采购方中出现即可，全部命中
+    assert _invoice_nos(db, party_condition(f"{tag} 乙方")) == [f"S{tag}-1000"]
+    assert _invoice_nos(db, party_condition(tag[2:6])) == [f"S{tag}-100%", f"S{tag}-1000"]
+    assert _invoice_nos(db, party_condition(f"{tag} 丙方")) == []
+
+
+def test_party_keyword_same_condition_without_postgresql():
+    with Session(create_engine("sqlite://")) as session:
+        condition = party_condition("甲方")
+        sql = str(condition.compile(dialect=session.get_bind().dialect))
+    assert "LIKE" in sql and "to_tsvector" not in sql
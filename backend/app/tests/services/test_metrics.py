@@ -0,0 +1,53 @@
+"""
+性能指标测试（路由耗时、每个请求的 SQL 统计、连接占用）
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from app.core import metrics
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_request_metrics_by_route_template(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", poolclass=metrics.InstrumentedQueuePool)
+    metrics.instrument_engine(engine, "test")
+    route = "/items/{item_id}"
+    app = FastAPI()
+    app.middleware("http")(metrics.metrics_middleware)
+
+    @app.get(route)
+    def read_item(item_id: int):
+        # 同步路由在线程池中执行，SQL 仍计入当前请求
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT :id"), {"id": item_id})
+        return {"id": item_id}
+
+    before = {
+        "requests": _sample("http_request_duration_seconds_count", method="GET", route=route, status="200"),
+        "queries": _sample("http_request_db_queries_sum", method="GET", route=route),
+        "holds": _sample("db_connection_hold_seconds_count", engine="test", route=route),
+    }
+    http = TestClient(app)
+    for item_id in (1, 2):
+        assert http.get(f"/items/{item_id}").json() == {"id": item_id}
+    assert http.get("/missing").status_code == 404
+
+    assert _sample("http_request_duration_seconds_count", method="GET", route=route, status="200") == before["requests"] + 2
+    assert _sample("http_request_db_queries_sum", method="GET", route=route) == before["queries"] + 4
+    assert _sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
+    # 连接按检出时的路由统计，归还后不再计为占用
+    assert _sample("db_connection_hold_seconds_count", engine="test", route=route) == before["holds"] + 2
+    assert _sample("db_connections_held", engine="test", route=route) == 0
+    assert _sample("db_pool_wait_seconds_count", engine="test") >= 2
+    assert _sample("db_pool_checked_out", engine="test") == 0
+
+    body = metrics.render().decode()
+    assert 'http_request_db_seconds_bucket{le="0.005",method="GET",route="/items/{item_id}"}' in body
+    engine.dispose()
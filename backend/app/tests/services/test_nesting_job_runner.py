@@ -0,0 +1,161 @@
+"""
+套料任务进程池测试
+"""
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.models import NestingJob
+from app.services import nesting_job_runner as runner_module
+from app.services.coil_candidate_index import refresh_coil_candidates
+from app.services.nesting_job_runner import (
+    JobProgress,
+    NestingJobCancelled,
+    NestingJobRunner,
+    run_nesting_job,
+)
+
+ORDER = {
+    "docNo": "SO-JOB-001", "docDate": "2025-01-01", "deliveryDate": "2025-02-01", "材质": "JOB304",
+    "qty": 2, "宽度": "1000", "长度": "2000", "公称厚度": "1.0", "表面要求": "Brushed",
+}
+
+
+@pytest.fixture
+def steel_coil(db: Session):
+    lot_id = f"LOT-{uuid4().hex[:8]}"
+    inventory_id = f"INV-{uuid4().hex[:8]}"
+    db.execute(
+        text("""
+            INSERT INTO inventory (inventory_id, material_id, material_desc, material_lot_id, lot_no, stock_qty)
+            VALUES (:inventory_id, 'M-1', '不锈钢钢卷', :lot_id, 'L-1', 1000)
+        """),
+        {"inventory_id": inventory_id, "lot_id": lot_id},
+    )
+    for desc, value in (("材质", "JOB304"), ("公称厚度", "1.0"), ("宽度", "1000")):
+        db.execute(
+            text("""
+                INSERT INTO material_lot_feature (material_lot_feature_id, material_lot_id, feature_desc, feature_value)
+                VALUES (:id, :lot_id, :desc, :value)
+            """),
+            {"id": uuid4().hex, "lot_id": lot_id, "desc": desc, "value": value},
+        )
+    db.commit()
+    refresh_coil_candidates(db, inventory_ids=[inventory_id])
+    yield lot_id
+    db.execute(text("DELETE FROM material_lot_feature WHERE material_lot_id = :lot_id"), {"lot_id": lot_id})
+    db.execute(text("DELETE FROM inventory WHERE inventory_id = :inventory_id"), {"inventory_id": inventory_id})
+    refresh_coil_candidates(db, inventory_ids=[inventory_id], commit=False)
+    db.execute(text("DELETE FROM nesting_job WHERE creator = 'job-test'"))
+    db.commit()
+
+
+def test_submitted_job_runs_in_process_pool(db: Session, steel_coil: str):
+    runner = NestingJobRunner(max_workers=1)
+    try:
+        job = runner.submit(db, {"selectedSoData": [ORDER]}, creator="job-test")
+        assert runner.wait(job.jobId, timeout=120)
+    finally:
+        runner.stop()
+
+    db.refresh(job)
+    assert (job.status, job.progress, job.stage) == ("completed", 100, None)
+    final_table = job.resultData["data"]["nesting_result"]["final_table"]
+    assert [row["SteelRollIdentifier"] for row in final_table] == [steel_coil]
+    assert job.resultData["code"] == 201
+
+
+def test_cancelled_job_is_not_executed(db: Session, steel_coil: str):
+    job = NestingJob(jobId=str(uuid4()), requestData={"selectedSoData": [ORDER]}, creator="job-test")
+    db.add(job)
+    db.commit()
+
+    NestingJobRunner().cancel(db, job)
+    assert run_nesting_job(job.jobId) == "cancelled"
+
+    db.refresh(job)
+    assert job.status == "cancelled"
+    assert job.startDate is None and job.resultData is None
+
+
+def test_progress_checkpoint_stops_cancelled_job(db: Session, steel_coil: str):
+    job = NestingJob(jobId=str(uuid4()), status="running", creator="job-test")
+    db.add(job)
+    db.commit()
+
+    JobProgress(job.jobId)(30, "直接匹配")
+    db.refresh(job)
+    assert (job.progress, job.stage) == (30, "直接匹配")
+
+    job.status = "cancelled"
+    db.add(job)
+    db.commit()
+    with pytest.raises(NestingJobCancelled):
+        JobProgress(job.jobId)(45, "单订单多倍数匹配")
+
+
+def test_orphaned_jobs_are_failed_on_start(db: Session):
+    stale = datetime.now() - timedelta(minutes=10)
+    orphaned = NestingJob(jobId=str(uuid4()), status="running", creator="job-test", owner="gone:1:x", heartbeatDate=stale)
+    alive = NestingJob(jobId=str(uuid4()), status="running", creator="job-test", owner="other:2:y", heartbeatDate=datetime.now())
+    db.add_all([orphaned, alive])
+    db.commit()
+    try:
+        assert NestingJobRunner(heartbeat_interval=1, stale_seconds=60).fail_orphaned_jobs() >= 1
+        db.refresh(orphaned)
+        db.refresh(alive)
+        assert orphaned.status == "failed" and orphaned.finishDate is not None
+        # 其他存活进程的任务心跳仍在更新，不受影响
+        assert alive.status == "running"
+    finally:
+        db.execute(text("DELETE FROM nesting_job WHERE creator = 'job-test'"))
+        db.commit()
+
+
+class _FakePool:
+    """不启动子进程的进程池：提交的任务保持未开始状态"""
+
+    def __init__(self, broken: bool = False, **kwargs):
+        self.broken = broken
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("子进程异常退出")
+        return Future()
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        self.shut_down = True
+
+
+def test_broken_pool_is_replaced_without_stopping_runner(db: Session, monkeypatch):
+    monkeypatch.setattr(runner_module, "ProcessPoolExecutor", _FakePool)
+    runner = NestingJobRunner(heartbeat_interval=60)
+    broken = _FakePool(broken=True)
+    queued = NestingJob(jobId=str(uuid4()), creator="job-test", owner=runner.owner_id, heartbeatDate=datetime.now())
+    db.add(queued)
+    db.commit()
+    runner._executor = broken
+    runner._futures[queued.jobId] = Future()
+    runner._future_pools[queued.jobId] = broken
+    try:
+        job = runner.submit(db, {"selectedSoData": [ORDER]}, creator="job-test")
+
+        # 只替换损坏的进程池并处理其中的任务，心跳线程继续运行
+        assert broken.shut_down and runner._executor is not broken
+        assert runner._future_pools[job.jobId] is runner._executor
+        assert not runner._stopping.is_set() and runner._heartbeat_thread.is_alive()
+        db.refresh(queued)
+        db.refresh(job)
+        assert queued.status == "failed"
+        assert job.status == "pending"
+    finally:
+        runner.stop()
+        db.execute(text("DELETE FROM nesting_job WHERE creator = 'job-test'"))
+        db.commit()
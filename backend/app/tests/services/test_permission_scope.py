@@ -0,0 +1,84 @@
+"""
+用户公司权限范围测试
+"""
+
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session, delete, select
+
+from app.core.security import get_password_hash
+from app.models import Company, User, UserCompany
+from app.models.models_invoice import Invoice, InvoiceFile
+from app.services.permission_scope import can_access_company, company_scope_cache, scoped, user_company_set
+
+
+@pytest.fixture
+def scope_data(db: Session):
+    """用户关联公司 A；公司 A、B 与无公司各一张票据"""
+    user = User(email=f"scope-{uuid4().hex[:8]}@example.com", hashed_password=get_password_hash("changethis"))
+    companies = [Company(name=f"权限测试{i}", code=f"SCOPE-{uuid4().hex[:8]}") for i in range(2)]
+    db.add(user)
+    db.add_all(companies)
+    db.commit()
+    db.add(UserCompany(user_id=user.id, company_id=companies[0].id, is_primary=True))
+    invoice_file = InvoiceFile(
+        file_name="scope.pdf", file_path="/tmp/scope.pdf", file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id
+    )
+    db.add(invoice_file)
+    db.commit()
+    invoices = [
+        Invoice(invoice_no=f"SCOPE-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                creator_id=user.id, company_id=company_id)
+        for company_id in (companies[0].id, companies[1].id, None)
+    ]
+    db.add_all(invoices)
+    db.commit()
+    yield user, companies, invoices
+
+    for invoice in invoices:
+        db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.exec(delete(UserCompany).where(UserCompany.user_id == user.id))
+    db.commit()
+    for company in companies:
+        db.delete(company)
+    db.delete(user)
+    db.commit()
+
+
+def test_list_filter_uses_exists(db: Session, scope_data):
+    user, companies, invoices = scope_data
+    statement = scoped(select(Invoice.id), Invoice.company_id, user)
+    assert "EXISTS" in str(statement) and " IN " not in str(statement)
+
+    visible = set(db.exec(statement.where(Invoice.id.in_([invoice.id for invoice in invoices]))).all())
+    assert visible == {invoices[0].id}
+
+    user.is_superuser = True
+    statement = scoped(select(Invoice.id), Invoice.company_id, user)
+    assert len(db.exec(statement.where(Invoice.id.in_([invoice.id for invoice in invoices]))).all()) == 3
+    user.is_superuser = False
+
+
+def test_membership_changes_invalidate_cache(db: Session, scope_data):
+    user, companies, _ = scope_data
+    company_scope_cache.clear()
+    assert user_company_set(db, user.id) == {companies[0].id}
+    assert company_scope_cache.get(user.id) == {companies[0].id}
+    assert can_access_company(db, user, None)
+    assert not can_access_company(db, user, companies[1].id)
+
+    db.add(UserCompany(user_id=user.id, company_id=companies[1].id))
+    db.commit()
+    assert company_scope_cache.get(user.id) is None
+    assert can_access_company(db, user, companies[1].id)
+
+    membership = db.exec(
+        select(UserCompany).where(UserCompany.user_id == user.id, UserCompany.company_id == companies[0].id)
+    ).one()
+    db.delete(membership)
+    db.commit()
+    assert not can_access_company(db, user, companies[0].id)
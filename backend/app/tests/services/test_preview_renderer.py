@@ -0,0 +1,78 @@
+"""
+票据预览图生成测试
+"""
+
+import importlib.util
+import json
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+from app.services.preview_renderer import (
+    MANIFEST_NAME, PreviewRenderer, PreviewUnavailable, preview_dir, read_manifest, render_previews,
+)
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+
+def test_manifest_marks_completed_previews(tmp_path):
+    source = tmp_path / "ab" / "cdef"
+    source.parent.mkdir()
+    source.write_bytes(b"data")
+    assert preview_dir(str(source)) == tmp_path / "ab" / "cdef.previews"
+    assert read_manifest(str(source)) is None
+
+    preview_dir(str(source)).mkdir()
+    (preview_dir(str(source)) / MANIFEST_NAME).write_text(json.dumps({"thumbnail": "thumb.webp", "pages": []}))
+    assert read_manifest(str(source))["thumbnail"] == "thumb.webp"
+    # 已生成的文件不再提交
+    assert PreviewRenderer(max_workers=1).submit(str(source), "image/png") is None
+
+
+class InlineExecutor:
+    """在当前进程中执行提交的任务（使对导入的替换对处理过程生效）"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def test_missing_dependency_disables_rendering(tmp_path, monkeypatch):
+    # 模拟未安装 Pillow
+    monkeypatch.setitem(sys.modules, "PIL", None)
+    source = tmp_path / "page.png"
+    source.write_bytes(b"not rendered")
+    with pytest.raises(PreviewUnavailable):
+        render_previews(str(source), "image/png", 64, 256, 5)
+
+    renderer = PreviewRenderer(max_workers=1)
+    monkeypatch.setattr(renderer, "_get_executor", InlineExecutor)
+    try:
+        assert renderer.ensure(str(source), "image/png", timeout=60) is None
+        assert renderer.stats()["unavailable"]
+        assert renderer.submit(str(source), "image/png") is None
+    finally:
+        renderer.stop()
+
+
+@pytest.mark.skipif(not HAS_PILLOW, reason="未安装 Pillow")
+def test_render_image_pages(tmp_path):
+    from PIL import Image
+
+    source = tmp_path / "scan.png"
+    Image.new("RGB", (2000, 1000), "white").save(source)
+    renderer = PreviewRenderer(max_workers=1)
+    try:
+        manifest = renderer.ensure(str(source), "image/png", timeout=60)
+    finally:
+        renderer.stop()
+
+    assert manifest == read_manifest(str(source))
+    assert len(manifest["pages"]) == 1
+    with Image.open(preview_dir(str(source)) / manifest["thumbnail"]) as thumbnail:
+        assert max(thumbnail.size) <= 320
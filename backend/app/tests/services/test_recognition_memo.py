@@ -0,0 +1,131 @@
+"""
+识别结果缓存测试
+"""
+
+import json
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session, delete, select
+
+from app.core.security import get_password_hash
+from app.models import User
+from app.models.models_invoice import (
+    Invoice, InvoiceFile, InvoiceItem, LLMConfig, RecognitionField, RecognitionResult, RecognitionResultCache,
+    RecognitionTask,
+)
+from app.services import recognition_memo
+from app.services.dify_service import SyntaxService
+
+RESPONSE = {"data": {"outputs": {"text": {"invoice_no": "MEMO-001", "total_amount": 100, "items": [
+    {"LineId": "1", "name": "钢卷", "quantity": 2, "amount": 100},
+]}}}}
+
+
+@pytest.fixture
+def memo_data(db: Session, tmp_path):
+    user = User(email=f"memo-{uuid4().hex[:8]}@example.com", hashed_password=get_password_hash("changethis"))
+    db.add(user)
+    db.commit()
+    config = LLMConfig(name=f"memo-{uuid4().hex[:8]}", endpoint="https://dify.example.com/v1", api_key="key",
+                       creator_id=user.id)
+    path = tmp_path / "memo.pdf"
+    path.write_bytes(b"%PDF-1.4 memo")
+    invoice_file = InvoiceFile(
+        file_name="memo.pdf", file_path=str(path), file_size=13, file_type="pdf", mime_type="application/pdf",
+        file_hash=uuid4().hex, uploader_id=user.id,
+    )
+    db.add_all([config, invoice_file])
+    db.commit()
+    invoice = Invoice(invoice_no=f"MEMO-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                      creator_id=user.id)
+    db.add(invoice)
+    db.commit()
+    yield user, config, invoice
+
+    task_ids = select(RecognitionTask.id).where(RecognitionTask.invoice_id == invoice.id)
+    db.exec(delete(RecognitionResultCache).where(RecognitionResultCache.file_hash == invoice_file.file_hash))
+    result_ids = select(RecognitionResult.id).where(RecognitionResult.invoice_id == invoice.id)
+    db.exec(delete(RecognitionField).where(RecognitionField.result_id.in_(result_ids)))
+    db.exec(delete(RecognitionResult).where(RecognitionResult.task_id.in_(task_ids)))
+    db.exec(delete(RecognitionTask).where(RecognitionTask.invoice_id == invoice.id))
+    db.exec(delete(InvoiceItem).where(InvoiceItem.id == invoice.id))
+    db.commit()
+    db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.delete(config)
+    db.commit()
+    db.delete(user)
+    db.commit()
+
+
+@pytest.fixture
+def dify_calls(monkeypatch):
+    calls = []
+
+    def fake_call(self, task, model_config, file, force_upload=False):
+        calls.append(task.id)
+        return {"success": True, "data": {
+            "raw_payload": json.dumps(RESPONSE, ensure_ascii=False), "normalized_fields": {},
+            "model_usage": {"total_tokens": 10}, "full_response": RESPONSE,
+        }}
+
+    monkeypatch.setattr(SyntaxService, "_call_dify_api", fake_call)
+    return calls
+
+
+def _new_task(db: Session, user: User, config: LLMConfig, invoice: Invoice, **params) -> RecognitionTask:
+    task = RecognitionTask(
+        task_no=f"MEMO-{uuid4().hex[:12]}", invoice_id=invoice.id, operator_id=user.id,
+        params={"model_config_id": str(config.id), "template_prompt": "提取票据字段", **params},
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+
+def test_second_task_replays_cached_result(db: Session, memo_data, dify_calls):
+    user, config, invoice = memo_data
+    first = _new_task(db, user, config, invoice)
+    assert SyntaxService(db).process_task(first.id)
+    assert dify_calls == [first.id]
+
+    second = _new_task(db, user, config, invoice)
+    assert SyntaxService(db).process_task(second.id)
+    assert dify_calls == [first.id]
+    db.refresh(second)
+    assert second.status == "completed"
+
+    replayed = db.exec(select(RecognitionResult).where(RecognitionResult.task_id == second.id)).one()
+    assert replayed.model_usage["cache_hit"] is True
+    assert replayed.model_usage["source_task_id"] == str(first.id)
+    assert json.loads(replayed.raw_payload) == RESPONSE
+    db.refresh(invoice)
+    assert invoice.invoice_no == "MEMO-001"
+    entry = db.exec(select(RecognitionResultCache).where(RecognitionResultCache.model_config_id == str(config.id))).one()
+    assert entry.hit_count == 1
+
+    # 提示词不同、或任务要求绕过缓存时重新调用
+    changed = _new_task(db, user, config, invoice, template_prompt="其他提示词")
+    bypass = _new_task(db, user, config, invoice, use_result_cache=False)
+    assert SyntaxService(db).process_task(changed.id)
+    assert SyntaxService(db).process_task(bypass.id)
+    assert dify_calls == [first.id, changed.id, bypass.id]
+
+
+def test_invalidate_by_invoice_and_config(db: Session, memo_data, dify_calls):
+    user, config, invoice = memo_data
+    task = _new_task(db, user, config, invoice)
+    assert SyntaxService(db).process_task(task.id)
+
+    assert recognition_memo.invalidate(db) == 0
+    assert recognition_memo.invalidate(db, invoice_id=invoice.id) == 1
+    db.commit()
+
+    again = _new_task(db, user, config, invoice)
+    assert SyntaxService(db).process_task(again.id)
+    assert dify_calls == [task.id, again.id]
+
+    assert recognition_memo.invalidate(db, model_config_id=config.id) == 1
+    db.commit()
@@ -0,0 +1,89 @@
+"""
+识别任务批量创建测试
+"""
+
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session, delete, select
+
+from app.core.security import get_password_hash
+from app.models import Company, User, UserCompany
+from app.models.models_invoice import Invoice, InvoiceFile, RecognitionTask
+from app.services.recognition_task_batch import BatchTaskError, apply_model_template_info, insert_tasks, resolve_invoices
+
+
+@pytest.fixture
+def batch_data(db: Session):
+    """用户关联公司 A；三张票据，第二个文件已识别成功，第三张属于公司 B"""
+    user = User(email=f"batch-{uuid4().hex[:8]}@example.com", hashed_password=get_password_hash("changethis"))
+    companies = [Company(name=f"批量测试{i}", code=f"BATCH-{uuid4().hex[:8]}") for i in range(2)]
+    db.add(user)
+    db.add_all(companies)
+    db.commit()
+    db.add(UserCompany(user_id=user.id, company_id=companies[0].id, is_primary=True))
+    files = [
+        InvoiceFile(
+            file_name=f"batch-{i}.pdf", file_path=f"/tmp/batch-{i}.pdf", file_size=1, file_type="pdf",
+            mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id, status=status
+        )
+        for i, status in enumerate(("pending", "processed", "pending"))
+    ]
+    db.add_all(files)
+    db.commit()
+    invoices = [
+        Invoice(invoice_no=f"BATCH-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                creator_id=user.id, company_id=company_id)
+        for invoice_file, company_id in zip(files, (companies[0].id, companies[0].id, companies[1].id))
+    ]
+    db.add_all(invoices)
+    db.commit()
+    yield user, files, invoices
+
+    db.exec(delete(RecognitionTask).where(RecognitionTask.invoice_id.in_([invoice.id for invoice in invoices])))
+    for invoice in invoices:
+        db.delete(invoice)
+    db.commit()
+    for invoice_file in files:
+        db.delete(invoice_file)
+    db.exec(delete(UserCompany).where(UserCompany.user_id == user.id))
+    db.commit()
+    for company in companies:
+        db.delete(company)
+    db.delete(user)
+    db.commit()
+
+
+def test_resolve_invoices(db: Session, batch_data):
+    user, files, invoices = batch_data
+    resolved = resolve_invoices(db, [files[1].id, files[0].id, files[0].id], user)
+    assert [invoice.id for invoice in resolved.invoices] == [invoices[0].id]
+    assert resolved.skipped_file_ids == [files[1].id]
+
+    with pytest.raises(BatchTaskError) as exc_info:
+        resolve_invoices(db, [files[0].id, files[2].id], user)
+    assert exc_info.value.status_code == 403
+
+    with pytest.raises(BatchTaskError) as exc_info:
+        resolve_invoices(db, [uuid4()], user)
+    assert exc_info.value.status_code == 404
+
+    user.is_superuser = True
+    assert len(resolve_invoices(db, [file.id for file in files], user).invoices) == 2
+    user.is_superuser = False
+
+
+def test_insert_tasks_single_statement(db: Session, batch_data):
+    user, files, invoices = batch_data
+    targets = [invoices[0], invoices[2]]
+    rows = insert_tasks(db, targets, {"model_config_id": str(uuid4())}, user.id, status="queued")
+    apply_model_template_info(db, targets, model_name="批量模型", recognition_status="processing")
+    db.commit()
+
+    tasks = db.exec(select(RecognitionTask).where(RecognitionTask.id.in_([row["id"] for row in rows]))).all()
+    assert {task.invoice_id for task in tasks} == {invoices[0].id, invoices[2].id}
+    assert all(task.status == "queued" and task.params["model_config_id"] for task in tasks)
+    assert len({task.task_no for task in tasks}) == 2
+
+    db.refresh(invoices[2])
+    assert invoices[2].recognition_status == "processing"
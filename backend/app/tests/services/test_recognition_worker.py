@@ -0,0 +1,115 @@
+"""
+识别任务工作池出队测试
+"""
+
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import bindparam, text
+from sqlmodel import Session, select
+
+from app.core.security import get_password_hash
+from app.models import User
+from app.models.models_invoice import Invoice, InvoiceFile, RecognitionTask
+from app.services.recognition_worker import RecognitionWorkerPool, TASK_STATUS_QUEUED
+
+
+@pytest.fixture
+def queued_tasks(db: Session):
+    """创建一张票据及三个已入队任务：配置A（优先级1、5），配置B（优先级0）"""
+    user = db.exec(select(User).where(User.email == "worker-test@example.com")).first()
+    if not user:
+        user = User(email="worker-test@example.com", hashed_password=get_password_hash("changethis"))
+        db.add(user)
+        db.commit()
+
+    invoice_file = InvoiceFile(
+        file_name="worker.pdf", file_path="/tmp/worker.pdf", file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id
+    )
+    db.add(invoice_file)
+    db.commit()
+    invoice = Invoice(invoice_no=f"WORKER-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id, creator_id=user.id)
+    db.add(invoice)
+    db.commit()
+
+    config_a, config_b = str(uuid4()), str(uuid4())
+    tasks = []
+    for config_id, priority in [(config_a, 1), (config_a, 5), (config_b, 0)]:
+        task = RecognitionTask(
+            task_no=f"TASK-{uuid4().hex[:12]}", invoice_id=invoice.id, params={"model_config_id": config_id},
+            status=TASK_STATUS_QUEUED, priority=priority, operator_id=user.id
+        )
+        db.add(task)
+        tasks.append(task)
+    db.commit()
+    yield {"config_a": config_a, "config_b": config_b, "tasks": tasks}
+
+    for task in tasks:
+        db.delete(task)
+    db.commit()
+    db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.commit()
+
+
+def test_claim_honours_priority_and_per_config_limit(queued_tasks):
+    pool = RecognitionWorkerPool(concurrency=4, per_config_limit=1)
+    high_priority_task = queued_tasks["tasks"][1]
+
+    claimed = pool._claim_next_task()
+    assert claimed == (str(high_priority_task.id), queued_tasks["config_a"])
+    pool._inflight[claimed[0]] = claimed[1]
+
+    # 配置A已达到上限，下一个应领取配置B的任务（即使优先级更低）
+    claimed = pool._claim_next_task()
+    assert claimed == (str(queued_tasks["tasks"][2].id), queued_tasks["config_b"])
+    pool._inflight[claimed[0]] = claimed[1]
+
+    # 两个配置均已满
+    assert pool._claim_next_task() is None
+
+
+def test_stale_sweep_requeues_only_tasks_without_heartbeat(db: Session, queued_tasks):
+    live_pool = RecognitionWorkerPool(concurrency=4, per_config_limit=4, heartbeat_interval=1, stale_seconds=60)
+    live_id, _ = live_pool._claim_next_task()
+    dead_id, _ = live_pool._claim_next_task()
+    live_pool._inflight[live_id] = queued_tasks["config_a"]
+
+    # 模拟两个任务都已长时间未更新心跳，其中 live_id 仍在本实例中执行
+    db.execute(
+        text("UPDATE recognition_task SET heartbeat_at = :old WHERE id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        {"old": datetime.now() - timedelta(minutes=10), "ids": [live_id, dead_id]},
+    )
+    db.commit()
+    live_pool._heartbeat()
+
+    # 另一个实例启动后的检查：只重新入队没有心跳的任务
+    RecognitionWorkerPool(heartbeat_interval=1, stale_seconds=60)._requeue_stale_tasks()
+    db.expire_all()
+    live_task = db.get(RecognitionTask, UUID(live_id))
+    dead_task = db.get(RecognitionTask, UUID(dead_id))
+    assert (live_task.status, live_task.worker_id) == ("processing", live_pool.worker_id)
+    assert (dead_task.status, dead_task.worker_id, dead_task.heartbeat_at) == (TASK_STATUS_QUEUED, None, None)
+
+
+def test_stale_task_fails_after_max_attempts(db: Session, queued_tasks):
+    pool = RecognitionWorkerPool(concurrency=4, per_config_limit=4, heartbeat_interval=1, stale_seconds=60, max_attempts=2)
+    stale = {"old": datetime.now() - timedelta(minutes=10)}
+
+    # 第一次中断：重新入队；第二次领取后再次中断：达到上限，标记为失败
+    for expected_status in (TASK_STATUS_QUEUED, "failed"):
+        task_id, _ = pool._claim_next_task()
+        db.execute(text("UPDATE recognition_task SET heartbeat_at = :old WHERE id = :id"), {**stale, "id": task_id})
+        db.commit()
+        pool._requeue_stale_tasks()
+        db.expire_all()
+        task = db.get(RecognitionTask, UUID(task_id))
+        assert task.status == expected_status
+
+    assert (task.attempts, task.error_code, task.worker_id) == (2, "WORKER_INTERRUPTED", None)
+    assert db.get(Invoice, task.invoice_id).recognition_status == "failed"
@@ -0,0 +1,45 @@
+"""
+数据库结构能力注册表测试
+"""
+
+from sqlalchemy import create_engine
+
+from app.core.db import engine
+from app.services.schema_capabilities import (
+    INVOICE_BASE_FIELDS,
+    RECOGNITION_TASK_BASE_FIELDS,
+    SchemaCapabilities,
+    SchemaCapabilityRegistry,
+)
+
+
+def test_from_columns_builds_field_lists():
+    columns = {
+        "recognition_task": RECOGNITION_TASK_BASE_FIELDS + ("template_version_id",),
+        "invoice": INVOICE_BASE_FIELDS + ("model_name",),
+    }
+    capabilities = SchemaCapabilities.from_columns(columns, introspected=True)
+    assert capabilities.recognition_task_fields[3:5] == ("template_id", "template_version_id")
+    assert capabilities.invoice_fields[-1] == "model_name"
+    assert "template_name" not in capabilities.invoice_fields
+    assert capabilities.task_has_template_version_id
+
+    capabilities = SchemaCapabilities.from_columns({"recognition_task": ("id", "status")}, introspected=True)
+    assert capabilities.recognition_task_fields == ("id", "status")
+    assert not capabilities.task_has_template_id
+
+
+def test_refresh_introspects_database():
+    registry = SchemaCapabilityRegistry(bind=engine)
+    capabilities = registry.get()
+    assert capabilities.introspected
+    assert capabilities.has_column("invoice_file", "file_hash")
+    assert registry.get() is capabilities
+
+
+def test_refresh_falls_back_to_defaults():
+    registry = SchemaCapabilityRegistry(bind=create_engine("postgresql+psycopg://nobody@127.0.0.1:1/none"))
+    capabilities = registry.refresh()
+    assert not capabilities.introspected
+    assert capabilities.recognition_task_fields == RECOGNITION_TASK_BASE_FIELDS
+    assert capabilities.invoice_fields == INVOICE_BASE_FIELDS
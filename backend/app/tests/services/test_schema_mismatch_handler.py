@@ -392,6 +392,22 @@ class TestHandleMismatch:
         assert result.final_data == output_data
         assert result.requires_manual_review == False
 
+    def test_handle_mismatch_sync_inside_running_loop(self, mismatch_handler):
+        """同步版本可在已有事件循环的线程中直接调用（不再嵌套 asyncio.run）"""
+        output_data = {"invoice_no": 12345678, "invoice_date": "2024-01-01"}
+
+        async def call_from_loop():
+            return mismatch_handler.handle_mismatch_sync(
+                output_data=output_data,
+                schema_id=None,
+                model_config_id=None,
+                handling_strategy="auto"
+            )
+
+        result = asyncio.run(call_from_loop())
+        assert isinstance(result, SchemaMismatchResult)
+        assert result.final_data == output_data
+
     @pytest.mark.asyncio
     async def test_handle_error_case(self, mismatch_handler):
         """测试错误处理"""
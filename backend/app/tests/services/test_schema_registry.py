@@ -0,0 +1,90 @@
+"""
+Schema 校验器注册表测试
+"""
+
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.security import get_password_hash
+from app.models import User
+from app.models.models_invoice import OutputSchema
+from app.services.schema_registry import SchemaRegistry, schema_registry
+from app.services.schema_validation_service import schema_validation_service
+
+DEFINITION = {
+    "type": "object",
+    "required": ["invoice_no"],
+    "properties": {"invoice_no": {"type": "string"}, "total_amount": {"type": "number"}},
+    "additionalProperties": False,
+}
+
+
+@pytest.fixture
+def output_schema(db: Session):
+    user = db.exec(select(User).where(User.email == "schema-registry@example.com")).first()
+    if not user:
+        user = User(email="schema-registry@example.com", hashed_password=get_password_hash("changethis"))
+        db.add(user)
+        db.commit()
+    schema = OutputSchema(
+        name=f"注册表测试-{uuid4().hex[:8]}", version="1.0.0", schema_definition=DEFINITION,
+        creator_id=user.id, update_time=datetime.now(),
+    )
+    db.add(schema)
+    db.commit()
+    db.refresh(schema)
+    yield schema
+    db.delete(schema)
+    db.commit()
+    schema_registry.invalidate(schema.id)
+
+
+def test_compiled_schema_is_reused_until_changed(db: Session, output_schema: OutputSchema):
+    registry = SchemaRegistry(ttl_seconds=3600)
+    compiled = registry.get(output_schema.id)
+    assert compiled.version == "1.0.0"
+    assert registry.get(str(output_schema.id)) is compiled
+
+    # 修改后未失效前仍使用缓存，invalidate 后重新编译
+    output_schema.schema_definition = {**DEFINITION, "required": ["invoice_no", "total_amount"]}
+    output_schema.update_time = datetime.now() + timedelta(seconds=1)
+    db.add(output_schema)
+    db.commit()
+    assert registry.get(output_schema.id) is compiled
+    registry.invalidate(output_schema.id)
+    recompiled = registry.get(output_schema.id)
+    assert recompiled is not compiled
+    assert recompiled.first_error({"invoice_no": "A"}) is not None
+
+
+def test_expired_entries_are_rechecked_by_version(db: Session, output_schema: OutputSchema):
+    registry = SchemaRegistry(ttl_seconds=0)
+    compiled = registry.get(output_schema.id)
+    assert registry.get(output_schema.id) is compiled
+
+    output_schema.version = "1.0.1"
+    db.add(output_schema)
+    db.commit()
+    assert registry.get(output_schema.id).version == "1.0.1"
+
+    output_schema.is_active = False
+    db.add(output_schema)
+    db.commit()
+    fallback = registry.get(output_schema.id)
+    assert fallback is None or fallback.schema_id != str(output_schema.id)
+
+
+def test_batch_validation_uses_one_schema(output_schema: OutputSchema):
+    results = schema_validation_service.validate_outputs_sync(
+        [{"invoice_no": "A", "total_amount": 1.5}, {"total_amount": "x"}, ["not", "an", "object"]],
+        schema_id=str(output_schema.id),
+    )
+    assert [result.is_valid for result in results] == [True, False, False]
+    assert results[1].errors[0]["message"] == "'invoice_no' is a required property"
+    assert results[2].errors[0]["field"] == "root"
+
+    single = schema_validation_service.validate_output_sync({"invoice_no": "A", "extra": 1}, str(output_schema.id))
+    assert not single.is_valid
@@ -0,0 +1,126 @@
+"""
+统计日汇总测试
+"""
+
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.core.security import get_password_hash
+from app.models import Company, User
+from app.models.models_invoice import Invoice, InvoiceFile, RecognitionTask, StatisticsDailyRollup
+from app.services.statistics_rollup import get_overview, get_trends, rebuild_rollup, refresh_rollup_for_tasks
+
+
+def _company_rows(db: Session, company_id) -> list:
+    rows = db.exec(
+        select(StatisticsDailyRollup)
+        .where(StatisticsDailyRollup.company_id == company_id)
+        .order_by(StatisticsDailyRollup.stat_date)
+    ).all()
+    return [
+        (row.stat_date, row.invoice_count, row.invoice_amount, row.review_pending, row.task_count, row.task_pending)
+        for row in rows
+    ]
+
+
+@pytest.fixture
+def company_invoices(db: Session):
+    """一个公司：今天一张票据（含一个待处理任务），昨天一张票据；另有一张无公司的票据"""
+    user = db.exec(select(User).where(User.email == "stats-test@example.com")).first()
+    if not user:
+        user = User(email="stats-test@example.com", hashed_password=get_password_hash("changethis"))
+        db.add(user)
+        db.commit()
+    company = Company(name="统计测试公司", code=f"STATS-{uuid4().hex[:8]}")
+    db.add(company)
+    invoice_file = InvoiceFile(
+        file_name="stats.pdf", file_path="/tmp/stats.pdf", file_size=1, file_type="pdf",
+        mime_type="application/pdf", file_hash=uuid4().hex, uploader_id=user.id
+    )
+    db.add(invoice_file)
+    db.commit()
+
+    now = datetime.now()
+    invoices = [
+        Invoice(invoice_no=f"STATS-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                creator_id=user.id, company_id=company.id, total_amount=100.0, create_time=now),
+        Invoice(invoice_no=f"STATS-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                creator_id=user.id, company_id=company.id, total_amount=50.0, create_time=now - timedelta(days=1)),
+        Invoice(invoice_no=f"STATS-{uuid4().hex[:8]}", invoice_type="未知", file_id=invoice_file.id,
+                creator_id=user.id, total_amount=10.0, create_time=now),
+    ]
+    db.add_all(invoices)
+    db.commit()
+    task = RecognitionTask(task_no=f"TASK-{uuid4().hex[:12]}", invoice_id=invoices[0].id, operator_id=user.id)
+    db.add(task)
+    db.commit()
+    yield {"company": company, "invoices": invoices, "task": task}
+
+    db.delete(task)
+    db.commit()
+    for invoice in invoices:
+        db.delete(invoice)
+    db.commit()
+    db.delete(invoice_file)
+    db.delete(company)
+    db.commit()
+    assert _company_rows(db, company.id) == []
+
+
+def test_orm_writes_refresh_company_rollup(db: Session, company_invoices: dict):
+    company = company_invoices["company"]
+    today = date.today()
+    assert _company_rows(db, company.id) == [
+        (today - timedelta(days=1), 1, 50.0, 1, 0, 0),
+        (today, 1, 100.0, 1, 1, 1),
+    ]
+
+    overview = get_overview(db, [company.id])
+    assert overview["overview"] | {"total_templates": 0, "active_templates": 0} == {
+        "total_invoices": 2, "today_invoices": 1, "total_tasks": 1, "today_tasks": 1,
+        "total_templates": 0, "active_templates": 0, "total_amount": 150.0, "today_amount": 100.0,
+    }
+    assert overview["task_status"] == {"pending": 1, "processing": 0, "completed": 0, "failed": 0}
+    assert [day["invoices"] for day in overview["daily_stats"]] == [0, 0, 0, 0, 0, 1, 1]
+
+    # 原生 SQL 修改任务状态后显式刷新；已入队等待领取的任务计入 pending
+    task = company_invoices["task"]
+    db.execute(text("UPDATE recognition_task SET status = 'queued' WHERE id = :id"), {"id": task.id})
+    refresh_rollup_for_tasks(db, [task.id])
+    db.commit()
+    assert get_overview(db, [company.id])["task_status"]["pending"] == 1
+    db.execute(text("UPDATE recognition_task SET status = 'processing' WHERE id = :id"), {"id": task.id})
+    refresh_rollup_for_tasks(db, [task.id])
+    db.commit()
+    assert get_overview(db, [company.id])["task_status"]["processing"] == 1
+
+    # ORM 修改状态与审核结果
+    db.refresh(task)
+    task.status = "completed"
+    invoice = company_invoices["invoices"][0]
+    invoice.review_status = "approved"
+    db.add_all([task, invoice])
+    db.commit()
+    overview = get_overview(db, [company.id])
+    assert overview["task_status"] == {"pending": 0, "processing": 0, "completed": 1, "failed": 0}
+    assert overview["review_status"] == {"pending": 1, "approved": 1, "rejected": 0}
+
+    # 未关联公司的用户看不到任何数据
+    assert get_overview(db, [])["overview"]["total_invoices"] == 0
+
+
+def test_rebuild_matches_incremental_rollup(db: Session, company_invoices: dict):
+    company = company_invoices["company"]
+    incremental = _company_rows(db, company.id)
+    rebuild_rollup(db)
+    assert _company_rows(db, company.id) == incremental
+
+    trends = get_trends(db, [company.id], 3)
+    assert trends["trends"][-1] == {
+        "date": (date.today() - timedelta(days=1)).strftime("%Y-%m-%d"), "invoices": 1, "amount": 50.0, "tasks": 0,
+    }
+    assert len(trends["trends"]) == 3
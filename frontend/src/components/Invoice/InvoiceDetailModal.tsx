@@ -71,6 +71,7 @@ interface InvoiceFileInfo {
   file_hash: string
   mime_type: string
   file_type: string
+  download_url?: string
 }
 
 interface InvoiceItem {
@@ -221,7 +222,7 @@ const InvoiceDetailModal = ({ isOpen, onClose, invoiceId }: InvoiceDetailModalPr
         setInvoiceFile(response.data)
         // 如果是PDF文件，获取文件内容并创建blob URL
         if (response.data.mime_type === 'application/pdf') {
-          await fetchPdfAsBlob()
+          await fetchPdfAsBlob(response.data.download_url)
         }
       }
     } catch (error: any) {
@@ -260,7 +261,8 @@ const InvoiceDetailModal = ({ isOpen, onClose, invoiceId }: InvoiceDetailModalPr
     }
   }
 
-  const fetchPdfAsBlob = async () => {
+  // downloadUrl 带文件内容版本，浏览器可直接使用缓存
+  const fetchPdfAsBlob = async (downloadUrl?: string) => {
     try {
       const token = localStorage.getItem('access_token')
       if (!token) {
@@ -272,7 +274,7 @@ const InvoiceDetailModal = ({ isOpen, onClose, invoiceId }: InvoiceDetailModalPr
       
       // 使用fetch获取文件，可以设置Authorization header
       const response = await fetch(
-        `${apiBaseUrl}/api/v1/invoices/${invoiceId}/file/download`,
+        downloadUrl ? `${apiBaseUrl}${downloadUrl}` : `${apiBaseUrl}/api/v1/invoices/${invoiceId}/file/download`,
         {
           headers: {
             'Authorization': `Bearer ${token}`